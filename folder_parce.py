@@ -205,7 +205,11 @@ def _calc_column_width(
     col_num: int,
     excel_cfg: Dict[str, Any],
 ) -> int:
-    """Ширина колонки: как calculate_column_width в main_impl (AUTO / фикс / added_columns_width)."""
+    """
+    Ширина колонки по ячейкам листа (auto_width_max_data_rows первых строк). Правила AUTO / фикс /
+    added_columns_width — как calculate_column_width_from_series в main_impl (там ширины считает
+    column_widths_from_frame по DataFrame с выборкой performance.column_width).
+    """
     added = excel_cfg.get("added_columns_width") or {}
     name = str(col_name) if col_name is not None else ""
     if name in added and isinstance(added[name], dict):
@@ -4,6 +4,7 @@
 Весь остальной код и модули находятся в каталоге src/.
 """
 
+import argparse
 import sys
 
 from src.config_loader import Config
@@ -12,9 +13,16 @@ from src import main_impl
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="SPOD: загрузка CSV, обработка и выгрузка в Excel")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Полный прогон даже при совпадении отпечатка (performance.run_memo)",
+    )
+    args = parser.parse_args()
     config = Config()
     set_current_config(config)
-    main_impl.main()
+    main_impl.main(force=args.force)
 
 
 if __name__ == "__main__":
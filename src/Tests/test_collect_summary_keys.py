@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Каркас SUMMARY: векторный collect_summary_keys_optimized против циклов collect_summary_keys."""
+
+from __future__ import annotations
+
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.main_impl as main_impl
+
+_KEYS = [
+    "CONTEST_CODE",
+    "TOURNAMENT_CODE",
+    "REWARD_CODE",
+    "GROUP_CODE",
+    "GROUP_VALUE",
+    "INDICATOR_CODE",
+    "INDICATOR_ADD_CALC_TYPE",
+]
+
+
+@pytest.fixture(autouse=True)
+def _summary_columns(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main_impl, "SUMMARY_KEY_COLUMNS", list(_KEYS))
+
+
+def _rows(df: pd.DataFrame) -> list:
+    return sorted(map(tuple, df[_KEYS].itertuples(index=False)))
+
+
+def _assert_same(dfs: dict) -> None:
+    expected = main_impl.collect_summary_keys(dfs)
+    actual = main_impl.collect_summary_keys_optimized(dfs)
+    assert list(actual.columns) == _KEYS
+    assert not actual.duplicated().any()
+    assert _rows(actual) == _rows(expected)
+
+
+def _spod_frames(seed: int, n_contests: int = 25) -> dict:
+    """Листы в форме выгрузки SPOD (строки, пустые значения, сироты, NaN после обработки)."""
+    rnd = random.Random(seed)
+    contests = [f"CNT_{i:03d}" for i in range(n_contests)]
+    pick = lambda: rnd.choice(contests + ["ORPHAN_C"])  # noqa: E731
+
+    contest_data = pd.DataFrame({"CONTEST_CODE": contests[: n_contests - 3] + ["CNT_ONLY_DATA"]})
+    schedule = pd.DataFrame({
+        "TOURNAMENT_CODE": [f"T_{i:04d}" for i in range(2 * n_contests)] + ["T_NOC", "T_NOC", "T_0001"],
+        "CONTEST_CODE": [pick() for _ in range(2 * n_contests)] + [np.nan, np.nan, "CNT_001"],
+        "TOURNAMENT_STATUS": "АКТИВНЫЙ",
+    })
+    link = pd.DataFrame({
+        "REWARD_CODE": [f"R_{rnd.randrange(n_contests):03d}" for _ in range(3 * n_contests)] + ["R_NOC"],
+        "CONTEST_CODE": [pick() for _ in range(3 * n_contests)] + [np.nan],
+    })
+    reward = pd.DataFrame({"REWARD_CODE": [f"R_{i:03d}" for i in range(n_contests + 5)] + ["R_ONLY_REWARD"]})
+    group_rows = []
+    for _ in range(3 * n_contests):
+        value = rnd.choice(["1", "2", "MSK", "SPB", "", np.nan])
+        group_rows.append((pick(), rnd.choice(["GRP_TB", "GRP_GOSB", "GRP_ROLE", np.nan]), value))
+    group_rows.append(("CNT_NV", "GRP_ONLY_NAN", np.nan))
+    groups = pd.DataFrame(group_rows, columns=["CONTEST_CODE", "GROUP_CODE", "GROUP_VALUE"])
+    ind_rows = []
+    for i in range(2 * n_contests):
+        ind_rows.append((
+            pick(),
+            f"IND_{i:03d}" if i % 7 else rnd.choice([np.nan, f" IND_{i:03d} "]),
+            rnd.choice(["", "SUM", "AVG", " SUM", np.nan]),
+        ))
+    ind_rows += [(np.nan, "IND_NOC", "SUM"), ("-", "IND_DASH", "AVG")]
+    indicators = pd.DataFrame(ind_rows, columns=["CONTEST_CODE", "INDICATOR_CODE", "INDICATOR_ADD_CALC_TYPE"])
+    return {
+        "CONTEST-DATA": contest_data,
+        "TOURNAMENT-SCHEDULE": schedule,
+        "REWARD-LINK": link,
+        "REWARD": reward,
+        "GROUP": groups,
+        "INDICATOR": indicators,
+    }
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_optimized_matches_loops(seed: int) -> None:
+    _assert_same(_spod_frames(seed))
+
+
+@pytest.mark.parametrize(
+    "missing",
+    [
+        (),
+        ("INDICATOR",),
+        ("GROUP", "INDICATOR"),
+        ("TOURNAMENT-SCHEDULE", "REWARD-LINK"),
+        ("CONTEST-DATA", "TOURNAMENT-SCHEDULE", "REWARD-LINK", "GROUP", "INDICATOR"),
+    ],
+)
+def test_optimized_matches_loops_with_missing_sheets(missing: tuple) -> None:
+    dfs = _spod_frames(7, n_contests=8)
+    for sheet in missing:
+        dfs[sheet] = pd.DataFrame() if sheet != "GROUP" else None
+    _assert_same(dfs)
+
+
+def test_empty_input_gives_empty_frame() -> None:
+    result = main_impl.collect_summary_keys_optimized({})
+    assert result.empty and list(result.columns) == _KEYS
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""AUTO-ширина колонок по DataFrame (performance.column_width) — одинаково для всех движков записи."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import src.main_impl as main_impl
+from src.config_loader import merge_column_width_config
+
+_PARAMS = {"min_col_width": 4, "max_col_width": 60, "col_width_mode": "AUTO"}
+
+
+def test_merge_column_width_config() -> None:
+    assert merge_column_width_config(None)["head_rows"] == 500
+    assert merge_column_width_config({"random_rows": "10", "_note": "x"})["random_rows"] == 10
+    with pytest.raises(ValueError):
+        merge_column_width_config({"head_rows": -1})
+
+
+def test_long_text_below_head_is_measured() -> None:
+    values = ["ab"] * 2000
+    values[1500] = "x" * 40
+    series = pd.Series(values)
+    settings = merge_column_width_config({"head_rows": 10, "random_rows": 0})
+    assert main_impl.calculate_column_width_from_series("C", series, _PARAMS, settings) == 40
+    # Выше порога полного обхода — только выборка (первые строки)
+    sampled = dict(settings, full_scan_max_rows=100)
+    assert main_impl.calculate_column_width_from_series("C", series, _PARAMS, sampled) == 4
+
+
+def test_neighbours_of_longest_sampled_values() -> None:
+    # Блок длинных значений: в выборку попала только первая строка блока
+    values = ["ab"] * 5000
+    for i in range(9, 30):
+        values[i] = "x" * (20 + i)
+    series = pd.Series(values)
+    settings = merge_column_width_config({"head_rows": 10, "random_rows": 0, "full_scan_max_rows": 0})
+    assert main_impl.calculate_column_width_from_series("C", series, _PARAMS, settings) == 49
+    no_longest = dict(settings, longest_rows=0)
+    assert main_impl.calculate_column_width_from_series("C", series, _PARAMS, no_longest) == 29
+
+
+def test_sample_positions_are_deterministic() -> None:
+    settings = merge_column_width_config({"head_rows": 5, "random_rows": 7})
+    first = main_impl._column_width_sample_positions(1000, settings)
+    assert list(first[:5]) == [0, 1, 2, 3, 4] and len(set(first)) == 12
+    assert (first == main_impl._column_width_sample_positions(1000, settings)).all()
+    assert list(main_impl._column_width_sample_positions(8, settings)) == list(range(8))
+
+
+def test_typed_columns_and_limits() -> None:
+    df = pd.DataFrame({
+        "I": pd.array([5, -123456, None, 7], dtype="Int64"),
+        "F": [1.5, np.nan, 0.123456, 2.0],
+        "K": pd.Categorical(["aa", "bbbbbbbbbbbbb", "aa", None], categories=["aa", "bbbbbbbbbbbbb", "z" * 30]),
+        "D": pd.to_datetime(["2024-01-01", None, "2024-02-01", "2024-03-01"]),
+        "WIDE": ["y" * 200] * 4,
+        "FIX": ["q"] * 4,
+        "ADDED": ["w" * 50] * 4,
+    })
+    params = dict(_PARAMS, added_columns_width={
+        "FIX": {"width_mode": 15},
+        "ADDED": {"max_width": 20, "min_width": 3},
+    })
+    widths = main_impl.column_widths_from_frame(df, params)
+    assert widths == [7, 8, 13, 19, 60, 15, 20]
+
+
+def test_engines_write_same_widths(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main_impl, "SHEET_ORDER", ["DATA"])
+    monkeypatch.setattr(main_impl, "APPLY_SORT_TO_MAIN", False)
+    monkeypatch.setattr(main_impl, "COLUMN_FORMATS", [
+        {"sheet": "DATA", "columns": ["N"], "data_type": "number", "decimal_places": 0},
+    ])
+    df = pd.DataFrame({"N": ["1 000 000", "2"], "T": ["короткий", "очень длинное значение ячейки"]})
+    widths = {}
+    for engine in ("openpyxl", "stream"):
+        monkeypatch.setattr(main_impl, "EXCEL_ENGINE", engine)
+        path = tmp_path / f"{engine}.xlsx"
+        main_impl.write_to_excel({"DATA": (df, dict(_PARAMS))}, str(path))
+        ws = load_workbook(path)["DATA"]
+        widths[engine] = [ws.column_dimensions[c].width for c in "AB"]
+    # Ширина N — по записанному числу 1000000 (после COLUMN_FORMATS), а не по строке «1 000 000»
+    assert widths["openpyxl"] == widths["stream"] == [7, 29]
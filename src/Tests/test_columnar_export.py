@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Колоночная выгрузка листов (токен main_columnar, src/columnar_export.py)."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src import console_ui
+from src.columnar_export import (
+    merge_columnar_output_config,
+    read_columnar_sheets,
+    write_columnar_sheets,
+)
+from src.config_loader import parse_run_outputs_config
+
+
+def _sheets() -> dict:
+    contest = pd.DataFrame(
+        {
+            "CONTEST_CODE": ["C1", "C2", "C3"],
+            "STATUS": pd.Categorical(["А", "Б", "А"]),
+            "MIXED": [1, "два", None],
+            "DT": pd.to_datetime(["2026-01-01", None, "2026-03-01"]),
+        },
+        index=[5, 7, 9],
+    )
+    dup = pd.DataFrame([[1, 2, 3]], columns=["X", "X", "Y"])
+    return {"CONTEST-DATA": (contest, {}), "SUMMARY": (dup, {}), "EMPTY": (pd.DataFrame(), {})}
+
+
+def test_config_validation() -> None:
+    assert merge_columnar_output_config(None) == {"format": "auto", "compression": None}
+    assert merge_columnar_output_config({"format": "Pickle", "_note": "x"})["format"] == "pickle"
+    with pytest.raises(ValueError):
+        merge_columnar_output_config({"format": "xlsx"})
+
+
+@pytest.mark.parametrize("fmt", ["pickle", "parquet", "feather"])
+def test_round_trip_and_manifest(tmp_path: Path, fmt: str) -> None:
+    if fmt != "pickle":
+        pytest.importorskip("pyarrow")
+    out = tmp_path / "SPOD_PROM main_2026-10-18_10-00-00.columnar"
+    manifest_path = write_columnar_sheets(
+        _sheets(), str(out), {"format": fmt}, sheet_order=["SUMMARY", "CONTEST-DATA"], block="PROM"
+    )
+    manifest = json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+    assert manifest["format"] == fmt and manifest["block"] == "PROM"
+    assert [e["sheet"] for e in manifest["sheets"]] == ["SUMMARY", "CONTEST-DATA", "EMPTY"]
+    assert manifest["sheets"][0]["renamed_columns"] == {"X (2)": "X"}
+    assert manifest["sheets"][1]["rows"] == 3
+    for entry in manifest["sheets"]:
+        assert (out / entry["file"]).is_file()
+
+    back = read_columnar_sheets(str(out))
+    assert list(back["SUMMARY"].columns) == ["X", "X", "Y"]
+    contest = back["CONTEST-DATA"]
+    assert contest["CONTEST_CODE"].tolist() == ["C1", "C2", "C3"]
+    assert contest["STATUS"].astype(str).tolist() == ["А", "Б", "А"]
+    assert contest["MIXED"].tolist()[:2] in ([1, "два"], ["1", "два"])
+    assert pd.isna(contest["MIXED"].iloc[2]) and pd.isna(contest["DT"].iloc[1])
+
+
+def test_run_outputs_token_keeps_processing_pipeline() -> None:
+    ro = parse_run_outputs_config({"run_outputs": ["main_columnar", "consistency_only"]})
+    tokens, write_main, consistency_early = ro[0], ro[3], ro[5]
+    assert "main_columnar" in tokens and not write_main and not consistency_early
+    ro = parse_run_outputs_config({"run_outputs": ["main_columnar", "manager_stats_only"]})
+    assert ro[7] is False  # manager_stats_early
+    assert console_ui.expected_phases_for_run_flags(
+        False, False, False, True, False, write_columnar=True
+    ) == 6
+    assert console_ui.expected_phases_for_run_flags(False, False, True, False, False, write_columnar=True) == 6
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Колонки результатов проверок консистентности (буфер ResultColumns) и общие наборы справочников."""
+
+from __future__ import annotations
+
+import pandas as pd
+
+from src.consistency_checks import (
+    ReferenceSets,
+    ResultColumns,
+    _run_field_format_check,
+    run_all_consistency_checks,
+    run_referential,
+)
+
+_RULES = {
+    "rules": [
+        {"id": "fmt", "type": "field_format", "sheet": "REWARD", "field": "DATE",
+         "format": {"type": "date"}, "output": {"column_on_sheet": "ПРОВЕРКА ДАТА"}},
+        {"id": "uniq", "type": "unique", "sheet": "REWARD", "key_columns": ["REWARD_CODE"]},
+        {"id": "ref", "type": "referential", "sheet_src": "REWARD", "column_src": "CONTEST_CODE",
+         "sheet_ref": "CONTEST", "column_ref": "CONTEST_CODE", "output": {"column_on_sheet": "ПРОВЕРКА CONTEST"}},
+        {"id": "spod", "type": "json_spod_format", "sheet": "CONTEST", "json_column": "ADD_DATA",
+         "json_required": False},
+    ]
+}
+
+
+def _sheets() -> dict:
+    reward = pd.DataFrame(
+        {"REWARD_CODE": ["R1", "R1", "R2"], "DATE": ["2026-01-01", "bad", ""], "CONTEST_CODE": ["C1", "C9", "C1"]},
+        dtype=object,
+    )
+    contest = pd.DataFrame({"CONTEST_CODE": ["C1"], "ADD_DATA": ['{"""a""": 1}']}, dtype=object)
+    return {"REWARD": (reward, {"sheet": "REWARD"}), "CONTEST": (contest, {"sheet": "CONTEST"})}
+
+
+def test_columns_attached_once_without_mutating_input() -> None:
+    sheets = _sheets()
+    reward_in = sheets["REWARD"][0]
+    results = run_all_consistency_checks(sheets, _RULES, max_workers=4)
+
+    assert list(reward_in.columns) == ["REWARD_CODE", "DATE", "CONTEST_CODE"]
+    df = sheets["REWARD"][0]
+    assert set(df.columns) - set(reward_in.columns) == {"ПРОВЕРКА ДАТА", "ДУБЛЬ: REWARD_CODE", "ПРОВЕРКА CONTEST"}
+    assert df["ДУБЛЬ: REWARD_CODE"].tolist() == ["x2", "x2", ""]
+    assert df["ПРОВЕРКА CONTEST"].tolist() == ["OK", "НЕТ в CONTEST", "OK"]
+    assert df["ПРОВЕРКА ДАТА"].tolist()[0] == "OK"
+    assert "ПРОВЕРКА: JSON (формат SPOD)" in sheets["CONTEST"][0].columns
+    by_id = {r["check_id"]: r for r in results}
+    assert by_id["fmt"]["violations"] == 2 and by_id["uniq"]["violations"] == 2 and by_id["ref"]["violations"] == 1
+
+
+def test_buffer_replaces_existing_column_and_standalone_writer() -> None:
+    sheets = _sheets()
+    df_in = sheets["REWARD"][0].assign(**{"ПРОВЕРКА ДАТА": "старое"})
+    sheets["REWARD"] = (df_in, {"sheet": "REWARD"})
+    buf = ResultColumns()
+    _run_field_format_check(sheets, _RULES["rules"][0], buf)
+    assert sheets["REWARD"][0] is df_in and buf.get("REWARD", "ПРОВЕРКА ДАТА") is not None
+    buf.attach(sheets)
+    assert sheets["REWARD"][0]["ПРОВЕРКА ДАТА"].tolist()[0] == "OK"
+    assert list(sheets["REWARD"][0].columns).count("ПРОВЕРКА ДАТА") == 1
+
+    # Без буфера правило, как раньше, пишет колонку прямо на лист
+    plain = _sheets()
+    _run_field_format_check(plain, _RULES["rules"][0])
+    assert plain["REWARD"][0]["ПРОВЕРКА ДАТА"].tolist() == sheets["REWARD"][0]["ПРОВЕРКА ДАТА"].tolist()
+
+
+def test_reference_sets_shared_between_rules() -> None:
+    reward = pd.DataFrame(
+        {"CONTEST_CODE": ["C1", " C1 ", "C2", "", "C3"], "GROUP": ["G1", "G1", "G1", "G1", "G2"]}, dtype=object
+    )
+    contest = pd.DataFrame(
+        {"CONTEST_CODE": ["C1", "C2", "C3"], "GROUP": ["G1", "G2", "G2"], "ACTIVE": ["Y", "N", "Y"]}, dtype=object
+    )
+    ref = {"sheet_src": "REWARD", "sheet_ref": "CONTEST", "column_src": "CONTEST_CODE", "column_ref": "CONTEST_CODE"}
+    rules = {
+        "rules": [
+            dict(ref, id="a", type="referential", output={"column_on_sheet": "A"}),
+            dict(ref, id="b", type="referential", output={"column_on_sheet": "B"}),
+            dict(ref, id="c", type="referential", output={"column_on_sheet": "C"},
+                 ref_row_conditions=[{"column": "ACTIVE", "op": "=", "value": "Y"}]),
+            {"id": "d", "type": "referential_composite", "sheet_src": "REWARD", "sheet_ref": "CONTEST",
+             "columns_src": ["CONTEST_CODE", "GROUP"], "columns_ref": ["CONTEST_CODE", "GROUP"],
+             "output": {"column_on_sheet": "D"}},
+        ]
+    }
+    sheets = {"REWARD": (reward, {}), "CONTEST": (contest, {})}
+    sets = ReferenceSets()
+    for rule in rules["rules"][:2]:
+        run_referential(sheets, rule, reference_sets=sets)
+    assert (sets.built, sets.reused) == (1, 1)
+
+    results = {r["check_id"]: r for r in run_all_consistency_checks(sheets, rules, max_workers=2)}
+    df = sheets["REWARD"][0]
+    assert df["A"].tolist() == df["B"].tolist() == ["OK", "OK", "OK", "OK", "OK"]
+    assert df["C"].tolist() == ["OK", "OK", "НЕТ в CONTEST", "OK", "OK"]
+    assert df["D"].tolist() == ["OK", "OK", "НЕТ в CONTEST", "НЕТ в CONTEST", "OK"]
+    assert results["c"]["violations"] == 1 and results["d"]["violations"] == 2
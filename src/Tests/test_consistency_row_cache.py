@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Инкрементальные построчные проверки консистентности (performance.incremental)."""
+
+from __future__ import annotations
+
+import copy
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+import pandas.testing as pdt
+
+from src.consistency_checks import run_all_consistency_checks
+from src.consistency_row_cache import ConsistencyRowCache, merge_incremental_config
+
+_RULES: Dict[str, Any] = {
+    "rules": [
+        {"id": "len", "type": "field_length", "sheet": "REWARD", "result_column": "LEN_CHECK",
+         "fields": {"REWARD_CODE": {"limit": 4, "operator": "<="}}},
+        {"id": "fmt", "type": "field_format", "sheet": "REWARD", "field": "DATE",
+         "format": {"type": "date", "date_format": "YYYY-MM-DD"}},
+        {"id": "in", "type": "field_in_values", "sheet": "REWARD", "field": "TYPE",
+         "allowed_values": ["ITEM", "BADGE"], "row_conditions": [{"column": "ACTIVE", "op": "=", "value": "Y"}]},
+        {"id": "eq", "type": "json_field_equals_column", "sheet": "REWARD", "json_column": "ADD_DATA",
+         "json_key": "code", "column_compare": "REWARD_CODE"},
+        {"id": "uniq", "type": "unique", "sheet": "REWARD", "key_columns": ["REWARD_CODE"]},
+    ]
+}
+
+
+def _frame(rows: List[Dict[str, str]]) -> pd.DataFrame:
+    return pd.DataFrame(rows, dtype=object)
+
+
+def _rows(n: int) -> List[Dict[str, str]]:
+    return [
+        {
+            "REWARD_CODE": f"R{i}" if i % 7 else f"R{i}00000",
+            "DATE": "2026-01-31" if i % 5 else "31.01.2026",
+            "TYPE": "ITEM" if i % 3 else "OTHER",
+            "ACTIVE": "Y" if i % 4 else "N",
+            "ADD_DATA": f'{{"code": "R{i}"}}' if i % 6 else "{bad",
+        }
+        for i in range(n)
+    ]
+
+
+def _run(rows: List[Dict[str, str]], cache: Any = None) -> tuple:
+    sheets = {"REWARD": (_frame(rows), {"sheet": "REWARD"})}
+    results = run_all_consistency_checks(sheets, copy.deepcopy(_RULES), max_workers=2, row_cache=cache)
+    if cache is not None:
+        cache.flush()
+    return sheets["REWARD"][0], results
+
+
+def test_incremental_matches_full_run(tmp_path: Path) -> None:
+    cfg = merge_incremental_config({"enabled": True, "dir": str(tmp_path / "cache"), "min_rows": 0})
+    rows = _rows(60)
+    _run(rows, ConsistencyRowCache(cfg, str(tmp_path), "PROM"))
+
+    changed = [dict(r) for r in rows]
+    changed[1]["REWARD_CODE"] = "LONGCODE"
+    changed[2]["DATE"] = "bad"
+    changed.append({"REWARD_CODE": "R99", "DATE": "-", "TYPE": "BADGE", "ACTIVE": "Y", "ADD_DATA": '{"code": "X"}'})
+    cache = ConsistencyRowCache(cfg, str(tmp_path), "PROM")
+    df_inc, res_inc = _run(changed, cache)
+    df_full, res_full = _run(changed)
+
+    pdt.assert_frame_equal(df_inc[df_full.columns], df_full)
+    assert res_inc == res_full
+    by_rule = {s["check_id"]: s for s in cache.stats}
+    assert set(by_rule) == {"len", "fmt", "in", "eq"}
+    # Меняются только строки, чьи читаемые правилом колонки изменились
+    assert by_rule["len"]["computed"] == 2 and by_rule["eq"]["computed"] == 2
+    assert by_rule["fmt"]["computed"] == 2 and by_rule["in"]["computed"] == 1
+    assert by_rule["fmt"]["reused"] == 59
+
+
+def test_cache_pruned_to_current_rules(tmp_path: Path) -> None:
+    cfg = merge_incremental_config({"enabled": True, "dir": str(tmp_path / "cache"), "min_rows": 0})
+    _run(_rows(10), ConsistencyRowCache(cfg, str(tmp_path), "PROM"))
+    cache_dir = tmp_path / "cache" / "PROM"
+    assert len(list(cache_dir.glob("*.pkl"))) == 4
+
+    rules = copy.deepcopy(_RULES)
+    rules["rules"] = [r for r in rules["rules"] if r["id"] != "fmt"]
+    cache = ConsistencyRowCache(cfg, str(tmp_path), "PROM")
+    sheets = {"REWARD": (_frame(_rows(10)), {"sheet": "REWARD"})}
+    run_all_consistency_checks(sheets, rules, row_cache=cache)
+    cache.flush()
+    assert sorted(p.name.split("_")[0] for p in cache_dir.glob("*.pkl")) == ["eq", "in", "len"]
+    assert all(s["computed"] == 0 for s in cache.stats)
+
+    # Маленькие листы (min_rows) проверяются без кэша
+    small = ConsistencyRowCache(merge_incremental_config({"dir": str(tmp_path / "c2")}), str(tmp_path), "PROM")
+    _run(_rows(10), small)
+    assert small.stats == []
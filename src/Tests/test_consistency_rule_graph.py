@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Граф зависимостей правил консистентности и планировщик без барьера между фазами."""
+
+from __future__ import annotations
+
+import pandas as pd
+
+from src import debug_timing
+from src.consistency_checks import (
+    _RuleGraph,
+    _rule_result_column,
+    _sheet_written_by_rule,
+    run_all_consistency_checks,
+)
+
+_RULES = [
+    {"id": "uniq", "type": "unique", "sheet": "REWARD", "key_columns": ["REWARD_CODE"]},
+    {"id": "len", "type": "field_length", "sheet": "REWARD", "fields": {"REWARD_CODE": {"limit": 2, "operator": "<="}}},
+    {"id": "fmt", "type": "field_format", "sheet": "REWARD", "field": "DATE", "format": {"type": "date"}},
+    {"id": "in", "type": "field_in_values", "sheet": "REWARD", "field": "TYPE", "allowed_values": ["ITEM"]},
+    {"id": "eq", "type": "json_field_equals_column", "sheet": "REWARD", "json_column": "ADD_DATA",
+     "json_key": "code", "column_compare": "REWARD_CODE"},
+    {"id": "jin", "type": "json_field_in_column", "sheet": "REWARD", "json_column": "ADD_DATA",
+     "json_key": "parentRewardCode", "column_in_sheet": "REWARD_CODE"},
+    {"id": "prio", "type": "json_priority_unique_per_contest_link", "sheet": "REWARD", "json_column": "ADD_DATA"},
+    {"id": "ref", "type": "referential", "sheet_src": "REWARD-LINK", "column_src": "REWARD_CODE",
+     "sheet_ref": "REWARD", "column_ref": "REWARD_CODE"},
+    {"id": "spod", "type": "json_spod_format", "sheet": "REWARD", "json_column": "ADD_DATA", "json_required": False},
+]
+
+
+def _sheets() -> dict:
+    reward = pd.DataFrame(
+        {
+            "REWARD_CODE": ["R1", "R1", "R22"],
+            "DATE": ["2026-01-01", "bad", ""],
+            "TYPE": ["ITEM", "BADGE", "ITEM"],
+            "ADD_DATA": ['{"code": "R1", "priority": 1}', '{"parentRewardCode": "R9"}', "{bad"],
+        },
+        dtype=object,
+    )
+    link = pd.DataFrame({"CONTEST_CODE": ["C1", "C1"], "REWARD_CODE": ["R1", "R5"]}, dtype=object)
+    return {"REWARD": (reward, {}), "REWARD-LINK": (link, {})}
+
+
+def test_result_column_names_match_rule_functions() -> None:
+    for rule in _RULES:
+        sheets = _sheets()
+        sheet = _sheet_written_by_rule(rule)
+        before = set(sheets[sheet][0].columns)
+        run_all_consistency_checks(sheets, {"rules": [rule]})
+        assert set(sheets[sheet][0].columns) - before == {_rule_result_column(rule)}, rule["id"]
+
+
+def test_rule_reading_another_result_waits_for_it() -> None:
+    rules = [
+        {"id": "dup_ref", "type": "field_in_values", "sheet": "REWARD", "field": "ДУБЛЬ: REWARD_CODE",
+         "allowed_values": ["x2"], "allow_empty": False, "output": {"column_on_sheet": "ПРОВЕРКА ДУБЛЯ"}},
+        {"id": "uniq", "type": "unique", "sheet": "REWARD", "key_columns": ["REWARD_CODE"]},
+        {"id": "fmt1", "type": "field_format", "sheet": "REWARD", "field": "DATE", "format": {"type": "date"},
+         "output": {"column_on_sheet": "ФОРМАТ"}},
+        {"id": "fmt2", "type": "field_format", "sheet": "REWARD", "field": "TYPE", "format": {"type": "date"},
+         "output": {"column_on_sheet": "ФОРМАТ"}},
+        {"id": "spod", "type": "json_spod_format", "sheet": "REWARD", "json_column": "ADD_DATA"},
+    ]
+    sheets = _sheets()
+    graph = _RuleGraph(sheets, list(enumerate(rules)))
+    assert graph.deps == {0: {1}, 1: set(), 2: set(), 3: {2}, 4: set()}
+    assert graph.inputs[0] == {"REWARD": ["ДУБЛЬ: REWARD_CODE"]}
+    assert max(graph.priority, key=graph.priority.get) == 4
+
+    debug_timing.reset_run_timing()
+    results = run_all_consistency_checks(sheets, {"rules": rules}, max_workers=2)
+    df = sheets["REWARD"][0]
+    assert results[0]["total_rows"] == 3 and results[0]["violations"] == 1
+    # Обе записи одной колонки собраны каждая по своим значениям; на листе — колонка правила, стоящего позже
+    assert results[2]["violations"] == 2 and results[3]["violations"] == 3
+    assert list(df.columns[4:]) == ["ПРОВЕРКА ДУБЛЯ", "ДУБЛЬ: REWARD_CODE", "ФОРМАТ", "ПРОВЕРКА: JSON (формат SPOD)"]
+    stat = debug_timing._stat_tables["Проверки консистентности"]
+    assert sorted(r["ID"] for r in stat) == sorted(r["id"] for r in rules)
+    assert next(r for r in stat if r["ID"] == "dup_ref")["Ждёт правил"] == "uniq"
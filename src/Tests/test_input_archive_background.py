@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Архив входных CSV в фоновом процессе (input_archive_sqlite.background)."""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src import debug_timing
+from src.input_archive_background import join_input_archive, start_input_archive_background
+
+_CFG = {
+    "enabled": True,
+    "row_level_archive": True,
+    "default_archive_to_db": True,
+    "parallel_row_processing": {"enabled": False},
+    "default_row_key_by_sheet": {"REWARD": ["REWARD_CODE"]},
+    "reporting": {"console": "summary", "log": "normal"},
+}
+
+
+def _payload(tmp_path: Path) -> dict:
+    df = pd.DataFrame({"REWARD_CODE": ["R1", "R2"], "NAME": ["a", "b"]}, dtype=object)
+    csv_path = tmp_path / "REWARD.csv"
+    df.to_csv(csv_path, sep=";", index=False)
+    return {"REWARD": {"df_raw": df, "file_conf": {"file": "REWARD", "sheet": "REWARD"}, "file_path": str(csv_path)}}
+
+
+def test_background_archive_joins_with_logs_and_stdout(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture, capsys: pytest.CaptureFixture
+) -> None:
+    db = tmp_path / "archive_v2.sqlite"
+    with caplog.at_level(logging.INFO):
+        # Уровень корневого логгера на момент старта передаётся дочернему процессу
+        job = start_input_archive_background(str(tmp_path), dict(_CFG, db_path=str(db)), _payload(tmp_path))
+        result = join_input_archive(job)
+    assert result["ok"] and result["duration_sec"] > 0
+    assert job.process.exitcode == 0
+    conn = sqlite3.connect(str(db))
+    assert conn.execute("SELECT COUNT(*) FROM archive_row_current").fetchone()[0] == 2
+    conn.close()
+    # Логи дочернего процесса воспроизведены в основном, консольный отчёт архива напечатан при присоединении
+    assert any("[archive_v2] Итог: new=2" in r.getMessage() for r in caplog.records)
+    assert "Архив входных CSV" in capsys.readouterr().out
+
+
+def test_background_archive_error_does_not_raise(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    payload = _payload(tmp_path)
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("x")
+    job = start_input_archive_background(
+        str(tmp_path), dict(_CFG, db_path=str(blocker / "archive.sqlite")), payload
+    )
+    result = join_input_archive(job)
+    assert not result["ok"]
+    assert any("фоновый процесс" in r.getMessage() and "Traceback" in r.getMessage() for r in caplog.records)
+
+
+def test_record_phase_in_console_summary() -> None:
+    debug_timing.reset_run_timing()
+    debug_timing.record_phase("01b_input_archive_sqlite_background", 1.25)
+    phases = debug_timing.get_run_summary_for_console()["phases"]
+    assert phases == [{"label": "01b_input_archive_sqlite_background", "duration_sec": 1.25}]
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Обслуживание БД архива: retention v1/v2, REINDEX, переход на auto_vacuum=INCREMENTAL."""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+import pytest
+
+from src.input_archive_maintenance import maintain_database, merge_maintenance_config
+from src.input_archive_query import reconstruct_sheet_as_of
+from src.input_archive_sqlite import run_input_archive_sqlite
+from src.input_archive_sqlite_v2 import run_input_archive_sqlite_v2
+
+_CFG = {
+    "enabled": True,
+    "default_archive_to_db": True,
+    "parallel_row_processing": {"enabled": False},
+    "default_row_key_by_sheet": {"REWARD": ["REWARD_CODE"]},
+    "reporting": {"console": "off", "log": "off"},
+}
+# Граница окна далеко после прогонов теста — все замены версий «старые»
+_LATER = datetime(2100, 1, 1, tzinfo=timezone.utc)
+
+
+def _ingest(tmp_path: Path, rows: List[Dict[str, str]], tag: str, *, v2: bool = True, file_name: str = "REWARD") -> Path:
+    csv_path = tmp_path / f"REWARD_{tag}.csv"
+    df = pd.DataFrame(rows, dtype=object)
+    df.to_csv(csv_path, sep=";", index=False)
+    db = tmp_path / ("archive_v2.sqlite" if v2 else "archive_v1.sqlite")
+    payloads = {"REWARD": {"df_raw": df, "file_conf": {"file": file_name, "sheet": "REWARD"}, "file_path": str(csv_path)}}
+    if v2:
+        run_input_archive_sqlite_v2(str(tmp_path), dict(_CFG, row_level_archive=True, db_path=str(db)), payloads)
+    else:
+        run_input_archive_sqlite(str(tmp_path), dict(_CFG, db_path=str(db)), payloads)
+    return db
+
+
+def _count(db: Path, sql: str) -> int:
+    conn = sqlite3.connect(str(db))
+    try:
+        return int(conn.execute(sql).fetchone()[0])
+    finally:
+        conn.close()
+
+
+def test_v2_retention_keeps_window_and_recent_versions(tmp_path: Path) -> None:
+    for v in range(4):
+        db = _ingest(tmp_path, [{"REWARD_CODE": "R0", "NAME": f"v{v}"}, {"REWARD_CODE": "R1", "NAME": "const"}], str(v))
+    assert _count(db, "SELECT COUNT(*) FROM archive_row_payload") == 5
+    cfg = merge_maintenance_config({"keep_versions": 2, "max_age_days": 30})
+
+    # Замены были только что — внутри окна ничего не удаляется
+    res = maintain_database(str(db), cfg)
+    assert res["status"] == "ok" and res["v2"]["versions"] == 0 and res["v1"] is None
+
+    res = maintain_database(str(db), cfg, now=_LATER, dry_run=True)
+    assert res["status"] == "dry_run" and res["v2"]["versions"] == 2 and res["v2"]["blobs"] == 2
+    assert _count(db, "SELECT COUNT(*) FROM archive_row_payload") == 5
+
+    res = maintain_database(str(db), cfg, now=_LATER)
+    assert res["v2"]["versions"] == 2 and res["v2"]["blobs"] == 2
+    assert _count(db, "SELECT COUNT(*) FROM archive_row_payload") == 3
+    assert _count(db, "SELECT COUNT(*) FROM archive_row_blob") == 3
+    df, _ = reconstruct_sheet_as_of(str(db), "REWARD", "2999-01-01")
+    assert dict(zip(df["REWARD_CODE"], df["NAME"])) == {"R0": "v3", "R1": "const"}
+
+
+def test_v2_drop_superseded_files(tmp_path: Path) -> None:
+    _ingest(tmp_path, [{"REWARD_CODE": "R0", "NAME": "old"}], "1", file_name="REWARD 01-08.csv")
+    db = _ingest(tmp_path, [{"REWARD_CODE": "R0", "NAME": "new"}], "2", file_name="REWARD 17-08.csv")
+    cfg = merge_maintenance_config({"max_age_days": 30, "drop_superseded_files": True})
+    res = maintain_database(str(db), cfg, now=_LATER)
+    assert res["v2"]["files"] == 1
+    assert _count(db, "SELECT COUNT(DISTINCT file_name) FROM archive_row_current") == 1
+    assert _count(db, "SELECT COUNT(*) FROM archive_row_payload WHERE file_name = 'REWARD 01-08.csv'") == 0
+    # Тело старого файла больше ни на что не ссылается
+    assert _count(db, "SELECT COUNT(*) FROM archive_row_blob") == 1
+
+
+def test_v1_retention_removes_snapshot_rows(tmp_path: Path) -> None:
+    for v in range(3):
+        db = _ingest(tmp_path, [{"REWARD_CODE": "R0", "NAME": f"v{v}"}, {"REWARD_CODE": "R1", "NAME": "x"}], str(v), v2=False)
+    assert _count(db, "SELECT COUNT(*) FROM archive_file_snapshot") == 3
+    res = maintain_database(str(db), merge_maintenance_config({"keep_versions": 1, "max_age_days": 0}), now=_LATER)
+    assert res["v1"] == {"files": 0, "snapshots": 2, "rows": 4} and res["v2"] is None
+    assert _count(db, "SELECT COUNT(*) FROM arch_REWARD") == 2
+    assert _count(db, "SELECT COUNT(*) FROM archive_file_snapshot WHERE row_status = 'latest'") == 1
+
+
+def test_compaction_converts_to_incremental_vacuum(tmp_path: Path) -> None:
+    db = _ingest(tmp_path, [{"REWARD_CODE": f"R{i}", "NAME": "x" * 200} for i in range(500)], "1")
+    conn = sqlite3.connect(str(db))
+    conn.execute("PRAGMA auto_vacuum=NONE")
+    conn.execute("VACUUM")
+    conn.close()
+    assert _count(db, "PRAGMA auto_vacuum") == 0
+
+    res = maintain_database(str(db), merge_maintenance_config(None))
+    assert res["compact"]["converted_to_incremental"] and _count(db, "PRAGMA auto_vacuum") == 2
+
+    conn = sqlite3.connect(str(db))
+    conn.execute("DELETE FROM archive_row_blob")
+    conn.commit()
+    conn.close()
+    res = maintain_database(str(db), merge_maintenance_config({"keep_versions": None, "max_age_days": None}))
+    assert res["compact"]["freelist_before"] > 0 and res["compact"]["freelist_after"] == 0
+    assert res["size_after"] < res["size_before"]
+
+
+def test_busy_database_is_skipped(tmp_path: Path) -> None:
+    db = _ingest(tmp_path, [{"REWARD_CODE": "R0", "NAME": "x"}], "1")
+    holder = sqlite3.connect(str(db), isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        res = maintain_database(str(db), merge_maintenance_config({"busy_timeout_sec": 0}))
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert res["status"] == "busy"
+
+
+def test_maintenance_config_validation() -> None:
+    cfg = merge_maintenance_config({"keep_versions": 0, "vacuum": False, "_note": "x"})
+    assert cfg["keep_versions"] == 1 and cfg["vacuum"] == "off" and "_note" not in cfg
+    with pytest.raises(ValueError):
+        merge_maintenance_config({"vacuum": "sometimes"})
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Контентно-адресуемое хранилище тел строк архива v2 (archive_row_blob, zlib + словарь листа, миграция)."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from src.input_archive_payload_store import PayloadReader, content_hash_of, merge_payload_store_config
+from src.input_archive_row_hash import compute_row_hash
+from src.input_archive_sqlite_v2 import run_input_archive_sqlite_v2
+
+_CFG = {
+    "enabled": True,
+    "row_level_archive": True,
+    "default_archive_to_db": True,
+    "parallel_row_processing": {"enabled": False},
+    "default_row_key_by_sheet": {"REWARD": ["REWARD_CODE"]},
+    "reporting": {"console": "off", "log": "off"},
+}
+
+
+def _ingest(tmp_path: Path, rows: List[Dict[str, str]], tag: str, **cfg_extra) -> sqlite3.Connection:
+    csv_path = tmp_path / f"REWARD_{tag}.csv"
+    df = pd.DataFrame(rows, dtype=object)
+    df.to_csv(csv_path, sep=";", index=False)
+    db = tmp_path / "archive_v2.sqlite"
+    cfg = dict(_CFG, db_path=str(db), **cfg_extra)
+    run_input_archive_sqlite_v2(
+        str(tmp_path), cfg, {"REWARD": {"df_raw": df, "file_conf": {"file": "REWARD", "sheet": "REWARD"}, "file_path": str(csv_path)}}
+    )
+    return sqlite3.connect(str(db))
+
+
+def _rows(n: int, name: str = "Награда") -> List[Dict[str, str]]:
+    return [
+        {"REWARD_CODE": f"R{i}", "NAME": f"{name} {i % 10}", "TYPE": "ITEM", "DESCRIPTION": "Описание награды за турнир"}
+        for i in range(n)
+    ]
+
+
+def test_blobs_deduplicated_by_content(tmp_path: Path) -> None:
+    v1 = _rows(3)
+    v2 = [dict(r, NAME="изменено") if r["REWARD_CODE"] == "R0" else r for r in v1]
+    _ingest(tmp_path, v1, "1").close()
+    _ingest(tmp_path, v2, "2").close()
+    conn = _ingest(tmp_path, v1, "3")  # R0 вернулся к первой версии — тот же blob
+    versions = conn.execute(
+        "SELECT blob_id FROM archive_row_payload WHERE json_extract((SELECT row_key_json FROM archive_row_current c "
+        "WHERE c.row_key_hash = archive_row_payload.row_key_hash), '$.REWARD_CODE') = 'R0' ORDER BY id"
+    ).fetchall()
+    assert len(versions) == 3 and versions[0] == versions[2] != versions[1]
+    assert conn.execute("SELECT COUNT(*) FROM archive_row_blob").fetchone()[0] == 4
+    # current ссылается на тот же blob, что и последняя версия; content_hash = row_hash
+    row = conn.execute(
+        "SELECT c.blob_id, p.blob_id, c.row_hash, b.content_hash FROM archive_row_current c "
+        "JOIN archive_row_payload p ON p.id = c.payload_id JOIN archive_row_blob b ON b.id = c.blob_id LIMIT 1"
+    ).fetchone()
+    assert row[0] == row[1] and row[2] == row[3]
+    assert PayloadReader(conn.cursor()).load(versions[0][0]) == v1[0]
+    conn.close()
+
+
+def test_zlib_with_sheet_dictionary(tmp_path: Path) -> None:
+    conn = _ingest(tmp_path, _rows(400), "1")
+    assert conn.execute("SELECT COUNT(*), MAX(sample_rows) FROM archive_row_zdict").fetchone() == (1, 400)
+    raw, stored, codecs = conn.execute(
+        "SELECT SUM(raw_bytes), SUM(LENGTH(body)), GROUP_CONCAT(DISTINCT codec) FROM archive_row_blob"
+    ).fetchone()
+    assert codecs == "zlib" and stored * 4 < raw
+    reader = PayloadReader(conn.cursor())
+    bodies = [reader.decode_row(*r) for r in conn.execute("SELECT codec, zdict_id, body FROM archive_row_blob")]
+    assert sorted(b["REWARD_CODE"] for b in bodies) == sorted(f"R{i}" for i in range(400))
+    conn.close()
+
+    plain_dir = tmp_path / "plain"
+    plain_dir.mkdir()
+    conn = _ingest(plain_dir, _rows(2), "1", payload_store={"compression": "none"})
+    assert conn.execute("SELECT codec, zdict_id FROM archive_row_blob").fetchall() == [("json", None)] * 2
+    conn.close()
+    assert merge_payload_store_config({"compression": "none"})["compression"] == "json"
+
+
+def test_migration_from_payload_json(tmp_path: Path) -> None:
+    db = tmp_path / "archive_v2.sqlite"
+    conn = sqlite3.connect(str(db))
+    conn.executescript(
+        """
+        CREATE TABLE archive_row_current (
+            sheet_name TEXT NOT NULL, file_name TEXT NOT NULL, subdir TEXT NOT NULL DEFAULT '',
+            row_key_hash TEXT NOT NULL, row_key_json TEXT NOT NULL, row_hash TEXT NOT NULL,
+            row_status TEXT NOT NULL DEFAULT 'active', source_file TEXT, source_path TEXT,
+            first_seen_at TEXT NOT NULL, last_loaded_at TEXT NOT NULL, inactive_since TEXT, payload_id INTEGER,
+            PRIMARY KEY (sheet_name, file_name, subdir, row_key_hash)
+        );
+        CREATE TABLE archive_row_payload (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, sheet_name TEXT NOT NULL, file_name TEXT NOT NULL,
+            subdir TEXT NOT NULL DEFAULT '', row_key_hash TEXT NOT NULL, row_hash TEXT NOT NULL,
+            loaded_at TEXT NOT NULL, source_file TEXT, payload_json TEXT NOT NULL
+        );
+        CREATE INDEX idx_archive_row_payload_sheet_key
+            ON archive_row_payload(sheet_name, file_name, subdir, row_key_hash, row_hash);
+        """
+    )
+    old = {"REWARD_CODE": "R0", "NAME": "старое"}
+    new = {"REWARD_CODE": "R0", "NAME": "новое"}
+    for pid, fields in ((10, old), (11, new), (12, old)):
+        conn.execute(
+            "INSERT INTO archive_row_payload VALUES (?, 'REWARD', 'REWARD', '', 'k0', ?, '2026-01-01', 'f', ?)",
+            (pid, compute_row_hash(fields), json.dumps(fields, ensure_ascii=False, sort_keys=True)),
+        )
+    conn.execute(
+        "INSERT INTO archive_row_current VALUES ('REWARD', 'REWARD', '', 'k0', '{}', ?, 'active', 'f', 'p', "
+        "'2026-01-01', '2026-01-01', NULL, 12)",
+        (compute_row_hash(old),),
+    )
+    conn.commit()
+    conn.close()
+
+    conn = _ingest(tmp_path, [{"REWARD_CODE": "R1", "NAME": "x"}], "1")
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(archive_row_payload)")]
+    assert "payload_json" not in cols and "blob_id" in cols
+    blobs = dict(conn.execute("SELECT id, blob_id FROM archive_row_payload WHERE id IN (10, 11, 12)").fetchall())
+    assert blobs[10] == blobs[12] != blobs[11]
+    blob_id = conn.execute("SELECT blob_id FROM archive_row_current WHERE row_key_hash = 'k0'").fetchone()[0]
+    assert blob_id == blobs[12]
+    reader = PayloadReader(conn.cursor())
+    assert reader.load(blob_id) == old and reader.load(blobs[11]) == new
+    content = conn.execute("SELECT content_hash FROM archive_row_blob WHERE id = ?", (blob_id,)).fetchone()[0]
+    assert content == content_hash_of(old)
+    # Новые версии получают id после перенесённых
+    assert conn.execute("SELECT MIN(id) FROM archive_row_payload WHERE sheet_name = 'REWARD' AND row_key_hash != 'k0'").fetchone()[0] > 12
+    conn.close()
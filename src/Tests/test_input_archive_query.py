@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Восстановление листа из архива v2 на дату (src/input_archive_query.py)."""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from src.input_archive_query import main, parse_as_of, reconstruct_sheet_as_of
+from src.input_archive_sqlite_v2 import run_input_archive_sqlite_v2
+
+_CFG = {
+    "enabled": True,
+    "row_level_archive": True,
+    "default_archive_to_db": True,
+    "parallel_row_processing": {"enabled": False},
+    "default_row_key_by_sheet": {"REWARD": ["REWARD_CODE"]},
+    "reporting": {"console": "off", "log": "off"},
+}
+
+
+def _ingest(tmp_path: Path, rows: List[Dict[str, str]], tag: str) -> str:
+    csv_path = tmp_path / f"REWARD_{tag}.csv"
+    df = pd.DataFrame(rows, dtype=object)
+    df.to_csv(csv_path, sep=";", index=False)
+    db = tmp_path / "archive_v2.sqlite"
+    run_input_archive_sqlite_v2(
+        str(tmp_path),
+        dict(_CFG, db_path=str(db)),
+        {"REWARD": {"df_raw": df, "file_conf": {"file": "REWARD", "sheet": "REWARD"}, "file_path": str(csv_path)}},
+    )
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _state(db: Path, as_of: str) -> Dict[str, str]:
+    df, scope = reconstruct_sheet_as_of(str(db), "REWARD", as_of)
+    assert scope is not None and scope.file_name == "REWARD"
+    return dict(zip(df["REWARD_CODE"], df["NAME"]))
+
+
+def test_state_as_of_follows_versions_and_status(tmp_path: Path) -> None:
+    db = tmp_path / "archive_v2.sqlite"
+    before = datetime.now(timezone.utc).isoformat()
+    t1 = _ingest(tmp_path, [{"REWARD_CODE": "R0", "NAME": "a"}, {"REWARD_CODE": "R1", "NAME": "b"}, {"REWARD_CODE": "R2", "NAME": "c"}], "1")
+    # R0 изменён, R1 пропал из файла
+    t2 = _ingest(tmp_path, [{"REWARD_CODE": "R0", "NAME": "a2"}, {"REWARD_CODE": "R2", "NAME": "c"}], "2")
+    # R1 вернулся без изменений (новой версии тела нет), R2 пропал
+    t3 = _ingest(tmp_path, [{"REWARD_CODE": "R0", "NAME": "a2"}, {"REWARD_CODE": "R1", "NAME": "b"}], "3")
+
+    assert _state(db, t1) == {"R0": "a", "R1": "b", "R2": "c"}
+    assert _state(db, t2) == {"R0": "a2", "R2": "c"}
+    assert _state(db, t3) == {"R0": "a2", "R1": "b"}
+    df, scope = reconstruct_sheet_as_of(str(db), "REWARD", before)
+    assert scope is None and df.empty
+
+    conn = sqlite3.connect(str(db))
+    assert conn.execute("SELECT row_status FROM archive_row_status_log ORDER BY id").fetchall() == [
+        ("inactive",),
+        ("active",),
+        ("inactive",),
+    ]
+    # Без журнала (архив до его появления) снятые строки определяются по inactive_since
+    conn.execute("DELETE FROM archive_row_status_log")
+    conn.commit()
+    conn.close()
+    assert _state(db, t3) == {"R0": "a2", "R1": "b"}
+
+
+def test_parse_as_of() -> None:
+    assert parse_as_of("2026-09-01") == "2026-09-01T23:59:59.999999Z"
+    assert parse_as_of("2026-09-01T10:00:00+03:00") == "2026-09-01T07:00:00.000000Z"
+
+
+def test_cli_writes_csv(tmp_path: Path, capsys) -> None:
+    _ingest(tmp_path, [{"REWARD_CODE": "R0", "NAME": "Награда"}], "1")
+    out = tmp_path / "out.csv"
+    code = main(
+        ["--sheet", "REWARD", "--as-of", "2999-01-01", "--db", str(tmp_path / "archive_v2.sqlite"), "--subdir", "", "--out", str(out)]
+    )
+    assert code == 0
+    assert "1 строк" in capsys.readouterr().out
+    df = pd.read_csv(out, sep=";", encoding="utf-8-sig", dtype=str)
+    assert df.to_dict("records") == [{"NAME": "Награда", "REWARD_CODE": "R0"}]
@@ -42,3 +42,49 @@ def test_dedupe_last_wins() -> None:
     assert dups == 1
     assert len(out) == 1
     assert out[0].row_hash == "h2"
+
+
+def _records_rows_vs_columnar(df: pd.DataFrame, key_columns, hash_columns=None, cfg=None):
+    from src.input_archive_row_parallel import (
+        compute_row_hashes_columnar,
+        compute_row_hashes_parallel,
+        dataframe_to_row_dicts,
+    )
+
+    cfg = cfg or {"enabled": False}
+    rows = compute_row_hashes_parallel(dataframe_to_row_dicts(df), key_columns, hash_columns, cfg)
+    cols = compute_row_hashes_columnar(df, key_columns, hash_columns, cfg)
+    return rows, cols
+
+
+def test_columnar_hashes_identical_to_rows() -> None:
+    df = pd.DataFrame(
+        {
+            "CONTEST_CODE": [" C1 ", "C2", None, "C\"4\\", "Ключ\n"],
+            "VALUE": ["-", "null", float("nan"), "  текст  ", "1.5"],
+            "N": [1, 2.5, pd.NA, pd.Timestamp("2026-01-01"), "None"],
+            "ÉMOJI 🙂": [" ", "\t", "", "x", "\x00"],
+        },
+        dtype=object,
+    )
+    for hash_columns in (None, ["VALUE", "N", "NO_SUCH"]):
+        rows, cols = _records_rows_vs_columnar(df, ["CONTEST_CODE", "N"], hash_columns)
+        assert [(r.row_key_hash, r.row_key_json, r.row_hash, r.fields) for r in rows] == [
+            (r.row_key_hash, r.row_key_json, r.row_hash, r.fields) for r in cols
+        ]
+    rows, cols = _records_rows_vs_columnar(df, ["NO_KEY"])
+    assert [(r.error, r.fields) for r in rows] == [(r.error, r.fields) for r in cols]
+    assert cols[0].error and not cols[0].row_key_hash
+
+
+def test_columnar_shared_memory_pool_and_fallback() -> None:
+    df = pd.DataFrame({"K": [f"k{i}" for i in range(1200)], "V": [f" v{i % 7} " for i in range(1200)]}, dtype=object)
+    cfg = {"enabled": True, "max_workers": 2, "chunk_size": 300, "min_rows_for_parallel": 100}
+    rows, cols = _records_rows_vs_columnar(df, ["K"], None, cfg)
+    assert [(r.row_key_hash, r.row_hash) for r in rows] == [(r.row_key_hash, r.row_hash) for r in cols]
+
+    # Не object-колонки и повторяющиеся имена — построчный режим
+    _, cols = _records_rows_vs_columnar(pd.DataFrame({"K": [1, 2]}), ["K"])
+    assert cols is None
+    _, cols = _records_rows_vs_columnar(pd.DataFrame([["a", "b"]], columns=["K", "K"], dtype=object), ["K"])
+    assert cols is None
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Построчный архив v2: set-based ingest через временную staging-таблицу."""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from src.input_archive_payload_store import PayloadReader
+from src.input_archive_sqlite_v2 import (
+    TABLE_CURRENT,
+    TABLE_INGEST_RUN,
+    TABLE_PAYLOAD,
+    run_input_archive_sqlite_v2,
+)
+
+_CFG = {
+    "enabled": True,
+    "row_level_archive": True,
+    "default_archive_to_db": True,
+    "skip_ingest_if_file_unchanged": True,
+    "parallel_row_processing": {"enabled": False},
+    "default_row_key_by_sheet": {"REWARD": ["REWARD_CODE"]},
+    "reporting": {"console": "off", "log": "off"},
+}
+
+
+def _ingest(tmp_path: Path, rows: List[Dict[str, str]], tag: str) -> None:
+    csv_path = tmp_path / f"REWARD_{tag}.csv"
+    df = pd.DataFrame(rows, dtype=object)
+    df.to_csv(csv_path, sep=";", index=False)
+    cfg = dict(_CFG, db_path=str(tmp_path / "archive_v2.sqlite"))
+    payload = {"df_raw": df, "file_conf": {"file": "REWARD", "sheet": "REWARD"}, "file_path": str(csv_path)}
+    run_input_archive_sqlite_v2(str(tmp_path), cfg, {"REWARD": payload})
+
+
+def _state(tmp_path: Path) -> Dict[str, tuple]:
+    conn = sqlite3.connect(str(tmp_path / "archive_v2.sqlite"))
+    rows = conn.execute(
+        f"""
+        SELECT json_extract(c.row_key_json, '$.REWARD_CODE'), c.row_status, p.blob_id,
+               c.inactive_since IS NOT NULL
+        FROM {TABLE_CURRENT} c LEFT JOIN {TABLE_PAYLOAD} p ON p.id = c.payload_id
+        """
+    ).fetchall()
+    reader = PayloadReader(conn.cursor())
+    out = {code: (status, reader.load(blob_id)["NAME"], inactive) for code, status, blob_id, inactive in rows}
+    conn.close()
+    return out
+
+
+def _last_run(tmp_path: Path) -> tuple:
+    conn = sqlite3.connect(str(tmp_path / "archive_v2.sqlite"))
+    row = conn.execute(
+        f"SELECT count_new, count_changed, count_unchanged, count_inactive, db_write_sec "
+        f"FROM {TABLE_INGEST_RUN} ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+    conn.close()
+    return row
+
+
+def test_bulk_ingest_new_changed_unchanged_inactive(tmp_path: Path) -> None:
+    # Больше строк, чем лимит bind-переменных SQLite (999) — без IN-списков из Python
+    base = [{"REWARD_CODE": f"R{i}", "NAME": f"n{i}"} for i in range(1500)]
+    _ingest(tmp_path, base, "1")
+    assert _last_run(tmp_path)[:4] == (1500, 0, 0, 0)
+    assert _last_run(tmp_path)[4] is not None
+
+    second = [dict(r) for r in base[:1200]]
+    second[0]["NAME"] = "изменено"
+    second.append({"REWARD_CODE": "R_NEW", "NAME": "new"})
+    second.append({"REWARD_CODE": "R_NEW", "NAME": "new-last"})  # дубликат ключа: last-wins
+    _ingest(tmp_path, second, "2")
+    assert _last_run(tmp_path)[:4] == (1, 1, 1199, 300)
+    state = _state(tmp_path)
+    assert state["R0"] == ("active", "изменено", False)
+    assert state["R_NEW"] == ("active", "new-last", False)
+    assert state["R1300"] == ("inactive", "n1300", True)
+    assert sum(1 for v in state.values() if v[0] == "active") == 1201
+
+    # Возврат снятой строки с тем же содержимым — unchanged и снова active
+    third = second + [base[1300]]
+    _ingest(tmp_path, third, "3")
+    assert _last_run(tmp_path)[:4] == (0, 0, 1202, 0)  # уже снятые строки повторно не считаются
+    assert _state(tmp_path)["R1300"] == ("active", "n1300", False)
+
+    conn = sqlite3.connect(str(tmp_path / "archive_v2.sqlite"))
+    n_payload = conn.execute(f"SELECT COUNT(*) FROM {TABLE_PAYLOAD}").fetchone()[0]
+    conn.close()
+    assert n_payload == 1500 + 2
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Хранение развёрнутых JSON-колонок (json_columns[*].storage) и отчёт о памяти в STAT_FILE."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import src.debug_timing as debug_timing
+import src.main_impl as main_impl
+from src.json_utils import json_column_storage
+
+
+def _reward_df(n: int = 60) -> pd.DataFrame:
+    cells = []
+    for i in range(n):
+        payload = {"id": i, "type": "A" if i % 2 else "B", "level": i % 3}
+        if i % 10 == 0:
+            payload["rare"] = {"x": "редко"}
+        cells.append(json.dumps(payload, ensure_ascii=False))
+    return pd.DataFrame({"REWARD_CODE": [f"R{i}" for i in range(n)], "REWARD_ADD_DATA": cells})
+
+
+def test_storage_option_validation() -> None:
+    assert json_column_storage({"column": "X"}) == "object"
+    assert json_column_storage({"column": "X", "storage": "Category"}) == "category"
+    with pytest.raises(ValueError):
+        json_column_storage({"column": "X", "storage": "sparse"})
+
+
+def test_category_storage_keeps_values_and_saves_memory(monkeypatch: pytest.MonkeyPatch) -> None:
+    plain = main_impl.flatten_json_column_recursive(_reward_df(), "REWARD_ADD_DATA", prefix="ADD_DATA")
+    compact = main_impl.flatten_json_column_recursive(
+        _reward_df(), "REWARD_ADD_DATA", prefix="ADD_DATA", storage="category"
+    )
+    assert list(compact.columns) == list(plain.columns)
+    assert isinstance(compact["ADD_DATA => type"].dtype, pd.CategoricalDtype)
+    assert isinstance(compact["ADD_DATA => rare => x"].dtype, pd.CategoricalDtype)
+    # Уникальные значения (JSON уровня строки, id) — остаются object
+    assert compact["ADD_DATA"].dtype == object
+    assert compact["ADD_DATA => id"].dtype == plain["ADD_DATA => id"].dtype
+    for col in plain.columns:
+        left = plain[col].astype(object).where(plain[col].notna(), None).tolist()
+        right = compact[col].astype(object).where(compact[col].notna(), None).tolist()
+        assert left == right, col
+
+    monkeypatch.setattr(
+        main_impl, "JSON_COLUMNS", {"REWARD": [{"column": "REWARD_ADD_DATA", "prefix": "ADD_DATA"}]}
+    )
+    (row,) = main_impl._sheet_memory_report_rows({"REWARD": (compact, {})})
+    assert row["Колонок JSON (развёрнутых)"] == 5 and row["Из них category"] == 4
+    assert row["Экономия, МБ"] > 0
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "stream"])
+def test_category_columns_written_like_object(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, engine: str
+) -> None:
+    monkeypatch.setattr(main_impl, "EXCEL_ENGINE", engine)
+    monkeypatch.setattr(main_impl, "SHEET_ORDER", ["REWARD"])
+    monkeypatch.setattr(main_impl, "APPLY_SORT_TO_MAIN", False)
+    values = {}
+    for storage in ("object", "category"):
+        df = main_impl.flatten_json_column_recursive(
+            _reward_df(), "REWARD_ADD_DATA", prefix="ADD_DATA", storage=storage
+        )
+        path = tmp_path / f"{storage}.xlsx"
+        main_impl.write_to_excel({"REWARD": (df, {})}, str(path))
+        ws = load_workbook(path)["REWARD"]
+        values[storage] = [[c.value for c in row] for row in ws.iter_rows()]
+    assert values["category"] == values["object"]
+
+
+def test_stat_file_extra_sheet(tmp_path: Path) -> None:
+    debug_timing.reset_run_timing()
+    debug_timing.record_stat_rows("Память листов", [{"Лист": "REWARD", "Строк": 3}])
+    out = debug_timing.write_performance_statistics_excel(str(tmp_path))
+    wb = load_workbook(out)
+    assert "Память листов" in wb.sheetnames
+    assert [c.value for c in wb["Память листов"][2]] == ["REWARD", 3]
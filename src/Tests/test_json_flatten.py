@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Движок разворота JSON (src/json_utils.flatten_json_values): процессы, план путей схемы."""
+
+from __future__ import annotations
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import pandas as pd
+import pytest
+
+import src.json_utils as json_utils
+from src.json_utils import (
+    compile_json_path_plan,
+    create_json_flatten_pool,
+    flatten_json_values,
+    merge_json_flatten_config,
+    safe_json_loads,
+)
+
+
+def _legacy_flatten(values: List[Any], prefix: str, sep: str = "; ") -> Dict[str, List[Any]]:
+    """Прежний построчный разворот (extract + update) — эталон."""
+
+    def extract(obj: Any, current_prefix: str) -> Dict[str, Any]:
+        fields: Dict[str, Any] = {}
+        if isinstance(obj, str):
+            nested = safe_json_loads(obj)
+            fields[current_prefix] = obj
+            if isinstance(nested, (dict, list)):
+                fields.update(extract(nested, current_prefix))
+            return fields
+        if isinstance(obj, dict):
+            fields[current_prefix] = json.dumps(obj, ensure_ascii=False)
+            for k, v in obj.items():
+                fields.update(extract(v, f"{current_prefix} => {k}"))
+        elif isinstance(obj, list):
+            if all(isinstance(x, (str, int, float, bool, type(None))) for x in obj):
+                fields[current_prefix] = sep.join(str(x) for x in obj)
+            else:
+                fields[current_prefix] = json.dumps(obj, ensure_ascii=False)
+                for idx, x in enumerate(obj):
+                    fields.update(extract(x, f"{current_prefix} => [{idx}]"))
+        elif isinstance(obj, float) and pd.isna(obj):
+            fields[current_prefix] = None
+        else:
+            fields[current_prefix] = obj
+        return fields
+
+    cols: Dict[str, List[Any]] = {}
+    for idx, val in enumerate(values):
+        if isinstance(val, str):
+            val = val.strip()
+            parsed = {} if val in {"", "-", "None", "null"} else safe_json_loads(val)
+        elif isinstance(val, (dict, list)):
+            parsed = val
+        else:
+            parsed = {}
+        for k, v in extract(parsed, prefix).items():
+            cols.setdefault(k, [None] * len(values))[idx] = v
+    return cols
+
+
+def _values() -> List[Any]:
+    base = {"a": 1, "b": {"c": "x", "d": [1, 2]}, "e": '{"f": {"g": true}}', "h": "plain text"}
+    rows: List[Any] = []
+    for i in range(40):
+        row = json.loads(json.dumps(base))
+        row["a"] = i
+        rows.append(json.dumps(row, ensure_ascii=False))
+    rows += [
+        json.dumps({"b": {"c": "y"}, "a": 2}),  # другой порядок ключей — мимо плана
+        json.dumps({"a": 1, "b": "[{\"k\": 1}, 2]", "e": None, "h": 1.5}),
+        json.dumps({"a": [{"x": 1}, {"y": [1, {"z": 2}]}], "b": {"c": "{not json"}, "e": "[1, 2]", "h": ""}),
+        '{"a": 1,}',  # лишняя запятая — починка safe_json_loads
+        "not json at all",
+        "-",
+        None,
+        float("nan"),
+        "[1, 2, 3]",
+        json.dumps({"a => b": 1, "a": {"b": 2}}),  # коллизия путей: последний выигрывает
+    ]
+    return rows
+
+
+@pytest.mark.parametrize("schema_plan", [False, True])
+def test_flatten_matches_legacy(schema_plan: bool) -> None:
+    values = _values()
+    settings = merge_json_flatten_config({"mode": "sequential", "schema_plan": schema_plan})
+    cols, n_errors = flatten_json_values(values, "P", settings=settings, label=f"t{schema_plan}")
+    expected = _legacy_flatten(values, "P")
+    assert list(cols) == list(expected)
+    assert cols == expected
+    assert n_errors == 0
+
+
+@pytest.mark.parametrize("mode", ["process", "thread"])
+def test_parallel_modes_match_sequential(mode: str) -> None:
+    values = _values() * 3
+    seq, _ = flatten_json_values(values, "Q", settings=merge_json_flatten_config({"mode": "sequential"}))
+    settings = merge_json_flatten_config(
+        {"mode": mode, "max_workers": 3, "chunk_size": 10, "min_rows_for_parallel": 1}
+    )
+    par, n_errors = flatten_json_values(values, "Q", settings=settings)
+    assert list(par) == list(seq)
+    assert par == seq
+    assert n_errors == 0
+
+
+def test_shared_pool_from_worker_threads(monkeypatch: pytest.MonkeyPatch) -> None:
+    values = _values() * 3
+    seq, _ = flatten_json_values(values, "Q", settings=merge_json_flatten_config({"mode": "sequential"}))
+    settings = merge_json_flatten_config({"mode": "process", "max_workers": 2, "chunk_size": 10, "min_rows_for_parallel": 1})
+    pool = create_json_flatten_pool(settings)
+    assert pool is not None
+    try:
+        # Из рабочих потоков новые пулы не создаются: общий пул или последовательный разворот
+        monkeypatch.setattr(json_utils, "ProcessPoolExecutor", None)
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            shared = ex.submit(flatten_json_values, values, "Q", settings=settings, executor=pool).result()
+            alone = ex.submit(flatten_json_values, values, "Q", settings=settings).result()
+    finally:
+        pool.shutdown()
+    assert shared == (seq, 0) and alone == (seq, 0)
+    assert create_json_flatten_pool(merge_json_flatten_config({"mode": "thread"}), 4) is None
+
+
+def test_plan_and_config() -> None:
+    plan = compile_json_path_plan({"a": 1, "b": {"c": 2}}, "P")
+    assert plan.keys == ("a", "b") and plan.prefixes == ("P => a", "P => b")
+    assert plan.children[0] is None and plan.children[1].prefixes == ("P => b => c",)
+    assert compile_json_path_plan([1], "P") is None
+    assert merge_json_flatten_config(None)["mode"] == "auto"
+    with pytest.raises(ValueError):
+        merge_json_flatten_config({"mode": "gpu"})
+
+
+def test_dedupe_broadcasts_same_result() -> None:
+    values = (_values() + [None, float("nan"), "-"]) * 4
+    expected = _legacy_flatten(values, "D")
+    for dedupe in (False, True):
+        settings = merge_json_flatten_config({"mode": "sequential", "dedupe": dedupe, "schema_plan": False})
+        cols, n_errors = flatten_json_values(values, "D", settings=settings)
+        assert list(cols) == list(expected)
+        assert cols == expected
+        assert n_errors == 0
+    # Нехешируемые значения (dict в ячейке) — без factorize
+    cols, _ = flatten_json_values([{"a": 1}, {"a": 1}], "H")
+    assert cols == {"H": ['{"a": 1}'] * 2, "H => a": [1, 1]}
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Инкрементальный merge по ключам (performance.incremental.merge)."""
+
+from __future__ import annotations
+
+import copy
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+import pandas.testing as pdt
+
+from src import main_impl
+from src.consistency_row_cache import merge_incremental_config
+from src.main_impl import add_fields_to_sheet, merge_fields_across_sheets
+from src.merge_row_cache import MergeRowCache
+
+_CALLS: List[Dict[str, Any]] = [
+    {"src_keys": ["CODE"], "dst_keys": ["CODE"], "columns": ["NAME", "STATUS"], "kwargs": {"mode": "value"}},
+    {"src_keys": ["CODE", "REGION"], "dst_keys": ["CODE", "REGION"], "columns": ["NAME"], "kwargs": {"mode": "value"}},
+    {"src_keys": ["CODE"], "dst_keys": ["CODE"], "columns": ["NAME"], "kwargs": {"mode": "count"}},
+    {"src_keys": ["CODE"], "dst_keys": ["CODE"], "columns": ["STATUS"],
+     "kwargs": {"mode": "count", "count_aggregation": "nunique", "count_label": "ST"}},
+]
+
+
+def _dst(n: int) -> pd.DataFrame:
+    codes = [f"C{i % 40}" for i in range(n)]
+    codes[5] = None
+    return pd.DataFrame(
+        {"CODE": codes, "REGION": [f"R{i % 3}" for i in range(n)], "OTHER": [str(i) for i in range(n)]}, dtype=object
+    )
+
+
+def _src() -> pd.DataFrame:
+    rows = [
+        {"CODE": f"C{i % 30}", "REGION": f"R{i % 3}", "NAME": f"N{i}", "STATUS": "A" if i % 4 else "B"}
+        for i in range(90)
+    ]
+    return pd.DataFrame(rows, dtype=object)
+
+
+def _run(df_dst: pd.DataFrame, df_src: pd.DataFrame, cache: Any = None) -> List[pd.DataFrame]:
+    out = []
+    for i, call in enumerate(_CALLS):
+        args = (df_dst.copy(), df_src.copy(), call["src_keys"], call["dst_keys"], call["columns"], "DST", "SRC")
+        if cache is None:
+            out.append(add_fields_to_sheet(*args, **call["kwargs"]))
+        else:
+            out.append(cache.add_fields(add_fields_to_sheet, {"n": i}, *args, **call["kwargs"]))
+    if cache is not None:
+        cache.flush()
+    return out
+
+
+def test_incremental_merge_matches_full(tmp_path: Path) -> None:
+    cfg = merge_incremental_config({"enabled": True, "dir": str(tmp_path / "cache"), "min_rows": 0})
+    dst, src = _dst(200), _src()
+    first = MergeRowCache(cfg, str(tmp_path), "PROM")
+    for got, want in zip(_run(dst, src, first), _run(dst, src)):
+        pdt.assert_frame_equal(got, want)
+    assert all(s["computed"] == 200 for s in first.stats)
+
+    # Правка значения, новая строка группы, удалённая группа, перестановка строк внутри группы
+    src2 = src.copy()
+    src2.loc[3, "NAME"] = "EDITED"
+    src2 = pd.concat([src2, pd.DataFrame([{"CODE": "C7", "REGION": "R1", "NAME": "LATE", "STATUS": "Z"}])], ignore_index=True)
+    src2 = src2[src2["CODE"] != "C11"]
+    c2 = src2.index[src2["CODE"] == "C2"]
+    src2 = src2.reindex(list(src2.index.difference(c2, sort=False)) + list(reversed(c2))).reset_index(drop=True)
+    dst2 = dst.copy()
+    dst2.loc[0, "CODE"] = "C35"
+    dst2 = pd.concat([dst2, pd.DataFrame([{"CODE": "NEW", "REGION": "R0", "OTHER": "x"}])], ignore_index=True)
+
+    cache = MergeRowCache(cfg, str(tmp_path), "PROM")
+    for got, want in zip(_run(dst2, src2, cache), _run(dst2, src2)):
+        pdt.assert_frame_equal(got, want)
+    stat = cache.stats[0]
+    assert (stat["src_keys_new"], stat["src_keys_changed"], stat["src_keys_removed"]) == (0, 3, 1)
+    # Пересчитаны только строки с ключами C3, C7, C11, C2, пустым ключом и NEW; строка, сменившая
+    # ключ на уже известный C35, берёт значение из кэша
+    touched = dst2["CODE"].isin(["C3", "C7", "C11", "C2", "NEW"]) | dst2["CODE"].isna()
+    assert stat["computed"] == int(touched.sum()) < len(dst2)
+
+
+def test_merge_chain_and_pruning(tmp_path: Path, monkeypatch) -> None:
+    cfg = merge_incremental_config({"enabled": True, "dir": str(tmp_path / "cache"), "min_rows": 0})
+    # Первый проход — группа из двух правил (параллельный путь), второй читает колонку первого
+    passes = [
+        [
+            {"sheet_src": "A", "sheet_dst": "B", "src_key": ["K"], "dst_key": ["K"], "column": ["V"]},
+            {"sheet_src": "A", "sheet_dst": "C", "src_key": ["K"], "dst_key": ["K"], "column": ["V"], "mode": "count"},
+        ],
+        [{"sheet_src": "B", "sheet_dst": "C", "src_key": ["K"], "dst_key": ["K"], "column": ["A=>V"]}],
+    ]
+
+    def sheets(v3: str) -> Dict[str, Any]:
+        a = pd.DataFrame({"K": [f"k{i}" for i in range(20)], "V": [v3 if i == 3 else f"v{i}" for i in range(20)]})
+        b = pd.DataFrame({"K": [f"k{i}" for i in range(20)]})
+        c = pd.DataFrame({"K": [f"k{i % 20}" for i in range(50)]})
+        return {s: (df.astype(object), {"sheet": s}) for s, df in (("A", a), ("B", b), ("C", c))}
+
+    def run(v3: str, cache: Any, rules: List[List[Dict[str, Any]]] = passes) -> pd.DataFrame:
+        data = sheets(v3)
+        monkeypatch.setattr(main_impl, "_MERGE_ROW_CACHE", cache)
+        for rules_pass in rules:
+            merge_fields_across_sheets(data, copy.deepcopy(rules_pass), merge_name="T")
+        if cache is not None:
+            cache.flush()
+        return data["C"][0]
+
+    run("v3", MergeRowCache(cfg, str(tmp_path), "PROM"))
+    cache = MergeRowCache(cfg, str(tmp_path), "PROM")
+    got = run("changed", cache)
+    pdt.assert_frame_equal(got, run("changed", None))
+    assert (got.loc[got["K"] == "k3", "B=>A=>V"] == "changed").all()
+    # Изменение в A дошло до C через ключ k3: одна строка B, по 3 строки C в обоих правилах
+    computed = {(s["sheet_src"], s["sheet_dst"]): s["computed"] for s in cache.stats}
+    assert computed == {("A", "B"): 1, ("A", "C"): 3, ("B", "C"): 3}
+    merge_dir = tmp_path / "cache" / "PROM" / "merge"
+    assert len(list(merge_dir.glob("*.pkl"))) == 3
+
+    only_first = MergeRowCache(cfg, str(tmp_path), "PROM")
+    run("changed", only_first, passes[:1])
+    assert len(list(merge_dir.glob("*.pkl"))) == 2
+    assert sorted(s["computed"] for s in only_first.stats) == [0, 0]
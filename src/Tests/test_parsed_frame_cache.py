@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Тесты кэша разбора CSV по SHA-256 (performance.parse_cache)."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import src.main_impl as main_impl
+from src import run_memo
+from src.parsed_frame_cache import (
+    code_fingerprint,
+    load_parsed_frames,
+    merge_parse_cache_config,
+    parse_signature,
+    store_parsed_frames,
+)
+
+
+def test_merge_config_defaults_and_validation() -> None:
+    cfg = merge_parse_cache_config(None)
+    assert cfg["enabled"] is False and cfg["format"] == "auto"
+    assert merge_parse_cache_config({"enabled": True, "format": "PICKLE"})["format"] == "pickle"
+    with pytest.raises(ValueError):
+        merge_parse_cache_config({"format": "csv"})
+
+
+def test_signature_covers_every_src_module(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Подпись разбора — хеш всех модулей src: правка spod_json.py и любых новых модулей сбрасывает кэш
+    assert code_fingerprint() == run_memo.code_version()
+    before = parse_signature({"sheet": "REWARD"})
+    monkeypatch.setattr(run_memo, "_code_version_value", "changed")
+    assert parse_signature({"sheet": "REWARD"}) != before
+
+
+def test_store_load_and_invalidate_on_change(tmp_path: Path) -> None:
+    cfg = merge_parse_cache_config({"enabled": True, "dir": "cache", "keep_per_file": 1})
+    csv_path = tmp_path / "a.csv"
+    csv_path.write_text("A;B\n1;2\n", encoding="utf-8")
+    sig = parse_signature({"expected_columns": 0})
+    df_raw = pd.DataFrame({"A": ["1"], "B": ["2"]})
+    df_flat = df_raw.assign(**{"B => x": [None]})
+    issues = [{"row_index": 3, "expected_cols": 2, "actual_cols": 3, "direction": "больше"}]
+
+    assert load_parsed_frames(cfg, str(tmp_path), "S", str(csv_path), sig) is None
+    store_parsed_frames(cfg, str(tmp_path), "S", str(csv_path), sig, df_flat, df_raw, issues)
+    flat, raw, got_issues = load_parsed_frames(cfg, str(tmp_path), "S", str(csv_path), sig)
+    pd.testing.assert_frame_equal(flat, df_flat)
+    pd.testing.assert_frame_equal(raw, df_raw)
+    assert got_issues == issues
+    # Другие параметры разбора — промах
+    assert load_parsed_frames(cfg, str(tmp_path), "S", str(csv_path), parse_signature({"x": 1})) is None
+
+    # Изменённое содержимое — промах; старая версия вытесняется при сохранении новой
+    csv_path.write_text("A;B\n1;3\n", encoding="utf-8")
+    os.utime(csv_path, ns=(1, 1))
+    assert load_parsed_frames(cfg, str(tmp_path), "S", str(csv_path), sig) is None
+    store_parsed_frames(cfg, str(tmp_path), "S", str(csv_path), sig, df_flat, df_raw, [])
+    entry_dir = next((tmp_path / "cache" / "S").iterdir())
+    assert len([n for n in os.listdir(entry_dir) if n.endswith(".meta.json")]) == 1
+
+
+def test_process_single_file_uses_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "IN").mkdir()
+    (tmp_path / "IN" / "data.csv").write_text(
+        'CODE;FEATURE\nC1;{"a": 1, "b": {"c": "x"}}\nC2;-\n', encoding="utf-8"
+    )
+    monkeypatch.setattr(main_impl, "DIR_INPUT", str(tmp_path / "IN"))
+    monkeypatch.setattr(main_impl, "PROJECT_BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(main_impl, "JSON_COLUMNS", {"DATA": [{"column": "FEATURE", "prefix": "FEATURE"}]})
+    monkeypatch.setattr(main_impl, "CONSISTENCY_CHECKS", {})
+    monkeypatch.setattr(
+        main_impl, "PARSE_CACHE", merge_parse_cache_config({"enabled": True, "dir": "CACHE"})
+    )
+    file_conf = {"file": "data", "sheet": "DATA"}
+
+    first = main_impl.process_single_file(file_conf)
+    calls = []
+    monkeypatch.setattr(main_impl, "read_csv_file", lambda *a, **k: calls.append(a))
+    second = main_impl.process_single_file(file_conf)
+
+    assert calls == []
+    pd.testing.assert_frame_equal(second[0], first[0])
+    pd.testing.assert_frame_equal(second[3], first[3])
+    assert second[4] == first[4]
@@ -16,6 +16,7 @@ from src.rating_item_matrix import (
     _order_counts_by_employee,
     _parse_item_order_groups,
     _resolve_fill_colors,
+    attach_rating_item_matrix_fills,
 )
 
 
@@ -113,3 +114,31 @@ def test_item_amount_global_five_orders_five_managers() -> None:
     assert _item_amount_row_blocked("global", 5, 0, 5)
     assert not _item_amount_row_blocked("global", 5, 1, 5)
     assert not _item_amount_header_stock_out("per_manager", 5, 1, 5)
+
+
+def test_attach_fills_to_rating_params() -> None:
+    import pandas as pd
+
+    cfg = {"enabled": True}
+    fills = _resolve_fill_colors(cfg)
+    params = {"freeze": "C2"}
+    sheets = {"RATING": (pd.DataFrame({"TAB": ["1", "2"], "ITEM_A": [1, "N"]}), params)}
+    meta = {
+        "sheet_rating": "RATING",
+        "fills": fills,
+        "header_stock_out_columns": ["ITEM_A"],
+        "matrix_cells": [
+            {"row_excel": 2, "col_name": "ITEM_A", "fill_key": FILL_ORDERED_AVAILABLE},
+            {"row_excel": 3, "col_name": "ITEM_A", "fill_key": FILL_UNAVAILABLE_NOT_ORDERED},
+            {"row_excel": 9, "col_name": "ITEM_A", "fill_key": FILL_ORDERED_AVAILABLE},
+        ],
+    }
+    assert attach_rating_item_matrix_fills(sheets, meta, cfg)
+    overlay = sheets["RATING"][1]["cell_fills"]
+    assert overlay["header"] == {"ITEM_A": fills["header_stock_out"]}
+    assert overlay["columns"]["ITEM_A"] == [
+        fills[FILL_ORDERED_AVAILABLE],
+        fills[FILL_UNAVAILABLE_NOT_ORDERED],
+    ]
+    assert "cell_fills" not in params  # исходный dict конфигурации листа не меняется
+    assert not attach_rating_item_matrix_fills(sheets, {**meta, "skip_colors": True}, cfg)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Быстрый разбор CSV в read_csv_file совпадает с построчным (кадр и расхождения числа полей)."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.main_impl import _parse_csv_bytes_fast, _parse_csv_text_rows, read_csv_file
+
+_CASES = [
+    "A;B;C\n1;2;3\n4;5;6\n",
+    "\ufeffA; B ;C\r\n1;2;3\r\n;;\r\n",
+    # меньше/больше полей, пустая строка в середине, JSON с «;» в последней колонке
+    'ID;NAME;JSON\n1;x\n\n2;y;{"a": "1;2"; "b": 3}\n3;"q";"""z"""\n',
+    "A;B\n1;2\r3;4\n5;6",
+    "A\n\nx\n y \n",
+    "A;B\n",
+    "A;B\n1;2;3;4\n",
+    "A;B\r\n1;2\r\n\r\nпривет;мир;!\r\n3;4",
+    "КОД;ИМЯ\nа;б\nв\nг;д;е;ё\n",
+]
+
+
+@pytest.mark.parametrize("text", _CASES)
+@pytest.mark.parametrize("expected", [0, 3])
+def test_fast_parser_matches_rows(text: str, expected: int) -> None:
+    fast = _parse_csv_bytes_fast(text.encode("utf-8"), expected)
+    if fast is None:
+        return  # случай отдан построчному разбору
+    ref_df, ref_issues = _parse_csv_text_rows(text.lstrip("\ufeff"), expected)
+    df, issues = fast
+    pd.testing.assert_frame_equal(df, ref_df)
+    assert issues == ref_issues
+
+
+def test_read_csv_file_repairs_only_mismatching_lines(tmp_path: Path) -> None:
+    path = tmp_path / "data.csv"
+    path.write_text('A;B;C\n1;2;3\n4;5\n6;7;{"k": "a;b"}\n', encoding="utf-8")
+    df, issues = read_csv_file(str(path))
+    assert df.values.tolist() == [["1", "2", "3"], ["4", "5", ""], ["6", "7", '{"k": "a;b"}']]
+    assert [(i["row_index"], i["direction"]) for i in issues] == [(3, "меньше"), (4, "больше")]
+    assert all(dt == object for dt in df.dtypes)
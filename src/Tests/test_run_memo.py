@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Мемоизация прогона блока (performance.run_memo): отпечаток, манифест, повтор книг, --force."""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import src.main_impl as main_impl
+from src import run_memo
+
+_TS_OLD = "2026-10-18_09-00-00"
+_TS_NEW = "2026-10-18_10-30-00"
+
+
+def _inputs(tmp_path: Path) -> List[tuple]:
+    a = tmp_path / "CONTEST.csv"
+    b = tmp_path / "REWARD.csv"
+    a.write_text("A;B\n1;2\n", encoding="utf-8")
+    b.write_text("C\nx\n", encoding="utf-8")
+    return [("CONTEST-DATA", str(a)), ("REWARD", str(b))]
+
+
+def test_merge_run_memo_config() -> None:
+    assert run_memo.merge_run_memo_config(None) == {"enabled": False, "link": "hardlink"}
+    cfg = run_memo.merge_run_memo_config({"enabled": 1, "link": "COPY", "_note": "x"})
+    assert cfg == {"enabled": True, "link": "copy"}
+    with pytest.raises(ValueError):
+        run_memo.merge_run_memo_config({"link": "symlink"})
+
+
+def test_fingerprint_changes_with_inputs_config_and_date(tmp_path: Path) -> None:
+    files = _inputs(tmp_path)
+    cfg = {"performance": {"excel_engine": "stream"}, "paths": {"input": "IN"}}
+    base = run_memo.run_fingerprint("prom", files, cfg, "2026-10-18")["fingerprint"]
+    # Порядок ключей конфига и входов не влияет
+    same_cfg = {"paths": {"input": "IN"}, "performance": {"excel_engine": "stream"}}
+    assert run_memo.run_fingerprint("PROM", files[::-1], same_cfg, "2026-10-18")["fingerprint"] == base
+    assert run_memo.run_fingerprint("PROM", files, cfg, "2026-10-19")["fingerprint"] != base
+    assert run_memo.run_fingerprint("IFT", files, cfg, "2026-10-18")["fingerprint"] != base
+    other_cfg = {"performance": {"excel_engine": "openpyxl"}, "paths": {"input": "IN"}}
+    assert run_memo.run_fingerprint("PROM", files, other_cfg, "2026-10-18")["fingerprint"] != base
+    Path(files[1][1]).write_text("C\ny\n", encoding="utf-8")
+    assert run_memo.run_fingerprint("PROM", files, cfg, "2026-10-18")["fingerprint"] != base
+    assert len(run_memo.code_version()) == 64
+
+
+@pytest.mark.parametrize("link", ["hardlink", "copy"])
+def test_record_find_and_reuse(tmp_path: Path, link: str) -> None:
+    out = tmp_path / "OUT"
+    out.mkdir()
+    (out / "old.log").write_text("не из этого прогона", encoding="utf-8")
+    before = run_memo.list_output_files(str(out))
+    main_name = f"SPOD_PROM_{_TS_OLD}.xlsx"
+    stat_name = f"STAT_FILE {_TS_OLD}.xlsx"
+    (out / main_name).write_bytes(b"main")
+    (out / stat_name).write_bytes(b"stat")
+    columnar_name = f"SPOD_PROM_{_TS_OLD}.columnar"
+    (out / columnar_name).mkdir()
+    (out / columnar_name / "manifest.json").write_text("{}", encoding="utf-8")
+    fp = run_memo.run_fingerprint("PROM", _inputs(tmp_path), {}, "2026-10-18")
+    assert run_memo.record_run(str(out), fp, before) == sorted([main_name, stat_name, columnar_name])
+
+    assert run_memo.find_previous_run(str(out), "другой") is None
+    run = run_memo.find_previous_run(str(out), fp["fingerprint"])
+    assert run is not None and run["outputs"] == sorted([main_name, stat_name, columnar_name])
+
+    reused = run_memo.reuse_previous_outputs(str(out), run, link=link, timestamp=_TS_NEW)
+    new_main = out / f"SPOD_PROM_{_TS_NEW}.xlsx"
+    assert sorted(os.path.basename(d) for _, d in reused) == sorted(
+        [new_main.name, f"STAT_FILE {_TS_NEW}.xlsx", f"SPOD_PROM_{_TS_NEW}.columnar"]
+    )
+    assert (out / f"SPOD_PROM_{_TS_NEW}.columnar" / "manifest.json").read_text(encoding="utf-8") == "{}"
+    assert new_main.read_bytes() == b"main"
+    assert os.path.samefile(new_main, out / main_name) == (link == "hardlink")
+
+    # Удалённый файл прошлого прогона — повтор невозможен
+    (out / stat_name).unlink()
+    assert run_memo.find_previous_run(str(out), fp["fingerprint"]) is None
+
+
+def test_pipeline_reuses_outputs_and_force_recomputes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    in_dir = tmp_path / "IN"
+    in_dir.mkdir()
+    (in_dir / "CONTEST.csv").write_text("A\n1\n", encoding="utf-8")
+    out_dir = tmp_path / "OUT" / "PROM" / "2026" / "18-10"
+    out_dir.mkdir(parents=True)
+    monkeypatch.setattr(main_impl, "DIR_INPUT", str(in_dir))
+    monkeypatch.setattr(main_impl, "INPUT_FILES", [{"file": "CONTEST", "sheet": "CONTEST-DATA"}])
+    monkeypatch.setattr(main_impl, "RUN_OUTPUTS", ["main_only"])
+    monkeypatch.setattr(main_impl, "CFG_RAW", {"paths": {"input": "IN"}})
+    monkeypatch.setattr(main_impl, "RUN_MEMO", {"enabled": True, "link": "hardlink"})
+    monkeypatch.setattr(main_impl, "get_output_dir_for_run", lambda base, block=None: str(out_dir))
+    stages: List[str] = []
+    stamps = iter([_TS_OLD, _TS_NEW])
+
+    def fake_stages(block: str, log_file: str, start_time) -> None:
+        name = f"{main_impl.OUTPUT_FILENAME_MAIN}_{next(stamps)}.xlsx"
+        (out_dir / name).write_bytes(b"book")
+        stages.append(block)
+
+    monkeypatch.setattr(main_impl, "_run_block_stages", fake_stages)
+    log_file = str(tmp_path / "run.log")
+    manifest = out_dir / run_memo.MANIFEST_NAME
+
+    main_impl._run_pipeline_for_block("PROM", log_file)
+    assert stages == ["PROM"]
+    first = out_dir / f"{main_impl.OUTPUT_FILENAME_MAIN}_{_TS_OLD}.xlsx"
+    manifest_text = manifest.read_text(encoding="utf-8")
+
+    # Повтор: этапы не выполняются, книга — жёсткая ссылка на книгу первого прогона
+    main_impl._run_pipeline_for_block("PROM", log_file)
+    assert stages == ["PROM"]
+    books = sorted(out_dir.glob("*.xlsx"))
+    assert len(books) == 2 and all(os.path.samefile(b, first) for b in books)
+
+    # --force: этапы выполняются заново, новая книга — отдельный файл, манифест дописан новым прогоном
+    manifest_text = manifest.read_text(encoding="utf-8")
+    monkeypatch.setattr(main_impl, "RUN_FORCE", True)
+    main_impl._run_pipeline_for_block("PROM", log_file)
+    assert stages == ["PROM", "PROM"]
+    forced = out_dir / f"{main_impl.OUTPUT_FILENAME_MAIN}_{_TS_NEW}.xlsx"
+    assert forced.is_file() and not os.path.samefile(forced, first)
+    assert forced.stat().st_ino != first.stat().st_ino
+    assert manifest.read_text(encoding="utf-8") != manifest_text
+    assert forced.name in json.loads(manifest.read_text(encoding="utf-8"))["runs"][-1]["outputs"]
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""План стилей листа (COLUMN_FORMATS → колонки) и целые числа на этапе подготовки DataFrame."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import src.main_impl as main_impl
+
+_HEADERS = ["ФИО", "Баллы | Q1", "Баллы | Q2", "Доля", "Дата"]
+
+
+def _rules(sheet: str) -> list:
+    return [
+        {"sheet": sheet, "column_prefixes": ["Баллы |"], "data_type": "number", "decimal_places": 0},
+        {"sheet": sheet, "columns": ["Доля"], "data_type": "number", "decimal_places": 2, "horizontal": "right"},
+        {"sheet": sheet, "columns": ["Баллы | Q2"], "data_type": "text", "horizontal": "center", "wrap_text": True},
+    ]
+
+
+@pytest.fixture()
+def _formats(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main_impl, "COLUMN_FORMATS", _rules("RATING_A") + _rules("RATING_B"))
+    monkeypatch.setattr(main_impl, "SKIP_DATA_ALIGNMENT_SHEETS", ["RAW_*"])
+
+
+def test_plan_resolves_rules_per_column(_formats: None) -> None:
+    plan = main_impl.sheet_style_plan("RATING_A", _HEADERS)
+    assert plan.covered == {1, 2, 3}
+    assert plan.force_int == {1, 2}
+    assert plan.num_formats[0] is None and plan.num_formats[3] == "#,##0.00"
+    # Последнее подходящее правило задаёт выравнивание, формат числа остаётся от числового правила
+    assert plan.num_formats[2] == plan.num_formats[1]
+    assert plan.alignments[2] == ("center", "center", True)
+    assert plan.alignments[0] == ("left", "center", True)
+    assert [len(idxs) for _, idxs in plan.rule_columns] == [2, 1, 1]
+    assert main_impl._column_indices_covered_by_column_formats("RATING_A", _HEADERS) == {2, 3, 4}
+
+
+def test_plan_cached_for_sheets_with_same_headers(_formats: None) -> None:
+    first = main_impl.sheet_style_plan("RATING_A", _HEADERS)
+    assert main_impl.sheet_style_plan("RATING_B", list(_HEADERS)) is first
+    assert main_impl.sheet_style_plan("RATING_A", _HEADERS[:-1]) is not first
+    # Лист без выравнивания данных — отдельный план
+    assert main_impl.sheet_style_plan("RAW_A", _HEADERS).alignments == (None,) * len(_HEADERS)
+
+
+def test_conversion_makes_int_cells_before_write(_formats: None) -> None:
+    df = pd.DataFrame({
+        "ФИО": ["a", "b", "c"],
+        "Баллы | Q1": ["1 000", "2", ""],
+        "Баллы | Q2": ["1", "2,5", "abc"],
+        "Доля": ["0,5", "1", None],
+        "Дата": ["2024-01-01"] * 3,
+    })
+    main_impl.apply_column_format_conversion(df, "RATING_A")
+    assert str(df["Баллы | Q1"].dtype) == "Int64" and df["Баллы | Q1"].tolist()[:2] == [1000, 2]
+    # Дробные значения в колонке с 0 знаков: целыми становятся только целочисленные ячейки, затем правило text
+    assert df["Баллы | Q2"].tolist() == ["1", "2,5", "abc"]
+    assert df["Доля"].tolist()[:2] == [0.5, 1.0]
+
+
+def test_openpyxl_cells_get_column_styles(tmp_path: Path, _formats: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main_impl, "EXCEL_ENGINE", "openpyxl")
+    monkeypatch.setattr(main_impl, "SHEET_ORDER", ["RATING_A"])
+    monkeypatch.setattr(main_impl, "APPLY_SORT_TO_MAIN", False)
+    df = pd.DataFrame({
+        "ФИО": ["a", "b", "c"],
+        "Баллы | Q1": ["1", "2,0", "3.5"],
+        "Баллы | Q2": ["7", "8", "9"],
+        "Доля": ["0,5", "1", "2"],
+        "Дата": pd.to_datetime(["2024-01-01", None, "2024-03-01"]),
+    })
+    path = tmp_path / "out.xlsx"
+    main_impl.write_to_excel({"RATING_A": (df, {})}, str(path))
+    ws = load_workbook(path)["RATING_A"]
+    assert [ws.cell(row=r, column=2).value for r in (2, 3, 4)] == [1, 2, "3.5"]
+    assert ws["B2"].number_format == ws["B4"].number_format == "#,##0"
+    assert ws["D3"].number_format == "#,##0.00" and ws["D3"].alignment.horizontal == "right"
+    assert ws["C2"].alignment.horizontal == "center" and ws["C2"].alignment.wrap_text
+    # Колонка без правил: общий перенос по словам, формат даты pandas сохранён
+    assert ws["E2"].alignment.wrap_text and ws["E2"].number_format == ws["E4"].number_format != "General"
+    assert ws["A1"].font.b and not ws["A2"].font.b
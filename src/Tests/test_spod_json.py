@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Разбор SPOD-JSON с тройными кавычками (src/spod_json.py) и маршрут safe_json_loads."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+import src.main_impl as main_impl
+from src.json_utils import safe_json_loads, safe_json_loads_cached
+from src.spod_json import SpodJsonError, parse_spod_json
+
+_CELLS = [
+    '{"""vid""": """VID_01""", """accuracy""": 2, """minNumber""": -1.5e2, """flag""": true, """x""": null}',
+    '[{"""period_code""": 0, """criterion_mark_type""": """>""", """criterion_mark_value""": 0}]',
+    '{"""seasonItem""": ["""S1""", """S2"""], """nested""": {"""a""": {"""b""": []}}, """e""": {}}',
+    '{"""text""": """Простой текст: с двоеточием, запятой и {скобками}"""}',
+    '{"""empty""": """""", """esc""": """a\\\\nb\\\\u0041"""}',
+    '{ """k""" :\t"""v""" ,\n"""n""":"""1""" }',
+    '{"""mixed""": "json string", """num""": 10}',
+]
+
+
+@pytest.mark.parametrize("cell", _CELLS)
+def test_parse_matches_triple_quote_replacement(cell: str) -> None:
+    expected = json.loads(cell.replace('"""', '"'))
+    assert parse_spod_json(cell) == expected
+    assert safe_json_loads(cell) == expected
+    assert main_impl.safe_json_loads(cell) == expected
+
+
+def test_dialect_cases_beyond_replacement() -> None:
+    # Одиночная кавычка внутри """…""" — после замены строка была бы сломана
+    cell = '{"""title""": """Конкурс "Лидер" года"""}'
+    assert parse_spod_json(cell) == {"title": 'Конкурс "Лидер" года'}
+    assert safe_json_loads(cell) == {"title": 'Конкурс "Лидер" года'}
+    # Апостроф больше не портится заменой ' → "
+    assert safe_json_loads('{"""name""": """O\'Brien"""}') == {"name": "O'Brien"}
+
+
+@pytest.mark.parametrize(
+    "cell",
+    [
+        '{"""a""": 1,}',
+        '{"""a""" 1}',
+        '{"""a""": """x}',
+        '{"""a""": 1} tail',
+        "{'a': 1}",
+        '{"""a""": """x "y"\\\\n"""}',
+    ],
+)
+def test_parse_rejects_outside_dialect(cell: str) -> None:
+    with pytest.raises(SpodJsonError):
+        parse_spod_json(cell)
+
+
+def test_repair_chain_still_used_for_broken_cells() -> None:
+    assert safe_json_loads('{"""a""": 1,}') == {"a": 1}
+    assert safe_json_loads("{'a': 1}") == {"a": 1}
+    assert safe_json_loads("plain text") is None
+
+
+def test_cached_loads_shares_result() -> None:
+    cell = '{"""k""": ["""v"""]}'
+    first = safe_json_loads_cached(cell)
+    assert first == {"k": ["v"]}
+    assert safe_json_loads_cached(cell) is first
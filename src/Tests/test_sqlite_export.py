@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Выгрузка обработанных листов в SQLite (токен main_sqlite, src/sqlite_export.py)."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src import console_ui
+from src.config_loader import parse_run_outputs_config
+from src.sqlite_export import sheet_index_keys, write_sheets_sqlite
+
+_ARCHIVE_CFG = {"default_row_key_by_sheet": {"CONTEST-DATA": ["CONTEST_CODE"], "RATING_*": ["ID"]}}
+_MERGE_RULES = [
+    {"sheet_src": "CONTEST-DATA", "sheet_dst": "REPORT", "src_key": ["CONTEST_CODE"], "dst_key": ["CONTEST_CODE"]},
+    {"sheet_src": "REWARD", "sheet_dst": "REPORT", "src_key": ["REWARD_CODE"], "dst_key": ["MANAGER", "REWARD_CODE"]},
+]
+
+
+def _sheets() -> dict:
+    contest = pd.DataFrame(
+        {
+            "CONTEST_CODE": ["C1", "C2", None],
+            "PLAN": [1.5, np.nan, 3.0],
+            "N": pd.array([1, None, 3], dtype="Int64"),
+            "CNT": np.array([4, 5, 6], dtype=np.int64),
+            "STATUS": pd.Categorical(["А", "Б", "А"]),
+            "DT": pd.to_datetime(["2026-01-01 10:00:00", None, "2026-03-01"], format="ISO8601"),
+            "MIXED": [np.int64(7), "текст", {"a": 1}],
+        }
+    )
+    report = pd.DataFrame([["C1", "M1", "R1", "x"]], columns=["CONTEST_CODE", "MANAGER", "REWARD_CODE", "contest_code"])
+    return {
+        "CONTEST-DATA": (contest, {}),
+        "REPORT": (report, {}),
+        "RATING_LIST": (pd.DataFrame({"ID": [1, 2]}), {}),
+        "EMPTY": (pd.DataFrame(), {}),
+    }
+
+
+def test_index_keys_from_row_keys_and_merge_rules() -> None:
+    assert sheet_index_keys("CONTEST-DATA", {}, _ARCHIVE_CFG, _MERGE_RULES) == [("CONTEST_CODE",)]
+    assert sheet_index_keys("REPORT", {"row_key_columns": ["MANAGER"]}, _ARCHIVE_CFG, _MERGE_RULES) == [
+        ("MANAGER",),
+        ("CONTEST_CODE",),
+        ("MANAGER", "REWARD_CODE"),
+    ]
+    assert sheet_index_keys("RATING_LIST", {}, _ARCHIVE_CFG, []) == [("ID",)]
+
+
+def test_write_sheets_sqlite(tmp_path: Path) -> None:
+    db = tmp_path / "SPOD_PROM main_2026-10-18_10-00-00.sqlite"
+    info = write_sheets_sqlite(
+        _sheets(), str(db), archive_cfg=_ARCHIVE_CFG, merge_rules=_MERGE_RULES, block="PROM"
+    )
+    assert info["sheets"] == 4 and info["rows"] == 6 and info["indexes"] == 4
+    assert not (tmp_path / (db.name + ".tmp")).exists()
+
+    conn = sqlite3.connect(str(db))
+    rows = conn.execute('SELECT * FROM "CONTEST-DATA"').fetchall()
+    assert rows[0] == ("C1", 1.5, 1, 4, "А", "2026-01-01 10:00:00", "7")  # TEXT-аффинность
+    assert rows[1] == ("C2", None, None, 5, "Б", None, "текст")
+    assert rows[2][0] is None and rows[2][-1] == "{'a': 1}"
+    types = {r[1]: r[2] for r in conn.execute('PRAGMA table_info("CONTEST-DATA")')}
+    assert types["PLAN"] == "REAL" and types["N"] == "INTEGER" and types["DT"] == "TEXT"
+    # contest_code совпадает с CONTEST_CODE без учёта регистра — переименована
+    assert [r[1] for r in conn.execute('PRAGMA table_info("REPORT")')][-1] == "contest_code (2)"
+
+    indexes = {
+        (r[0], tuple(c[2] for c in conn.execute(f'PRAGMA index_info("{r[1]}")')))
+        for r in conn.execute("SELECT tbl_name, name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")
+    }
+    assert indexes == {
+        ("CONTEST-DATA", ("CONTEST_CODE",)),
+        ("REPORT", ("CONTEST_CODE",)),
+        ("REPORT", ("MANAGER", "REWARD_CODE")),
+        ("RATING_LIST", ("ID",)),
+    }
+    sheets = {r[0]: (r[2], json.loads(r[4])) for r in conn.execute("SELECT * FROM _sheets")}
+    assert sheets["REPORT"] == (1, [["CONTEST_CODE"], ["MANAGER", "REWARD_CODE"]])
+    assert dict(conn.execute("SELECT key, value FROM _meta"))["block"] == "PROM"
+    conn.close()
+
+
+def test_run_outputs_token() -> None:
+    ro = parse_run_outputs_config({"run_outputs": ["main_sqlite", "consistency_only"]})
+    assert "main_sqlite" in ro[0] and not ro[3] and not ro[5]
+    assert console_ui.expected_phases_for_run_flags(False, False, True, False, False, write_sqlite=True) == 6
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Тесты потоковой записи основной книги (performance.excel_engine: stream)."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import src.main_impl as main_impl
+from src.config_loader import parse_excel_engine
+from src.xlsx_stream_writer import (
+    CellStyle,
+    StreamSheet,
+    XlsxStyleRegistry,
+    col_letter,
+    write_xlsx_stream,
+)
+
+
+def _sample_df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "NAME": ["x", " y ", None, "ab"],
+            "AMOUNT": ["1 000", "2", "abc", None],
+            "DT": pd.to_datetime(["2024-01-01 00:00", "2024-02-03 10:00", None, "2020-01-01 00:00"]),
+            "RATIO": [1.5, np.nan, 3.0, 4.0],
+        }
+    )
+
+
+def _cell_snapshot(path: Path):
+    wb = load_workbook(path)
+    out = {"sheets": wb.sheetnames, "active": wb.active.title}
+    for ws in wb:
+        cells = []
+        for row in ws.iter_rows():
+            for c in row:
+                cells.append(
+                    (
+                        c.coordinate,
+                        c.value,
+                        c.number_format,
+                        bool(c.font.b),
+                        c.fill.fgColor.rgb if c.fill.fill_type else None,
+                        c.alignment.horizontal,
+                        bool(c.alignment.wrap_text),
+                    )
+                )
+        out[ws.title] = {
+            "freeze": ws.freeze_panes,
+            "filter": ws.auto_filter.ref,
+            "widths": [ws.column_dimensions[col_letter(i)].width for i in range(1, ws.max_column + 1)],
+            "cells": cells,
+        }
+    return out
+
+
+def test_parse_excel_engine() -> None:
+    assert parse_excel_engine({}) == "openpyxl"
+    assert parse_excel_engine({"performance": {"excel_engine": "STREAM"}}) == "stream"
+    with pytest.raises(ValueError):
+        parse_excel_engine({"performance": {"excel_engine": "xlsxwriter"}})
+
+
+def test_write_xlsx_stream_roundtrip(tmp_path: Path) -> None:
+    styles = XlsxStyleRegistry()
+    header = styles.style_id(CellStyle(bold=True, fill="E6F3FF", border=True))
+    num = styles.style_id(CellStyle(num_fmt="#,##0.000"))
+    assert styles.style_id(CellStyle(num_fmt="#,##0.000")) == num
+    df = pd.DataFrame({"A": ["t\x01", None], "B": [1, 2.25], "C": [True, False]})
+    sheet = StreamSheet(
+        name="DATA",
+        df=df,
+        header_styles=[header] * 3,
+        data_styles=[0, num, 0],
+        datetime_styles=[0, 0, 0],
+        date_styles=[0, 0, 0],
+        col_widths=[10, 12, 8],
+        freeze="B2",
+        selected=True,
+    )
+    path = tmp_path / "out.xlsx"
+    write_xlsx_stream(str(path), [sheet], styles)
+    ws = load_workbook(path)["DATA"]
+    assert [c.value for c in ws[1]] == ["A", "B", "C"]
+    assert ws["A2"].value == "t"  # недопустимый в XML символ отброшен
+    assert ws["A1"].font.b and ws["A1"].fill.fgColor.rgb == "00E6F3FF"
+    assert ws["A3"].value is None
+    assert ws["B2"].value == 1 and ws["B3"].value == 2.25
+    assert ws["B3"].number_format == "#,##0.000"
+    assert ws["C2"].value is True
+    assert ws.freeze_panes == "B2"
+    assert ws.auto_filter.ref == "A1:C3"
+    assert ws.column_dimensions["B"].width == 12
+
+
+def test_stream_engine_matches_openpyxl(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    rules = [
+        {
+            "sheet": "SUMMARY",
+            "columns": ["AMOUNT"],
+            "data_type": "number",
+            "decimal_places": 0,
+            "thousands_separator": True,
+            "horizontal": "right",
+        }
+    ]
+    scheme = [
+        {
+            "group": "t",
+            "header_bg": "FFCC00",
+            "header_fg": "000000",
+            "column_bg": "EEEEEE",
+            "column_fg": None,
+            "style_scope": "all",
+            "sheets": ["SUMMARY"],
+            "columns": ["RATIO"],
+        }
+    ]
+    monkeypatch.setattr(main_impl, "COLUMN_FORMATS", rules)
+    monkeypatch.setattr(main_impl, "COLOR_SCHEME", scheme)
+    monkeypatch.setattr(main_impl, "MERGE_FIELDS_ADVANCED", [])
+    monkeypatch.setattr(main_impl, "_color_scheme_cache", None)
+    monkeypatch.setattr(main_impl, "SHEET_ORDER", ["SUMMARY"])
+    monkeypatch.setattr(main_impl, "APPLY_SORT_TO_MAIN", False)
+    monkeypatch.setattr(main_impl, "SKIP_DATA_ALIGNMENT_SHEETS", ["RAW"])
+
+    snapshots = {}
+    for engine in ("openpyxl", "stream"):
+        monkeypatch.setattr(main_impl, "EXCEL_ENGINE", engine)
+        sheets = {
+            "SUMMARY": (_sample_df(), {"freeze": "B2", "max_col_width": 40}),
+            "RAW": (
+                _sample_df(),
+                {"cell_fills": {"header": {"NAME": "FF0000"}, "columns": {"AMOUNT": ["C6EFCE", None, "FFB6C1"]}}},
+            ),
+        }
+        path = tmp_path / f"{engine}.xlsx"
+        main_impl.write_to_excel(sheets, str(path))
+        snapshots[engine] = _cell_snapshot(path)
+
+    assert snapshots["stream"] == snapshots["openpyxl"]
+    summary = snapshots["stream"]["SUMMARY"]["cells"]
+    assert ("B2", 1000, "#,##0", False, None, "right", False) in summary
+    by_ref = {c[0]: c for c in summary}
+    assert by_ref["D1"][4] == "00FFCC00"
+    assert by_ref["D2"][4] == "00EEEEEE"
+    raw = {c[0]: c for c in snapshots["stream"]["RAW"]["cells"]}
+    assert raw["A1"][4] == "00FF0000"
+    assert raw["B2"][4] == "00C6EFCE" and raw["B3"][4] is None and raw["B4"][4] == "00FFB6C1"
+
+
+def test_parallel_sheet_render_matches_sequential(tmp_path: Path) -> None:
+    styles = XlsxStyleRegistry()
+    bold = styles.style_id(CellStyle(bold=True))
+
+    def _sheets():
+        out = []
+        for k in range(3):
+            df = pd.DataFrame({"A": [f"s{k}_{i}" for i in range(50)], "B": np.arange(50) * (k + 1)})
+            out.append(
+                StreamSheet(
+                    name=f"S{k}",
+                    df=df,
+                    header_styles=[bold, bold],
+                    data_styles=[0, 0],
+                    datetime_styles=[0, 0],
+                    date_styles=[0, 0],
+                    col_widths=[10, 10],
+                    selected=(k == 0),
+                )
+            )
+        return out
+
+    seq = tmp_path / "seq.xlsx"
+    par = tmp_path / "par.xlsx"
+    write_xlsx_stream(str(seq), _sheets(), styles)
+    write_xlsx_stream(str(par), _sheets(), styles, max_workers=3, min_rows_for_parallel=1)
+    a, b = _cell_snapshot(seq), _cell_snapshot(par)
+    assert a == b
+    assert a["S2"]["cells"][-1][1] == 49 * 3
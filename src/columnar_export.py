@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Колоночная выгрузка обработанных листов (токен ``main_columnar`` в run_outputs).
+
+Каждый лист ``sheets_data`` (после merge, SUMMARY, матрицы RATING, сводки SEASON) пишется
+отдельным файлом без оформления Excel: Parquet или Feather (нужен pyarrow), иначе pickle.
+Рядом — ``manifest.json``: лист → файл, формат, число строк, колонки и их типы.
+Каталог выгрузки: ``<имя основной книги>_<таймштамп>.columnar`` в OUT/<BLOCK>/YYYY/DD-MM.
+Настройки — раздел ``columnar_output`` конфига.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# Увеличивать при изменении структуры manifest.json
+MANIFEST_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+DEFAULT_COLUMNAR_OUTPUT: Dict[str, Any] = {
+    # auto (Parquet при pyarrow, иначе pickle) | parquet | feather | pickle
+    "format": "auto",
+    # Сжатие Parquet / Feather (None — по умолчанию pyarrow)
+    "compression": None,
+}
+
+_FORMATS = ("auto", "parquet", "feather", "pickle")
+_EXTENSIONS = {"parquet": ".parquet", "feather": ".feather", "pickle": ".pkl"}
+
+
+def merge_columnar_output_config(raw: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Дефолты + раздел ``columnar_output`` из конфига."""
+    cfg = dict(DEFAULT_COLUMNAR_OUTPUT)
+    if isinstance(raw, Mapping):
+        for k, v in raw.items():
+            if not str(k).startswith("_"):
+                cfg[k] = v
+    fmt = str(cfg.get("format") or "auto").strip().lower()
+    if fmt not in _FORMATS:
+        raise ValueError(
+            f"columnar_output.format: недопустимое значение {cfg.get('format')!r}; "
+            f"допустимо: {', '.join(_FORMATS)}"
+        )
+    cfg["format"] = fmt
+    cfg["compression"] = cfg.get("compression") or None
+    return cfg
+
+
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_columnar_format(fmt: str) -> str:
+    """Фактический формат: parquet/feather без pyarrow — pickle (с предупреждением в лог)."""
+    if fmt == "auto":
+        return "parquet" if _pyarrow_available() else "pickle"
+    if fmt in ("parquet", "feather") and not _pyarrow_available():
+        logging.warning(f"[columnar] pyarrow не установлен — формат {fmt} заменён на pickle")
+        return "pickle"
+    return fmt
+
+
+def _safe_name(text: str) -> str:
+    return re.sub(r"[^0-9A-Za-z._-]+", "_", text).strip("_") or "sheet"
+
+
+def _unique_columns(columns: Sequence[Any]) -> Tuple[List[str], Dict[str, str]]:
+    """Имена колонок строками и без повторов (``X``, ``X (2)``, …); переименования — для манифеста."""
+    seen: Dict[str, int] = {}
+    out: List[str] = []
+    renamed: Dict[str, str] = {}
+    for col in columns:
+        name = str(col)
+        if name in seen:
+            seen[name] += 1
+            new_name = f"{name} ({seen[name]})"
+            while new_name in seen:
+                seen[name] += 1
+                new_name = f"{name} ({seen[name]})"
+            renamed[new_name] = name
+            name = new_name
+        seen.setdefault(name, 1)
+        out.append(name)
+    return out, renamed
+
+
+def columnar_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """
+    Кадр в виде, пригодном для Parquet/Feather: строковые уникальные имена колонок, RangeIndex.
+    Данные не копируются, если менять нечего.
+    """
+    names, renamed = _unique_columns(list(df.columns))
+    out = df
+    if names != list(df.columns):
+        out = df.copy(deep=False)
+        out.columns = names
+    if not isinstance(out.index, pd.RangeIndex) or out.index.start != 0 or out.index.step != 1:
+        out = out.reset_index(drop=True)
+    return out, renamed
+
+
+def _stringify_mixed_objects(df: pd.DataFrame) -> pd.DataFrame:
+    """object-колонки со смешанными типами (число и строка) → строки; None/NaN сохраняются."""
+    out = df.copy(deep=False)
+    for col in out.columns:
+        s = out[col]
+        if s.dtype == object:
+            out[col] = s.where(s.isna(), s.astype(str))
+    return out
+
+
+def _write_frame(df: pd.DataFrame, path: str, fmt: str, compression: Optional[str]) -> None:
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        kwargs = {"compression": compression} if compression else {}
+        try:
+            df.to_parquet(tmp, index=False, **kwargs)
+        except Exception as ex:  # pyarrow не выводит тип object-колонки со смешанными значениями
+            logging.debug(f"[columnar] {os.path.basename(path)}: {ex}; смешанные object-колонки → строки")
+            _stringify_mixed_objects(df).to_parquet(tmp, index=False, **kwargs)
+    elif fmt == "feather":
+        kwargs = {"compression": compression} if compression else {}
+        try:
+            df.to_feather(tmp, **kwargs)
+        except Exception as ex:
+            logging.debug(f"[columnar] {os.path.basename(path)}: {ex}; смешанные object-колонки → строки")
+            _stringify_mixed_objects(df).to_feather(tmp, **kwargs)
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+def write_columnar_sheets(
+    sheets_data: Mapping[str, Any],
+    out_dir: str,
+    settings: Optional[Mapping[str, Any]] = None,
+    sheet_order: Optional[Sequence[str]] = None,
+    block: Optional[str] = None,
+) -> str:
+    """
+    Пишет листы ``sheets_data`` ({лист: (DataFrame, params)}) в ``out_dir`` и manifest.json.
+
+    Порядок листов — как в основной книге (``sheet_order``, затем остальные по алфавиту).
+
+    Returns:
+        путь к manifest.json
+    """
+    cfg = merge_columnar_output_config(settings)
+    fmt = resolve_columnar_format(cfg["format"])
+    ext = _EXTENSIONS[fmt]
+    os.makedirs(out_dir, exist_ok=True)
+
+    order = [s for s in (sheet_order or []) if s in sheets_data]
+    order += sorted(s for s in sheets_data if s not in order)
+    entries: List[Dict[str, Any]] = []
+    for idx, sheet_name in enumerate(order, start=1):
+        item = sheets_data[sheet_name]
+        df = item[0] if isinstance(item, (list, tuple)) else item
+        if not isinstance(df, pd.DataFrame):
+            continue
+        frame, renamed = columnar_frame(df)
+        file_name = f"{idx:02d}_{_safe_name(sheet_name)}{ext}"
+        _write_frame(frame, os.path.join(out_dir, file_name), fmt, cfg["compression"])
+        entry: Dict[str, Any] = {
+            "sheet": sheet_name,
+            "file": file_name,
+            "rows": int(len(frame)),
+            "columns": [{"name": str(c), "dtype": str(t)} for c, t in frame.dtypes.items()],
+        }
+        if renamed:
+            entry["renamed_columns"] = renamed
+        entries.append(entry)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "block": block,
+        "format": fmt,
+        "sheets": entries,
+    }
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    logging.info(f"[columnar] Листов: {len(entries)}, формат {fmt} → {out_dir}")
+    return manifest_path
+
+
+def read_columnar_sheets(out_dir: str) -> Dict[str, pd.DataFrame]:
+    """Обратное чтение выгрузки по manifest.json: {лист: DataFrame} с исходными именами колонок."""
+    with open(os.path.join(out_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    fmt = manifest.get("format")
+    out: Dict[str, pd.DataFrame] = {}
+    for entry in manifest.get("sheets") or []:
+        path = os.path.join(out_dir, entry["file"])
+        if fmt == "parquet":
+            df = pd.read_parquet(path)
+        elif fmt == "feather":
+            df = pd.read_feather(path)
+        else:
+            df = pd.read_pickle(path)
+        renamed = entry.get("renamed_columns") or {}
+        if renamed:
+            df.columns = [renamed.get(c, c) for c in df.columns]
+        out[entry["sheet"]] = df
+    return out
@@ -10,7 +10,7 @@
 import fnmatch
 import json
 import os
-from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
 
 # Листы, где по умолчанию не ставим Alignment на ячейки данных (только заголовок).
 # Шаблоны — fnmatch (RATING_*, ORDER_*, ORDER-* для ORDER-SEASON-SUMMARY).
@@ -24,6 +24,18 @@ DEFAULT_SKIP_DATA_ALIGNMENT_SHEETS: List[str] = [
     "ORDER-*",
 ]
 
+# Движок записи основной книги Excel (performance.excel_engine)
+EXCEL_ENGINES: Tuple[str, ...] = ("openpyxl", "stream")
+DEFAULT_EXCEL_ENGINE: str = "openpyxl"
+
+# Оценка AUTO-ширины колонок по DataFrame (performance.column_width)
+DEFAULT_COLUMN_WIDTH: Dict[str, Any] = {
+    "head_rows": 500,
+    "random_rows": 500,
+    "longest_rows": 20,
+    "full_scan_max_rows": 2000,
+}
+
 # Имя каталога и файла входа относительно корня проекта
 _CONFIG_DIR_NAME: str = "config"
 _CONFIG_ENTRY_NAME: str = "config.json"
@@ -33,6 +45,8 @@ _RUN_OUTPUT_TOKENS: Set[str] = frozenset(
     {
         "source_only",
         "main_only",
+        "main_columnar",
+        "main_sqlite",
         "consistency_only",
         "manager_stats_only",
         "stat_file_only",
@@ -179,6 +193,54 @@ def parse_skip_data_alignment_sheets(cfg: Dict[str, Any]) -> List[str]:
     return result
 
 
+def parse_excel_engine(cfg: Dict[str, Any]) -> str:
+    """
+    Движок записи основной книги из ``performance.excel_engine``.
+
+    ``openpyxl`` — pandas.ExcelWriter + оформление ячеек openpyxl (по умолчанию);
+    ``stream`` — потоковая запись XML листов (src/xlsx_stream_writer.py).
+    """
+    perf = cfg.get("performance")
+    if not isinstance(perf, dict):
+        return DEFAULT_EXCEL_ENGINE
+    raw = perf.get("excel_engine")
+    if raw is None or (isinstance(raw, str) and not raw.strip()):
+        return DEFAULT_EXCEL_ENGINE
+    engine = str(raw).strip().lower()
+    if engine not in EXCEL_ENGINES:
+        raise ValueError(
+            f"performance.excel_engine: недопустимое значение {raw!r}; "
+            f"допустимо: {', '.join(EXCEL_ENGINES)}"
+        )
+    return engine
+
+
+def merge_column_width_config(raw: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """
+    Дефолты + ``performance.column_width``: выборка значений для AUTO-ширины колонок.
+
+    ``head_rows`` — первые строки, ``random_rows`` — случайные строки (фиксированное зерно),
+    ``longest_rows`` — у скольких самых длинных значений выборки домерить соседние строки,
+    ``full_scan_max_rows`` — до этого числа строк текстовые колонки меряются целиком.
+    """
+    cfg = dict(DEFAULT_COLUMN_WIDTH)
+    if isinstance(raw, Mapping):
+        for k, v in raw.items():
+            if not str(k).startswith("_"):
+                cfg[k] = v
+    for key in DEFAULT_COLUMN_WIDTH:
+        try:
+            value = int(cfg[key])
+        except (TypeError, ValueError):
+            value = -1
+        if value < 0:
+            raise ValueError(
+                f"performance.column_width.{key}: ожидается целое число >= 0, получено {cfg[key]!r}"
+            )
+        cfg[key] = value
+    return cfg
+
+
 def sheet_skips_data_alignment(
     sheet_name: str,
     patterns: Optional[Sequence[str]] = None,
@@ -464,7 +526,7 @@ def parse_run_outputs_config(cfg: Dict[str, Any]) -> Tuple[List[str], bool, bool
         if not tokens:
             raise ValueError(
                 "run_outputs: укажите хотя бы одно из значений: "
-                "source_only, main_only, consistency_only, manager_stats_only, "
+                "source_only, main_only, main_columnar, main_sqlite, consistency_only, manager_stats_only, "
                 "stat_file_only, rating_item_matrix, season_order_summary, "
                 "contest_badge_form_export, contest_badge_form_import, "
                 "contest_badge_form_blank"
@@ -496,10 +558,12 @@ def parse_run_outputs_config(cfg: Dict[str, Any]) -> Tuple[List[str], bool, bool
     write_stat_file = "stat_file_only" in tokens
     run_rating_item_matrix = "rating_item_matrix" in tokens
     run_season_order_summary = "season_order_summary" in tokens
+    # Выгрузки обработанных листов (main_columnar, main_sqlite) требуют того же пайплайна, что и основная книга
+    write_processed = write_main or bool(tokens & {"main_columnar", "main_sqlite"})
     # Ранний «только консистентность» без основной книги — как старый режим 4
-    consistency_early = write_consistency_file and not write_main
+    consistency_early = write_consistency_file and not write_processed
     # Только статистика менеджеров без основной книги — выход после merge
-    manager_stats_early = write_manager_stats and not write_main
+    manager_stats_early = write_manager_stats and not write_processed
 
     # Число 1–4 для логов и совместимости со старым кодом
     if source_only_exit:
@@ -615,6 +679,8 @@ class Config:
         self.rating_item_matrix: Dict[str, Any] = self._cfg.get("rating_item_matrix") or {}
         # Сводка заказов по группам SEASON (см. season_order_summary.py)
         self.season_order_summary: Dict[str, Any] = self._cfg.get("season_order_summary") or {}
+        # Колоночная выгрузка листов (токен main_columnar; см. columnar_export.py)
+        self.columnar_output: Dict[str, Any] = self._cfg.get("columnar_output") or {}
         self.manager_stats: Dict[str, Any] = self._cfg.get("manager_stats") or {}
 
         # Параллелизм и ускорение оформления Excel
@@ -625,6 +691,17 @@ class Config:
         self.skip_data_alignment_sheets: List[str] = parse_skip_data_alignment_sheets(
             self._cfg
         )
+        self.excel_engine: str = parse_excel_engine(self._cfg)
+        # Кэш разобранных CSV по SHA-256 (src/parsed_frame_cache.py); дефолты — merge_parse_cache_config
+        self.parse_cache: Dict[str, Any] = _perf.get("parse_cache") or {}
+        # Разворот JSON-колонок (src/json_utils.py); дефолты — merge_json_flatten_config
+        self.json_flatten: Dict[str, Any] = _perf.get("json_flatten") or {}
+        # Выборка значений для AUTO-ширины колонок; дефолты — merge_column_width_config
+        self.column_width: Dict[str, Any] = _perf.get("column_width") or {}
+        # Мемоизация прогона по отпечатку входов/конфига/кода; дефолты — src.run_memo.merge_run_memo_config
+        self.run_memo: Dict[str, Any] = _perf.get("run_memo") or {}
+        # Построчный кэш проверок консистентности; дефолты — src.consistency_row_cache.merge_incremental_config
+        self.incremental: Dict[str, Any] = _perf.get("incremental") or {}
 
         # Выгрузка сырых данных (source): сортировка листов при записи в SPOD_PROM source *.xlsx
         _source = self._cfg.get("source_export") or {}
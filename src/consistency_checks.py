@@ -9,19 +9,22 @@
 с одним CONTEST_CODE по REWARD-LINK; парсинг ADD_DATA через _parse_add_data_cell_with_normalized.
 """
 
+import heapq
 import json
 import logging
 import os
 import re
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from collections import defaultdict
 from typing import Any, Dict, List, Optional, Set, Tuple
 
+import numpy as np
 import pandas as pd
 
-from src.debug_timing import debug_timed
+from src.debug_timing import debug_timed, format_duration_ru, record_stat_rows
 
 
 _BLOCK_TOKENS: Set[str] = {"PROM", "IFT", "PSI"}
@@ -51,6 +54,91 @@ def _get_sheet_item(sheets_data: Dict[str, Any], sheet_name: str) -> Optional[Tu
     return (df, conf)
 
 
+class ResultColumns:
+    """
+    Буфер колонок результатов проверок по листам на время run_all_consistency_checks.
+    Правила не копируют лист ради одной колонки: результат (Series по индексу листа) кладётся сюда,
+    сбор результата читает его отсюда, а на листы все колонки попадают одним pd.concat в attach().
+    """
+
+    def __init__(self) -> None:
+        self._by_sheet: Dict[str, Dict[str, pd.Series]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, sheet_name: str, column: str, values: pd.Series) -> None:
+        with self._lock:
+            self._by_sheet.setdefault(sheet_name, {})[column] = values
+
+    def get(self, sheet_name: str, column: str) -> Optional[pd.Series]:
+        with self._lock:
+            return self._by_sheet.get(sheet_name, {}).get(column)
+
+    def columns(self, sheet_name: str) -> Dict[str, pd.Series]:
+        with self._lock:
+            return dict(self._by_sheet.get(sheet_name, {}))
+
+    def attach(self, sheets_data: Dict[str, Any], order: Optional[List[Tuple[str, str]]] = None) -> None:
+        """
+        Дописывает накопленные колонки на листы (одноимённые колонки листа заменяются).
+        order — пары (лист, колонка): эти колонки идут первыми в заданном порядке, остальные — в порядке записи.
+        """
+        with self._lock:
+            by_sheet, self._by_sheet = self._by_sheet, {}
+        rank = {key: i for i, key in reversed(list(enumerate(order or [])))}
+        for sheet_name, cols in by_sheet.items():
+            item = _get_sheet_item(sheets_data, sheet_name)
+            if item is None or not cols:
+                continue
+            df, conf = item
+            if rank:
+                names = sorted(cols, key=lambda c: rank.get((sheet_name, c), len(rank)))
+                cols = {c: cols[c] for c in names}
+            added = pd.DataFrame({c: s.to_numpy() for c, s in cols.items()}, index=df.index)
+            replaced = [c for c in added.columns if c in df.columns]
+            if replaced:
+                df = df.drop(columns=replaced)
+            sheets_data[sheet_name] = (pd.concat([df, added], axis=1), conf)
+
+
+def _put_result_column(
+    sheets_data: Dict[str, Any],
+    sheet_name: str,
+    column: str,
+    values: Any,
+    result_columns: Optional[ResultColumns] = None,
+) -> None:
+    """
+    Колонка результата правила (значения по строкам листа): в буфер result_columns, а без буфера
+    (отдельный вызов правила) — сразу на лист.
+    """
+    item = _get_sheet_item(sheets_data, sheet_name)
+    if item is None:
+        return
+    df, conf = item
+    if result_columns is not None:
+        result_columns.put(sheet_name, column, pd.Series(values, index=df.index, dtype=object))
+        return
+    df = df.copy()
+    df[column] = values
+    sheets_data[sheet_name] = (df, conf)
+
+
+def _sheet_and_result(
+    sheets_data: Dict[str, Any],
+    sheet_name: str,
+    column: str,
+    result_columns: Optional[ResultColumns] = None,
+) -> Tuple[Optional[pd.DataFrame], Optional[pd.Series]]:
+    """Лист и колонка результата правила (из буфера result_columns или с листа); (None, None) — листа нет."""
+    df = _get_sheet_df(sheets_data, sheet_name)
+    if df is None:
+        return None, None
+    series = result_columns.get(sheet_name, column) if result_columns is not None else None
+    if series is None and column in df.columns:
+        series = df[column]
+    return df, series
+
+
 def _excel_row(idx: int) -> int:
     """Номер строки в Excel: строка 1 — заголовок, первая строка данных = 2."""
     return int(idx) + 2
@@ -235,13 +323,94 @@ def _referential_row_conditions_mask(
     return m
 
 
+def _strip_cells(values: pd.Series) -> pd.Series:
+    """Значения колонки для сравнения: пусто/NaN → "", иначе str(...).strip()."""
+    return values.where(values.notna(), "").astype(str).str.strip()
+
+
+class ReferenceSets:
+    """
+    Наборы значений справочников на один прогон проверок: ключ — (лист, колонки, условия строк).
+    Правила referential / referential_composite с одним справочником (CONTEST-DATA.CONTEST_CODE,
+    REWARD.REWARD_CODE и т.п.) строят набор один раз; проверка строк — векторный isin.
+    Листы во время прогона не меняются (колонки результатов — в ResultColumns), поэтому наборы
+    не устаревают.
+    """
+
+    def __init__(self) -> None:
+        self._values: Dict[Tuple[str, Tuple[str, ...], str, bool], pd.Index] = {}
+        self._key_locks: Dict[Tuple[str, Tuple[str, ...], str, bool], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.built = 0
+        self.reused = 0
+
+    def get(
+        self,
+        df_ref: pd.DataFrame,
+        sheet_ref: str,
+        columns_ref: List[str],
+        ref_conds: Optional[List[Dict[str, Any]]],
+        composite: bool,
+    ) -> pd.Index:
+        key = (
+            str(sheet_ref),
+            tuple(columns_ref),
+            json.dumps(ref_conds or [], ensure_ascii=False, sort_keys=True, default=str),
+            composite,
+        )
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            values = self._values.get(key)
+            if values is None:
+                values = _build_reference_values(df_ref, sheet_ref, columns_ref, ref_conds, composite)
+                self._values[key] = values
+                self.built += 1
+            else:
+                self.reused += 1
+        return values
+
+
+def _build_reference_values(
+    df_ref: pd.DataFrame,
+    sheet_ref: str,
+    columns_ref: List[str],
+    ref_conds: Optional[List[Dict[str, Any]]],
+    composite: bool,
+) -> pd.Index:
+    """
+    Уникальные значения справочника по строкам, прошедшим ref_conds: для referential — Index
+    строк (astype(str).strip), для referential_composite — MultiIndex кортежей (пусто/NaN → "").
+    """
+    ref_mask = _referential_row_conditions_mask(df_ref, ref_conds, str(sheet_ref or ""))
+    ref_sub = df_ref.loc[ref_mask, list(columns_ref)]
+    if not composite:
+        return pd.Index(ref_sub[columns_ref[0]].astype(str).str.strip().unique())
+    return pd.MultiIndex.from_arrays([_strip_cells(ref_sub[c]) for c in columns_ref]).unique()
+
+
+def _reference_values(
+    df_ref: pd.DataFrame,
+    sheet_ref: str,
+    columns_ref: List[str],
+    ref_conds: Optional[List[Dict[str, Any]]],
+    reference_sets: Optional[ReferenceSets],
+    composite: bool = False,
+) -> pd.Index:
+    if reference_sets is None:
+        return _build_reference_values(df_ref, sheet_ref, columns_ref, ref_conds, composite)
+    return reference_sets.get(df_ref, sheet_ref, columns_ref, ref_conds, composite)
+
+
 def run_referential(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
+    reference_sets: Optional[ReferenceSets] = None,
 ) -> Dict[str, Any]:
     """
     Проверка типа referential: значения column_src на sheet_src должны быть в sheet_ref.column_ref.
-    Записывает колонку результата на sheet_src. Возвращает запись для сводки.
+    Записывает колонку результата на sheet_src (или в буфер result_columns). Возвращает запись для сводки.
     """
     sheet_src = rule.get("sheet_src")
     column_src = rule.get("column_src")
@@ -266,19 +435,12 @@ def run_referential(
     ref_conds = rule.get("ref_row_conditions") or rule.get("sheet_ref_row_conditions")
     src_mask = _referential_row_conditions_mask(df_src, src_conds, str(sheet_src or ""))
 
-    ref_set = set()
+    src_values = _strip_cells(df_src[column_src])
+    found = src_values.eq("")
     if df_ref is not None and column_ref in df_ref.columns:
-        ref_mask = _referential_row_conditions_mask(df_ref, ref_conds, str(sheet_ref or ""))
-        ref_sub = df_ref.loc[ref_mask]
-        ref_set = set(ref_sub[column_ref].astype(str).str.strip())
-
-    def _status(val: Any) -> str:
-        s = str(val).strip() if pd.notna(val) else ""
-        if s == "":
-            return "OK"
-        return "OK" if s in ref_set else f"НЕТ в {sheet_ref}"
-
-    checked = df_src[column_src].map(_status)
+        ref_values = _reference_values(df_ref, sheet_ref, [column_ref], ref_conds, reference_sets)
+        found |= src_values.isin(ref_values)
+    checked = pd.Series(np.where(found.to_numpy(), "OK", f"НЕТ в {sheet_ref}"), index=df_src.index, dtype=object)
     results = checked.where(src_mask, other="—")
     total = len(df_src)
     violations_mask = src_mask & (checked != "OK")
@@ -290,14 +452,8 @@ def run_referential(
             val = df_src.loc[idx, column_src]
             v = "" if pd.isna(val) else str(val).strip()[:50]
             sample.append(f"[{_excel_row(idx)}] {v}")
-    # Записываем колонку на лист (модифицируем sheets_data)
-    item = _get_sheet_item(sheets_data, sheet_src)
-    if item is not None:
-        df, conf = item
-        df = df.copy()
-        df[col_out] = results.values
-        sheets_data[sheet_src] = (df, conf)
-        logging.debug(f"[consistency] referential {check_id}: записана колонка {col_out} на {sheet_src}")
+    _put_result_column(sheets_data, sheet_src, col_out, results.values, result_columns)
+    logging.debug(f"[consistency] referential {check_id}: записана колонка {col_out} на {sheet_src}")
 
     return {
         "check_id": check_id,
@@ -315,6 +471,8 @@ def run_referential(
 def run_referential_composite(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
+    reference_sets: Optional[ReferenceSets] = None,
 ) -> Dict[str, Any]:
     """
     Проверка типа referential_composite: комбинация columns_src на sheet_src должна встречаться в sheet_ref (columns_ref).
@@ -341,21 +499,16 @@ def run_referential_composite(
     ref_conds = rule.get("ref_row_conditions") or rule.get("sheet_ref_row_conditions")
     src_mask = _referential_row_conditions_mask(df_src, src_conds, str(sheet_src or ""))
 
-    ref_set = set()
-    if df_ref is not None:
-        missing_ref = [c for c in columns_ref if c not in df_ref.columns]
-        if not missing_ref:
-            ref_mask = _referential_row_conditions_mask(df_ref, ref_conds, str(sheet_ref or ""))
-            ref_sub = df_ref.loc[ref_mask]
-            for _, row in ref_sub[columns_ref].iterrows():
-                t = tuple(str(row[c]).strip() if pd.notna(row[c]) else "" for c in columns_ref)
-                ref_set.add(t)
-
-    def _row_status(row: pd.Series) -> str:
-        t = tuple(str(row[c]).strip() if pd.notna(row[c]) else "" for c in columns_src)
-        return "OK" if t in ref_set else f"НЕТ в {sheet_ref}"
-
-    checked = df_src[columns_src].apply(_row_status, axis=1)
+    found = np.zeros(len(df_src), dtype=bool)
+    if len(columns_src) != len(columns_ref) or not columns_src:
+        logging.warning(
+            f"[consistency] referential_composite {check_id}: columns_src и columns_ref разной длины или пусты"
+        )
+    elif df_ref is not None and all(c in df_ref.columns for c in columns_ref):
+        ref_values = _reference_values(df_ref, sheet_ref, list(columns_ref), ref_conds, reference_sets, composite=True)
+        src_keys = pd.MultiIndex.from_arrays([_strip_cells(df_src[c]) for c in columns_src])
+        found = src_keys.isin(ref_values)
+    checked = pd.Series(np.where(found, "OK", f"НЕТ в {sheet_ref}"), index=df_src.index, dtype=object)
     results = checked.where(src_mask, other="—")
     total = len(df_src)
     violations_mask = src_mask & (checked != "OK")
@@ -368,12 +521,7 @@ def run_referential_composite(
             parts = [str(row[c]).strip()[:30] for c in columns_src]
             sample.append(f"[{_excel_row(idx)}] {','.join(parts)}")
 
-    item = _get_sheet_item(sheets_data, sheet_src)
-    if item is not None:
-        df, conf = item
-        df = df.copy()
-        df[col_out] = results.values
-        sheets_data[sheet_src] = (df, conf)
+    _put_result_column(sheets_data, sheet_src, col_out, results.values, result_columns)
 
     return {
         "check_id": check_id,
@@ -405,6 +553,7 @@ def _parse_cfg_date(value: Any, date_format: str) -> Optional[datetime]:
 def run_cross_sheet_date_lte_today(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
 ) -> Dict[str, Any]:
     """
     Проверка: для каждого кода из sheet_src.column_src дата sheet_ref.column_date_ref
@@ -509,12 +658,7 @@ def run_cross_sheet_date_lte_today(
             msg = str(checked.loc[idx]).strip()
             sample.append(f"[{_excel_row(idx)}] {code} | {msg}")
 
-    item = _get_sheet_item(sheets_data, sheet_src)
-    if item is not None:
-        df, conf = item
-        df = df.copy()
-        df[col_out] = results.values
-        sheets_data[sheet_src] = (df, conf)
+    _put_result_column(sheets_data, sheet_src, col_out, results.values, result_columns)
 
     return {
         "check_id": check_id,
@@ -529,13 +673,17 @@ def run_cross_sheet_date_lte_today(
     }
 
 
-def _run_unique_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -> None:
+def _run_unique_check(
+    sheets_data: Dict[str, Any],
+    rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
+) -> None:
     """
     Создаёт на листе колонку с пометкой дублей по key_columns (значение «xN» или пусто).
     Опционально: unique_scope_conditions + unique_scope_mode (all/any) — только строки, где выполнены
     условия column==value (И или ИЛИ); unique_require_non_empty — строки с пустыми указанными колонками
     в проверку не входят. Устаревшие unique_scope_column / unique_scope_value — одна пара, режим И.
-    Обновляет sheets_data на месте. Вызывается до collect_unique_result, чтобы колонка существовала.
+    Колонка — на лист или в буфер result_columns. Вызывается до collect_unique_result, чтобы колонка существовала.
     """
     sheet_name = rule.get("sheet")
     key_columns = rule.get("key_columns") or []
@@ -545,7 +693,7 @@ def _run_unique_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -> None
     item = _get_sheet_item(sheets_data, sheet_name)
     if item is None:
         return
-    df, conf = item
+    df = item[0]
     missing = [c for c in key_columns if c not in df.columns]
     if missing:
         logging.warning(f"[consistency] unique: лист {sheet_name}, отсутствуют колонки {missing}, пропуск")
@@ -562,9 +710,7 @@ def _run_unique_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -> None
                 return f"x{k}" if k > 1 else ""
 
             result_col.loc[active] = dup_counts.map(_dup_label).values
-        df = df.copy()
-        df[col_name] = result_col.values
-        sheets_data[sheet_name] = (df, conf)
+        _put_result_column(sheets_data, sheet_name, col_name, result_col.values, result_columns)
         logging.debug(
             f"[consistency] unique: лист {sheet_name}, колонка {col_name}, активных строк: {int(active.sum())}"
         )
@@ -572,11 +718,15 @@ def _run_unique_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -> None
         logging.error(f"[consistency] Ошибка при создании колонки дублей {sheet_name} по {key_columns}: {e}")
 
 
-def _run_field_length_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -> None:
+def _run_field_length_check(
+    sheets_data: Dict[str, Any],
+    rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
+) -> None:
     """
     Создаёт на листе колонку результата проверки длины полей (FIELD_LENGTH_CHECK и т.д.).
     Правило должно содержать sheet, result_column, fields (имя_поля -> {limit, operator}).
-    Обновляет sheets_data на месте. Вызывается до collect_field_length_result.
+    Колонка — на лист или в буфер result_columns. Вызывается до collect_field_length_result.
     """
     sheet_name = rule.get("sheet")
     result_column = rule.get("result_column") or "FIELD_LENGTH_CHECK"
@@ -585,7 +735,7 @@ def _run_field_length_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -
     item = _get_sheet_item(sheets_data, sheet_name)
     if item is None:
         return
-    df, conf = item
+    df = item[0]
     missing = [f for f in fields_config if f not in df.columns]
     if missing:
         logging.warning(
@@ -623,17 +773,16 @@ def _run_field_length_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -
                 lambda val: f"{field_name} = {len(str(val))} {operator} {limit}"
             )
 
-    df = df.copy()
     if violations_dict:
         violations_df = pd.DataFrame(violations_dict)
         violations_series = violations_df.apply(
             lambda row: "; ".join([str(v) for v in row if v and str(v).strip()]),
             axis=1,
         )
-        df[result_column] = violations_series.replace("", "-")
+        values: Any = violations_series.replace("", "-").to_numpy()
     else:
-        df[result_column] = "-"
-    sheets_data[sheet_name] = (df, conf)
+        values = "-"
+    _put_result_column(sheets_data, sheet_name, result_column, values, result_columns)
     logging.debug(
         f"[consistency] field_length: записана колонка {result_column} на {sheet_name}"
     )
@@ -714,11 +863,15 @@ def _format_error_to_code(msg: str) -> str:
     return "формат"
 
 
-def _run_field_format_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -> None:
+def _run_field_format_check(
+    sheets_data: Dict[str, Any],
+    rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
+) -> None:
     """
     Создаёт на листе колонку результата проверки формата поля (field_format).
     Правило: sheet, field, format (type, ...), output.column_on_sheet.
-    Обновляет sheets_data на месте.
+    Колонка — на лист или в буфер result_columns.
     """
     sheet_name = rule.get("sheet")
     field_name = rule.get("field")
@@ -731,21 +884,20 @@ def _run_field_format_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -
     if item is None:
         logging.debug(f"[consistency] field_format {check_id}: лист {sheet_name} отсутствует")
         return
-    df, conf = item
+    df = item[0]
     if field_name not in df.columns:
         logging.warning(f"[consistency] field_format {check_id}: поле {field_name} не найдено на {sheet_name}")
         return
 
     results = df[field_name].apply(lambda val: _validate_field_format(val, format_spec))
-    df = df.copy()
-    df[col_out] = results.values
-    sheets_data[sheet_name] = (df, conf)
+    _put_result_column(sheets_data, sheet_name, col_out, results.values, result_columns)
     logging.debug(f"[consistency] field_format {check_id}: записана колонка {col_out} на {sheet_name}")
 
 
 def collect_field_format_result(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
 ) -> Dict[str, Any]:
     """
     Собирает результат проверки field_format по уже заполненной колонке.
@@ -756,8 +908,8 @@ def collect_field_format_result(
     col_out = output.get("column_on_sheet") or f"ПРОВЕРКА ФОРМАТ: {field_name}"
     check_id = rule.get("id", "")
 
-    df = _get_sheet_df(sheets_data, sheet_name)
-    if df is None or col_out not in df.columns:
+    df, result = _sheet_and_result(sheets_data, sheet_name, col_out, result_columns)
+    if df is None or result is None:
         return {
             "check_id": check_id,
             "sheet": sheet_name,
@@ -770,7 +922,7 @@ def collect_field_format_result(
             "include_in_summary": output.get("include_in_summary", True),
         }
 
-    col_series = df[col_out].astype(str).str.strip()
+    col_series = result.astype(str).str.strip()
     violations_mask = col_series != "OK"
     n_violations = int(violations_mask.sum())
     total = len(df)
@@ -910,7 +1062,11 @@ def _validate_field_in_values_scalar(
     return f"не в списке: {', '.join(bad)}"
 
 
-def _run_field_in_values_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -> None:
+def _run_field_in_values_check(
+    sheets_data: Dict[str, Any],
+    rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
+) -> None:
     """
     Проверка: значение колонки или ключа JSON должно входить в allowed_values (IN).
     source: column (поле field) | json (json_column + json_key).
@@ -935,7 +1091,7 @@ def _run_field_in_values_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]
     if item is None:
         logging.debug(f"[consistency] field_in_values {check_id}: лист {sheet_name} отсутствует")
         return
-    df, conf = item
+    df = item[0]
 
     if source in ("json", "json_field"):
         if not json_column or not json_key:
@@ -982,15 +1138,14 @@ def _run_field_in_values_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]
         return _validate_field_in_values_scalar(row.get(field_name), allowed, allow_empty)
 
     results = df.apply(_check_one, axis=1)
-    df = df.copy()
-    df[col_out] = results.values
-    sheets_data[sheet_name] = (df, conf)
+    _put_result_column(sheets_data, sheet_name, col_out, results.values, result_columns)
     logging.debug(f"[consistency] field_in_values {check_id}: записана колонка {col_out} на {sheet_name}")
 
 
 def collect_field_in_values_result(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
 ) -> Dict[str, Any]:
     """Собирает результат проверки field_in_values по уже заполненной колонке."""
     sheet_name = rule.get("sheet")
@@ -1003,8 +1158,8 @@ def collect_field_in_values_result(
     source = str(rule.get("source", "column")).strip().lower()
     value_col = field_name if source not in ("json", "json_field") else (rule.get("json_column") or "")
 
-    df = _get_sheet_df(sheets_data, sheet_name)
-    if df is None or col_out not in df.columns:
+    df, result = _sheet_and_result(sheets_data, sheet_name, col_out, result_columns)
+    if df is None or result is None:
         return {
             "check_id": check_id,
             "sheet": sheet_name,
@@ -1017,7 +1172,7 @@ def collect_field_in_values_result(
             "include_in_summary": output.get("include_in_summary", True),
         }
 
-    col_series = df[col_out].astype(str).str.strip()
+    col_series = result.astype(str).str.strip()
     applicable = col_series != "—"
     violations_mask = applicable & (col_series != "OK")
     n_violations = int(violations_mask.sum())
@@ -1056,6 +1211,7 @@ def collect_field_in_values_result(
 def collect_unique_result(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
 ) -> Dict[str, Any]:
     """
     Собирает результат проверки unique по колонке (ДУБЛЬ: ...).
@@ -1067,8 +1223,8 @@ def collect_unique_result(
     col_name = output.get("column_on_sheet") or ("ДУБЛЬ: " + "_".join(key_columns))
     check_id = rule.get("id", "")
 
-    df = _get_sheet_df(sheets_data, sheet_name)
-    if df is None or col_name not in df.columns:
+    df, result = _sheet_and_result(sheets_data, sheet_name, col_name, result_columns)
+    if df is None or result is None:
         return {
             "check_id": check_id,
             "sheet": sheet_name,
@@ -1081,7 +1237,7 @@ def collect_unique_result(
             "include_in_summary": output.get("include_in_summary", True),
         }
 
-    col_series = df[col_name].astype(str).str.strip()
+    col_series = result.astype(str).str.strip()
     violations_mask = col_series != ""
     n_violations = int(violations_mask.sum())
     # Число строк, для которых правило реально применялось (область + непустые обязательные колонки)
@@ -1089,7 +1245,7 @@ def collect_unique_result(
     total = int(active.sum())
     sample = []
     if n_violations > 0 and key_columns and all(c in df.columns for c in key_columns):
-        dup_df = df.loc[violations_mask, key_columns + [col_name]].copy()
+        dup_df = df.loc[violations_mask, key_columns].copy()
         dup_df["_row"] = dup_df.index
         grouped = dup_df.groupby(key_columns, dropna=False)
         for key_vals, grp in grouped:
@@ -1146,6 +1302,7 @@ def _compact_field_length_cell(cell_text: str) -> str:
 def collect_field_length_result(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
 ) -> Dict[str, Any]:
     """
     Собирает результат проверки field_length по уже заполненной колонке (FIELD_LENGTH_CHECK и т.д.).
@@ -1157,8 +1314,8 @@ def collect_field_length_result(
     col_out = output.get("column_on_sheet") or result_column
     check_id = rule.get("id", "")
 
-    df = _get_sheet_df(sheets_data, sheet_name)
-    if df is None or result_column not in df.columns:
+    df, result = _sheet_and_result(sheets_data, sheet_name, result_column, result_columns)
+    if df is None or result is None:
         return {
             "check_id": check_id,
             "sheet": sheet_name,
@@ -1171,7 +1328,7 @@ def collect_field_length_result(
             "include_in_summary": output.get("include_in_summary", True),
         }
 
-    col_series = df[result_column].astype(str).str.strip()
+    col_series = result.astype(str).str.strip()
     violations_mask = (col_series != "") & (col_series != "-")
     n_violations = int(violations_mask.sum())
     total = len(df)
@@ -1221,7 +1378,11 @@ def _parse_add_data_cell_with_normalized(val: Any) -> Tuple[Optional[Dict[str, A
         return None, raw_str, normalized
 
 
-def _run_json_field_equals_column_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -> None:
+def _run_json_field_equals_column_check(
+    sheets_data: Dict[str, Any],
+    rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
+) -> None:
     """
     Проверка: значение ключа json_key в JSON-поле json_column должно равняться значению колонки column_compare.
     Опционально: только для строк, где filter_column == filter_value и/или в JSON есть json_filter_key == json_filter_value.
@@ -1245,7 +1406,7 @@ def _run_json_field_equals_column_check(sheets_data: Dict[str, Any], rule: Dict[
     if item is None:
         logging.debug(f"[consistency] json_field_equals_column {check_id}: лист {sheet_name} отсутствует")
         return
-    df, conf = item
+    df = item[0]
     for c in [json_column, column_compare]:
         if c not in df.columns:
             logging.warning(f"[consistency] json_field_equals_column {check_id}: колонка {c} не найдена на {sheet_name}")
@@ -1293,15 +1454,14 @@ def _run_json_field_equals_column_check(sheets_data: Dict[str, Any], rule: Dict[
         return f"ожидалось {expected}, в ADD_DATA: {from_json}"
 
     results = df.apply(_check_one, axis=1)
-    df = df.copy()
-    df[col_out] = results.values
-    sheets_data[sheet_name] = (df, conf)
+    _put_result_column(sheets_data, sheet_name, col_out, results.values, result_columns)
     logging.debug(f"[consistency] json_field_equals_column {check_id}: записана колонка {col_out} на {sheet_name}")
 
 
 def collect_json_field_equals_column_result(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
 ) -> Dict[str, Any]:
     """Собирает результат проверки json_field_equals_column по уже заполненной колонке."""
     sheet_name = rule.get("sheet")
@@ -1312,8 +1472,8 @@ def collect_json_field_equals_column_result(
     col_out = output.get("column_on_sheet") or f"ПРОВЕРКА: {json_key} в {json_column} = {column_compare}"
     check_id = rule.get("id", "")
 
-    df = _get_sheet_df(sheets_data, sheet_name)
-    if df is None or col_out not in df.columns:
+    df, result = _sheet_and_result(sheets_data, sheet_name, col_out, result_columns)
+    if df is None or result is None:
         return {
             "check_id": check_id,
             "sheet": sheet_name,
@@ -1325,7 +1485,7 @@ def collect_json_field_equals_column_result(
             "sample": [],
             "include_in_summary": output.get("include_in_summary", True),
         }
-    col_series = df[col_out].astype(str).str.strip()
+    col_series = result.astype(str).str.strip()
     violations_mask = col_series.ne("") & col_series.ne("OK")
     n_violations = int(violations_mask.sum())
     total_applicable = int((col_series.ne("")).sum())
@@ -1361,7 +1521,11 @@ def collect_json_field_equals_column_result(
     }
 
 
-def _run_json_field_in_column_check(sheets_data: Dict[str, Any], rule: Dict[str, Any]) -> None:
+def _run_json_field_in_column_check(
+    sheets_data: Dict[str, Any],
+    rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
+) -> None:
     """
     Проверка: все уникальные значения ключа json_key в JSON-поле json_column должны присутствовать
     в колонке column_in_sheet того же листа (например parentRewardCode из ADD_DATA — в REWARD_CODE).
@@ -1379,7 +1543,7 @@ def _run_json_field_in_column_check(sheets_data: Dict[str, Any], rule: Dict[str,
     if item is None:
         logging.debug(f"[consistency] json_field_in_column {check_id}: лист {sheet_name} отсутствует")
         return
-    df, conf = item
+    df = item[0]
     for c in [json_column, column_in_sheet]:
         if c not in df.columns:
             logging.warning(f"[consistency] json_field_in_column {check_id}: колонка {c} не найдена на {sheet_name}")
@@ -1410,15 +1574,14 @@ def _run_json_field_in_column_check(sheets_data: Dict[str, Any], rule: Dict[str,
         return f"НЕТ в {column_in_sheet}"
 
     results = df.apply(_check_one, axis=1)
-    df = df.copy()
-    df[col_out] = results.values
-    sheets_data[sheet_name] = (df, conf)
+    _put_result_column(sheets_data, sheet_name, col_out, results.values, result_columns)
     logging.debug(f"[consistency] json_field_in_column {check_id}: записана колонка {col_out} на {sheet_name}")
 
 
 def _run_json_priority_unique_per_contest_link_check(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
 ) -> None:
     """
     Проверка: для каждого CONTEST_CODE на REWARD-LINK берутся уникальные REWARD_CODE (GROUP_CODE не учитывается).
@@ -1448,7 +1611,7 @@ def _run_json_priority_unique_per_contest_link_check(
     if item_reward is None:
         logging.debug(f"[consistency] json_priority_unique_per_contest_link {check_id}: лист {sheet_name} отсутствует")
         return
-    df_reward, conf = item_reward
+    df_reward = item_reward[0]
     for c in (reward_code_column, json_column):
         if c not in df_reward.columns:
             logging.warning(
@@ -1572,9 +1735,7 @@ def _run_json_priority_unique_per_contest_link_check(
         elif idx in ok_idx:
             result_series.loc[idx] = "OK"
 
-    df_out = df_reward.copy()
-    df_out[col_out] = result_series.values
-    sheets_data[sheet_name] = (df_out, conf)
+    _put_result_column(sheets_data, sheet_name, col_out, result_series.values, result_columns)
     logging.debug(
         f"[consistency] json_priority_unique_per_contest_link {check_id}: записана колонка {col_out} на {sheet_name}"
     )
@@ -1583,6 +1744,7 @@ def _run_json_priority_unique_per_contest_link_check(
 def collect_json_priority_unique_per_contest_link_result(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
 ) -> Dict[str, Any]:
     """Собирает результат проверки json_priority_unique_per_contest_link по уже заполненной колонке."""
     sheet_name = rule.get("sheet", "REWARD")
@@ -1591,8 +1753,8 @@ def collect_json_priority_unique_per_contest_link_result(
     col_out = output.get("column_on_sheet") or f"ПРОВЕРКА: {json_key} уникален по CONTEST (REWARD-LINK)"
     check_id = rule.get("id", "")
 
-    df = _get_sheet_df(sheets_data, sheet_name)
-    if df is None or col_out not in df.columns:
+    df, result = _sheet_and_result(sheets_data, sheet_name, col_out, result_columns)
+    if df is None or result is None:
         return {
             "check_id": check_id,
             "sheet": sheet_name,
@@ -1604,7 +1766,7 @@ def collect_json_priority_unique_per_contest_link_result(
             "sample": [],
             "include_in_summary": output.get("include_in_summary", True),
         }
-    col_series = df[col_out].astype(str).str.strip()
+    col_series = result.astype(str).str.strip()
     violations_mask = col_series.ne("") & col_series.ne("OK")
     n_violations = int(violations_mask.sum())
     total_applicable = int((col_series.ne("")).sum())
@@ -1633,6 +1795,7 @@ def collect_json_priority_unique_per_contest_link_result(
 def collect_json_field_in_column_result(
     sheets_data: Dict[str, Any],
     rule: Dict[str, Any],
+    result_columns: Optional[ResultColumns] = None,
 ) -> Dict[str, Any]:
     """Собирает результат проверки json_field_in_column по уже заполненной колонке."""
     sheet_name = rule.get("sheet")
@@ -1643,8 +1806,8 @@ def collect_json_field_in_column_result(
     col_out = output.get("column_on_sheet") or f"ПРОВЕРКА: {json_key} из {json_column} в {column_in_sheet}"
     check_id = rule.get("id", "")
 
-    df = _get_sheet_df(sheets_data, sheet_name)
-    if df is None or col_out not in df.columns:
+    df, result = _sheet_and_result(sheets_data, sheet_name, col_out, result_columns)
+    if df is None or result is None:
         return {
             "check_id": check_id,
             "sheet": sheet_name,
@@ -1656,7 +1819,7 @@ def collect_json_field_in_column_result(
             "sample": [],
             "include_in_summary": output.get("include_in_summary", True),
         }
-    col_series = df[col_out].astype(str).str.strip()
+    col_series = result.astype(str).str.strip()
     violations_mask = col_series.ne("") & col_series.ne("OK")
     n_violations = int(violations_mask.sum())
     total_applicable = int((col_series.ne("")).sum())
@@ -1687,7 +1850,7 @@ def collect_json_field_in_column_result(
 
 
 def _sheet_written_by_rule(rule: Dict[str, Any]) -> Optional[str]:
-    """Лист, в который правило пишет результат (для блокировки)."""
+    """Лист, в который правило пишет колонку результата."""
     t = rule.get("type", "")
     if t in (
         "unique",
@@ -1810,17 +1973,298 @@ def _skipped_by_block_rule_summary(
     }
 
 
+# Правила, которые сначала пишут колонку результата, а затем собирают по ней запись свода
+_WRITE_RUNNERS = {
+    "unique": _run_unique_check,
+    "field_length": _run_field_length_check,
+    "field_format": _run_field_format_check,
+    "field_in_values": _run_field_in_values_check,
+    "json_field_equals_column": _run_json_field_equals_column_check,
+    "json_field_in_column": _run_json_field_in_column_check,
+    "json_priority_unique_per_contest_link": _run_json_priority_unique_per_contest_link_check,
+}
+
+# Относительная стоимость строки листа по типу правила — для порядка запуска (длинные правила раньше)
+_RULE_COST_WEIGHTS: Dict[str, float] = {
+    "json_spod_format": 8.0,
+    "json_priority_unique_per_contest_link": 4.0,
+    "json_field_equals_column": 4.0,
+    "json_field_in_column": 3.0,
+    "field_in_values": 3.0,
+    "field_format": 2.0,
+    "cross_sheet_date_lte_today": 2.0,
+    "referential_composite": 2.0,
+}
+
+# Ключи правила, которые не называют колонки листов (при поиске читаемых колонок не учитываются)
+_RULE_META_KEYS = frozenset(("id", "name", "type", "enabled", "output", "blocks", "apply_blocks", "result_column"))
+
+
+def _rule_result_column(rule: Dict[str, Any]) -> Optional[str]:
+    """Имя колонки результата правила на листе _sheet_written_by_rule (умолчания — как в функциях правил)."""
+    t = rule.get("type", "")
+    if t == "field_length":
+        return rule.get("result_column") or "FIELD_LENGTH_CHECK"
+    col = (rule.get("output") or {}).get("column_on_sheet")
+    if col:
+        return col
+    if t == "unique":
+        return "ДУБЛЬ: " + "_".join(rule.get("key_columns") or [])
+    if t in ("referential", "referential_composite"):
+        return "ПРОВЕРКА"
+    if t == "cross_sheet_date_lte_today":
+        return f"ПРОВЕРКА: {rule.get('column_date_ref')} <= today"
+    if t == "field_format":
+        return f"ПРОВЕРКА ФОРМАТ: {rule.get('field')}"
+    if t == "field_in_values":
+        return f"ПРОВЕРКА IN: {rule.get('field') or rule.get('column') or rule.get('json_key') or '?'}"
+    if t == "json_field_equals_column":
+        return f"ПРОВЕРКА: {rule.get('json_key')} в {rule.get('json_column')} = {rule.get('column_compare')}"
+    if t == "json_field_in_column":
+        return f"ПРОВЕРКА: {rule.get('json_key')} из {rule.get('json_column')} в {rule.get('column_in_sheet')}"
+    if t == "json_priority_unique_per_contest_link":
+        return f"ПРОВЕРКА: {rule.get('json_key', 'priority')} уникален по CONTEST (REWARD-LINK)"
+    if t == "json_spod_format":
+        return "ПРОВЕРКА: JSON (формат SPOD)"
+    return None
+
+
+def _rule_read_sheets(rule: Dict[str, Any]) -> Set[str]:
+    """Листы, которые читает правило (свой лист, sheet_src / sheet_ref, лист связей REWARD-LINK)."""
+    sheets = {rule.get(k) for k in ("sheet", "sheet_src", "sheet_ref", "link_sheet")}
+    if rule.get("type") == "json_priority_unique_per_contest_link":
+        sheets.add(rule.get("link_sheet", "REWARD-LINK"))
+    return {str(s) for s in sheets if s}
+
+
+def _rule_strings(value: Any, out: Set[str]) -> Set[str]:
+    """Все строковые значения параметров правила (кандидаты в читаемые колонки)."""
+    if isinstance(value, str):
+        out.add(value)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            if k not in _RULE_META_KEYS:
+                _rule_strings(v, out)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _rule_strings(v, out)
+    return out
+
+
+class _RuleGraph:
+    """
+    Зависимости включённых правил по объявленным листам и колонкам.
+
+    Правило B ждёт правило A, если читает колонку результата A на листе, который читает
+    (колонки — консервативно: любое строковое значение параметров B), или пишет ту же колонку
+    того же листа и стоит в конфиге позже (сбор результата A видит колонку A). Колонки результатов,
+    прочитанные B, подставляются на его листы из буфера ResultColumns. Приоритет правила —
+    оценка его стоимости (строки листов × вес типа) плюс самый дорогой путь зависящих от него правил.
+    """
+
+    def __init__(self, sheets_data: Dict[str, Any], enabled_pairs: List[Tuple[int, Dict[str, Any]]]) -> None:
+        self.rules: Dict[int, Dict[str, Any]] = dict(enabled_pairs)
+        self.deps: Dict[int, Set[int]] = {gi: set() for gi in self.rules}
+        self.inputs: Dict[int, Dict[str, List[str]]] = {gi: {} for gi in self.rules}
+        self.cost: Dict[int, float] = {}
+        writes: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        for gi, rule in enabled_pairs:
+            sheet, col = _sheet_written_by_rule(rule), _rule_result_column(rule)
+            if sheet and col:
+                writes[(sheet, col)].append(gi)
+        for gi, rule in enabled_pairs:
+            read_sheets = _rule_read_sheets(rule)
+            strings = _rule_strings(rule, set())
+            for (sheet, col), writers in writes.items():
+                if gi in writers:
+                    self.deps[gi].update(w for w in writers if w < gi)
+                elif sheet in read_sheets and col in strings:
+                    self.deps[gi].update(writers)
+                    self.inputs[gi].setdefault(sheet, []).append(col)
+            rows = 0
+            for sheet in read_sheets:
+                df = _get_sheet_df(sheets_data, sheet)
+                rows += len(df) if df is not None else 0
+            self.cost[gi] = max(1, rows) * _RULE_COST_WEIGHTS.get(rule.get("type", ""), 1.0)
+        self._break_cycles()
+        self.dependents: Dict[int, Set[int]] = {gi: set() for gi in self.rules}
+        for gi, deps in self.deps.items():
+            for d in deps:
+                self.dependents[d].add(gi)
+        self.priority: Dict[int, float] = {}
+        for gi in reversed(self.topological_order()):
+            self.priority[gi] = self.cost[gi] + max((self.priority[d] for d in self.dependents[gi]), default=0.0)
+
+    def output_order(self) -> List[Tuple[str, str]]:
+        """(лист, колонка результата) правил в порядке конфига."""
+        out: List[Tuple[str, str]] = []
+        for gi in sorted(self.rules):
+            sheet, col = _sheet_written_by_rule(self.rules[gi]), _rule_result_column(self.rules[gi])
+            if sheet and col:
+                out.append((sheet, col))
+        return out
+
+    def topological_order(self) -> List[int]:
+        """Порядок, в котором каждое правило стоит после своих зависимостей (неполный — при цикле)."""
+        pending = {gi: len(deps) for gi, deps in self.deps.items()}
+        users: Dict[int, List[int]] = defaultdict(list)
+        for gi, deps in self.deps.items():
+            for d in deps:
+                users[d].append(gi)
+        ready = sorted(gi for gi, n in pending.items() if n == 0)
+        order: List[int] = []
+        while ready:
+            gi = ready.pop(0)
+            order.append(gi)
+            for u in users[gi]:
+                pending[u] -= 1
+                if pending[u] == 0:
+                    ready.append(u)
+        return order
+
+    def _break_cycles(self) -> None:
+        cyclic = set(self.rules) - set(self.topological_order())
+        if not cyclic:
+            return
+        ids = ", ".join(str(self.rules[gi].get("id", gi)) for gi in sorted(cyclic))
+        logging.warning(
+            f"[consistency] Циклическая зависимость правил ({ids}) — для них действует порядок конфига"
+        )
+        for gi in cyclic:
+            self.deps[gi] = {d for d in self.deps[gi] if d < gi}
+
+
+def _sheets_with_result_columns(
+    sheets_data: Dict[str, Any],
+    result_columns: ResultColumns,
+    columns_by_sheet: Dict[str, List[str]],
+) -> Dict[str, Any]:
+    """Листы для правила, читающего колонки результатов других правил: эти колонки — из буфера."""
+    if not columns_by_sheet:
+        return sheets_data
+    view = dict(sheets_data)
+    for sheet, cols in columns_by_sheet.items():
+        item = _get_sheet_item(sheets_data, sheet)
+        if item is None:
+            continue
+        extra = {c: s for c in cols if (s := result_columns.get(sheet, c)) is not None}
+        if extra:
+            view[sheet] = (item[0].assign(**extra), item[1])
+    return view
+
+
+def _run_rule_graph(graph: _RuleGraph, n_workers: int, run_one: Any) -> None:
+    """
+    Выполняет run_one(gi) для всех правил графа: правило запускается, как только завершены его
+    зависимости; из готовых первым идёт правило с наибольшим приоритетом. Ошибка run_one прерывает прогон.
+    """
+    pending = {gi: len(deps) for gi, deps in graph.deps.items()}
+    ready = [(-graph.priority[gi], gi) for gi, n in pending.items() if n == 0]
+    heapq.heapify(ready)
+    running: Dict[Any, int] = {}
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        while ready or running:
+            while ready and len(running) < n_workers:
+                _, gi = heapq.heappop(ready)
+                running[executor.submit(run_one, gi)] = gi
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                gi = running.pop(future)
+                future.result()
+                for d in graph.dependents[gi]:
+                    pending[d] -= 1
+                    if pending[d] == 0:
+                        heapq.heappush(ready, (-graph.priority[d], d))
+
+
+def _collect_rule_result(
+    sheets_data: Dict[str, Any],
+    rule: Dict[str, Any],
+    result_columns: ResultColumns,
+    reference_sets: ReferenceSets,
+) -> Dict[str, Any]:
+    """Запись свода CONSISTENCY по правилу (для правил _WRITE_RUNNERS — по уже записанной колонке)."""
+    rule_type = rule.get("type", "")
+    check_id = rule.get("id", "")
+    try:
+        if rule_type == "referential":
+            return run_referential(sheets_data, rule, result_columns, reference_sets)
+        if rule_type == "referential_composite":
+            return run_referential_composite(sheets_data, rule, result_columns, reference_sets)
+        if rule_type == "cross_sheet_date_lte_today":
+            return run_cross_sheet_date_lte_today(sheets_data, rule, result_columns)
+        if rule_type == "unique":
+            return collect_unique_result(sheets_data, rule, result_columns)
+        if rule_type == "field_length":
+            return collect_field_length_result(sheets_data, rule, result_columns)
+        if rule_type == "field_format":
+            return collect_field_format_result(sheets_data, rule, result_columns)
+        if rule_type == "field_in_values":
+            return collect_field_in_values_result(sheets_data, rule, result_columns)
+        if rule_type == "json_field_equals_column":
+            return collect_json_field_equals_column_result(sheets_data, rule, result_columns)
+        if rule_type == "json_field_in_column":
+            return collect_json_field_in_column_result(sheets_data, rule, result_columns)
+        if rule_type == "json_priority_unique_per_contest_link":
+            return collect_json_priority_unique_per_contest_link_result(sheets_data, rule, result_columns)
+        if rule_type == "json_spod_format":
+            from src.json_spod_format_check import run_json_spod_format_check
+
+            return run_json_spod_format_check(sheets_data, rule, result_columns)
+        logging.debug(f"[consistency] Неизвестный тип правила: {rule_type}, id={check_id}")
+        _out = rule.get("output") or {}
+        return {
+            "check_id": check_id,
+            "sheet": rule.get("sheet_src") or rule.get("sheet", ""),
+            "name": rule.get("name", ""),
+            "column_on_sheet": _out.get("column_on_sheet", ""),
+            "type": rule_type,
+            "total_rows": 0,
+            "violations": 0,
+            "sample": [],
+            "include_in_summary": True,
+        }
+    except Exception as e:
+        logging.error(f"[consistency] Ошибка при выполнении правила {check_id} ({rule_type}): {e}")
+        _out = rule.get("output") or {}
+        return {
+            "check_id": check_id,
+            "sheet": rule.get("sheet_src") or rule.get("sheet", ""),
+            "name": rule.get("name", ""),
+            "column_on_sheet": _out.get("column_on_sheet", ""),
+            "type": rule_type,
+            "total_rows": 0,
+            "violations": 0,
+            "sample": [],
+            "include_in_summary": True,
+            "error": str(e),
+        }
+
+
+def _critical_path_sec(graph: _RuleGraph, durations: Dict[int, float]) -> float:
+    """Самая длинная по фактическому времени цепочка зависимых правил."""
+    finish: Dict[int, float] = {}
+    for gi in graph.topological_order():
+        finish[gi] = durations.get(gi, 0.0) + max((finish[d] for d in graph.deps[gi]), default=0.0)
+    return max(finish.values(), default=0.0)
+
+
 def run_all_consistency_checks(
     sheets_data: Dict[str, Any],
     config: Dict[str, Any],
     current_block: Optional[str] = None,
     max_workers: Optional[int] = None,
+    row_cache: Optional[Any] = None,
 ) -> List[Dict[str, Any]]:
     """
     Выполняет все включённые правила консистентности (с параллелизацией по правилам).
-    Сначала создаёт колонки unique (ДУБЛЬ: …), field_length, json_* на листах; затем referential/referential_composite
-    и сбор результатов. Правила, пишущие в разные листы, выполняются параллельно;
-    запись в один лист защищена блокировкой по листу.
+    Правила собираются в граф зависимостей (_RuleGraph) и запускаются без общего барьера между
+    записью колонок и сбором результатов: правило стартует, как только готовы его входы, первыми —
+    самые длинные цепочки (json_spod_format на больших листах). Правила не меняют листы: колонки
+    результатов копятся в ResultColumns и дописываются на листы одним pd.concat на лист в конце.
+    Время каждого правила — лист «Проверки консистентности» в STAT_FILE.
+    row_cache — ConsistencyRowCache (performance.incremental): построчные правила пересчитываются
+    только для строк, которых не было в прошлом прогоне.
     Возвращает список записей для сводного листа в порядке правил (включая выключенные — синтетическая строка свода).
     """
     rules = config.get("rules") or []
@@ -1843,143 +2287,64 @@ def run_all_consistency_checks(
         f"[consistency] Параллельный запуск проверок: потоков={n_workers}, "
         f"включённых правил={len(enabled_pairs)} из {len(rules)}, блок={current_block or '-'}"
     )
+    result_columns = ResultColumns()
+    reference_sets = ReferenceSets()
+    graph = _RuleGraph(sheets_data, enabled_pairs)
+    if row_cache is not None:
+        row_cache.snapshot_input_columns(sheets_data)
 
-    # Листы, в которые что-то пишется — по одному Lock на лист (только для включённых правил)
-    sheets_written: set = set()
-    for _, r in enabled_pairs:
-        sh = _sheet_written_by_rule(r)
-        if sh:
-            sheets_written.add(sh)
-    lock_by_sheet: Dict[str, threading.Lock] = {s: threading.Lock() for s in sheets_written}
-
-    def _phase1_task(idx: int, rule: Dict[str, Any]) -> None:
-        sheet = _sheet_written_by_rule(rule)
-        if not sheet or sheet not in lock_by_sheet:
-            return
-        with lock_by_sheet[sheet]:
-            if rule.get("type") == "unique":
-                _run_unique_check(sheets_data, rule)
-            elif rule.get("type") == "field_length":
-                _run_field_length_check(sheets_data, rule)
-            elif rule.get("type") == "field_format":
-                _run_field_format_check(sheets_data, rule)
-            elif rule.get("type") == "field_in_values":
-                _run_field_in_values_check(sheets_data, rule)
-            elif rule.get("type") == "json_field_equals_column":
-                _run_json_field_equals_column_check(sheets_data, rule)
-            elif rule.get("type") == "json_field_in_column":
-                _run_json_field_in_column_check(sheets_data, rule)
-            elif rule.get("type") == "json_priority_unique_per_contest_link":
-                _run_json_priority_unique_per_contest_link_check(sheets_data, rule)
-
-    # Фаза 1: создаём колонки unique, field_length, field_format, json_* на листах
-    phase1_rules = [
-        (gi, r)
-        for gi, r in enabled_pairs
-        if r.get("type")
-        in (
-            "unique",
-            "field_length",
-            "field_format",
-            "field_in_values",
-            "json_field_equals_column",
-            "json_field_in_column",
-            "json_priority_unique_per_contest_link",
-        )
-    ]
-    if phase1_rules:
-        with ThreadPoolExecutor(max_workers=n_workers) as executor:
-            futures_ph1 = [executor.submit(_phase1_task, idx, rule) for idx, rule in phase1_rules]
-            for f in as_completed(futures_ph1):
-                f.result()
-
-    # Фаза 2: referential/referential_composite/collect/json_spod_format — (глобальный индекс правила, результат)
-    def _phase2_task(idx: int, rule: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
-        rule_type = rule.get("type", "")
-        check_id = rule.get("id", "")
-        try:
-            if rule_type == "referential":
-                sheet_src = rule.get("sheet_src")
-                if sheet_src and sheet_src in lock_by_sheet:
-                    with lock_by_sheet[sheet_src]:
-                        res = run_referential(sheets_data, rule)
-                else:
-                    res = run_referential(sheets_data, rule)
-            elif rule_type == "referential_composite":
-                sheet_src = rule.get("sheet_src")
-                if sheet_src and sheet_src in lock_by_sheet:
-                    with lock_by_sheet[sheet_src]:
-                        res = run_referential_composite(sheets_data, rule)
-                else:
-                    res = run_referential_composite(sheets_data, rule)
-            elif rule_type == "cross_sheet_date_lte_today":
-                sheet_src = rule.get("sheet_src")
-                if sheet_src and sheet_src in lock_by_sheet:
-                    with lock_by_sheet[sheet_src]:
-                        res = run_cross_sheet_date_lte_today(sheets_data, rule)
-                else:
-                    res = run_cross_sheet_date_lte_today(sheets_data, rule)
-            elif rule_type == "unique":
-                res = collect_unique_result(sheets_data, rule)
-            elif rule_type == "field_length":
-                res = collect_field_length_result(sheets_data, rule)
-            elif rule_type == "field_format":
-                res = collect_field_format_result(sheets_data, rule)
-            elif rule_type == "field_in_values":
-                res = collect_field_in_values_result(sheets_data, rule)
-            elif rule_type == "json_field_equals_column":
-                res = collect_json_field_equals_column_result(sheets_data, rule)
-            elif rule_type == "json_field_in_column":
-                res = collect_json_field_in_column_result(sheets_data, rule)
-            elif rule_type == "json_priority_unique_per_contest_link":
-                res = collect_json_priority_unique_per_contest_link_result(sheets_data, rule)
-            elif rule_type == "json_spod_format":
-                from src.json_spod_format_check import run_json_spod_format_check
-
-                sh_json = rule.get("sheet")
-                if sh_json and sh_json in lock_by_sheet:
-                    with lock_by_sheet[sh_json]:
-                        res = run_json_spod_format_check(sheets_data, rule)
-                else:
-                    res = run_json_spod_format_check(sheets_data, rule)
+    slot: List[Optional[Dict[str, Any]]] = [None] * len(rules)
+    started: Dict[int, float] = {}
+    durations: Dict[int, float] = {}
+    t_start = time.perf_counter()
+
+    def _rule_task(gi: int) -> None:
+        rule = graph.rules[gi]
+        t0 = time.perf_counter()
+        sheets = _sheets_with_result_columns(sheets_data, result_columns, graph.inputs[gi])
+        writer = _WRITE_RUNNERS.get(rule.get("type", ""))
+        if writer is not None and _sheet_written_by_rule(rule):
+            if row_cache is not None and row_cache.handles(rule):
+                row_cache.run_rule(sheets, rule, writer, result_columns)
             else:
-                logging.debug(f"[consistency] Неизвестный тип правила: {rule_type}, id={check_id}")
-                _out = rule.get("output") or {}
-                return (idx, {
-                    "check_id": check_id,
-                    "sheet": rule.get("sheet_src") or rule.get("sheet", ""),
-                    "name": rule.get("name", ""),
-                    "column_on_sheet": _out.get("column_on_sheet", ""),
-                    "type": rule_type,
-                    "total_rows": 0,
-                    "violations": 0,
-                    "sample": [],
-                    "include_in_summary": True,
-                })
-            return (idx, res)
-        except Exception as e:
-            logging.error(f"[consistency] Ошибка при выполнении правила {check_id} ({rule_type}): {e}")
-            _out = rule.get("output") or {}
-            return (idx, {
-                "check_id": check_id,
-                "sheet": rule.get("sheet_src") or rule.get("sheet", ""),
-                "name": rule.get("name", ""),
-                "column_on_sheet": _out.get("column_on_sheet", ""),
-                "type": rule_type,
-                "total_rows": 0,
-                "violations": 0,
-                "sample": [],
-                "include_in_summary": True,
-                "error": str(e),
-            })
+                writer(sheets, rule, result_columns)
+        slot[gi] = _collect_rule_result(sheets, rule, result_columns, reference_sets)
+        started[gi] = t0 - t_start
+        durations[gi] = time.perf_counter() - t0
 
-    slot: List[Optional[Dict[str, Any]]] = [None] * len(rules)
     if enabled_pairs:
-        with ThreadPoolExecutor(max_workers=n_workers) as executor:
-            futures_ph2 = [executor.submit(_phase2_task, gi, rule) for gi, rule in enabled_pairs]
-            for future in as_completed(futures_ph2):
-                gi, res = future.result()
-                slot[gi] = res
+        _run_rule_graph(graph, n_workers, _rule_task)
+    wall_sec = time.perf_counter() - t_start
+    # Колонки на листах — в порядке правил конфига, а не завершения
+    result_columns.attach(sheets_data, graph.output_order())
+    if reference_sets.built:
+        logging.debug(
+            f"[consistency] Наборы справочников: построено {reference_sets.built}, "
+            f"повторно использовано {reference_sets.reused}"
+        )
+    if durations:
+        logging.debug(
+            f"[consistency] Планировщик правил: {len(durations)} правил за {wall_sec:.2f} с, "
+            f"сумма времени правил {sum(durations.values()):.2f} с, "
+            f"критический путь {_critical_path_sec(graph, durations):.2f} с"
+        )
+        record_stat_rows(
+            "Проверки консистентности",
+            [
+                {
+                    "№ правила": gi + 1,
+                    "ID": graph.rules[gi].get("id", ""),
+                    "Тип": graph.rules[gi].get("type", ""),
+                    "Лист": _sheet_written_by_rule(graph.rules[gi]) or "",
+                    "Ждёт правил": ", ".join(str(graph.rules[d].get("id", d)) for d in sorted(graph.deps[gi])),
+                    "Оценка стоимости": round(graph.cost[gi], 1),
+                    "Старт от начала проверок_сек": round(started[gi], 6),
+                    "Длительность": format_duration_ru(durations[gi]),
+                    "Длительность_сек": round(durations[gi], 6),
+                }
+                for gi in sorted(durations, key=lambda g: started[g])
+            ],
+        )
     out: List[Dict[str, Any]] = []
     for i, rule in enumerate(rules):
         if slot[i] is not None:
@@ -2325,6 +2690,7 @@ def run_consistency_checks_and_attach_summary(
     config: Dict[str, Any],
     current_block: Optional[str] = None,
     max_workers: Optional[int] = None,
+    row_cache: Optional[Any] = None,
 ) -> List[Dict[str, Any]]:
     """
     Полный цикл: выполнить все проверки (с параллелизацией), добавить сводный лист в sheets_data,
@@ -2336,7 +2702,10 @@ def run_consistency_checks_and_attach_summary(
         config,
         current_block=current_block,
         max_workers=max_workers,
+        row_cache=row_cache,
     )
+    if row_cache is not None:
+        row_cache.flush()
     # config здесь — секция consistency_checks (summary_sheet_name + rules), а не весь config.json
     rules = config.get("rules") or []
     df_summary = build_consistency_summary_df(results, rules=rules)
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Инкрементальный режим проверок консистентности (performance.incremental).
+
+Для построчных правил (``field_length``, ``field_format``, ``field_in_values``,
+``json_field_equals_column``) результат ячейки зависит только от значений своей строки в
+колонках, которые правило читает. Ключ строки — 128-битный хеш этих значений
+(``pd.util.hash_pandas_object`` с двумя ключами, без нормализации: «-» и пусто различаются);
+для известных ключей значения колонок результата берутся из кэша прошлого прогона, правило
+выполняется только на новых и изменённых строках, полные колонки результата уходят в буфер прогона.
+
+Запись кэша — на правило: подпись = параметры правила + читаемые колонки и их типы + версия
+кода проверок. В кэше остаются только строки последнего прогона; файлы правил, не выполнявшихся
+в прогоне блока, удаляются. Формат на диске — pickle, каталог ``<dir>/<BLOCK>``.
+
+Правила, зависящие от других строк или листов (unique, referential, json_field_in_column и т.д.),
+выполняются полностью.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.consistency_checks import ResultColumns
+
+# Увеличивать при изменении структуры записи кэша
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_INCREMENTAL: Dict[str, Any] = {
+    "enabled": False,
+    "dir": "OUT/CACHE/consistency",
+    # Листы меньше этого числа строк проверяются полностью (хеширование дороже самой проверки)
+    "min_rows": 1000,
+    # Merge и SUMMARY по ключам (src/merge_row_cache.py) — при enabled
+    "merge": True,
+}
+
+ROW_LOCAL_RULE_TYPES = frozenset(
+    ("field_length", "field_format", "field_in_values", "json_field_equals_column")
+)
+
+# Модули, от которых зависит результат построчных правил
+_CODE_FILES: Tuple[str, ...] = ("consistency_checks.py", "consistency_row_cache.py")
+_HASH_KEYS: Tuple[str, str] = ("spod-incr-key-01", "spod-incr-key-02")
+_code_fingerprint_values: Dict[Tuple[str, ...], str] = {}
+
+RuleRunner = Callable[[Dict[str, Any], Dict[str, Any], Optional[ResultColumns]], None]
+
+
+def merge_incremental_config(raw: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Дефолты + ``performance.incremental`` из конфига."""
+    cfg = dict(DEFAULT_INCREMENTAL)
+    if isinstance(raw, Mapping):
+        for k, v in raw.items():
+            if not str(k).startswith("_"):
+                cfg[k] = v
+    cfg["enabled"] = bool(cfg.get("enabled"))
+    cfg["dir"] = str(cfg.get("dir") or DEFAULT_INCREMENTAL["dir"])
+    cfg["min_rows"] = max(0, int(cfg.get("min_rows") or 0))
+    cfg["merge"] = bool(cfg.get("merge", True))
+    return cfg
+
+
+def code_fingerprint(files: Tuple[str, ...] = _CODE_FILES) -> str:
+    """SHA-256 исходников (по умолчанию — проверок): любая правка логики сбрасывает кэш."""
+    value = _code_fingerprint_values.get(files)
+    if value is None:
+        sha = hashlib.sha256()
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in files:
+            try:
+                with open(os.path.join(src_dir, name), "rb") as f:
+                    sha.update(name.encode("utf-8"))
+                    sha.update(f.read())
+            except OSError:
+                sha.update(f"{name}:missing".encode("utf-8"))
+        value = _code_fingerprint_values[files] = sha.hexdigest()
+    return value
+
+
+def rule_input_columns(rule: Mapping[str, Any]) -> Optional[List[str]]:
+    """
+    Колонки листа, от которых зависит результат строки построчного правила (без повторов, в порядке
+    конфига). ``None`` — правило не построчное.
+    """
+    t = rule.get("type")
+    if t not in ROW_LOCAL_RULE_TYPES:
+        return None
+    cols: List[Any] = []
+    if t == "field_length":
+        cols.extend((rule.get("fields") or {}).keys())
+    elif t == "field_format":
+        cols.append(rule.get("field"))
+    elif t == "field_in_values":
+        if str(rule.get("source", "column")).strip().lower() in ("json", "json_field"):
+            cols.append(rule.get("json_column"))
+        else:
+            cols.append(rule.get("field") or rule.get("column"))
+        for cond in rule.get("row_conditions") or rule.get("sheet_row_conditions") or []:
+            if isinstance(cond, dict):
+                cols.append(str(cond.get("column", "")).strip())
+    elif t == "json_field_equals_column":
+        cols.extend((rule.get("json_column"), rule.get("column_compare"), rule.get("filter_column")))
+    out: List[str] = []
+    for c in cols:
+        if c and c not in out:
+            out.append(str(c))
+    return out
+
+
+def row_content_keys(df: pd.DataFrame, columns: List[str]) -> List[Tuple[int, int]]:
+    """Ключ каждой строки: пара 64-битных хешей значений ``columns`` (индекс не учитывается)."""
+    sub = df[columns]
+    h1 = pd.util.hash_pandas_object(sub, index=False, hash_key=_HASH_KEYS[0]).to_numpy()
+    h2 = pd.util.hash_pandas_object(sub, index=False, hash_key=_HASH_KEYS[1]).to_numpy()
+    return list(zip(h1.tolist(), h2.tolist()))
+
+
+def _rule_signature(rule: Mapping[str, Any], df: pd.DataFrame, columns: List[str]) -> str:
+    payload = json.dumps(
+        {
+            "v": CACHE_FORMAT_VERSION,
+            "code": code_fingerprint(),
+            "rule": rule,
+            "columns": columns,
+            "dtypes": [str(df[c].dtype) for c in columns],
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _safe_name(text: str) -> str:
+    return re.sub(r"[^0-9A-Za-z._-]+", "_", text).strip("_") or "rule"
+
+
+class ConsistencyRowCache:
+    """
+    Кэш построчных результатов правил одного прогона блока.
+
+    ``snapshot_input_columns`` — до первой проверки (колонки CSV листа); ``run_rule`` — вместо
+    прямого вызова функции правила (результат — в буфер колонок прогона); ``flush`` — после всех
+    проверок (запись и очистка каталога).
+    """
+
+    def __init__(self, cfg: Mapping[str, Any], base_dir: str, block: Optional[str]) -> None:
+        root = str(cfg.get("dir") or DEFAULT_INCREMENTAL["dir"])
+        root = root if os.path.isabs(root) else os.path.join(base_dir, root)
+        self.cache_dir = os.path.join(root, _safe_name(str(block or "DEFAULT")))
+        self.min_rows = int(cfg.get("min_rows") or 0)
+        self.stats: List[Dict[str, Any]] = []
+        self._input_columns: Dict[str, Set[str]] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def snapshot_input_columns(self, sheets_data: Mapping[str, Any]) -> None:
+        """Колонки листов до проверок: правило, читающее колонку другой проверки, не кэшируется."""
+        for sheet, item in sheets_data.items():
+            if isinstance(item, (list, tuple)) and item and isinstance(item[0], pd.DataFrame):
+                self._input_columns[sheet] = set(item[0].columns)
+
+    def handles(self, rule: Mapping[str, Any]) -> bool:
+        return rule.get("type") in ROW_LOCAL_RULE_TYPES
+
+    def _path(self, sig: str, check_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{_safe_name(check_id)}_{sig}.pkl")
+
+    def _load(self, path: str) -> Optional[Dict[str, Any]]:
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            if entry.get("version") != CACHE_FORMAT_VERSION:
+                return None
+            return entry
+        except Exception as ex:
+            logging.warning(f"[incremental] Запись кэша {path} не прочитана ({ex}) — правило считается полностью")
+            return None
+
+    def run_rule(
+        self,
+        sheets_data: Dict[str, Any],
+        rule: Dict[str, Any],
+        runner: RuleRunner,
+        result_columns: ResultColumns,
+    ) -> None:
+        """
+        Построчное правило: функция правила выполняется только на строках, которых нет в кэше;
+        колонки результата (кэш + новые строки) кладутся в result_columns.
+        """
+        t0 = time.perf_counter()
+        sheet = rule.get("sheet")
+        check_id = str(rule.get("id", "") or rule.get("type", ""))
+        item = sheets_data.get(sheet) if sheet else None
+        columns = rule_input_columns(rule)
+        if (
+            not isinstance(item, (list, tuple))
+            or len(item) < 2
+            or not isinstance(item[0], pd.DataFrame)
+            or columns is None
+            or not columns
+            or len(item[0]) < max(1, self.min_rows)
+            or not set(columns) <= self._input_columns.get(sheet, set())
+        ):
+            runner(sheets_data, rule, result_columns)
+            return
+        df, conf = item[0], item[1]
+        keys = row_content_keys(df, columns)
+        sig = _rule_signature(rule, df, columns)
+        path = self._path(sig, check_id)
+        entry = self._load(path)
+        cached: Dict[Tuple[int, int], Tuple[Any, ...]] = entry["rows"] if entry else {}
+        out_cols: List[str] = list(entry["columns"]) if entry else []
+        if entry is not None and not out_cols:
+            # При этих параметрах правило колонку не пишет (нет полей, пустой allowed_values)
+            miss = np.zeros(len(keys), dtype=bool)
+        else:
+            miss = np.fromiter((k not in cached for k in keys), dtype=bool, count=len(keys))
+        n_miss = int(miss.sum())
+
+        if n_miss:
+            fresh = ResultColumns()
+            runner({sheet: (df.loc[miss], conf)}, rule, fresh)
+            fresh_cols = fresh.columns(sheet)
+            out_cols = list(fresh_cols)
+            miss_keys = [keys[i] for i in np.flatnonzero(miss)]
+            cached = dict(cached)
+            cached.update(zip(miss_keys, zip(*(fresh_cols[c].tolist() for c in out_cols))))
+
+        for j, col in enumerate(out_cols):
+            result_columns.put(sheet, col, pd.Series([cached[k][j] for k in keys], index=df.index, dtype=object))
+
+        current = set(keys) if out_cols else set()
+        rows = cached if len(cached) == len(current) else {k: cached[k] for k in current}
+        with self._lock:
+            self._entries[path] = {
+                "version": CACHE_FORMAT_VERSION,
+                "check_id": check_id,
+                "sheet": sheet,
+                "columns": out_cols,
+                "rows": rows,
+            }
+            if n_miss or len(rows) != len(cached) or entry is None:
+                self._dirty.add(path)
+            self.stats.append(
+                {
+                    "check_id": check_id,
+                    "sheet": sheet,
+                    "rows": len(keys),
+                    "reused": len(keys) - n_miss,
+                    "computed": n_miss,
+                    "duration_sec": round(time.perf_counter() - t0, 3),
+                }
+            )
+
+    def flush(self) -> None:
+        """Сохраняет изменённые записи и удаляет записи правил, не выполнявшихся в этом прогоне."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for path in sorted(self._dirty):
+                tmp = path + ".tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump(self._entries[path], f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if name.endswith(".pkl") and path not in self._entries:
+                    os.remove(path)
+        except OSError as ex:
+            logging.warning(f"[incremental] Кэш проверок не сохранён в {self.cache_dir}: {ex}")
+        self._dirty.clear()
+        reused = sum(s["reused"] for s in self.stats)
+        total = sum(s["rows"] for s in self.stats)
+        logging.info(
+            f"[incremental] Построчные проверки: правил {len(self.stats)}, строк {total}, "
+            f"из кэша {reused}, пересчитано {total - reused}"
+        )
@@ -26,6 +26,8 @@ def expected_phases_for_run_flags(
     consistency_early: bool,
     write_manager_stats: bool = False,
     manager_stats_early: bool = False,
+    write_columnar: bool = False,
+    write_sqlite: bool = False,
 ) -> int:
     """
     Число верхнеуровневых debug_phase в main_impl для полосы прогресса.
@@ -44,8 +46,14 @@ def expected_phases_for_run_flags(
     if manager_stats_early:
         n += 1  # 08 manager_stats
         return n
-    if write_main:
-        n += 2  # 05, 06
+    if write_main or write_columnar or write_sqlite:
+        n += 1  # 05
+        if write_main:
+            n += 1  # 06
+        if write_columnar:
+            n += 1  # 06 columnar
+        if write_sqlite:
+            n += 1  # 06 sqlite
         if write_consistency_file:
             n += 1  # 07
         if write_manager_stats:
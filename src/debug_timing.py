@@ -29,6 +29,8 @@ _run_start_perf: float = 0.0
 _stats: Dict[str, Dict[str, Any]] = {}
 # Завершённые фазы (порядок = хронология окончания этапа) — для выгрузки в отдельный Excel
 _phase_records: List[Dict[str, Any]] = []
+# Дополнительные листы STAT_FILE: имя листа -> строки (например, «Память листов»)
+_stat_tables: Dict[str, List[Dict[str, Any]]] = {}
 _atexit_registered: bool = False
 # глубина вложенности фаз (для отступа в логе)
 _phase_depth = threading.local()
@@ -121,16 +123,41 @@ def get_run_summary_for_console(max_top: int = 8) -> Dict[str, Any]:
 
 def reset_run_timing() -> None:
     """Сброс статистики и фиксация момента старта прогона (вызывать один раз в начале main)."""
-    global _run_start_perf, _stats, _phase_records, _atexit_registered
+    global _run_start_perf, _stats, _phase_records, _stat_tables, _atexit_registered
     with _lock:
         _run_start_perf = time.perf_counter()
         _stats = {}
         _phase_records = []
+        _stat_tables = {}
         if not _atexit_registered:
             atexit.register(log_perf_summary)
             _atexit_registered = True
 
 
+def record_stat_rows(sheet_name: str, rows: List[Dict[str, Any]]) -> None:
+    """Строки для дополнительного листа STAT_FILE (листы — в порядке первой записи)."""
+    with _lock:
+        _stat_tables.setdefault(sheet_name, []).extend(dict(r) for r in rows)
+
+
+def record_phase(label: str, duration_sec: float) -> None:
+    """
+    Фаза, время которой измерено вне debug_phase (например, в фоновом процессе):
+    строка в таблице этапов консоли и STAT_FILE, заканчивается «сейчас». Прогресс-бар не сдвигает.
+    """
+    run_ms_end = run_elapsed_sec() * 1000.0
+    logging.debug(f"[PERF] фаза «{label}» (вне debug_phase) за {duration_sec*1000:.2f} ms")
+    with _lock:
+        _phase_records.append(
+            {
+                "label": label,
+                "duration_sec": float(duration_sec),
+                "run_ms_start": max(0.0, run_ms_end - duration_sec * 1000.0),
+                "run_ms_end": run_ms_end,
+            }
+        )
+
+
 def run_elapsed_sec() -> float:
     """Секунды с момента reset_run_timing() (monotonic)."""
     with _lock:
@@ -333,7 +360,7 @@ def write_performance_statistics_excel(
     """
     Создаёт файл ``STAT_FILE YYYY-MM-DD_HH-MM-SS.xlsx`` в указанном каталоге с листами:
     «Сводка» (общие сведения и время прогона), «Этапы» (фазы ``debug_phase``),
-    «Функции» (агрегаты ``@debug_timed``). Время в человекочитаемом формате и дубли в секундах для сортировки.
+    «Функции» (агрегаты ``@debug_timed``) и дополнительные листы ``record_stat_rows``. Время в человекочитаемом формате и дубли в секундах для сортировки.
 
     Returns:
         Полный путь к файлу или None, если таймер прогона не был запущен.
@@ -344,6 +371,7 @@ def write_performance_statistics_excel(
         total_run_sec = time.perf_counter() - _run_start_perf
         phases = list(_phase_records)
         stat_items = list(_stats.items())
+        extra_tables = {name: list(rows) for name, rows in _stat_tables.items()}
 
     try:
         import pandas as pd
@@ -457,6 +485,8 @@ def write_performance_statistics_excel(
             df_summary.to_excel(writer, index=False, sheet_name="Сводка")
             df_phases.to_excel(writer, index=False, sheet_name="Этапы")
             df_funcs.to_excel(writer, index=False, sheet_name="Функции")
+            for name, rows in extra_tables.items():
+                pd.DataFrame(rows).to_excel(writer, index=False, sheet_name=name[:31])
         logging.info(f"[PERF] Файл статистики времени: {out_path}")
         return out_path
     except Exception as ex:
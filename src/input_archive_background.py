@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Запись входного архива SQLite (v1 или построчный v2) — синхронно или в фоновом процессе.
+
+При ``input_archive_sqlite.background: true`` архив пишется отдельным процессом из уже прочитанных
+сырых кадров этапа 01, а пайплайн блока идёт дальше (консистентность, merge, Excel): от результата
+архива ничего не зависит. Процесс присоединяется перед STAT_FILE и итоговой сводкой блока.
+
+Логи дочернего процесса собираются в список и воспроизводятся в логгере основного процесса
+при присоединении, консольный отчёт архива (stdout) печатается там же — вывод этапов не перемешивается.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import logging
+import multiprocessing
+import sys
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def run_input_archive(project_base_dir: str, archive_cfg: Dict[str, Any], payloads: Dict[str, Dict[str, Any]]) -> None:
+    """Построчный архив v2 при ``row_level_archive``, иначе v1 (БД — ``legacy_db_path``, если задан)."""
+    if archive_cfg.get("row_level_archive"):
+        from src.input_archive_sqlite_v2 import run_input_archive_sqlite_v2
+
+        run_input_archive_sqlite_v2(project_base_dir, archive_cfg, payloads)
+        return
+    from src.input_archive_sqlite import run_input_archive_sqlite
+
+    cfg_v1 = dict(archive_cfg)
+    legacy_db = (cfg_v1.get("legacy_db_path") or "").strip()
+    if legacy_db:
+        cfg_v1["db_path"] = legacy_db
+    run_input_archive_sqlite(project_base_dir, cfg_v1, payloads)
+
+
+class _CollectingHandler(logging.Handler):
+    """Записи лога дочернего процесса: (уровень, текст с traceback) для передачи в основной процесс."""
+
+    def __init__(self) -> None:
+        super().__init__(level=logging.DEBUG)
+        self.records: List[Tuple[int, str]] = []
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.records.append((record.levelno, self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+
+def _archive_process_main(
+    project_base_dir: str,
+    archive_cfg: Dict[str, Any],
+    payloads: Dict[str, Dict[str, Any]],
+    log_level: int,
+    conn: Any,
+) -> None:
+    """Точка входа фонового процесса: архив, затем один ответ в pipe (время, логи, stdout, ошибка)."""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    collector = _CollectingHandler()
+    root.addHandler(collector)
+    root.setLevel(log_level)
+    stdout = io.StringIO()
+    error = ""
+    t0 = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(stdout):
+            run_input_archive(project_base_dir, archive_cfg, payloads)
+    except Exception:
+        error = traceback.format_exc()
+    conn.send(
+        {
+            "duration_sec": time.perf_counter() - t0,
+            "logs": collector.records,
+            "stdout": stdout.getvalue(),
+            "error": error,
+        }
+    )
+    conn.close()
+
+
+@dataclass
+class InputArchiveJob:
+    """Запущенный фоновый процесс архива."""
+
+    process: Any
+    conn: Any
+    started: float
+
+
+def start_input_archive_background(
+    project_base_dir: str,
+    archive_cfg: Dict[str, Any],
+    payloads: Dict[str, Dict[str, Any]],
+) -> InputArchiveJob:
+    """
+    Запускает архив в отдельном процессе. Кадры передаются при старте процесса
+    (fork — копия памяти без pickle, spawn — pickle в ``start``), после возврата ``payloads`` можно освободить.
+    """
+    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_archive_process_main,
+        args=(project_base_dir, archive_cfg, payloads, logging.getLogger().level, child_conn),
+        name="input_archive_sqlite",
+    )
+    process.start()
+    child_conn.close()
+    logging.info(f"[archive_sqlite] Архив входных CSV запущен в фоновом процессе (pid={process.pid})")
+    return InputArchiveJob(process=process, conn=parent_conn, started=time.perf_counter())
+
+
+def join_input_archive(job: InputArchiveJob) -> Dict[str, Any]:
+    """
+    Ждёт фоновый архив, воспроизводит его логи и консольный отчёт.
+
+    Returns:
+        {"duration_sec": время архива в процессе, "wait_sec": ожидание при присоединении, "ok": bool}
+    """
+    t0 = time.perf_counter()
+    try:
+        result: Optional[Dict[str, Any]] = job.conn.recv()
+    except EOFError:
+        result = None
+    job.process.join()
+    job.conn.close()
+    wait_sec = time.perf_counter() - t0
+    if result is None:
+        logging.error(
+            f"[archive_sqlite] Фоновый процесс архива завершился без результата "
+            f"(код {job.process.exitcode}) — продолжаем"
+        )
+        return {"duration_sec": t0 - job.started, "wait_sec": wait_sec, "ok": False}
+    for level, message in result["logs"]:
+        logging.log(level, message)
+    if result["stdout"]:
+        sys.stdout.write(result["stdout"])
+        sys.stdout.flush()
+    if result["error"]:
+        logging.error(
+            "[archive_sqlite] Ошибка записи архива во входной SQLite (фоновый процесс, пайплайн продолжен)\n"
+            + result["error"]
+        )
+    logging.info(
+        f"[archive_sqlite] Фоновый архив присоединён: работа {result['duration_sec']:.2f} с, "
+        f"ожидание при присоединении {wait_sec:.2f} с"
+    )
+    return {"duration_sec": float(result["duration_sec"]), "wait_sec": wait_sec, "ok": not result["error"]}
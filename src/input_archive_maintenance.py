@@ -0,0 +1,499 @@
+# -*- coding: utf-8 -*-
+"""
+Обслуживание БД входного архива (OUT/DB/<BLOCK>): retention истории, пересборка индексов, VACUUM.
+
+Запускать, когда пайплайн блока не работает: БД берётся на запись (``BEGIN IMMEDIATE``), занятая БД
+пропускается. Retention (v1 — снимки ``archive_file_snapshot`` + строки ``arch_*``, v2 — версии
+``archive_row_payload`` + журналы + неиспользуемые тела) выполняется одной транзакцией на БД:
+прерванный запуск откатывается целиком. REINDEX и VACUUM атомарны сами по себе.
+
+Версия / снимок удаляется, только если он (1) не входит в ``keep_versions`` последних для ключа строки
+(v2) или файла (v1) и (2) был заменён более новым раньше ``max_age_days`` дней назад — состояние на любую
+дату внутри окна (``src/input_archive_query.py``) остаётся восстановимым.
+
+CLI::
+
+    python -m src.input_archive_maintenance --block PROM [--dry-run]
+    python -m src.input_archive_maintenance --db OUT/DB/PROM/spod_input_archive_PROM_v2.sqlite
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from src.input_archive_payload_store import TABLE_BLOB, TABLE_ZDICT
+from src.input_archive_sqlite import (
+    INVENTORY_TABLE,
+    META_TABLE,
+    _quote_ident,
+    merge_archive_config,
+    sheet_to_table_name,
+)
+from src.input_archive_sqlite_v2 import (
+    TABLE_CURRENT,
+    TABLE_FILE_INVENTORY,
+    TABLE_INGEST_RUN,
+    TABLE_PAYLOAD,
+    TABLE_STATUS_LOG,
+)
+
+VACUUM_MODES = ("incremental", "full", "off")
+
+DEFAULT_MAINTENANCE: Dict[str, Any] = {
+    # Сколько последних версий тела на ключ (v2) / снимков на файл (v1) хранить всегда, включая актуальную
+    "keep_versions": 5,
+    # Более старые версии удаляются, если заменены раньше этого срока; null — только по keep_versions
+    "max_age_days": 180,
+    # Удалять целиком файлы листа (file_name + subdir), заменённые другим файлом того же листа до окна
+    "drop_superseded_files": False,
+    # REINDEX + PRAGMA optimize после retention
+    "reindex": True,
+    # incremental — auto_vacuum=INCREMENTAL (при первом запуске — разовый полный VACUUM), full — VACUUM, off — нет
+    "vacuum": "incremental",
+    # Ожидание снятия блокировки БД другим процессом, секунды
+    "busy_timeout_sec": 5,
+}
+
+_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+# Граница «заменено когда угодно» при max_age_days = null
+_FAR_FUTURE = "9999-12-31T23:59:59.999999Z"
+
+
+def merge_maintenance_config(raw: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Секция ``input_archive_sqlite.maintenance`` поверх значений по умолчанию."""
+    cfg = dict(DEFAULT_MAINTENANCE)
+    if isinstance(raw, Mapping):
+        cfg.update({k: v for k, v in raw.items() if not str(k).startswith("_")})
+    keep = cfg.get("keep_versions")
+    cfg["keep_versions"] = max(1, int(keep)) if keep is not None else None
+    age = cfg.get("max_age_days")
+    cfg["max_age_days"] = float(age) if age is not None else None
+    mode = str(cfg.get("vacuum") or "off").strip().lower()
+    if mode in ("false", "none", "no"):
+        mode = "off"
+    if mode not in VACUUM_MODES:
+        raise ValueError(f"maintenance.vacuum: ожидается {' / '.join(VACUUM_MODES)}, получено «{cfg.get('vacuum')}»")
+    cfg["vacuum"] = mode
+    cfg["drop_superseded_files"] = bool(cfg.get("drop_superseded_files"))
+    cfg["reindex"] = bool(cfg.get("reindex"))
+    cfg["busy_timeout_sec"] = float(cfg.get("busy_timeout_sec") or 0)
+    return cfg
+
+
+def _retention_bounds(cfg: Mapping[str, Any], now: datetime) -> Optional[Tuple[int, str]]:
+    """(сколько версий хранить всегда, граница «заменено до»); ``None`` — retention выключен."""
+    keep, age = cfg.get("keep_versions"), cfg.get("max_age_days")
+    if keep is None and age is None:
+        return None
+    cutoff = (now - timedelta(days=age)).strftime(_TS_FORMAT) if age is not None else _FAR_FUTURE
+    return int(keep or 1), cutoff
+
+
+def _table_exists(cur: sqlite3.Cursor, name: str) -> bool:
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cur.fetchone() is not None
+
+
+def _db_size(db_path: str) -> int:
+    """Размер БД с WAL-файлом (байты)."""
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.isfile(p))
+
+
+def apply_v2_retention(cur: sqlite3.Cursor, cfg: Mapping[str, Any], now: datetime) -> Dict[str, int]:
+    """Retention построчного архива в текущей транзакции; счётчики удалённого."""
+    stats = {"files": 0, "versions": 0, "status_log": 0, "ingest_runs": 0, "blobs": 0, "zdicts": 0}
+    bounds = _retention_bounds(cfg, now)
+    if bounds is None:
+        return stats
+    keep, cutoff = bounds
+    scope_cols = "sheet_name, file_name, subdir"
+
+    if cfg.get("drop_superseded_files") and cfg.get("max_age_days") is not None:
+        cur.execute(f"CREATE TEMP TABLE maint_stale_scope ({scope_cols})")
+        # Файл листа, после которого до границы окна загружался другой файл того же листа
+        cur.execute(
+            f"""
+            WITH scopes AS (
+                SELECT {scope_cols}, MIN(first_seen_at) AS first_at, MAX(last_loaded_at) AS last_at
+                FROM {TABLE_CURRENT}
+                GROUP BY {scope_cols}
+            )
+            INSERT INTO temp.maint_stale_scope
+            SELECT s.sheet_name, s.file_name, s.subdir
+            FROM scopes AS s
+            WHERE s.last_at <= ?
+              AND EXISTS (
+                  SELECT 1 FROM scopes AS t
+                  WHERE t.sheet_name = s.sheet_name
+                    AND NOT (t.file_name = s.file_name AND t.subdir = s.subdir)
+                    AND t.first_at > s.last_at AND t.first_at <= ?
+              )
+            """,
+            (cutoff, cutoff),
+        )
+        cur.execute("SELECT COUNT(*) FROM temp.maint_stale_scope")
+        stats["files"] = int(cur.fetchone()[0])
+        for table in (TABLE_CURRENT, TABLE_PAYLOAD, TABLE_STATUS_LOG, TABLE_FILE_INVENTORY, TABLE_INGEST_RUN):
+            cur.execute(
+                f"DELETE FROM {table} WHERE ({scope_cols}) IN (SELECT {scope_cols} FROM temp.maint_stale_scope)"
+            )
+            if table == TABLE_PAYLOAD:
+                stats["versions"] += max(cur.rowcount, 0)
+        cur.execute("DROP TABLE temp.maint_stale_scope")
+
+    # Версии: LAG по убыванию id — время загрузки следующей (более новой) версии того же ключа
+    cur.execute(
+        f"""
+        DELETE FROM {TABLE_PAYLOAD}
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id,
+                       ROW_NUMBER() OVER w AS rn,
+                       LAG(loaded_at) OVER w AS superseded_at
+                FROM {TABLE_PAYLOAD}
+                WINDOW w AS (PARTITION BY sheet_name, file_name, subdir, row_key_hash ORDER BY id DESC)
+            )
+            WHERE rn > ? AND superseded_at <= ?
+        )
+        AND id NOT IN (SELECT payload_id FROM {TABLE_CURRENT} WHERE payload_id IS NOT NULL)
+        """,
+        (keep, cutoff),
+    )
+    stats["versions"] += max(cur.rowcount, 0)
+
+    # Журнал статусов: до границы окна нужен только последний переход ключа
+    cur.execute(
+        f"""
+        DELETE FROM {TABLE_STATUS_LOG}
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, LAG(changed_at) OVER (
+                    PARTITION BY sheet_name, file_name, subdir, row_key_hash ORDER BY id DESC
+                ) AS newer_at
+                FROM {TABLE_STATUS_LOG}
+            )
+            WHERE newer_at <= ?
+        )
+        """,
+        (cutoff,),
+    )
+    stats["status_log"] = max(cur.rowcount, 0)
+
+    if cfg.get("max_age_days") is not None:
+        # Журнал прогонов: до границы окна — последний прогон листа (по нему выбирается файл листа на дату)
+        cur.execute(
+            f"""
+            DELETE FROM {TABLE_INGEST_RUN}
+            WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, LAG(started_at) OVER (
+                        PARTITION BY sheet_name ORDER BY started_at DESC, id DESC
+                    ) AS newer_at
+                    FROM {TABLE_INGEST_RUN}
+                )
+                WHERE newer_at <= ?
+            )
+            """,
+            (cutoff,),
+        )
+        stats["ingest_runs"] = max(cur.rowcount, 0)
+
+    if _table_exists(cur, TABLE_BLOB):
+        cur.execute(
+            f"""
+            DELETE FROM {TABLE_BLOB}
+            WHERE id NOT IN (
+                SELECT blob_id FROM {TABLE_PAYLOAD} WHERE blob_id IS NOT NULL
+                UNION
+                SELECT blob_id FROM {TABLE_CURRENT} WHERE blob_id IS NOT NULL
+            )
+            """
+        )
+        stats["blobs"] = max(cur.rowcount, 0)
+        # Последний словарь листа остаётся — им сжимаются следующие загрузки
+        cur.execute(
+            f"""
+            DELETE FROM {TABLE_ZDICT}
+            WHERE id NOT IN (SELECT zdict_id FROM {TABLE_BLOB} WHERE zdict_id IS NOT NULL)
+              AND id NOT IN (SELECT MAX(id) FROM {TABLE_ZDICT} GROUP BY sheet_name)
+            """
+        )
+        stats["zdicts"] = max(cur.rowcount, 0)
+    return stats
+
+
+def apply_v1_retention(
+    cur: sqlite3.Cursor,
+    cfg: Mapping[str, Any],
+    now: datetime,
+    snapshot_col: str = "__snapshot_id",
+) -> Dict[str, int]:
+    """Retention архива снимков v1 в текущей транзакции: historical-снимки и их строки в ``arch_*``."""
+    stats = {"files": 0, "snapshots": 0, "rows": 0}
+    bounds = _retention_bounds(cfg, now)
+    if bounds is None:
+        return stats
+    keep, cutoff = bounds
+    checked = "COALESCE(actuality_checked_at, loaded_at)"
+
+    cur.execute("CREATE TEMP TABLE maint_doomed_snapshot (id INTEGER PRIMARY KEY, sheet_name TEXT NOT NULL)")
+    # Снимок «заменён до границы», если последний раз подтверждён актуальным раньше неё
+    cur.execute(
+        f"""
+        INSERT INTO temp.maint_doomed_snapshot (id, sheet_name)
+        SELECT id, sheet_name FROM (
+            SELECT id, sheet_name, row_status, {checked} AS checked_at,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY sheet_name, file_name, subdir
+                       ORDER BY row_status = 'latest' DESC, {checked} DESC, id DESC
+                   ) AS rn
+            FROM {META_TABLE}
+        )
+        WHERE rn > ? AND row_status <> 'latest' AND checked_at <= ?
+        """,
+        (keep, cutoff),
+    )
+    if cfg.get("drop_superseded_files") and cfg.get("max_age_days") is not None:
+        cur.execute(
+            f"""
+            WITH scopes AS (
+                SELECT sheet_name, file_name, subdir,
+                       MIN(loaded_at) AS first_at, MAX({checked}) AS last_at
+                FROM {META_TABLE}
+                GROUP BY sheet_name, file_name, subdir
+            ),
+            stale AS (
+                SELECT s.sheet_name, s.file_name, s.subdir
+                FROM scopes AS s
+                WHERE s.last_at <= ?
+                  AND EXISTS (
+                      SELECT 1 FROM scopes AS t
+                      WHERE t.sheet_name = s.sheet_name
+                        AND NOT (t.file_name = s.file_name AND t.subdir = s.subdir)
+                        AND t.first_at > s.last_at AND t.first_at <= ?
+                  )
+            )
+            INSERT OR IGNORE INTO temp.maint_doomed_snapshot (id, sheet_name)
+            SELECT m.id, m.sheet_name FROM {META_TABLE} AS m
+            WHERE (m.sheet_name, m.file_name, m.subdir) IN (SELECT sheet_name, file_name, subdir FROM stale)
+            """,
+            (cutoff, cutoff),
+        )
+        cur.execute(
+            f"""
+            DELETE FROM {INVENTORY_TABLE}
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {META_TABLE} AS m
+                WHERE m.sheet_name = {INVENTORY_TABLE}.sheet_name AND m.file_name = {INVENTORY_TABLE}.file_name
+                  AND m.subdir = {INVENTORY_TABLE}.subdir
+                  AND m.id NOT IN (SELECT id FROM temp.maint_doomed_snapshot)
+            )
+            """
+        )
+        stats["files"] = max(cur.rowcount, 0)
+
+    cur.execute("SELECT DISTINCT sheet_name FROM temp.maint_doomed_snapshot")
+    for (sheet_name,) in cur.fetchall():
+        table = sheet_to_table_name(str(sheet_name))
+        if not _table_exists(cur, table):
+            continue
+        cur.execute(
+            f"DELETE FROM {_quote_ident(table)} WHERE {_quote_ident(snapshot_col)} IN "
+            f"(SELECT id FROM temp.maint_doomed_snapshot WHERE sheet_name = ?)",
+            (sheet_name,),
+        )
+        stats["rows"] += max(cur.rowcount, 0)
+    cur.execute(f"DELETE FROM {META_TABLE} WHERE id IN (SELECT id FROM temp.maint_doomed_snapshot)")
+    stats["snapshots"] = max(cur.rowcount, 0)
+    cur.execute(
+        f"UPDATE {META_TABLE} SET superseded_by_id = NULL "
+        f"WHERE superseded_by_id IN (SELECT id FROM temp.maint_doomed_snapshot)"
+    )
+    cur.execute("DROP TABLE temp.maint_doomed_snapshot")
+    return stats
+
+
+def _compact(conn: sqlite3.Connection, cfg: Mapping[str, Any], timings: Dict[str, float]) -> Dict[str, Any]:
+    """REINDEX / optimize, VACUUM по режиму, checkpoint WAL. Соединение — в autocommit."""
+    info: Dict[str, Any] = {"vacuum": cfg["vacuum"], "converted_to_incremental": False}
+    if cfg["reindex"]:
+        t0 = time.perf_counter()
+        conn.execute("REINDEX")
+        conn.execute("PRAGMA optimize")
+        timings["reindex_sec"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    info["freelist_before"] = int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+    if cfg["vacuum"] == "full":
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    elif cfg["vacuum"] == "incremental":
+        if int(conn.execute("PRAGMA auto_vacuum").fetchone()[0]) != 2:
+            # Режим auto_vacuum меняется только пересборкой файла — один раз
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            info["converted_to_incremental"] = True
+        else:
+            # PRAGMA возвращает строку на шаг — без выборки освобождается только первая страница
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+    info["freelist_after"] = int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    timings["vacuum_sec"] = time.perf_counter() - t0
+    return info
+
+
+def maintain_database(
+    db_path: str,
+    cfg: Mapping[str, Any],
+    *,
+    snapshot_col: str = "__snapshot_id",
+    dry_run: bool = False,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Retention + сжатие одной БД архива. ``dry_run`` — только посчитать удаляемое (транзакция откатывается).
+
+    Returns:
+        {"db_path", "status": ok | busy | dry_run, "size_before", "size_after", "v1", "v2", "compact", "timings"}
+    """
+    now = now or datetime.now(timezone.utc)
+    result: Dict[str, Any] = {"db_path": db_path, "size_before": _db_size(db_path), "v1": None, "v2": None}
+    timings: Dict[str, float] = {}
+    t_total = time.perf_counter()
+    conn = sqlite3.connect(db_path, timeout=cfg["busy_timeout_sec"], isolation_level=None)
+    try:
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            result.update(status="busy", size_after=result["size_before"], timings=timings, compact=None)
+            return result
+        t0 = time.perf_counter()
+        try:
+            if _table_exists(cur, META_TABLE):
+                result["v1"] = apply_v1_retention(cur, cfg, now, snapshot_col)
+            if _table_exists(cur, TABLE_PAYLOAD):
+                result["v2"] = apply_v2_retention(cur, cfg, now)
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+        cur.execute("ROLLBACK" if dry_run else "COMMIT")
+        timings["retention_sec"] = time.perf_counter() - t0
+        result["compact"] = None if dry_run else _compact(conn, cfg, timings)
+    finally:
+        conn.close()
+    timings["total_sec"] = time.perf_counter() - t_total
+    result.update(status="dry_run" if dry_run else "ok", size_after=_db_size(db_path), timings=timings)
+    return result
+
+
+def resolve_block_databases(block: str, config_path: Optional[str] = None) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Существующие БД архива блока по конфигу (``db_path``, ``legacy_db_path``, ``archive_db_path`` из input_files)
+    и слитая секция ``input_archive_sqlite``.
+    """
+    from src.block_runtime import resolve_block_placeholders
+    from src.config_loader import (
+        default_config_path,
+        get_input_files_for_block,
+        load_config_dict,
+        parse_input_files_by_block,
+        resolve_project_base_dir,
+    )
+    from src.input_archive_sqlite_v2 import merge_archive_v2_config
+
+    path = config_path or default_config_path()
+    cfg = load_config_dict(path)
+    base_dir = resolve_project_base_dir(path)
+    archive_cfg = resolve_block_placeholders(merge_archive_v2_config(cfg.get("input_archive_sqlite")), block)
+    rel_paths = [archive_cfg.get("db_path"), archive_cfg.get("legacy_db_path")]
+    for fc in get_input_files_for_block(parse_input_files_by_block(cfg), block):
+        rel_paths.append(resolve_block_placeholders(dict(fc), block).get("archive_db_path"))
+    found: List[str] = []
+    for rel in rel_paths:
+        rel = str(rel or "").strip()
+        if not rel:
+            continue
+        p = os.path.normpath(rel if os.path.isabs(rel) else os.path.join(base_dir, rel))
+        if os.path.isfile(p) and p not in found:
+            found.append(p)
+    return found, archive_cfg
+
+
+def _format_result(res: Mapping[str, Any]) -> str:
+    mb = 1024 * 1024
+    head = f"{res['db_path']}: "
+    if res["status"] == "busy":
+        return head + "БД занята другим процессом — пропущена"
+    parts = [
+        f"{res['size_before'] / mb:.1f} → {res['size_after'] / mb:.1f} МБ",
+        f"{res['timings'].get('total_sec', 0.0):.1f} с",
+    ]
+    if res.get("v1"):
+        v1 = res["v1"]
+        parts.append(f"v1: снимков −{v1['snapshots']}, строк arch_* −{v1['rows']}, файлов −{v1['files']}")
+    if res.get("v2"):
+        v2 = res["v2"]
+        parts.append(
+            f"v2: версий −{v2['versions']}, тел −{v2['blobs']}, журнал статусов −{v2['status_log']}, "
+            f"прогонов −{v2['ingest_runs']}, файлов −{v2['files']}"
+        )
+    compact = res.get("compact")
+    if compact:
+        vac = compact["vacuum"] + (" (переход на auto_vacuum=INCREMENTAL)" if compact["converted_to_incremental"] else "")
+        parts.append(f"VACUUM {vac}, свободных страниц {compact['freelist_before']} → {compact['freelist_after']}")
+    if res["status"] == "dry_run":
+        parts.append("пробный прогон, изменения откатены")
+    return head + "; ".join(parts)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Обслуживание БД входного архива: retention, REINDEX, VACUUM (запускать без работающего пайплайна)."
+    )
+    parser.add_argument("--block", action="append", help="Блок (PROM / IFT / PSI), можно несколько; по умолчанию PROM")
+    parser.add_argument("--db", action="append", help="Путь к БД вместо путей из конфига, можно несколько")
+    parser.add_argument("--config", help="Точка входа конфига (по умолчанию config/config.json)")
+    parser.add_argument("--dry-run", action="store_true", help="Только посчитать удаляемое, без изменений")
+    args = parser.parse_args(argv)
+
+    from src.config_loader import default_config_path, load_config_dict
+    from src.input_archive_sqlite_v2 import merge_archive_v2_config
+
+    if args.db:
+        db_paths = [os.path.abspath(p) for p in args.db]
+        archive_cfg = merge_archive_v2_config(load_config_dict(args.config or default_config_path()).get("input_archive_sqlite"))
+    else:
+        db_paths, archive_cfg = [], {}
+        for block in args.block or ["PROM"]:
+            found, archive_cfg = resolve_block_databases(str(block).strip().upper(), args.config)
+            db_paths.extend(p for p in found if p not in db_paths)
+    try:
+        cfg = merge_maintenance_config(archive_cfg.get("maintenance"))
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    snapshot_col = merge_archive_config(archive_cfg)["system_columns"]["snapshot_id"]
+    if not db_paths:
+        print("БД архива не найдены", file=sys.stderr)
+        return 1
+    code = 0
+    for db_path in db_paths:
+        if not os.path.isfile(db_path):
+            print(f"{db_path}: не найдена", file=sys.stderr)
+            code = 1
+            continue
+        res = maintain_database(db_path, cfg, snapshot_col=snapshot_col, dry_run=args.dry_run)
+        print(_format_result(res))
+        if res["status"] == "busy":
+            code = 1
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
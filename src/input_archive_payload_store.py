@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+Контентно-адресуемое хранилище тел строк построчного архива v2 (``input_archive_sqlite.payload_store``).
+
+Тело строки (JSON полей после нормализации) хранится **один раз на содержимое** в ``archive_row_blob``:
+ключ — ``content_hash`` (SHA-256 канонического JSON всех полей; при ``row_hash_columns: null``
+совпадает с ``row_hash``). Версии (``archive_row_payload``) и текущее состояние (``archive_row_current``)
+ссылаются на blob по ``blob_id``.
+
+Сжатие — zlib; при ``sheet_dictionary`` для листа один раз строится общий словарь (zdict, до 32 КБ)
+из выборки тел первой крупной загрузки и хранится в ``archive_row_zdict`` — короткие строки с
+повторяющимися именами колонок сжимаются в разы лучше, чем поодиночке.
+
+Старые БД (колонка ``payload_json`` в ``archive_row_payload``) переводятся ``migrate_payload_store``
+при первом открытии: тела → blob, таблица версий пересобирается с ``blob_id`` (id версий сохраняются).
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import zlib
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from src.input_archive_row_hash import compute_row_hash
+
+TABLE_BLOB = "archive_row_blob"
+TABLE_ZDICT = "archive_row_zdict"
+
+CODEC_JSON = "json"
+CODEC_ZLIB = "zlib"
+
+# Предел окна zlib: словарь длиннее 32 КБ не используется
+_ZDICT_MAX_BYTES = 32768
+
+DEFAULT_PAYLOAD_STORE: Dict[str, Any] = {
+    "compression": CODEC_ZLIB,
+    "level": 6,
+    "sheet_dictionary": True,
+    "dictionary_min_rows": 200,
+    "dictionary_sample_rows": 2000,
+    "dictionary_max_bytes": _ZDICT_MAX_BYTES,
+}
+
+
+def merge_payload_store_config(raw: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Слияние ``payload_store`` с дефолтами; compression — zlib или none (тело как есть)."""
+    cfg = dict(DEFAULT_PAYLOAD_STORE)
+    if isinstance(raw, Mapping):
+        cfg.update(raw)
+    compression = str(cfg.get("compression") or "none").lower().strip()
+    if compression in ("none", "off", "false", CODEC_JSON):
+        compression = CODEC_JSON
+    if compression not in (CODEC_JSON, CODEC_ZLIB):
+        raise ValueError(
+            f"input_archive_sqlite.payload_store.compression: ожидается zlib или none, получено {cfg.get('compression')!r}"
+        )
+    cfg["compression"] = compression
+    cfg["level"] = min(9, max(0, int(cfg.get("level", 6))))
+    cfg["sheet_dictionary"] = bool(cfg.get("sheet_dictionary"))
+    cfg["dictionary_min_rows"] = max(1, int(cfg.get("dictionary_min_rows") or 1))
+    cfg["dictionary_sample_rows"] = max(1, int(cfg.get("dictionary_sample_rows") or 1))
+    cfg["dictionary_max_bytes"] = min(_ZDICT_MAX_BYTES, max(256, int(cfg.get("dictionary_max_bytes") or 0)))
+    return cfg
+
+
+def payload_to_json(fields: Mapping[str, str]) -> str:
+    """Тело строки как JSON (формат прежней колонки ``payload_json``)."""
+    return json.dumps(fields, ensure_ascii=False, sort_keys=True)
+
+
+def content_hash_of(fields: Mapping[str, str]) -> str:
+    """Ключ blob: SHA-256 канонического JSON всех полей (= row_hash без ``row_hash_columns``)."""
+    return compute_row_hash(fields)
+
+
+def ensure_payload_store_schema(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_ZDICT} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sheet_name TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            sample_rows INTEGER NOT NULL,
+            zdict BLOB NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_BLOB} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content_hash TEXT NOT NULL UNIQUE,
+            codec TEXT NOT NULL,
+            zdict_id INTEGER,
+            raw_bytes INTEGER NOT NULL,
+            body BLOB NOT NULL
+        )
+        """
+    )
+
+
+def build_zdict(sample_jsons: Sequence[str], max_bytes: int) -> bytes:
+    """
+    Словарь zlib из выборки тел: строки берутся равномерно по выборке, пока не наберётся max_bytes.
+    Конец словаря ближе всего к сжимаемым данным — туда попадают последние взятые строки.
+    """
+    if not sample_jsons:
+        return b""
+    parts: List[bytes] = []
+    total = 0
+    step = max(1, len(sample_jsons) // 64)
+    for text in sample_jsons[::step]:
+        data = text.encode("utf-8")
+        if total + len(data) > max_bytes:
+            break
+        parts.append(data)
+        total += len(data)
+    return b"".join(parts)[-max_bytes:]
+
+
+def encode_payload(text: str, codec: str, level: int, zdict: Optional[bytes]) -> bytes:
+    data = text.encode("utf-8")
+    if codec == CODEC_JSON:
+        return data
+    if zdict:
+        comp = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, zdict=zdict)
+    else:
+        comp = zlib.compressobj(level)
+    return comp.compress(data) + comp.flush()
+
+
+def decode_payload(codec: str, body: bytes, zdict: Optional[bytes]) -> str:
+    if codec == CODEC_JSON:
+        return bytes(body).decode("utf-8")
+    if zdict:
+        dec = zlib.decompressobj(zlib.MAX_WBITS, zdict=zdict)
+    else:
+        dec = zlib.decompressobj()
+    return (dec.decompress(body) + dec.flush()).decode("utf-8")
+
+
+class PayloadReader:
+    """Чтение тел по blob_id с кэшем словарей (для запросов к архиву и тестов)."""
+
+    def __init__(self, cur: sqlite3.Cursor) -> None:
+        self._cur = cur
+        self._zdicts: Dict[int, bytes] = {}
+
+    def _zdict(self, zdict_id: Optional[int]) -> Optional[bytes]:
+        if zdict_id is None:
+            return None
+        zid = int(zdict_id)
+        if zid not in self._zdicts:
+            self._cur.execute(f"SELECT zdict FROM {TABLE_ZDICT} WHERE id = ?", (zid,))
+            row = self._cur.fetchone()
+            self._zdicts[zid] = bytes(row[0]) if row else b""
+        return self._zdicts[zid]
+
+    def decode_row(self, codec: str, zdict_id: Optional[int], body: bytes) -> Dict[str, str]:
+        return json.loads(decode_payload(str(codec), body, self._zdict(zdict_id)))
+
+    def load(self, blob_id: int) -> Optional[Dict[str, str]]:
+        self._cur.execute(f"SELECT codec, zdict_id, body FROM {TABLE_BLOB} WHERE id = ?", (int(blob_id),))
+        row = self._cur.fetchone()
+        if row is None:
+            return None
+        return self.decode_row(row[0], row[1], row[2])
+
+
+def _sheet_zdict(
+    cur: sqlite3.Cursor,
+    sheet_name: str,
+    sample: Sequence[str],
+    cfg: Mapping[str, Any],
+    now_utc: str,
+) -> Tuple[Optional[int], Optional[bytes]]:
+    """Словарь листа: последний сохранённый или новый из выборки (если выборка достаточно большая)."""
+    if cfg["compression"] != CODEC_ZLIB or not cfg["sheet_dictionary"]:
+        return None, None
+    cur.execute(
+        f"SELECT id, zdict FROM {TABLE_ZDICT} WHERE sheet_name = ? ORDER BY id DESC LIMIT 1", (sheet_name,)
+    )
+    row = cur.fetchone()
+    if row is not None:
+        return int(row[0]), bytes(row[1])
+    if len(sample) < cfg["dictionary_min_rows"]:
+        return None, None
+    zdict = build_zdict(sample[: cfg["dictionary_sample_rows"]], cfg["dictionary_max_bytes"])
+    if not zdict:
+        return None, None
+    cur.execute(
+        f"INSERT INTO {TABLE_ZDICT} (sheet_name, created_at, sample_rows, zdict) VALUES (?, ?, ?, ?)",
+        (sheet_name, now_utc, min(len(sample), cfg["dictionary_sample_rows"]), zdict),
+    )
+    return int(cur.lastrowid), zdict
+
+
+def insert_blobs(
+    cur: sqlite3.Cursor,
+    sheet_name: str,
+    items: Sequence[Tuple[str, str]],
+    cfg: Mapping[str, Any],
+    now_utc: str,
+) -> int:
+    """
+    Тела (content_hash, JSON), которых ещё нет в ``archive_row_blob`` (вызывающий отбирает их запросом);
+    сжатие словарём листа. Возвращает число вставленных blob.
+    """
+    if not items:
+        return 0
+    zdict_id, zdict = _sheet_zdict(cur, sheet_name, [text for _, text in items], cfg, now_utc)
+    codec = cfg["compression"]
+    level = cfg["level"]
+    cur.executemany(
+        f"""
+        INSERT OR IGNORE INTO {TABLE_BLOB} (content_hash, codec, zdict_id, raw_bytes, body)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            (h, codec, zdict_id, len(text.encode("utf-8")), encode_payload(text, codec, level, zdict))
+            for h, text in items
+        ),
+    )
+    return len(items)
+
+
+def _columns(cur: sqlite3.Cursor, table: str) -> List[str]:
+    cur.execute(f"PRAGMA table_info({table})")
+    return [str(r[1]) for r in cur.fetchall()]
+
+
+def needs_migration(cur: sqlite3.Cursor, payload_table: str) -> bool:
+    """Старая схема: тело версии в ``payload_json`` без ссылки на blob."""
+    return "payload_json" in _columns(cur, payload_table)
+
+
+def migrate_payload_store(
+    cur: sqlite3.Cursor,
+    *,
+    payload_table: str,
+    current_table: str,
+    create_payload_table_sql: Iterable[str],
+    cfg: Mapping[str, Any],
+    now_utc: str,
+    batch_rows: int = 20000,
+) -> Dict[str, int]:
+    """
+    Перевод ``payload_json`` → ``archive_row_blob`` в текущей транзакции.
+
+    Таблица версий пересобирается (новая схема из ``create_payload_table_sql``, id сохраняются),
+    ``archive_row_current`` получает ``blob_id``. Returns: {"versions", "blobs"}.
+    """
+    ensure_payload_store_schema(cur)
+    cur.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS archive_row_migrate_map (payload_id INTEGER PRIMARY KEY, blob_id INTEGER)"
+    )
+    cur.execute("DELETE FROM temp.archive_row_migrate_map")
+    cur.execute(f"SELECT DISTINCT sheet_name FROM {payload_table} ORDER BY sheet_name")
+    sheets = [str(r[0]) for r in cur.fetchall()]
+    read = cur.connection.cursor()
+    versions = 0
+    blobs = 0
+    for sheet_name in sheets:
+        read.execute(
+            f"SELECT id, payload_json FROM {payload_table} WHERE sheet_name = ? ORDER BY id", (sheet_name,)
+        )
+        while True:
+            rows = read.fetchmany(batch_rows)
+            if not rows:
+                break
+            hashed = [(int(pid), content_hash_of(json.loads(text)), text) for pid, text in rows]
+            fresh: Dict[str, str] = {}
+            for _, h, text in hashed:
+                fresh.setdefault(h, text)
+            cur.execute("CREATE TEMP TABLE IF NOT EXISTS archive_row_migrate_hash (content_hash TEXT PRIMARY KEY)")
+            cur.execute("DELETE FROM temp.archive_row_migrate_hash")
+            cur.executemany("INSERT INTO temp.archive_row_migrate_hash VALUES (?)", ((h,) for h in fresh))
+            cur.execute(
+                f"""
+                SELECT content_hash FROM temp.archive_row_migrate_hash
+                WHERE content_hash NOT IN (SELECT content_hash FROM {TABLE_BLOB})
+                """
+            )
+            missing = [str(r[0]) for r in cur.fetchall()]
+            blobs += insert_blobs(cur, sheet_name, [(h, fresh[h]) for h in missing], cfg, now_utc)
+            cur.executemany(
+                f"""
+                INSERT INTO temp.archive_row_migrate_map (payload_id, blob_id)
+                SELECT ?, id FROM {TABLE_BLOB} WHERE content_hash = ?
+                """,
+                ((pid, h) for pid, h, _ in hashed),
+            )
+            versions += len(rows)
+    read.close()
+
+    old_table = f"{payload_table}__json"
+    # Индексы переезжают вместе с переименованной таблицей — снимаем, чтобы создать заново на новой
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (payload_table,))
+    for (index_name,) in cur.fetchall():
+        cur.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+    cur.execute(f"ALTER TABLE {payload_table} RENAME TO {old_table}")
+    for sql in create_payload_table_sql:
+        cur.execute(sql)
+    new_cols = [c for c in _columns(cur, payload_table) if c != "blob_id"]
+    col_list = ", ".join(new_cols)
+    cur.execute(
+        f"""
+        INSERT INTO {payload_table} ({col_list}, blob_id)
+        SELECT {", ".join("o." + c for c in new_cols)}, m.blob_id
+        FROM {old_table} AS o
+        LEFT JOIN temp.archive_row_migrate_map AS m ON m.payload_id = o.id
+        ORDER BY o.id
+        """
+    )
+    cur.execute(f"DROP TABLE {old_table}")
+    if "blob_id" not in _columns(cur, current_table):
+        cur.execute(f"ALTER TABLE {current_table} ADD COLUMN blob_id INTEGER")
+    cur.execute(
+        f"""
+        UPDATE {current_table}
+        SET blob_id = (SELECT m.blob_id FROM temp.archive_row_migrate_map AS m WHERE m.payload_id = {current_table}.payload_id)
+        WHERE payload_id IS NOT NULL
+        """
+    )
+    cur.execute("DROP TABLE temp.archive_row_migrate_map")
+    cur.execute("DROP TABLE IF EXISTS temp.archive_row_migrate_hash")
+    return {"versions": versions, "blobs": blobs}
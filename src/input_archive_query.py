@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Состояние листа из построчного архива v2 на дату (point-in-time).
+
+Для каждого ключа строки берётся последняя версия тела с ``loaded_at`` не позже даты; строка
+попадает в результат, если на эту дату не была снята с учёта (``archive_row_status_log``,
+для строк, снятых до появления журнала, — ``archive_row_current.inactive_since``).
+Лист на дату — файл (``file_name``, ``subdir``) последнего ingest листа до этой даты.
+
+Тела читаются потоком (``fetchmany``) и раскодируются по одному — в памяти только результат.
+
+CLI::
+
+    python -m src.input_archive_query --block PROM --sheet REPORT --as-of 2026-09-01 [--out REPORT.csv]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+from src.input_archive_payload_store import TABLE_BLOB, PayloadReader, needs_migration
+from src.input_archive_sqlite_v2 import (
+    TABLE_CURRENT,
+    TABLE_INGEST_RUN,
+    TABLE_PAYLOAD,
+    TABLE_STATUS_LOG,
+    _ensure_v2_schema,
+)
+
+_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+@dataclass(frozen=True)
+class ArchiveScope:
+    """Логический вход архива: лист и файл из config, в рамках которого хранятся ключи строк."""
+
+    sheet_name: str
+    file_name: str
+    subdir: str
+
+
+def parse_as_of(value: str) -> str:
+    """
+    Граница «на дату» в формате меток архива (UTC, включительно).
+
+    Дата без времени (``2026-09-01``) — конец этого дня; время без зоны считается UTC.
+    """
+    text = str(value or "").strip()
+    try:
+        if len(text) == 10:
+            day = datetime.strptime(text, "%Y-%m-%d")
+            return day.strftime("%Y-%m-%dT23:59:59.999999Z")
+        moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError as e:
+        raise ValueError(f"as_of: ожидается дата ГГГГ-ММ-ДД или ISO-время, получено «{value}»") from e
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime(_TS_FORMAT)
+
+
+def resolve_scope(
+    cur: sqlite3.Cursor,
+    sheet_name: str,
+    cutoff: str,
+    *,
+    file_name: Optional[str] = None,
+    subdir: Optional[str] = None,
+) -> Optional[ArchiveScope]:
+    """
+    Файл листа на дату: последний ingest листа (с учётом заданных ``file_name`` / ``subdir``) не позже ``cutoff``.
+    ``None`` — лист до этой даты в архив не загружался.
+    """
+    where = ["sheet_name = ?"]
+    params: list = [sheet_name]
+    if file_name is not None:
+        where.append("file_name = ?")
+        params.append(file_name)
+    if subdir is not None:
+        where.append("subdir = ?")
+        params.append(subdir)
+    cond = " AND ".join(where)
+    cur.execute(
+        f"SELECT file_name, subdir FROM {TABLE_INGEST_RUN} WHERE {cond} AND started_at <= ? "
+        f"ORDER BY started_at DESC, id DESC LIMIT 1",
+        (*params, cutoff),
+    )
+    row = cur.fetchone()
+    if row is None:
+        # Журнал прогонов могли очистить — по последней версии тел
+        cur.execute(
+            f"SELECT file_name, subdir FROM {TABLE_PAYLOAD} WHERE {cond} AND loaded_at <= ? "
+            f"ORDER BY loaded_at DESC, id DESC LIMIT 1",
+            (*params, cutoff),
+        )
+        row = cur.fetchone()
+    if row is None:
+        return None
+    return ArchiveScope(sheet_name=sheet_name, file_name=str(row[0]), subdir=str(row[1]))
+
+
+def iter_rows_as_of(
+    conn: sqlite3.Connection,
+    scope: ArchiveScope,
+    cutoff: str,
+    *,
+    batch_rows: int = 5000,
+) -> Iterator[Dict[str, str]]:
+    """Тела строк, актуальных на ``cutoff``, в порядке версий (поток, без загрузки всей истории)."""
+    scope_params = (scope.sheet_name, scope.file_name, scope.subdir)
+    sql = f"""
+        WITH v AS (
+            SELECT row_key_hash, MAX(id) AS payload_id, blob_id, loaded_at
+            FROM {TABLE_PAYLOAD}
+            WHERE sheet_name = ? AND file_name = ? AND subdir = ? AND loaded_at <= ?
+            GROUP BY row_key_hash
+        ),
+        e AS (
+            SELECT row_key_hash, MAX(changed_at) AS changed_at, row_status
+            FROM (
+                SELECT row_key_hash, changed_at, row_status
+                FROM {TABLE_STATUS_LOG}
+                WHERE sheet_name = ? AND file_name = ? AND subdir = ? AND changed_at <= ?
+                UNION ALL
+                SELECT row_key_hash, inactive_since, 'inactive'
+                FROM {TABLE_CURRENT}
+                WHERE sheet_name = ? AND file_name = ? AND subdir = ?
+                  AND row_status = 'inactive' AND inactive_since <= ?
+            )
+            GROUP BY row_key_hash
+        )
+        SELECT b.codec, b.zdict_id, b.body
+        FROM v
+        JOIN {TABLE_BLOB} AS b ON b.id = v.blob_id
+        LEFT JOIN e ON e.row_key_hash = v.row_key_hash
+        WHERE e.row_key_hash IS NULL OR e.row_status = 'active' OR e.changed_at < v.loaded_at
+        ORDER BY v.payload_id
+    """
+    rows_cur = conn.cursor()
+    # Отдельный курсор для словарей: запросы читателя не сбрасывают поток строк
+    reader = PayloadReader(conn.cursor())
+    rows_cur.execute(sql, (*scope_params, cutoff) * 3)
+    while True:
+        batch = rows_cur.fetchmany(batch_rows)
+        if not batch:
+            break
+        for codec, zdict_id, body in batch:
+            yield reader.decode_row(codec, zdict_id, body)
+    rows_cur.close()
+
+
+def open_archive_for_query(db_path: str) -> sqlite3.Connection:
+    """
+    Подключение к БД архива v2 для запросов. Недостающие индексы и журнал статусов создаются
+    (идемпотентно); БД в старой схеме (``payload_json``) не переводится — нужен прогон main.
+    """
+    if not os.path.isfile(db_path):
+        raise FileNotFoundError(f"БД архива не найдена: {db_path}")
+    conn = sqlite3.connect(db_path, timeout=120.0)
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE_PAYLOAD,))
+    if cur.fetchone() is None:
+        conn.close()
+        raise ValueError(f"{db_path}: нет таблицы {TABLE_PAYLOAD} — это не построчный архив v2")
+    if needs_migration(cur, TABLE_PAYLOAD):
+        conn.close()
+        raise ValueError(f"{db_path}: архив в старой схеме (payload_json) — выполните прогон main.py для миграции")
+    _ensure_v2_schema(cur)
+    conn.commit()
+    return conn
+
+
+def reconstruct_sheet_as_of(
+    db_path: str,
+    sheet_name: str,
+    as_of: str,
+    *,
+    file_name: Optional[str] = None,
+    subdir: Optional[str] = None,
+) -> Tuple[pd.DataFrame, Optional[ArchiveScope]]:
+    """
+    Лист на дату ``as_of`` из архива ``db_path``: DataFrame (все колонки — строки, порядок колонок
+    по имени, как в теле архива) и файл, из которого он восстановлен (``None`` — данных на дату нет).
+    """
+    cutoff = parse_as_of(as_of)
+    conn = open_archive_for_query(db_path)
+    try:
+        scope = resolve_scope(conn.cursor(), sheet_name, cutoff, file_name=file_name, subdir=subdir)
+        if scope is None:
+            return pd.DataFrame(), None
+        df = pd.DataFrame.from_records(iter_rows_as_of(conn, scope, cutoff))
+        return df.astype(object), scope
+    finally:
+        conn.close()
+
+
+def resolve_block_archive(block: str, sheet_name: str, config_path: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """
+    БД архива и subdir листа для блока по конфигу прогона: ``archive_db_path`` записи input_files листа
+    или ``input_archive_sqlite.db_path`` (плейсхолдеры {BLOCK} подставлены). subdir — ``None``, если лист
+    в input_files блока не найден.
+    """
+    from src.block_runtime import resolve_block_placeholders
+    from src.config_loader import (
+        default_config_path,
+        get_input_files_for_block,
+        load_config_dict,
+        parse_input_files_by_block,
+        resolve_project_base_dir,
+    )
+    from src.input_archive_sqlite_v2 import merge_archive_v2_config
+
+    path = config_path or default_config_path()
+    cfg = load_config_dict(path)
+    base_dir = resolve_project_base_dir(path)
+    archive_cfg = resolve_block_placeholders(merge_archive_v2_config(cfg.get("input_archive_sqlite")), block)
+    db_rel = str(archive_cfg.get("db_path") or "OUT/DB/spod_input_archive_v2.sqlite")
+    subdir: Optional[str] = None
+    for fc in get_input_files_for_block(parse_input_files_by_block(cfg), block):
+        if str(fc.get("sheet", "")) != sheet_name:
+            continue
+        fc = resolve_block_placeholders(dict(fc), block)
+        db_rel = (fc.get("archive_db_path") or "").strip() or db_rel
+        subdir = (fc.get("subdir") or "").strip()
+        break
+    db_path = db_rel if os.path.isabs(db_rel) else os.path.join(base_dir, db_rel)
+    return db_path, subdir
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Лист из построчного архива входных CSV (v2) на дату.")
+    parser.add_argument("--block", default="PROM", help="Блок прогона (PROM / IFT / PSI): БД и subdir из конфига")
+    parser.add_argument("--sheet", required=True, help="Лист, как в input_files (например REPORT)")
+    parser.add_argument("--as-of", required=True, help="Дата ГГГГ-ММ-ДД (конец дня, UTC) или ISO-время")
+    parser.add_argument("--db", help="Путь к БД архива вместо пути из конфига")
+    parser.add_argument("--file", help="file_name в архиве (по умолчанию — файл последнего ingest листа на дату)")
+    parser.add_argument("--subdir", help="subdir в архиве (по умолчанию — из input_files блока)")
+    parser.add_argument("--config", help="Точка входа конфига (по умолчанию config/config.json)")
+    parser.add_argument("--out", help="Записать CSV (разделитель «;», UTF-8 с BOM, как входные файлы)")
+    args = parser.parse_args(argv)
+
+    block = str(args.block).strip().upper()
+    db_path, subdir = args.db, args.subdir
+    if not db_path or subdir is None:
+        cfg_db, cfg_subdir = resolve_block_archive(block, args.sheet, args.config)
+        db_path = db_path or cfg_db
+        subdir = subdir if subdir is not None else cfg_subdir
+    try:
+        df, scope = reconstruct_sheet_as_of(db_path, args.sheet, args.as_of, file_name=args.file, subdir=subdir)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    if scope is None:
+        print(f"Лист «{args.sheet}» на {args.as_of} в архиве {db_path} не найден", file=sys.stderr)
+        return 1
+    print(
+        f"«{scope.sheet_name}» на {args.as_of}: {len(df)} строк, файл «{scope.file_name}»"
+        + (f", subdir «{scope.subdir}»" if scope.subdir else "")
+    )
+    if args.out:
+        df.to_csv(args.out, sep=";", index=False, encoding="utf-8-sig")
+        print(f"Записано: {args.out}")
+    else:
+        with pd.option_context("display.max_columns", 20, "display.width", 200):
+            print(df.head(20).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,7 +7,8 @@ from __future__ import annotations
 
 import hashlib
 import json
-from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from json.encoder import encode_basestring
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 
 import pandas as pd
 
@@ -15,6 +16,8 @@ ROW_STATUS_ACTIVE = "active"
 ROW_STATUS_INACTIVE = "inactive"
 ROW_STATUS_SUPERSEDED = "superseded"
 
+_EMPTY_MARKERS = frozenset(("-", "None", "null"))
+
 
 def _norm_cell(value: Any) -> str:
     """Нормализация ячейки для хеша (как в плане: strip, пусто/NaN → '')."""
@@ -23,11 +26,24 @@ def _norm_cell(value: Any) -> str:
     if isinstance(value, float) and pd.isna(value):
         return ""
     s = str(value).strip()
-    if s in ("-", "None", "null"):
+    if s in _EMPTY_MARKERS:
         return ""
     return s
 
 
+def norm_column(values: Iterable[Any]) -> List[str]:
+    """``_norm_cell`` для всех значений колонки; для str — без вызова функции на ячейку."""
+    out: List[str] = []
+    append = out.append
+    for v in values:
+        if v.__class__ is str:
+            s = v.strip()
+            append("" if s in _EMPTY_MARKERS else s)
+        else:
+            append(_norm_cell(v))
+    return out
+
+
 def series_to_field_dict(row: pd.Series) -> Dict[str, str]:
     """Строка DataFrame → словарь имя_колонки → строка."""
     return {str(c): _norm_cell(row[c]) for c in row.index}
@@ -44,6 +60,26 @@ def canonical_json_object(fields: Mapping[str, str], keys: Sequence[str]) -> str
     return json.dumps(ordered, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
 
 
+def canonical_json_columns(
+    columns: Mapping[str, Sequence[str]],
+    keys: Sequence[str],
+    n_rows: int,
+) -> List[str]:
+    """
+    ``canonical_json_object`` для всех строк сразу по нормализованным колонкам:
+    строка JSON собирается из заранее закодированных фрагментов «"имя":"значение"»
+    (тот же ``encode_basestring``, что у ``json.dumps(ensure_ascii=False)``) — байт в байт.
+    """
+    names = [k for k in sorted(set(keys)) if k in columns]
+    if not names:
+        return ["{}"] * n_rows
+    parts: List[List[str]] = []
+    for i, name in enumerate(names):
+        prefix = ("{" if i == 0 else ",") + encode_basestring(name) + ":"
+        parts.append([prefix + encode_basestring(v) for v in columns[name]])
+    return ["".join(t) + "}" for t in zip(*parts)]
+
+
 def sha256_hex(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
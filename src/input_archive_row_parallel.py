@@ -1,27 +1,46 @@
 # -*- coding: utf-8 -*-
 """
-Параллельный расчёт хешей строк и классификация new / unchanged / changed (архив v2).
+Параллельный расчёт хешей строк архива v2 (классификация new / unchanged / changed — в SQLite,
+``input_archive_sqlite_v2``; здесь только её константы).
+
+Режимы хеширования (``parallel_row_processing.hash_mode``):
+
+- ``columnar`` — нормализация и канонический JSON по колонкам DataFrame, SHA-256 чанками;
+  воркерам передаётся общий буфер байтов (``multiprocessing.shared_memory``), а не словари строк.
+  Хеши совпадают с ``rows`` байт в байт; кадры, где это не гарантировано (не все колонки
+  object, повторяющиеся имена колонок), считаются построчно.
+- ``rows`` — словарь полей на строку (``dataframe_to_row_dicts``) и pickle чанков в воркеры.
 """
 
 from __future__ import annotations
 
+import hashlib
 import os
 from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from multiprocessing import shared_memory
 from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
 
+import numpy as np
+import pandas as pd
+
 from src.input_archive_row_hash import (
+    canonical_json_columns,
     compute_row_hash,
     compute_row_key,
+    norm_column,
     series_to_field_dict,
 )
 
-# Типы для классификации
+# Классы строк при сравнении с БД
 CLASS_NEW = "new"
 CLASS_UNCHANGED = "unchanged"
 CLASS_CHANGED = "changed"
 CLASS_DUPLICATE_KEY = "duplicate_key"
 
+HASH_MODE_COLUMNAR = "columnar"
+HASH_MODE_ROWS = "rows"
+
 
 @dataclass
 class RowHashRecord:
@@ -35,16 +54,6 @@ class RowHashRecord:
     error: str = ""
 
 
-@dataclass
-class ClassifiedRow:
-    """Строка после сравнения с БД."""
-
-    record: RowHashRecord
-    kind: str
-    existing_payload_id: Optional[int] = None
-    existing_row_hash: Optional[str] = None
-
-
 def _resolve_workers(cfg: Mapping[str, Any]) -> int:
     raw = int(cfg.get("max_workers") or 0)
     if raw > 0:
@@ -60,9 +69,15 @@ def merge_parallel_config(raw: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
         "max_workers": 0,
         "chunk_size": 2000,
         "min_rows_for_parallel": 500,
+        "hash_mode": HASH_MODE_COLUMNAR,
     }
     if isinstance(raw, dict):
         base.update(raw)
+    if base.get("hash_mode") not in (HASH_MODE_COLUMNAR, HASH_MODE_ROWS):
+        raise ValueError(
+            f"parallel_row_processing.hash_mode: ожидается {HASH_MODE_COLUMNAR!r} или "
+            f"{HASH_MODE_ROWS!r}, получено {base.get('hash_mode')!r}"
+        )
     return base
 
 
@@ -112,41 +127,6 @@ def _compute_chunk_worker(args: Tuple) -> List[RowHashRecord]:
     return out
 
 
-def _classify_chunk_worker(args: Tuple) -> List[ClassifiedRow]:
-    """Воркер классификации: (records_dicts, existing_map)."""
-    records_data, existing_map = args
-    classified: List[ClassifiedRow] = []
-    for rd in records_data:
-        rec = RowHashRecord(**rd)
-        if not rec.row_key_hash or rec.error:
-            classified.append(ClassifiedRow(record=rec, kind=CLASS_NEW))
-            continue
-        prev = existing_map.get(rec.row_key_hash)
-        if prev is None:
-            classified.append(ClassifiedRow(record=rec, kind=CLASS_NEW))
-            continue
-        prev_hash, prev_pid = prev
-        if prev_hash == rec.row_hash:
-            classified.append(
-                ClassifiedRow(
-                    record=rec,
-                    kind=CLASS_UNCHANGED,
-                    existing_payload_id=prev_pid,
-                    existing_row_hash=prev_hash,
-                )
-            )
-        else:
-            classified.append(
-                ClassifiedRow(
-                    record=rec,
-                    kind=CLASS_CHANGED,
-                    existing_payload_id=prev_pid,
-                    existing_row_hash=prev_hash,
-                )
-            )
-    return classified
-
-
 def dataframe_to_row_dicts(df) -> List[Dict[str, str]]:
     """DataFrame → список словарей полей (для picklable воркеров)."""
     rows: List[Dict[str, str]] = []
@@ -188,78 +168,120 @@ def compute_row_hashes_parallel(
     return merged
 
 
-def dedupe_by_key_last_wins(records: List[RowHashRecord]) -> Tuple[List[RowHashRecord], int]:
+def _hash_segments_worker(args: Tuple) -> List[str]:
     """
-    Дубликаты row_key_hash в одном файле: последняя строка побеждает.
-    Возвращает (уникальные записи, число предупреждений о дубликатах).
+    Воркер: (имя shared memory, число сегментов, начало, конец).
+    Буфер: смещения int64 (n + 1), затем байты сегментов подряд; результат — hex SHA-256 сегментов [a, b).
     """
-    by_key: Dict[str, RowHashRecord] = {}
-    dup_count = 0
-    for rec in sorted(records, key=lambda r: r.row_index):
-        if not rec.row_key_hash:
-            continue
-        if rec.row_key_hash in by_key:
-            dup_count += 1
-        by_key[rec.row_key_hash] = rec
-    return list(by_key.values()), dup_count
+    shm_name, n_segments, a, b = args
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        header = (n_segments + 1) * 8
+        offsets = np.ndarray((n_segments + 1,), dtype=np.int64, buffer=shm.buf)
+        offs = offsets[a : b + 1].tolist()
+        del offsets
+        buf = shm.buf
+        out = [
+            hashlib.sha256(buf[header + offs[i] : header + offs[i + 1]]).hexdigest()
+            for i in range(b - a)
+        ]
+        del buf
+    finally:
+        shm.close()
+    return out
 
 
-def classify_rows_parallel(
-    records: List[RowHashRecord],
-    existing_map: Dict[str, Tuple[str, Optional[int]]],
+def _sha256_segments(segments: List[bytes], cfg: Mapping[str, Any]) -> List[str]:
+    """SHA-256 списка байтовых строк; при большом объёме — воркеры читают общий буфер."""
+    n = len(segments)
+    workers = _resolve_workers(cfg)
+    use_pool = (
+        bool(cfg.get("enabled", True))
+        and n >= 2 * int(cfg.get("min_rows_for_parallel") or 500)
+        and workers > 1
+    )
+    if not use_pool:
+        return [hashlib.sha256(seg).hexdigest() for seg in segments]
+    lengths = np.fromiter((len(seg) for seg in segments), dtype=np.int64, count=n)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    header = (n + 1) * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(1, header + int(offsets[-1])))
+    try:
+        shm.buf[:header] = offsets.tobytes()
+        shm.buf[header : header + int(offsets[-1])] = b"".join(segments)
+        chunk_size = max(1, int(cfg.get("chunk_size") or 2000))
+        tasks = [(shm.name, n, a, b) for a, b in _chunk_indices(n, chunk_size)]
+        out: List[str] = []
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            for part in ex.map(_hash_segments_worker, tasks, chunksize=1):
+                out.extend(part)
+        return out
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def compute_row_hashes_columnar(
+    df: pd.DataFrame,
+    key_columns: Sequence[str],
+    hash_columns: Optional[Sequence[str]],
     parallel_cfg: Mapping[str, Any],
-) -> List[ClassifiedRow]:
+) -> Optional[List[RowHashRecord]]:
     """
-    Сравнение с картой из БД: key_hash → (row_hash, payload_id).
-    existing_map picklable (plain dict).
+    Те же записи, что ``compute_row_hashes_parallel(dataframe_to_row_dicts(df), …)``, без словарей
+    на этапе хеширования. None — кадр не подходит для колоночного режима (см. docstring модуля).
     """
+    names = [str(c) for c in df.columns]
+    if len(set(names)) != len(names) or not all(dt == object for dt in df.dtypes):
+        return None
     cfg = merge_parallel_config(parallel_cfg)
-    n = len(records)
+    n = len(df)
     if n == 0:
         return []
-    chunk_size = max(1, int(cfg.get("chunk_size") or 2000))
-    min_parallel = int(cfg.get("min_rows_for_parallel") or 500)
-    use_pool = bool(cfg.get("enabled", True)) and n >= min_parallel
-    chunks = _chunk_indices(n, chunk_size)
-
-    def _rec_to_dict(r: RowHashRecord) -> Dict[str, Any]:
-        return {
-            "row_index": r.row_index,
-            "row_key_hash": r.row_key_hash,
-            "row_key_json": r.row_key_json,
-            "row_hash": r.row_hash,
-            "fields": r.fields,
-            "error": r.error,
-        }
-
-    tasks = [
-        ([_rec_to_dict(records[i]) for i in range(a, b)], existing_map)
-        for a, b in chunks
+    columns: Dict[str, List[str]] = {
+        name: norm_column(df.iloc[:, i].to_numpy()) for i, name in enumerate(names)
+    }
+    if names:
+        fields_list = [dict(zip(names, values)) for values in zip(*columns.values())]
+    else:
+        fields_list = [{} for _ in range(n)]
+
+    missing = [c for c in key_columns if c not in columns]
+    if missing:
+        err = f"отсутствуют колонки ключа: {missing[:5]}"
+        return [
+            RowHashRecord(row_index=i, row_key_hash="", row_key_json="", row_hash="", fields=fields, error=err)
+            for i, fields in enumerate(fields_list)
+        ]
+    key_jsons = canonical_json_columns(columns, key_columns, n)
+    body_jsons = canonical_json_columns(columns, names if hash_columns is None else hash_columns, n)
+    digests = _sha256_segments(
+        [s.encode("utf-8") for s in key_jsons] + [s.encode("utf-8") for s in body_jsons], cfg
+    )
+    return [
+        RowHashRecord(
+            row_index=i,
+            row_key_hash=digests[i],
+            row_key_json=key_jsons[i],
+            row_hash=digests[n + i],
+            fields=fields_list[i],
+        )
+        for i in range(n)
     ]
-    if not use_pool:
-        merged: List[ClassifiedRow] = []
-        for t in tasks:
-            merged.extend(_classify_chunk_worker(t))
-        return merged
-    workers = _resolve_workers(cfg)
-    merged = []
-    with ProcessPoolExecutor(max_workers=workers) as ex:
-        for part in ex.map(_classify_chunk_worker, tasks, chunksize=1):
-            merged.extend(part)
-    return merged
 
 
-def count_by_kind(classified: List[ClassifiedRow]) -> Dict[str, int]:
-    """Счётчики new / unchanged / changed / errors."""
-    stats = {"new": 0, "unchanged": 0, "changed": 0, "key_errors": 0, "inactive_marked": 0}
-    for c in classified:
-        if c.record.error or not c.record.row_key_hash:
-            stats["key_errors"] += 1
+def dedupe_by_key_last_wins(records: List[RowHashRecord]) -> Tuple[List[RowHashRecord], int]:
+    """
+    Дубликаты row_key_hash в одном файле: последняя строка побеждает.
+    Возвращает (уникальные записи, число предупреждений о дубликатах).
+    """
+    by_key: Dict[str, RowHashRecord] = {}
+    dup_count = 0
+    for rec in sorted(records, key=lambda r: r.row_index):
+        if not rec.row_key_hash:
             continue
-        if c.kind == CLASS_NEW:
-            stats["new"] += 1
-        elif c.kind == CLASS_UNCHANGED:
-            stats["unchanged"] += 1
-        elif c.kind == CLASS_CHANGED:
-            stats["changed"] += 1
-    return stats
+        if rec.row_key_hash in by_key:
+            dup_count += 1
+        by_key[rec.row_key_hash] = rec
+    return list(by_key.values()), dup_count
@@ -50,6 +50,8 @@ def _defaults_cfg() -> Dict[str, Any]:
         # Если на диске снова тот же контент, что уже был в historical-снимке — не создавать новый arch_*,
         # а вернуть тот снимок в latest (см. _find_snapshot_id_by_content_sha256 / _reactivate_snapshot_as_latest).
         "reuse_matching_historical_snapshot": True,
+        # Запись архива отдельным процессом параллельно пайплайну блока (src/input_archive_background.py)
+        "background": False,
         "system_columns": {
             "snapshot_id": "__snapshot_id",
             "row_index": "__row_ix",
@@ -282,13 +284,30 @@ def _backfill_inventory_from_snapshots(cur: sqlite3.Cursor) -> None:
     )
 
 
+# SHA-256 файлов за прогон: (абсолютный путь, mtime_ns, размер) → hex. Один и тот же CSV хешируется
+# кэшем разбора (этап 01) и архивом v1/v2 — читаем байты один раз.
+_FILE_SHA_MEMO: Dict[Tuple[str, int, int], str] = {}
+
+
 def _hash_file(path: str) -> str:
-    """SHA-256 содержимого файла на диске (сырые байты CSV)."""
+    """SHA-256 содержимого файла на диске (сырые байты CSV); повторный вызов для неизменённого файла — из памяти."""
+    try:
+        st = os.stat(path)
+        memo_key: Optional[Tuple[str, int, int]] = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    except OSError:
+        memo_key = None
+    if memo_key is not None:
+        cached = _FILE_SHA_MEMO.get(memo_key)
+        if cached is not None:
+            return cached
     sha = hashlib.sha256()
     with open(path, "rb") as f:
         for chunk in iter(lambda: f.read(1024 * 1024), b""):
             sha.update(chunk)
-    return sha.hexdigest()
+    digest = sha.hexdigest()
+    if memo_key is not None:
+        _FILE_SHA_MEMO[memo_key] = digest
+    return digest
 
 
 def _normalize_sha256_hex(value: Optional[Any]) -> Optional[str]:
@@ -621,6 +640,8 @@ def run_input_archive_sqlite(
     conn = sqlite3.connect(db_path, timeout=60.0)
     conn.row_factory = sqlite3.Row
     try:
+        # Действует только на новую БД; существующую переводит разовый VACUUM обслуживания архива
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
         conn.execute("PRAGMA journal_mode=WAL")
         conn.execute("PRAGMA synchronous=NORMAL")
         cur = conn.cursor()
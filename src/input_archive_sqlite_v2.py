@@ -14,7 +14,7 @@ import time
 import uuid
 from collections import defaultdict
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Sequence
 
 import pandas as pd
 
@@ -24,15 +24,25 @@ from src.input_archive_row_parallel import (
     CLASS_CHANGED,
     CLASS_NEW,
     CLASS_UNCHANGED,
-    ClassifiedRow,
-    classify_rows_parallel,
+    HASH_MODE_COLUMNAR,
+    RowHashRecord,
+    compute_row_hashes_columnar,
     compute_row_hashes_parallel,
-    count_by_kind,
     dataframe_to_row_dicts,
     dedupe_by_key_last_wins,
     merge_parallel_config,
 )
 from src.csv_headers import resolve_columns_in_dataframe
+from src.input_archive_payload_store import (
+    TABLE_BLOB,
+    content_hash_of,
+    ensure_payload_store_schema,
+    insert_blobs,
+    merge_payload_store_config,
+    migrate_payload_store,
+    needs_migration,
+    payload_to_json,
+)
 from src.input_archive_sqlite import (
     _archive_reporting_modes,
     _hash_file,
@@ -45,45 +55,12 @@ TABLE_CURRENT = "archive_row_current"
 TABLE_PAYLOAD = "archive_row_payload"
 TABLE_INGEST_RUN = "archive_ingest_run"
 TABLE_FILE_INVENTORY = "archive_file_row_inventory"
-SCHEMA_VERSION = 2
-# Лимит bind-параметров SQLite (по умолчанию 999); запас под фиксированные ? в запросе.
-_SQLITE_IN_CHUNK_SIZE = 900
-
-
-def _execute_updates_by_row_key_hashes(
-    cur: sqlite3.Cursor,
-    row_key_hashes: Sequence[str],
-    *,
-    sheet_name: str,
-    file_name: str,
-    subdir: str,
-    row_status: str,
-    inactive_since: Optional[str],
-    last_loaded_at: str,
-) -> None:
-    """UPDATE archive_row_current батчами, чтобы не превысить лимит SQL-переменных."""
-    if not row_key_hashes:
-        return
-    base_params: List[Any] = [
-        row_status,
-        inactive_since,
-        last_loaded_at,
-        sheet_name,
-        file_name,
-        subdir,
-    ]
-    for i in range(0, len(row_key_hashes), _SQLITE_IN_CHUNK_SIZE):
-        chunk = row_key_hashes[i : i + _SQLITE_IN_CHUNK_SIZE]
-        placeholders = ",".join("?" * len(chunk))
-        cur.execute(
-            f"""
-            UPDATE {TABLE_CURRENT}
-            SET row_status = ?, inactive_since = ?, last_loaded_at = ?
-            WHERE sheet_name = ? AND file_name = ? AND subdir = ?
-              AND row_key_hash IN ({placeholders})
-            """,
-            [*base_params, *chunk],
-        )
+# Переходы active ↔ inactive без новой версии тела (для восстановления состояния на дату)
+TABLE_STATUS_LOG = "archive_row_status_log"
+SCHEMA_VERSION = 3
+# Временная таблица строк загружаемого файла (connection-local, в temp-схеме)
+TABLE_STAGE = "archive_row_stage"
+TABLE_STAGE_PAYLOAD = "archive_row_stage_payload"
 
 
 def _defaults_row_level() -> Dict[str, Any]:
@@ -98,9 +75,11 @@ def _defaults_row_level() -> Dict[str, Any]:
             "max_workers": 0,
             "chunk_size": 2000,
             "min_rows_for_parallel": 500,
+            "hash_mode": HASH_MODE_COLUMNAR,
         },
         "skip_ingest_if_file_unchanged": True,
         "default_row_key_by_sheet": {},
+        "payload_store": merge_payload_store_config(None),
     }
 
 
@@ -116,6 +95,8 @@ def merge_archive_v2_config(raw: Optional[Dict[str, Any]]) -> Dict[str, Any]:
             cfg["parallel_row_processing"] = merge_parallel_config(
                 {**row_defaults["parallel_row_processing"], **raw["parallel_row_processing"]}
             )
+        if isinstance(raw.get("payload_store"), dict):
+            cfg["payload_store"] = merge_payload_store_config(raw["payload_store"])
         if "default_row_key_by_sheet" in raw and isinstance(raw["default_row_key_by_sheet"], dict):
             cfg["default_row_key_by_sheet"] = dict(raw["default_row_key_by_sheet"])
         for k in ("row_level_archive", "schema_version", "legacy_db_path", "row_hash_columns", "skip_ingest_if_file_unchanged"):
@@ -152,6 +133,29 @@ def resolve_row_key_columns(
     return None
 
 
+def _payload_table_sql() -> List[str]:
+    """Таблица версий тела строки (тело — в archive_row_blob по blob_id) и её индекс."""
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_PAYLOAD} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sheet_name TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            subdir TEXT NOT NULL DEFAULT '',
+            row_key_hash TEXT NOT NULL,
+            row_hash TEXT NOT NULL,
+            loaded_at TEXT NOT NULL,
+            source_file TEXT,
+            blob_id INTEGER
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS idx_{TABLE_PAYLOAD}_sheet_key "
+        f"ON {TABLE_PAYLOAD}(sheet_name, file_name, subdir, row_key_hash, row_hash)",
+        f"CREATE INDEX IF NOT EXISTS idx_{TABLE_PAYLOAD}_scope_loaded "
+        f"ON {TABLE_PAYLOAD}(sheet_name, file_name, subdir, loaded_at)",
+    ]
+
+
 def _ensure_v2_schema(cur: sqlite3.Cursor) -> None:
     cur.execute(
         f"""
@@ -169,28 +173,34 @@ def _ensure_v2_schema(cur: sqlite3.Cursor) -> None:
             last_loaded_at TEXT NOT NULL,
             inactive_since TEXT,
             payload_id INTEGER,
+            blob_id INTEGER,
             PRIMARY KEY (sheet_name, file_name, subdir, row_key_hash)
         )
         """
     )
+    cur.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{TABLE_CURRENT}_scope_inactive "
+        f"ON {TABLE_CURRENT}(sheet_name, file_name, subdir, row_status, inactive_since)"
+    )
+    for sql in _payload_table_sql():
+        cur.execute(sql)
+    ensure_payload_store_schema(cur)
     cur.execute(
         f"""
-        CREATE TABLE IF NOT EXISTS {TABLE_PAYLOAD} (
+        CREATE TABLE IF NOT EXISTS {TABLE_STATUS_LOG} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             sheet_name TEXT NOT NULL,
             file_name TEXT NOT NULL,
             subdir TEXT NOT NULL DEFAULT '',
             row_key_hash TEXT NOT NULL,
-            row_hash TEXT NOT NULL,
-            loaded_at TEXT NOT NULL,
-            source_file TEXT,
-            payload_json TEXT NOT NULL
+            row_status TEXT NOT NULL,
+            changed_at TEXT NOT NULL
         )
         """
     )
     cur.execute(
-        f"CREATE INDEX IF NOT EXISTS idx_{TABLE_PAYLOAD}_sheet_key "
-        f"ON {TABLE_PAYLOAD}(sheet_name, file_name, subdir, row_key_hash, row_hash)"
+        f"CREATE INDEX IF NOT EXISTS idx_{TABLE_STATUS_LOG}_scope_changed "
+        f"ON {TABLE_STATUS_LOG}(sheet_name, file_name, subdir, changed_at)"
     )
     cur.execute(
         f"""
@@ -229,29 +239,6 @@ def _ensure_v2_schema(cur: sqlite3.Cursor) -> None:
     )
 
 
-def _load_existing_map(
-    cur: sqlite3.Cursor,
-    sheet_name: str,
-    file_name: str,
-    subdir: str,
-) -> Dict[str, Tuple[str, Optional[int]]]:
-    """Активные и неактивные строки листа+файла: key_hash → (row_hash, payload_id)."""
-    cur.execute(
-        f"""
-        SELECT row_key_hash, row_hash, payload_id
-        FROM {TABLE_CURRENT}
-        WHERE sheet_name = ? AND file_name = ? AND subdir = ?
-          AND row_status IN ('active', 'inactive')
-        """,
-        (sheet_name, file_name, subdir),
-    )
-    out: Dict[str, Tuple[str, Optional[int]]] = {}
-    for row in cur.fetchall():
-        kh = str(row[0])
-        out[kh] = (str(row[1]), row[2] if row[2] is not None else None)
-    return out
-
-
 def _get_file_inventory_sha(
     cur: sqlite3.Cursor,
     sheet_name: str,
@@ -295,42 +282,236 @@ def _upsert_file_inventory(
     )
 
 
-def _insert_payload(
+def _load_stage(cur: sqlite3.Cursor, records: Sequence[RowHashRecord]) -> None:
+    """
+    Ключи и хеши строк файла (только с валидным ключом) — во временную таблицу одним executemany;
+    ``pos`` — индекс записи в ``records``. Ссылки на тела — позже, только для new/changed.
+    """
+    cur.execute(
+        f"""
+        CREATE TEMP TABLE IF NOT EXISTS {TABLE_STAGE} (
+            pos INTEGER PRIMARY KEY,
+            row_key_hash TEXT NOT NULL UNIQUE,
+            row_key_json TEXT NOT NULL,
+            row_hash TEXT NOT NULL,
+            kind TEXT,
+            payload_id INTEGER
+        )
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TEMP TABLE IF NOT EXISTS {TABLE_STAGE_PAYLOAD} (
+            pos INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            blob_id INTEGER
+        )
+        """
+    )
+    cur.execute(f"DELETE FROM temp.{TABLE_STAGE}")
+    cur.execute(f"DELETE FROM temp.{TABLE_STAGE_PAYLOAD}")
+    cur.executemany(
+        f"""
+        INSERT INTO temp.{TABLE_STAGE} (pos, row_key_hash, row_key_json, row_hash)
+        VALUES (?, ?, ?, ?)
+        """,
+        ((pos, r.row_key_hash, r.row_key_json, r.row_hash) for pos, r in enumerate(records)),
+    )
+
+
+def _classify_stage(
     cur: sqlite3.Cursor,
     sheet_name: str,
     file_name: str,
     subdir: str,
-    row_key_hash: str,
-    row_hash: str,
-    loaded_at: str,
-    source_file: str,
-    payload_json: str,
-) -> int:
+) -> Dict[str, int]:
+    """new / changed / unchanged по archive_row_current (активные и неактивные ключи); счётчики по видам."""
     cur.execute(
         f"""
-        INSERT INTO {TABLE_PAYLOAD} (
-            sheet_name, file_name, subdir, row_key_hash, row_hash,
-            loaded_at, source_file, payload_json
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        UPDATE temp.{TABLE_STAGE}
+        SET kind = COALESCE(
+            (
+                SELECT CASE WHEN c.row_hash = {TABLE_STAGE}.row_hash THEN '{CLASS_UNCHANGED}' ELSE '{CLASS_CHANGED}' END
+                FROM {TABLE_CURRENT} AS c
+                WHERE c.sheet_name = ? AND c.file_name = ? AND c.subdir = ?
+                  AND c.row_key_hash = {TABLE_STAGE}.row_key_hash
+                  AND c.row_status IN ('active', 'inactive')
+            ),
+            '{CLASS_NEW}'
+        )
         """,
+        (sheet_name, file_name, subdir),
+    )
+    counts = {CLASS_NEW: 0, CLASS_CHANGED: 0, CLASS_UNCHANGED: 0}
+    cur.execute(f"SELECT kind, COUNT(*) FROM temp.{TABLE_STAGE} GROUP BY kind")
+    for kind, n in cur.fetchall():
+        counts[str(kind)] = int(n)
+    return counts
+
+
+def _fill_stage_payloads(
+    cur: sqlite3.Cursor,
+    records: Sequence[RowHashRecord],
+    *,
+    sheet_name: str,
+    content_is_row_hash: bool,
+    store_cfg: Mapping[str, Any],
+    now_utc: str,
+) -> int:
+    """
+    Ссылки new/changed строк на тела в archive_row_blob: ключ содержимого каждой строки во временную
+    таблицу, в хранилище — только тела, которых там ещё нет (JSON и сжатие — один раз на содержимое).
+    Возвращает число новых blob.
+    """
+    cur.execute(
+        f"SELECT pos FROM temp.{TABLE_STAGE} WHERE kind IN ('{CLASS_NEW}', '{CLASS_CHANGED}') ORDER BY pos"
+    )
+    positions = [int(r[0]) for r in cur.fetchall()]
+    cur.executemany(
+        f"INSERT INTO temp.{TABLE_STAGE_PAYLOAD} (pos, content_hash) VALUES (?, ?)",
         (
-            sheet_name,
-            file_name,
-            subdir,
-            row_key_hash,
-            row_hash,
-            loaded_at,
-            source_file,
-            payload_json,
+            (pos, records[pos].row_hash if content_is_row_hash else content_hash_of(records[pos].fields))
+            for pos in positions
         ),
     )
-    return int(cur.lastrowid)
-
+    cur.execute(
+        f"""
+        SELECT content_hash, MIN(pos) FROM temp.{TABLE_STAGE_PAYLOAD}
+        WHERE content_hash NOT IN (SELECT content_hash FROM {TABLE_BLOB})
+        GROUP BY content_hash
+        ORDER BY MIN(pos)
+        """
+    )
+    missing = [(str(h), payload_to_json(records[int(pos)].fields)) for h, pos in cur.fetchall()]
+    n_blobs = insert_blobs(cur, sheet_name, missing, store_cfg, now_utc)
+    cur.execute(
+        f"""
+        UPDATE temp.{TABLE_STAGE_PAYLOAD}
+        SET blob_id = (
+            SELECT b.id FROM {TABLE_BLOB} AS b WHERE b.content_hash = {TABLE_STAGE_PAYLOAD}.content_hash
+        )
+        """
+    )
+    return n_blobs
 
-def _fields_to_json(fields: Dict[str, str]) -> str:
-    import json
 
-    return json.dumps(fields, ensure_ascii=False, sort_keys=True)
+def _apply_stage(
+    cur: sqlite3.Cursor,
+    *,
+    sheet_name: str,
+    file_name: str,
+    subdir: str,
+    source_file: str,
+    source_path: str,
+    now_utc: str,
+) -> int:
+    """
+    Запись классифицированного staging в архив набором INSERT … SELECT / UPDATE:
+    тела новых и изменённых строк, upsert текущего состояния, отметка неизменённых,
+    снятие с учёта активных ключей, которых нет в файле. Возвращает число снятых с учёта.
+    Возврат неизменённой строки и снятие с учёта пишутся в archive_row_status_log.
+    """
+    scope = (sheet_name, file_name, subdir)
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {TABLE_PAYLOAD}")
+    max_payload_id = int(cur.fetchone()[0])
+    cur.execute(
+        f"""
+        INSERT INTO {TABLE_PAYLOAD} (
+            sheet_name, file_name, subdir, row_key_hash, row_hash,
+            loaded_at, source_file, blob_id
+        )
+        SELECT ?, ?, ?, s.row_key_hash, s.row_hash, ?, ?, b.blob_id
+        FROM temp.{TABLE_STAGE} AS s
+        JOIN temp.{TABLE_STAGE_PAYLOAD} AS b ON b.pos = s.pos
+        ORDER BY s.pos
+        """,
+        (*scope, now_utc, source_file),
+    )
+    cur.execute(
+        f"""
+        UPDATE temp.{TABLE_STAGE}
+        SET payload_id = (
+            SELECT p.id FROM {TABLE_PAYLOAD} AS p
+            WHERE p.sheet_name = ? AND p.file_name = ? AND p.subdir = ?
+              AND p.row_key_hash = {TABLE_STAGE}.row_key_hash AND p.id > ?
+        )
+        WHERE kind IN ('{CLASS_NEW}', '{CLASS_CHANGED}')
+        """,
+        (*scope, max_payload_id),
+    )
+    cur.execute(
+        f"""
+        INSERT INTO {TABLE_CURRENT} (
+            sheet_name, file_name, subdir, row_key_hash, row_key_json, row_hash,
+            row_status, source_file, source_path, first_seen_at, last_loaded_at,
+            inactive_since, payload_id, blob_id
+        )
+        SELECT ?, ?, ?, s.row_key_hash, s.row_key_json, s.row_hash, ?, ?, ?, ?, ?, NULL, s.payload_id, b.blob_id
+        FROM temp.{TABLE_STAGE} AS s
+        JOIN temp.{TABLE_STAGE_PAYLOAD} AS b ON b.pos = s.pos
+        WHERE s.kind IN ('{CLASS_NEW}', '{CLASS_CHANGED}')
+        ON CONFLICT(sheet_name, file_name, subdir, row_key_hash) DO UPDATE SET
+            row_key_json = excluded.row_key_json,
+            row_hash = excluded.row_hash,
+            row_status = 'active',
+            source_file = excluded.source_file,
+            source_path = excluded.source_path,
+            last_loaded_at = excluded.last_loaded_at,
+            inactive_since = NULL,
+            payload_id = excluded.payload_id,
+            blob_id = excluded.blob_id
+        """,
+        (*scope, ROW_STATUS_ACTIVE, source_file, source_path, now_utc, now_utc),
+    )
+    cur.execute(
+        f"""
+        INSERT INTO {TABLE_STATUS_LOG} (sheet_name, file_name, subdir, row_key_hash, row_status, changed_at)
+        SELECT c.sheet_name, c.file_name, c.subdir, c.row_key_hash, ?, ?
+        FROM {TABLE_CURRENT} AS c
+        JOIN temp.{TABLE_STAGE} AS s ON s.row_key_hash = c.row_key_hash
+        WHERE c.sheet_name = ? AND c.file_name = ? AND c.subdir = ?
+          AND c.row_status = 'inactive' AND s.kind = '{CLASS_UNCHANGED}'
+        """,
+        (ROW_STATUS_ACTIVE, now_utc, *scope),
+    )
+    cur.execute(
+        f"""
+        UPDATE {TABLE_CURRENT}
+        SET last_loaded_at = ?, source_file = ?, source_path = ?,
+            row_status = 'active', inactive_since = NULL
+        WHERE sheet_name = ? AND file_name = ? AND subdir = ?
+          AND row_key_hash IN (
+              SELECT row_key_hash FROM temp.{TABLE_STAGE} WHERE kind = '{CLASS_UNCHANGED}'
+          )
+        """,
+        (now_utc, source_file, source_path, *scope),
+    )
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM temp.{TABLE_STAGE})")
+    if not cur.fetchone()[0]:
+        # Файл без валидных ключей — активные строки не снимаем
+        return 0
+    cur.execute(
+        f"""
+        INSERT INTO {TABLE_STATUS_LOG} (sheet_name, file_name, subdir, row_key_hash, row_status, changed_at)
+        SELECT sheet_name, file_name, subdir, row_key_hash, ?, ?
+        FROM {TABLE_CURRENT}
+        WHERE sheet_name = ? AND file_name = ? AND subdir = ?
+          AND row_status = 'active'
+          AND row_key_hash NOT IN (SELECT row_key_hash FROM temp.{TABLE_STAGE})
+        """,
+        (ROW_STATUS_INACTIVE, now_utc, *scope),
+    )
+    cur.execute(
+        f"""
+        UPDATE {TABLE_CURRENT}
+        SET row_status = ?, inactive_since = ?, last_loaded_at = ?
+        WHERE sheet_name = ? AND file_name = ? AND subdir = ?
+          AND row_status = 'active'
+          AND row_key_hash NOT IN (SELECT row_key_hash FROM temp.{TABLE_STAGE})
+        """,
+        (ROW_STATUS_INACTIVE, now_utc, now_utc, *scope),
+    )
+    return int(cur.rowcount)
 
 
 def _ingest_one_file(
@@ -382,14 +563,21 @@ def _ingest_one_file(
                 "db_sec": 0.0,
             }
 
-    row_dicts = dataframe_to_row_dicts(df_raw)
+    # Время хеширования включает подготовку строк (словари или колонки) — режимы сравнимы
     t_hash_start = time.perf_counter()
-    records = compute_row_hashes_parallel(
-        row_dicts, row_key_columns, hash_cols_list, parallel_cfg
-    )
+    records: Optional[List[RowHashRecord]] = None
+    if merge_parallel_config(parallel_cfg).get("hash_mode") == HASH_MODE_COLUMNAR:
+        records = compute_row_hashes_columnar(df_raw, row_key_columns, hash_cols_list, parallel_cfg)
+    if records is None:
+        row_dicts = dataframe_to_row_dicts(df_raw)
+        records = compute_row_hashes_parallel(
+            row_dicts, row_key_columns, hash_cols_list, parallel_cfg
+        )
     hash_sec = time.perf_counter() - t_hash_start
 
+    key_errors = sum(1 for r in records if r.error or not r.row_key_hash)
     records, dup_warnings = dedupe_by_key_last_wins(records)
+    records = [r for r in records if r.row_key_hash and not r.error]
     if dup_warnings:
         logging.warning(
             "[archive_v2] «%s» / %s: дубликаты ключа строки (%s), политика last-wins",
@@ -398,122 +586,30 @@ def _ingest_one_file(
             dup_warnings,
         )
 
-    key_set: Set[str] = {r.row_key_hash for r in records if r.row_key_hash}
-
-    existing_map = _load_existing_map(cur, sheet_name, file_name, subdir)
+    # Staging: строки файла во временной таблице, сравнение с archive_row_current — одним запросом
     t_cmp_start = time.perf_counter()
-    classified = classify_rows_parallel(records, existing_map, parallel_cfg)
+    _load_stage(cur, records)
+    counts = _classify_stage(cur, sheet_name, file_name, subdir)
     compare_sec = time.perf_counter() - t_cmp_start
 
     t_db_start = time.perf_counter()
-    counts = count_by_kind(classified)
-    new_rows: List[ClassifiedRow] = []
-    changed_rows: List[ClassifiedRow] = []
-    unchanged_rows: List[ClassifiedRow] = []
-    for c in classified:
-        if c.record.error or not c.record.row_key_hash:
-            continue
-        if c.kind == CLASS_NEW:
-            new_rows.append(c)
-        elif c.kind == CLASS_CHANGED:
-            changed_rows.append(c)
-        elif c.kind == CLASS_UNCHANGED:
-            unchanged_rows.append(c)
-
-    for c in new_rows + changed_rows:
-        rec = c.record
-        pid = _insert_payload(
-            cur,
-            sheet_name,
-            file_name,
-            subdir,
-            rec.row_key_hash,
-            rec.row_hash,
-            now_utc,
-            source_file_label,
-            _fields_to_json(rec.fields),
-        )
-        cur.execute(
-            f"""
-            INSERT INTO {TABLE_CURRENT} (
-                sheet_name, file_name, subdir, row_key_hash, row_key_json, row_hash,
-                row_status, source_file, source_path, first_seen_at, last_loaded_at,
-                inactive_since, payload_id
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?)
-            ON CONFLICT(sheet_name, file_name, subdir, row_key_hash) DO UPDATE SET
-                row_key_json = excluded.row_key_json,
-                row_hash = excluded.row_hash,
-                row_status = 'active',
-                source_file = excluded.source_file,
-                source_path = excluded.source_path,
-                last_loaded_at = excluded.last_loaded_at,
-                inactive_since = NULL,
-                payload_id = excluded.payload_id
-            """,
-            (
-                sheet_name,
-                file_name,
-                subdir,
-                rec.row_key_hash,
-                rec.row_key_json,
-                rec.row_hash,
-                ROW_STATUS_ACTIVE,
-                source_file_label,
-                file_path,
-                now_utc,
-                now_utc,
-                pid,
-            ),
-        )
-
-    for c in unchanged_rows:
-        rec = c.record
-        cur.execute(
-            f"""
-            UPDATE {TABLE_CURRENT}
-            SET last_loaded_at = ?,
-                source_file = ?,
-                source_path = ?,
-                row_status = 'active',
-                inactive_since = NULL
-            WHERE sheet_name = ? AND file_name = ? AND subdir = ?
-              AND row_key_hash = ?
-            """,
-            (
-                now_utc,
-                source_file_label,
-                file_path,
-                sheet_name,
-                file_name,
-                subdir,
-                rec.row_key_hash,
-            ),
-        )
-
-    inactive_count = 0
-    if key_set:
-        cur.execute(
-            f"""
-            SELECT row_key_hash FROM {TABLE_CURRENT}
-            WHERE sheet_name = ? AND file_name = ? AND subdir = ?
-              AND row_status = 'active'
-            """,
-            (sheet_name, file_name, subdir),
-        )
-        to_inactivate = [str(r[0]) for r in cur.fetchall() if str(r[0]) not in key_set]
-        inactive_count = len(to_inactivate)
-        if to_inactivate:
-            _execute_updates_by_row_key_hashes(
-                cur,
-                to_inactivate,
-                sheet_name=sheet_name,
-                file_name=file_name,
-                subdir=subdir,
-                row_status=ROW_STATUS_INACTIVE,
-                inactive_since=now_utc,
-                last_loaded_at=now_utc,
-            )
-
+    new_blobs = _fill_stage_payloads(
+        cur,
+        records,
+        sheet_name=sheet_name,
+        content_is_row_hash=hash_cols_list is None,
+        store_cfg=cfg["payload_store"],
+        now_utc=now_utc,
+    )
+    inactive_count = _apply_stage(
+        cur,
+        sheet_name=sheet_name,
+        file_name=file_name,
+        subdir=subdir,
+        source_file=source_file_label,
+        source_path=file_path,
+        now_utc=now_utc,
+    )
     _upsert_file_inventory(cur, sheet_name, file_name, subdir, content_sha, row_count, now_utc)
     db_sec = time.perf_counter() - t_db_start
     total_sec = time.perf_counter() - t0
@@ -534,11 +630,11 @@ def _ingest_one_file(
             now_utc,
             datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
             content_sha,
-            len(new_rows),
-            len(changed_rows),
-            len(unchanged_rows),
+            counts[CLASS_NEW],
+            counts[CLASS_CHANGED],
+            counts[CLASS_UNCHANGED],
             inactive_count,
-            counts.get("key_errors", 0),
+            key_errors,
             round(hash_sec, 4),
             round(compare_sec, 4),
             round(db_sec, 4),
@@ -546,7 +642,7 @@ def _ingest_one_file(
     )
 
     logging.debug(
-        "[archive_v2] «%s» hash=%.3fs compare=%.3fs db=%.3fs total=%.3fs workers_cfg=%s rows=%s",
+        "[archive_v2] «%s» hash=%.3fs compare=%.3fs db=%.3fs total=%.3fs workers_cfg=%s rows=%s new_blobs=%s",
         sheet_name,
         hash_sec,
         compare_sec,
@@ -554,16 +650,18 @@ def _ingest_one_file(
         total_sec,
         parallel_cfg,
         row_count,
+        new_blobs,
     )
 
     return {
         "kind": "ingested",
-        "new": len(new_rows),
-        "changed": len(changed_rows),
-        "unchanged": len(unchanged_rows),
+        "new": counts[CLASS_NEW],
+        "changed": counts[CLASS_CHANGED],
+        "unchanged": counts[CLASS_UNCHANGED],
         "inactive": inactive_count,
-        "key_errors": counts.get("key_errors", 0),
+        "key_errors": key_errors,
         "dup_warnings": dup_warnings,
+        "new_blobs": new_blobs,
         "hash_sec": hash_sec,
         "compare_sec": compare_sec,
         "db_sec": db_sec,
@@ -668,11 +766,32 @@ def run_input_archive_sqlite_v2(
     conn = sqlite3.connect(db_path, timeout=120.0)
     conn.row_factory = sqlite3.Row
     try:
+        # auto_vacuum=INCREMENTAL — для новой БД (см. src/input_archive_maintenance.py)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
         conn.execute("PRAGMA journal_mode=WAL")
         conn.execute("PRAGMA synchronous=NORMAL")
         cur = conn.cursor()
         _ensure_v2_schema(cur)
+        migrated = None
+        if needs_migration(cur, TABLE_PAYLOAD):
+            migrated = migrate_payload_store(
+                cur,
+                payload_table=TABLE_PAYLOAD,
+                current_table=TABLE_CURRENT,
+                create_payload_table_sql=_payload_table_sql(),
+                cfg=cfg["payload_store"],
+                now_utc=now_utc,
+            )
         conn.commit()
+        if migrated is not None:
+            # Освобождённые страницы старых payload_json — обратно в ОС (одноразово после миграции)
+            conn.execute("VACUUM")
+            _log_archive_event(
+                log_mode,
+                f"[archive_v2] БД {db_display} переведена на {TABLE_BLOB}: версий {migrated['versions']}, "
+                f"уникальных тел {migrated['blobs']}",
+                "VACUUM выполнен",
+            )
 
         _log_archive_event(
             log_mode,
@@ -803,9 +803,12 @@ def _try_safe_load(s: str) -> Tuple[bool, Any]:
 def run_json_spod_format_check(
     sheets_data: dict,
     rule: dict,
+    result_columns: Optional[Any] = None,
 ) -> dict:
     """
     Записывает колонку результата на лист и возвращает запись для свода CONSISTENCY.
+    result_columns — буфер колонок прогона проверок (consistency_checks.ResultColumns): колонка
+    кладётся туда, лист не копируется.
     """
     sheet = rule.get("sheet")
     col_json = rule.get("json_column")
@@ -863,9 +866,12 @@ def run_json_spod_format_check(
             if len(sample) < _MAX_SAMPLE:
                 sample.append(f"[{_excel_row(idx)}] {msg[:200]}")
 
-    df = df.copy()
-    df[col_out] = statuses
-    sheets_data[sheet] = (df, conf)
+    if result_columns is not None:
+        result_columns.put(sheet, col_out, pd.Series(statuses, index=df.index, dtype=object))
+    else:
+        df = df.copy()
+        df[col_out] = statuses
+        sheets_data[sheet] = (df, conf)
 
     return {
         "check_id": check_id,
@@ -6,13 +6,17 @@
 import json
 import logging
 import re
+import threading
 import time as tmod
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Dict, List, Optional
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
 from src.debug_timing import debug_timed
+from src.spod_json import SpodJsonError, parse_spod_json
 
 
 def _log_json_parse_error(context: str, raw: str, ex_first: Exception, ex_after_fix: Exception) -> None:
@@ -36,12 +40,26 @@ def safe_json_loads(s: str) -> Any:
     """
     Преобразует строку в объект JSON. Возвращает dict/list или None при ошибке.
     Толерантен к разным кавычкам и пустым строкам; исправляет типичные ошибки JSON.
+
+    Ячейки SPOD с тройными кавычками разбираются без цепочки автоисправлений:
+    ``json.loads`` после замены \"\"\" → \", затем ``parse_spod_json`` (src/spod_json.py);
+    регулярные выражения — только для строк, не разобранных ни тем, ни другим.
     """
     if not isinstance(s, str):
         return s
     s = s.strip()
     if not s or s in {"-", "None", "null"}:
         return None
+    if '"""' in s:
+        # Валидный JSON не содержит трёх кавычек подряд — это диалект SPOD
+        try:
+            return json.loads(s.replace('"""', '"'))
+        except ValueError:
+            pass
+        try:
+            return parse_spod_json(s)
+        except SpodJsonError:
+            pass
     try:
         return json.loads(s)
     except Exception as ex:
@@ -241,3 +259,398 @@ def flatten_json_column_recursive(
     logging.info(f"[INFO] {column} → новых колонок: {len(new_cols)}")
     logging.info(f"[INFO] Все новые колонки: {list(new_cols.keys())}")
     return df
+
+
+# --- Общий движок разворота JSON (main_impl.flatten_json_column_recursive) ---
+#
+# Разбор JSON — чистая CPU-работа на Python: в потоках её сериализует GIL, поэтому крупные колонки
+# режутся на куски строк и разворачиваются в процессах (воркер — функция модуля, результат —
+# массивы колонок). План путей схемы (JsonPathPlan) строится по первой строке-словарю: для строк
+# той же формы префиксы колонок берутся готовыми, без разбора ключей и сборки строк.
+
+_EMPTY_JSON_CELLS = frozenset({"", "-", "None", "null"})
+# Один кодировщик вместо json.dumps(..., ensure_ascii=False) на каждый узел (вывод тот же)
+_JSON_ENCODE = json.JSONEncoder(ensure_ascii=False).encode
+
+DEFAULT_JSON_FLATTEN: Dict[str, Any] = {
+    # auto — процессы при max_workers > 1 и n ≥ min_rows_for_parallel, иначе последовательно;
+    # process | thread | sequential — принудительно
+    "mode": "auto",
+    # 0 — performance.max_workers_cpu
+    "max_workers": 0,
+    "chunk_size": 2000,
+    "min_rows_for_parallel": 5000,
+    "schema_plan": True,
+    # Одинаковые ячейки разбираются один раз (factorize), колонки раздаются строкам по кодам
+    "dedupe": True,
+}
+
+_JSON_FLATTEN_MODES = ("auto", "process", "thread", "sequential")
+
+
+def merge_json_flatten_config(raw: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Дефолты + ``performance.json_flatten`` из конфига."""
+    cfg = dict(DEFAULT_JSON_FLATTEN)
+    if isinstance(raw, Mapping):
+        for k, v in raw.items():
+            if not str(k).startswith("_"):
+                cfg[k] = v
+    mode = str(cfg.get("mode") or "auto").strip().lower()
+    if mode not in _JSON_FLATTEN_MODES:
+        raise ValueError(
+            f"performance.json_flatten.mode: недопустимое значение {cfg.get('mode')!r}; "
+            f"допустимо: {', '.join(_JSON_FLATTEN_MODES)}"
+        )
+    cfg["mode"] = mode
+    cfg["max_workers"] = max(0, int(cfg.get("max_workers") or 0))
+    cfg["chunk_size"] = max(1, int(cfg.get("chunk_size") or 1))
+    cfg["min_rows_for_parallel"] = max(0, int(cfg.get("min_rows_for_parallel") or 0))
+    cfg["schema_plan"] = bool(cfg.get("schema_plan"))
+    cfg["dedupe"] = bool(cfg.get("dedupe"))
+    return cfg
+
+
+@dataclass(frozen=True)
+class JsonPathPlan:
+    """
+    Узел плана разворота: ключи словаря в порядке JSON, готовые префиксы колонок
+    и планы вложенных словарей (None — значение разворачивается общим путём).
+    """
+
+    keys: Tuple[str, ...]
+    prefixes: Tuple[str, ...]
+    children: Tuple[Optional["JsonPathPlan"], ...]
+
+
+def compile_json_path_plan(obj: Any, prefix: str) -> Optional[JsonPathPlan]:
+    """План по образцу разобранного значения; None, если образец — не словарь."""
+    if not isinstance(obj, dict):
+        return None
+    keys = tuple(obj)
+    prefixes = tuple(f"{prefix} => {k}" for k in keys)
+    children = tuple(compile_json_path_plan(v, p) for v, p in zip(obj.values(), prefixes))
+    return JsonPathPlan(keys=keys, prefixes=prefixes, children=children)
+
+
+def _may_hold_json(text: str) -> bool:
+    # dict/list даёт только строка, начинающаяся с { или [ (автоисправление safe_json_loads
+    # меняет лишь кавычки/запятые) — прочий текст не разбираем
+    head = text[:1]
+    return head in ("{", "[") or (head.isspace() and text.lstrip()[:1] in ("{", "["))
+
+
+def _flatten_into(obj: Any, prefix: str, sep: str, out: Dict[str, Any]) -> None:
+    """
+    Общий разворот (как ``extract``): поле сохраняется, вложенный JSON в строке разворачивается.
+    Значения пишутся в один словарь ``out`` — порядок и «последний выигрывает» как у прежнего update.
+    """
+    if isinstance(obj, str):
+        out[prefix] = obj
+        if _may_hold_json(obj):
+            nested = safe_json_loads_cached(obj)
+            if isinstance(nested, (dict, list)):
+                _flatten_into(nested, prefix, sep, out)
+        return
+    if isinstance(obj, dict):
+        out[prefix] = _JSON_ENCODE(obj)
+        for k, v in obj.items():
+            _flatten_into(v, f"{prefix} => {k}", sep, out)
+    elif isinstance(obj, list):
+        if all(isinstance(x, (str, int, float, bool, type(None))) for x in obj):
+            out[prefix] = sep.join(str(x) for x in obj)
+        else:
+            out[prefix] = _JSON_ENCODE(obj)
+            for idx, x in enumerate(obj):
+                _flatten_into(x, f"{prefix} => [{idx}]", sep, out)
+    elif isinstance(obj, float) and pd.isna(obj):
+        out[prefix] = None
+    else:
+        out[prefix] = obj
+
+
+def _flatten_planned(obj: Any, plan: JsonPathPlan, prefix: str, sep: str, out: Dict[str, Any]) -> bool:
+    """Разворот по плану; при другой форме словаря — общий путь. True — форма совпала с планом."""
+    if type(obj) is not dict or tuple(obj) != plan.keys:
+        _flatten_into(obj, prefix, sep, out)
+        return False
+    out[prefix] = _JSON_ENCODE(obj)
+    for v, p, child in zip(obj.values(), plan.prefixes, plan.children):
+        if child is not None:
+            _flatten_planned(v, child, p, sep, out)
+        elif type(v) is str and not _may_hold_json(v):
+            out[p] = v
+        elif type(v) is int or type(v) is bool or v is None:
+            out[p] = v
+        else:
+            _flatten_into(v, p, sep, out)
+    return True
+
+
+# Мемо разбора одинаковых строк JSON (в выгрузках ячейки часто повторяются). Результат общий для
+# всех вызовов — только для кода, который разобранный объект не изменяет (разворот колонок).
+_JSON_MEMO: Dict[str, Any] = {}
+_JSON_MEMO_MAX_ENTRIES = 20000
+_JSON_MEMO_MAX_CHARS = 65536
+
+
+def safe_json_loads_cached(s: str) -> Any:
+    """``safe_json_loads`` с мемо по строке; возвращаемый dict/list изменять нельзя."""
+    if len(s) > _JSON_MEMO_MAX_CHARS:
+        return safe_json_loads(s)
+    try:
+        return _JSON_MEMO[s]
+    except KeyError:
+        pass
+    value = safe_json_loads(s)
+    if len(_JSON_MEMO) >= _JSON_MEMO_MAX_ENTRIES:
+        _JSON_MEMO.clear()
+    _JSON_MEMO[s] = value
+    return value
+
+
+def _parse_json_cell(val: Any) -> Any:
+    """Значение ячейки → объект для разворота (пустые маркеры и не-JSON типы → {})."""
+    if isinstance(val, str):
+        val = val.strip()
+        return {} if val in _EMPTY_JSON_CELLS else safe_json_loads_cached(val)
+    if isinstance(val, (dict, list)):
+        return val
+    return {}
+
+
+def _flatten_json_chunk(
+    task: Tuple[int, List[Any], str, str, Optional[JsonPathPlan]],
+) -> Tuple[int, Dict[str, List[Any]], List[int], int]:
+    """
+    Воркер (процесс/поток/последовательно): (начало, значения, префикс, sep, план) →
+    (начало, {колонка: значения куска}, позиции значений с ошибкой, значений не по плану).
+    """
+    start, values, prefix, sep, plan = task
+    n = len(values)
+    columns: Dict[str, List[Any]] = {}
+    errors: List[int] = []
+    n_plan_misses = 0
+    for i, val in enumerate(values):
+        out: Dict[str, Any] = {}
+        try:
+            parsed = _parse_json_cell(val)
+            if plan is None:
+                _flatten_into(parsed, prefix, sep, out)
+            elif not _flatten_planned(parsed, plan, prefix, sep, out) and isinstance(parsed, dict) and parsed:
+                n_plan_misses += 1
+        except Exception as ex:
+            logging.debug(f"Ошибка разбора JSON (значение {start + i}): {ex}")
+            errors.append(start + i)
+            out = {}
+        for k, v in out.items():
+            col = columns.get(k)
+            if col is None:
+                col = columns[k] = [None] * n
+            col[i] = v
+    return start, columns, errors, n_plan_misses
+
+
+# План путей по (префикс, sep): переиспользуется для следующих файлов с той же JSON-колонкой
+_json_path_plans: Dict[Tuple[str, str], JsonPathPlan] = {}
+_json_path_plans_lock = threading.Lock()
+# Сколько первых строк просматривать в поисках образца для плана
+_PLAN_SAMPLE_ROWS = 50
+
+
+def _json_path_plan_for(values: Sequence[Any], prefix: str, sep: str) -> Optional[JsonPathPlan]:
+    key = (prefix, sep)
+    with _json_path_plans_lock:
+        plan = _json_path_plans.get(key)
+    if plan is not None:
+        return plan
+    for val in values[:_PLAN_SAMPLE_ROWS]:
+        try:
+            parsed = _parse_json_cell(val)
+        except Exception:
+            continue
+        if isinstance(parsed, dict) and parsed:
+            plan = compile_json_path_plan(parsed, prefix)
+            with _json_path_plans_lock:
+                _json_path_plans[key] = plan
+            return plan
+    return None
+
+
+def _drop_json_path_plan(prefix: str, sep: str) -> None:
+    with _json_path_plans_lock:
+        _json_path_plans.pop((prefix, sep), None)
+
+
+def _factorize_cells(values: List[Any]) -> Optional[Tuple[np.ndarray, List[Any]]]:
+    """(коды строк, уникальные значения) или None, если повторов нет / значения нехешируемые."""
+    try:
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+    except TypeError:  # dict/list в ячейках
+        return None
+    if len(uniques) >= len(values):
+        return None
+    return codes, list(uniques)
+
+
+def _json_flatten_workers(cfg: Mapping[str, Any], max_workers: int) -> int:
+    return int(cfg.get("max_workers") or 0) or max(1, int(max_workers or 1))
+
+
+def create_json_flatten_pool(
+    settings: Optional[Mapping[str, Any]] = None,
+    max_workers: int = 1,
+) -> Optional[ProcessPoolExecutor]:
+    """
+    Общий пул процессов разворота на этап чтения CSV (передаётся в ``flatten_json_values`` как
+    ``executor``). Создавать в главном потоке до запуска потоков чтения файлов: процессы пула
+    запускаются здесь же, а не fork-ом из рабочего потока. ``None`` — режим без процессов
+    (sequential / thread, один воркер) или пул недоступен.
+    """
+    cfg = settings if settings is not None else merge_json_flatten_config(None)
+    workers = _json_flatten_workers(cfg, max_workers)
+    if cfg.get("mode") not in ("auto", "process") or workers <= 1:
+        return None
+    try:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        # Первая задача запускает все процессы пула в текущем потоке
+        pool.submit(int).result()
+        return pool
+    except Exception as ex:
+        logging.warning(f"[flatten_json] Пул процессов не создан ({ex}); разворот без процессов")
+        return None
+
+
+def flatten_json_values(
+    values: Sequence[Any],
+    prefix: str,
+    sep: str = "; ",
+    settings: Optional[Mapping[str, Any]] = None,
+    max_workers: int = 1,
+    label: str = "",
+    executor: Optional[Executor] = None,
+) -> Tuple[Dict[str, List[Any]], int]:
+    """
+    Разворот значений JSON-колонки в колонки ``{префикс => путь: значения}`` (длина = len(values)).
+
+    Колонки — в порядке первого появления, как у прежнего построчного разворота.
+    При ``dedupe`` разбирается каждое различное значение один раз, строки получают результат по
+    кодам factorize (одинаковые ячейки ссылаются на одни и те же объекты значений).
+    ``settings`` — результат ``merge_json_flatten_config``; ``max_workers`` используется,
+    если в настройках max_workers = 0. ``executor`` — общий пул (``create_json_flatten_pool``)
+    для режима process; без него собственный пул создаётся только в главном потоке, из рабочих
+    потоков разворот идёт последовательно. Возвращает (колонки, число строк с ошибкой разбора).
+    """
+    cfg = settings if settings is not None else merge_json_flatten_config(None)
+    values = list(values)
+    n_total = len(values)
+    factorized = _factorize_cells(values) if cfg.get("dedupe") else None
+    codes: Optional[np.ndarray] = None
+    if factorized is not None:
+        codes, values = factorized
+    n_rows = len(values)
+    workers = _json_flatten_workers(cfg, max_workers)
+    mode = cfg.get("mode", "auto")
+    if mode == "auto":
+        mode = "process" if workers > 1 else "sequential"
+    if n_rows < int(cfg.get("min_rows_for_parallel") or 0) or workers <= 1:
+        mode = "sequential"
+
+    plan = _json_path_plan_for(values, prefix, sep) if cfg.get("schema_plan") else None
+    if mode == "sequential":
+        chunk_size = max(n_rows, 1)
+    else:
+        chunk_size = max(int(cfg.get("chunk_size") or 1), -(-n_rows // workers))
+    tasks = [
+        (a, values[a : a + chunk_size], prefix, sep, plan) for a in range(0, n_rows, chunk_size)
+    ]
+    if len(tasks) < 2:
+        mode = "sequential"
+
+    if mode == "process" and executor is None and threading.current_thread() is not threading.main_thread():
+        # Пул на вызов из рабочего потока: N файлов — N пулов и fork многопоточного процесса
+        logging.debug(f"[flatten_json] {label or prefix}: вызов из рабочего потока без общего пула — последовательно")
+        mode = "sequential"
+
+    results = None
+    if mode == "process":
+        try:
+            if executor is not None:
+                results = list(executor.map(_flatten_json_chunk, tasks))
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as ex:
+                    results = list(ex.map(_flatten_json_chunk, tasks, chunksize=1))
+        except Exception as ex:
+            logging.warning(
+                f"[flatten_json] {label or prefix}: пул процессов недоступен ({ex}); разворот последовательно"
+            )
+    elif mode == "thread":
+        with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as ex:
+            results = list(ex.map(_flatten_json_chunk, tasks))
+    if results is None:
+        mode = "sequential"
+        results = [_flatten_json_chunk(t) for t in tasks]
+
+    columns: Dict[str, List[Any]] = {}
+    errors: List[int] = []
+    n_plan_misses = 0
+    for start, chunk_cols, chunk_errors, chunk_misses in results:
+        errors.extend(chunk_errors)
+        n_plan_misses += chunk_misses
+        for k, chunk_vals in chunk_cols.items():
+            col = columns.get(k)
+            if col is None:
+                col = columns[k] = [None] * n_rows
+            col[start : start + len(chunk_vals)] = chunk_vals
+    if plan is not None and n_plan_misses * 2 > n_rows:
+        # Форма данных сменилась — следующий вызов построит план заново
+        _drop_json_path_plan(prefix, sep)
+    if codes is not None:
+        # Раздача по кодам: O(различных значений) разбора + O(строк) копирования ссылок
+        columns = {k: np.asarray(col, dtype=object)[codes].tolist() for k, col in columns.items()}
+        n_errors = int(np.isin(codes, errors).sum()) if errors else 0
+    else:
+        n_errors = len(errors)
+    logging.debug(
+        f"[flatten_json] {label or prefix}: строк {n_total}, различных значений {n_rows}, "
+        f"кусков {len(tasks)}, режим {mode}, план путей: {'да' if plan is not None else 'нет'} "
+        f"(значений не по плану: {n_plan_misses})"
+    )
+    return columns, n_errors
+
+
+# --- Хранение развёрнутых колонок в памяти (json_columns[*].storage) ---
+
+# object — список Python-объектов (как раньше); category — pd.Categorical: коды int8/int16 на строку
+# вместо указателя на объект, пустые значения — код -1 (без объектов None)
+JSON_COLUMN_STORAGES = ("object", "category")
+# category — только если различных значений не больше этой доли строк (иначе экономии нет)
+_CATEGORY_MAX_UNIQUE_SHARE = 0.5
+
+
+def json_column_storage(json_conf: Mapping[str, Any]) -> str:
+    """Режим хранения развёрнутых колонок из элемента ``json_columns`` (ключ ``storage``)."""
+    raw = json_conf.get("storage")
+    storage = str(raw or "object").strip().lower()
+    if storage not in JSON_COLUMN_STORAGES:
+        raise ValueError(
+            f"json_columns «{json_conf.get('column')}».storage: недопустимое значение {raw!r}; "
+            f"допустимо: {', '.join(JSON_COLUMN_STORAGES)}"
+        )
+    return storage
+
+
+def compact_json_columns(columns: Mapping[str, Sequence[Any]], storage: str) -> Dict[str, Any]:
+    """
+    Значения развёрнутых колонок в выбранном хранении. Для ``category`` колонки с большой долей
+    различных значений (длинные JSON-тексты уровней) остаются object.
+    """
+    if storage != "category":
+        return dict(columns)
+    out: Dict[str, Any] = {}
+    for name, values in columns.items():
+        cat = pd.Categorical(values)
+        if len(cat.categories) <= len(cat) * _CATEGORY_MAX_UNIQUE_SHARE:
+            out[name] = cat
+        else:
+            out[name] = values
+    return out
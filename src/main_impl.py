@@ -3,6 +3,7 @@ import os          # Для работы с операционной систе
 import sys         # Для системных функций и аргументов командной строки
 from collections import defaultdict
 from typing import Optional, List, Dict, Any, Tuple, Set, Mapping, Sequence  # Для аннотаций типов
+import numpy as np  # Векторные операции (разбор CSV, маски строк)
 import pandas as pd  # Для работы с данными в табличном формате
 import logging     # Для логирования процессов
 from datetime import datetime  # Для работы с датами и временем
@@ -13,6 +14,7 @@ from time import time  # Для измерения времени выполне
 import json        # Для работы с JSON данными
 import re          # Для работы с регулярными выражениями
 import csv         # Для работы с CSV файлами
+import io          # Разбор текста CSV из памяти (read_csv_file)
 import unicodedata  # Нормализация имён колонок для except_columns / columns в COLUMN_FORMATS
 import time as tmod  # Для измерения времени выполнения операций (альтернативное имя)
 import inspect  # Для получения информации о вызывающей функции
@@ -20,6 +22,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed  # Для пар
 from itertools import product
 import threading  # Для синхронизации потоков
 import copy  # Копия конфигов листов для синтетических агрегированных листов
+import dataclasses  # replace() для стилей ячеек движка stream
 
 from src import console_ui  # Краткий вывод этапов и сводок в консоль (stdlib)
 from src.block_runtime import (
@@ -33,20 +36,63 @@ from src.block_runtime import (
 from src.config_loader import (
     filter_input_files_for_block,
     get_input_files_for_block,
+    merge_column_width_config,
     parse_input_files_by_block,
     parse_run_blocks_config,
     parse_run_blocks_parallel,
     parse_run_outputs_config,
     parse_run_outputs_for_block,
+    parse_excel_engine,
     parse_skip_data_alignment_sheets,
     resolve_output_filename_template,
     sheet_skips_data_alignment,
 )  # Разбор run_outputs / run_blocks / шаблоны имён / skip Alignment
+from src.json_utils import (  # Разворот JSON: пул процессов + план путей схемы (performance.json_flatten)
+    compact_json_columns,
+    create_json_flatten_pool,
+    flatten_json_values,
+    json_column_storage,
+    merge_json_flatten_config,
+)
+from src.json_utils import safe_json_loads as _json_utils_safe_json_loads
+from src.parsed_frame_cache import (  # Кэш этапа 01 по SHA-256 входного CSV (performance.parse_cache)
+    load_parsed_frames,
+    merge_parse_cache_config,
+    parse_signature,
+    store_parsed_frames,
+)
+from src.xlsx_stream_writer import (  # Движок stream для основной книги (performance.excel_engine)
+    DEFAULT_DATE_FORMAT,
+    DEFAULT_DATETIME_FORMAT,
+    CellStyle,
+    StreamSheet,
+    XlsxStyleRegistry,
+    write_xlsx_stream,
+)
+from src.columnar_export import (  # Колоночная выгрузка листов (токен main_columnar)
+    merge_columnar_output_config,
+    write_columnar_sheets,
+)
+from src.sqlite_export import write_sheets_sqlite  # Выгрузка листов в SQLite (токен main_sqlite)
+from src.input_archive_background import (
+    InputArchiveJob,
+    join_input_archive,
+    run_input_archive,
+    start_input_archive_background,
+)  # Архив входных CSV в SQLite: синхронно или фоновым процессом (input_archive_sqlite.background)
+from src import run_memo  # Повтор книг прошлого прогона при неизменных входах/конфиге/коде (performance.run_memo)
+from src.consistency_row_cache import (  # Пересчёт построчных проверок только для новых строк (performance.incremental)
+    ConsistencyRowCache,
+    merge_incremental_config,
+)
+from src.merge_row_cache import MergeRowCache  # Пересчёт merge/SUMMARY только для изменившихся ключей (performance.incremental)
 from src.consistency_checks import run_consistency_checks_and_attach_summary  # Проверки консистентности (отдельный модуль)
 from src.debug_timing import (
     debug_phase,
     debug_timed,
     get_run_summary_for_console,
+    record_phase,
+    record_stat_rows,
     reset_run_timing,
     run_elapsed_sec,
     set_debug_phase_console_hooks,
@@ -124,7 +170,7 @@ import warnings   # Для подавления UserWarning при парсин
 # 1. ВЕКТОРИЗАЦИЯ ФУНКЦИЙ (ускорение 50-200x):
 #    - validate_field_lengths_vectorized: замена iterrows() на векторные операции pandas
 #    - add_auto_gender_column_vectorized: замена iterrows() на строковые операции pandas
-#    - collect_summary_keys_optimized: упрощенная версия с использованием merge
+#    - collect_summary_keys_optimized: каркас SUMMARY через merge/groupby (вместо циклов по кодам)
 # 
 # 2. ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА:
 #    - Параллельное чтение CSV файлов через ThreadPoolExecutor
@@ -206,8 +252,9 @@ def _load_config_globals():
     global MAX_WORKERS_IO, MAX_WORKERS_CPU, MAX_WORKERS, TOURNAMENT_STATUS_CHOICES
     global SOURCE_EXPORT_SORT
     global INPUT_ARCHIVE_SQLITE, PROJECT_BASE_DIR, RATING_ITEM_MATRIX, SEASON_ORDER_SUMMARY
+    global COLUMNAR_OUTPUT
     global MANAGER_STATS
-    global SKIP_DATA_ALIGNMENT_SHEETS
+    global SKIP_DATA_ALIGNMENT_SHEETS, EXCEL_ENGINE, PARSE_CACHE, JSON_FLATTEN, COLUMN_WIDTH, RUN_MEMO, INCREMENTAL
 
     try:
         from src.config_holder import get_current_config
@@ -313,11 +360,20 @@ def _load_config_globals():
                 )
             else:
                 SKIP_DATA_ALIGNMENT_SHEETS = list(_skip_align)
+            EXCEL_ENGINE = getattr(_c, "excel_engine", None) or parse_excel_engine(
+                getattr(_c, "_cfg", {}) or {}
+            )
+            PARSE_CACHE = merge_parse_cache_config(getattr(_c, "parse_cache", None))
+            JSON_FLATTEN = merge_json_flatten_config(getattr(_c, "json_flatten", None))
+            COLUMN_WIDTH = merge_column_width_config(getattr(_c, "column_width", None))
+            RUN_MEMO = run_memo.merge_run_memo_config(getattr(_c, "run_memo", None))
+            INCREMENTAL = merge_incremental_config(getattr(_c, "incremental", None))
             TOURNAMENT_STATUS_CHOICES = _c.tournament_status_choices
             PROJECT_BASE_DIR = _c.base_dir
             INPUT_ARCHIVE_SQLITE = getattr(_c, "input_archive_sqlite", None) or {"enabled": False}
             RATING_ITEM_MATRIX = getattr(_c, "rating_item_matrix", None) or {}
             SEASON_ORDER_SUMMARY = getattr(_c, "season_order_summary", None) or {}
+            COLUMNAR_OUTPUT = merge_columnar_output_config(getattr(_c, "columnar_output", None))
             MANAGER_STATS = getattr(_c, "manager_stats", None) or {}
             return
     except Exception:
@@ -409,6 +465,12 @@ def _load_config_globals():
     MAX_WORKERS_CPU = _cfg["performance"]["max_workers_cpu"]
     MAX_WORKERS = MAX_WORKERS_CPU
     SKIP_DATA_ALIGNMENT_SHEETS = parse_skip_data_alignment_sheets(_cfg)
+    EXCEL_ENGINE = parse_excel_engine(_cfg)
+    PARSE_CACHE = merge_parse_cache_config(_cfg["performance"].get("parse_cache"))
+    JSON_FLATTEN = merge_json_flatten_config(_cfg["performance"].get("json_flatten"))
+    COLUMN_WIDTH = merge_column_width_config(_cfg["performance"].get("column_width"))
+    RUN_MEMO = run_memo.merge_run_memo_config(_cfg["performance"].get("run_memo"))
+    INCREMENTAL = merge_incremental_config(_cfg["performance"].get("incremental"))
     _TOURNAMENT_STATUS_DEFAULT = [
         "НЕОПРЕДЕЛЕН", "АКТИВНЫЙ", "ЗАПЛАНИРОВАН",
         "ПОДВЕДЕНИЕ ИТОГОВ", "ПОДВЕДЕНИЕ ИТОГОВ", "ПОДВЕДЕНИЕ ИТОГОВ", "ЗАВЕРШЕН",
@@ -419,6 +481,7 @@ def _load_config_globals():
     INPUT_ARCHIVE_SQLITE = merge_archive_v2_config(_cfg.get("input_archive_sqlite"))
     RATING_ITEM_MATRIX = _cfg.get("rating_item_matrix") or {}
     SEASON_ORDER_SUMMARY = _cfg.get("season_order_summary") or {}
+    COLUMNAR_OUTPUT = merge_columnar_output_config(_cfg.get("columnar_output"))
     MANAGER_STATS = _cfg.get("manager_stats") or {}
 
 
@@ -516,6 +579,34 @@ try:
     SKIP_DATA_ALIGNMENT_SHEETS
 except NameError:
     SKIP_DATA_ALIGNMENT_SHEETS = parse_skip_data_alignment_sheets({})
+try:
+    EXCEL_ENGINE
+except NameError:
+    EXCEL_ENGINE = parse_excel_engine({})
+try:
+    PARSE_CACHE
+except NameError:
+    PARSE_CACHE = merge_parse_cache_config(None)
+try:
+    JSON_FLATTEN
+except NameError:
+    JSON_FLATTEN = merge_json_flatten_config(None)
+try:
+    COLUMN_WIDTH
+except NameError:
+    COLUMN_WIDTH = merge_column_width_config(None)
+try:
+    RUN_MEMO
+except NameError:
+    RUN_MEMO = run_memo.merge_run_memo_config(None)
+try:
+    INCREMENTAL
+except NameError:
+    INCREMENTAL = merge_incremental_config(None)
+try:
+    COLUMNAR_OUTPUT
+except NameError:
+    COLUMNAR_OUTPUT = merge_columnar_output_config(None)
 # === КОНЕЦ ЗАГРУЗКИ КОНФИГА ===
 
 # Выходной файл Excel (шаблон из конфига output_filenames.main)
@@ -1204,17 +1295,163 @@ def check_input_files_exist() -> List[Dict[str, str]]:
         list: Список ненайденных файлов. Каждый элемент — dict с ключами "file", "sheet".
               Пустой список, если все файлы найдены.
     """
-    missing = []
+    return [
+        {"file": file_conf["file"], "sheet": file_conf["sheet"]}
+        for file_conf, path in _resolve_input_files()
+        if path is None
+    ]
+
+
+def _resolve_input_files() -> List[Tuple[Dict[str, Any], Optional[str]]]:
+    """Пары (file_conf, найденный путь или None) для всех INPUT_FILES — поиск как при загрузке."""
+    resolved = []
     for file_conf in INPUT_FILES:
-        base_name = file_conf["file"]
-        sheet_name = file_conf["sheet"]
         # Подкаталог (один уровень): если задан subdir — ищем в paths.input / subdir
         subdir = (file_conf.get("subdir") or "").strip()
         search_dir = os.path.join(DIR_INPUT, subdir) if subdir else DIR_INPUT
-        path = find_file_case_insensitive(search_dir, base_name, [".csv", ".CSV"])
-        if path is None:
-            missing.append({"file": base_name, "sheet": sheet_name})
-    return missing
+        resolved.append(
+            (file_conf, find_file_case_insensitive(search_dir, file_conf["file"], [".csv", ".CSV"]))
+        )
+    return resolved
+
+
+def _parse_csv_text_rows(
+    text: str,
+    expected_columns: int = 0,
+) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Построчный разбор CSV (csv.reader, «;», QUOTE_NONE) с нормализацией числа полей.
+    Эталон для ``_parse_csv_bytes_fast`` и запасной путь для пограничных случаев.
+    """
+    rows = []
+    headers = None
+    issues: List[Dict[str, Any]] = []
+    n = 0
+    csv_reader = csv.reader(io.StringIO(text, newline=""), delimiter=';', quoting=csv.QUOTE_NONE)
+    for i, row in enumerate(csv_reader):
+        if i == 0:
+            headers = [_normalize_column_name_for_format_match(h) for h in row]
+            # АВТО (expected_columns=0): ожидаемое число полей = длина заголовка; иначе — из конфига
+            n = expected_columns if expected_columns > 0 else len(headers)
+        else:
+            actual = len(row)
+            if actual < n:
+                row = list(row) + [""] * (n - actual)
+                issues.append({"row_index": i + 1, "expected_cols": n, "actual_cols": actual, "direction": "меньше"})
+            elif actual > n:
+                # Последняя колонка может содержать JSON с точкой с запятой внутри — склеиваем хвост в одну ячейку
+                row = list(row[: n - 1]) + [";".join(row[n - 1 :])]
+                issues.append({"row_index": i + 1, "expected_cols": n, "actual_cols": actual, "direction": "больше"})
+            rows.append(row)
+
+    df = pd.DataFrame(rows, columns=headers)
+    for col in df.columns:
+        df[col] = df[col].astype(str)
+    return df, issues
+
+
+def _parse_csv_bytes_fast(
+    data: bytes,
+    expected_columns: int = 0,
+) -> Optional[Tuple[pd.DataFrame, List[Dict[str, Any]]]]:
+    """
+    Быстрый разбор CSV (байты UTF-8): границы строк и число «;» в каждой считаются векторно (numpy),
+    строки с правильным числом полей читает C-парсер pandas (dtype=str, QUOTE_NONE) одним вызовом,
+    построчно чинятся только строки с расхождением. Результат совпадает с ``_parse_csv_text_rows``
+    (тот же кадр и issues). None — случай не поддержан (пустой файл, NUL, одиночный \\r,
+    заголовок не совпадает с expected_columns): нужен построчный разбор.
+    """
+    if data.startswith(b"\xef\xbb\xbf"):
+        data = data[3:]
+    if not data or b"\x00" in data:
+        return None
+    crlf = b"\r" in data
+    if crlf and data.count(b"\r") != data.count(b"\r\n"):
+        return None  # одиночный \r как разделитель строк — только построчный разбор
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    nl = np.flatnonzero(buf == 10)
+    starts = np.concatenate(([0], nl + 1))
+    ends = np.concatenate((nl, [len(buf)]))
+    if starts[-1] == len(buf):
+        # завершающий перевод строки не даёт пустой записи (как csv.reader)
+        starts, ends = starts[:-1], ends[:-1]
+    if crlf:
+        ends = ends - (buf[np.maximum(ends - 1, 0)] == 13)
+    if len(starts) == 0:
+        return None
+
+    header_line = data[starts[0]:ends[0]].decode("utf-8")
+    headers = [_normalize_column_name_for_format_match(h) for h in (header_line.split(";") if header_line else [])]
+    n = expected_columns if expected_columns > 0 else len(headers)
+    if n != len(headers) or n == 0:
+        return None
+
+    d_starts, d_ends = starts[1:], ends[1:]
+    semi = np.flatnonzero(buf == 59)
+    counts = np.searchsorted(semi, d_ends) - np.searchsorted(semi, d_starts) + 1
+    counts[d_ends == d_starts] = 0  # пустая строка — запись без полей
+    bad_pos = np.flatnonzero(counts != n)
+
+    issues: List[Dict[str, Any]] = []
+    bad_rows: List[List[str]] = []
+    for pos in bad_pos.tolist():
+        line = data[d_starts[pos]:d_ends[pos]].decode("utf-8")
+        row = line.split(";") if line else []
+        actual = len(row)
+        if actual < n:
+            row = row + [""] * (n - actual)
+            issues.append({"row_index": pos + 2, "expected_cols": n, "actual_cols": actual, "direction": "меньше"})
+        else:
+            # Последняя колонка может содержать JSON с точкой с запятой внутри — склеиваем хвост в одну ячейку
+            row = row[: n - 1] + [";".join(row[n - 1 :])]
+            issues.append({"row_index": pos + 2, "expected_cols": n, "actual_cols": actual, "direction": "больше"})
+        bad_rows.append(row)
+
+    n_data = len(d_starts)
+    n_good = n_data - len(bad_pos)
+    if n_good:
+        if len(bad_pos):
+            # Хорошие строки — срезы байтов между испорченными (целиком, с переводами строк)
+            parts = []
+            prev = int(d_starts[0])
+            for pos in bad_pos.tolist():
+                parts.append(data[prev:int(d_starts[pos])])
+                prev = int(starts[pos + 2]) if pos + 2 < len(starts) else len(data)
+            parts.append(data[prev:])
+            good_bytes = b"".join(parts)
+        else:
+            good_bytes = data[int(d_starts[0]):]
+        df_good = pd.read_csv(
+            io.BytesIO(good_bytes),
+            sep=";",
+            header=None,
+            names=list(range(n)),
+            dtype=str,
+            quoting=csv.QUOTE_NONE,
+            na_filter=False,
+            keep_default_na=False,
+            skip_blank_lines=False,
+            encoding="utf-8",
+            engine="c",
+        )
+        if len(df_good) != n_good:
+            return None
+    else:
+        df_good = pd.DataFrame({j: pd.Series([], dtype=object) for j in range(n)})
+
+    if bad_rows:
+        values = np.empty((n_data, n), dtype=object)
+        good_mask = np.ones(n_data, dtype=bool)
+        good_mask[bad_pos] = False
+        if n_good:
+            values[good_mask] = df_good.to_numpy(dtype=object)
+        values[bad_pos] = np.array(bad_rows, dtype=object).reshape(len(bad_rows), n)
+        df = pd.DataFrame(values, columns=headers)
+    else:
+        df = df_good
+        df.columns = headers
+    return df, issues
 
 
 @debug_timed(log_args_len=True)
@@ -1245,33 +1482,13 @@ def read_csv_file(
     logging.info(f"[START] read_csv_file {params}")
 
     try:
-        rows = []
-        headers = None
-        issues: List[Dict[str, Any]] = []
-
-        with open(file_path, "r", encoding="utf-8-sig", newline="") as file:
-            csv_reader = csv.reader(file, delimiter=';', quoting=csv.QUOTE_NONE)
-
-            for i, row in enumerate(csv_reader):
-                if i == 0:
-                    headers = [_normalize_column_name_for_format_match(h) for h in row]
-                    # АВТО (expected_columns=0): ожидаемое число полей = длина заголовка; иначе — из конфига
-                    n = expected_columns if expected_columns > 0 else len(headers)
-                else:
-                    actual = len(row)
-                    if actual < n:
-                        row = list(row) + [""] * (n - actual)
-                        issues.append({"row_index": i + 1, "expected_cols": n, "actual_cols": actual, "direction": "меньше"})
-                    elif actual > n:
-                        # Последняя колонка может содержать JSON с точкой с запятой внутри — склеиваем хвост в одну ячейку
-                        row = list(row[: n - 1]) + [";".join(row[n - 1 :])]
-                        issues.append({"row_index": i + 1, "expected_cols": n, "actual_cols": actual, "direction": "больше"})
-                    rows.append(row)
-
-        df = pd.DataFrame(rows, columns=headers)
-
-        for col in df.columns:
-            df[col] = df[col].astype(str)
+        with open(file_path, "rb") as file:
+            data = file.read()
+        result = _parse_csv_bytes_fast(data, expected_columns)
+        if result is None:
+            # Пограничные случаи (пустой файл, NUL, одиночный \r, заголовок ≠ expected_columns) — построчный разбор
+            result = _parse_csv_text_rows(data.decode("utf-8-sig"), expected_columns)
+        df, issues = result
 
         for col in df.columns:
             if "FEATURE" in col or "ADD_DATA" in col:
@@ -1402,10 +1619,11 @@ def write_source_excel(
             if not params:
                 params = {"max_col_width": 60, "freeze": "A2", "col_width_mode": "AUTO", "min_col_width": 10}
             header_cells = list(ws[1])
-            for col_num, cell in enumerate(header_cells, 1):
-                col_letter = get_column_letter(col_num)
-                width = calculate_column_width(cell.value, ws, params, col_num)
-                ws.column_dimensions[col_letter].width = width
+            src_df = raw_sheets_data[sheet_name][0] if sheet_name in raw_sheets_data else None
+            if src_df is None or len(src_df.columns) != len(header_cells):
+                src_df = pd.DataFrame(columns=[c.value for c in header_cells])
+            for col_num, width in enumerate(column_widths_from_frame(src_df, params), 1):
+                ws.column_dimensions[get_column_letter(col_num)].width = width
             ws.freeze_panes = params.get("freeze", "A2")
             # Автофильтр по умолчанию на всех листах source (только при валидных границах листа)
             try:
@@ -1507,7 +1725,16 @@ def write_to_excel(
                     by_cols.reverse()
                     ascending_list.reverse()
                     try:
-                        df_sorted = df.sort_values(by=by_cols, ascending=ascending_list)
+                        if isinstance(params_sheet, dict) and params_sheet.get("cell_fills"):
+                            # Заливки cell_fills заданы по позиции строки — переставляем их вместе с данными
+                            order = df.reset_index(drop=True).sort_values(
+                                by=by_cols, ascending=ascending_list
+                            ).index.to_numpy()
+                            df_sorted = df.iloc[order]
+                            params_sheet = dict(params_sheet)
+                            params_sheet["cell_fills"] = _reorder_cell_fills(params_sheet["cell_fills"], order)
+                        else:
+                            df_sorted = df.sort_values(by=by_cols, ascending=ascending_list)
                         sheets_data[sheet_name] = (df_sorted, params_sheet)
                     except Exception as e:
                         logging.warning(f"[write_to_excel] Сортировка листа {sheet_name} пропущена: {e}")
@@ -1545,7 +1772,12 @@ def write_to_excel(
 
         sheets_to_prepare = [s for s in ordered_sheets if s in sheets_data and sheets_data[s] is not None]
         prepared_sheets = {}
-        if sheets_to_prepare and COLUMN_FORMATS:
+        has_format_rules = bool(COLUMN_FORMATS) or any(
+            isinstance(sheets_data[s][1], dict) and sheets_data[s][1].get("column_format_rules")
+            for s in sheets_to_prepare
+            if len(sheets_data[s]) >= 2
+        )
+        if sheets_to_prepare and has_format_rules:
             with ThreadPoolExecutor(max_workers=min(MAX_WORKERS_IO, len(sheets_to_prepare))) as executor:
                 futures = {executor.submit(_prepare_sheet_for_write, sn): sn for sn in sheets_to_prepare}
                 for fut in as_completed(futures):
@@ -1562,67 +1794,87 @@ def write_to_excel(
                         continue
                     if data is not None:
                         prepared_sheets[sn] = data
-        # Листы без правил COLUMN_FORMATS или без параллельной подготовки — берём исходные данные
+        # Листы без правил COLUMN_FORMATS / column_format_rules — берём исходные данные
         for sn in ordered_sheets:
             if sn not in prepared_sheets and sn in sheets_data and sheets_data[sn] is not None:
                 prepared_sheets[sn] = sheets_data[sn]
 
-        # Создаем Excel файл с помощью pandas ExcelWriter
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-            # ОПТИМИЗАЦИЯ: Сначала записываем все данные (последовательно, т.к. ExcelWriter не поддерживает параллелизм)
-            for sheet_name in ordered_sheets:
-                if sheet_name not in prepared_sheets or prepared_sheets[sheet_name] is None:
-                    logging.warning(f"[write_to_excel] Пропущен лист {sheet_name}: данные отсутствуют или равны None")
-                    continue
-                sheet_data = prepared_sheets[sheet_name]
-                if len(sheet_data) < 1 or sheet_data[0] is None:
-                    logging.warning(f"[write_to_excel] Пропущен лист {sheet_name}: DataFrame равен None")
-                    continue
+        # Движок stream: листы сериализуются в XML напрямую (без модели ячеек openpyxl).
+        # При любой ошибке — удаляем частичный файл и пишем книгу прежним путём через openpyxl.
+        stream_written = False
+        if EXCEL_ENGINE == "stream":
+            try:
+                _write_to_excel_stream(ordered_sheets, prepared_sheets, output_path, use_color_scheme)
+                stream_written = True
+            except Exception as ex:
+                logging.exception(
+                    f"[write_to_excel] Движок stream завершился с ошибкой: {ex}. Запись через openpyxl."
+                )
+                try:
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+                except OSError:
+                    pass
+
+        if not stream_written:
+            # Создаем Excel файл с помощью pandas ExcelWriter
+            with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
+                # ОПТИМИЗАЦИЯ: Сначала записываем все данные (последовательно, т.к. ExcelWriter не поддерживает параллелизм)
+                for sheet_name in ordered_sheets:
+                    if sheet_name not in prepared_sheets or prepared_sheets[sheet_name] is None:
+                        logging.warning(f"[write_to_excel] Пропущен лист {sheet_name}: данные отсутствуют или равны None")
+                        continue
+                    sheet_data = prepared_sheets[sheet_name]
+                    if len(sheet_data) < 1 or sheet_data[0] is None:
+                        logging.warning(f"[write_to_excel] Пропущен лист {sheet_name}: DataFrame равен None")
+                        continue
                 
-                df_write, params_sheet = sheet_data
-                logging.debug(f"[write_to_excel] Записываем лист {sheet_name}...")
-                logging.debug(f"[write_to_excel] DataFrame shape: {df_write.shape}, колонок: {len(df_write.columns)}")
-                if len(df_write) == 0:
-                    logging.error(f"[write_to_excel] ❌ ОШИБКА: Лист {sheet_name} ПУСТОЙ перед записью!")
-                else:
-                    logging.debug(f"[write_to_excel] Первые 3 строки перед записью:\n{df_write.head(3).to_string()}")
+                    df_write, params_sheet = sheet_data
+                    logging.debug(f"[write_to_excel] Записываем лист {sheet_name}...")
+                    logging.debug(f"[write_to_excel] DataFrame shape: {df_write.shape}, колонок: {len(df_write.columns)}")
+                    if len(df_write) == 0:
+                        logging.error(f"[write_to_excel] ❌ ОШИБКА: Лист {sheet_name} ПУСТОЙ перед записью!")
+                    else:
+                        logging.debug(f"[write_to_excel] Первые 3 строки перед записью:\n{df_write.head(3).to_string()}")
 
-                df_write.to_excel(writer, index=False, sheet_name=sheet_name)
-                logging.info(f"Лист Excel записан: {sheet_name} (строк: {len(df_write)}, колонок: {len(df_write.columns)})")
+                    df_write.to_excel(writer, index=False, sheet_name=sheet_name)
+                    logging.info(f"Лист Excel записан: {sheet_name} (строк: {len(df_write)}, колонок: {len(df_write.columns)})")
             
-            # ОПТИМИЗАЦИЯ: Форматируем листы последовательно (openpyxl не thread-safe для параллельной записи)
-            # Примечание: Параллелизация форматирования Excel была откачена, т.к. openpyxl не thread-safe
-            # и параллельная запись в один файл создает блокировки, замедляющие выполнение
-            for sheet_name in ordered_sheets:
-                # ОПТИМИЗАЦИЯ v5.0: Проверка на None перед форматированием
-                if sheet_name not in sheets_data or sheets_data[sheet_name] is None:
-                    logging.warning(f"[write_to_excel] Пропущен лист {sheet_name} при форматировании: данные отсутствуют или равны None")
-                    continue
+                # ОПТИМИЗАЦИЯ: Форматируем листы последовательно (openpyxl не thread-safe для параллельной записи)
+                # Примечание: Параллелизация форматирования Excel была откачена, т.к. openpyxl не thread-safe
+                # и параллельная запись в один файл создает блокировки, замедляющие выполнение
+                for sheet_name in ordered_sheets:
+                    # ОПТИМИЗАЦИЯ v5.0: Проверка на None перед форматированием
+                    if sheet_name not in sheets_data or sheets_data[sheet_name] is None:
+                        logging.warning(f"[write_to_excel] Пропущен лист {sheet_name} при форматировании: данные отсутствуют или равны None")
+                        continue
                 
-                sheet_data = sheets_data[sheet_name]
-                if len(sheet_data) < 1 or sheet_data[0] is None:
-                    logging.warning(f"[write_to_excel] Пропущен лист {sheet_name} при форматировании: DataFrame равен None")
-                    continue
+                    sheet_data = sheets_data[sheet_name]
+                    if len(sheet_data) < 1 or sheet_data[0] is None:
+                        logging.warning(f"[write_to_excel] Пропущен лист {sheet_name} при форматировании: DataFrame равен None")
+                        continue
                 
-                df, params_sheet = sheet_data
-                ws = writer.sheets[sheet_name]
-                _format_sheet(ws, df, params_sheet, use_color_scheme=use_color_scheme)  # Применяем форматирование
-                logging.info(f"Лист Excel сформирован: {sheet_name} (строк: {len(df)}, колонок: {len(df.columns)})")
+                    df, params_sheet = sheet_data
+                    ws = writer.sheets[sheet_name]
+                    # Ширины колонок — по записанному (подготовленному) DataFrame
+                    df_written = prepared_sheets.get(sheet_name, (df,))[0]
+                    _format_sheet(ws, df_written, params_sheet, use_color_scheme=use_color_scheme)  # Применяем форматирование
+                    logging.info(f"Лист Excel сформирован: {sheet_name} (строк: {len(df)}, колонок: {len(df.columns)})")
             
-            # Делаем SUMMARY лист активным по умолчанию (если он есть в файле)
-            try:
-                if "SUMMARY" in writer.book.sheetnames:
-                    writer.book.active = writer.book.sheetnames.index("SUMMARY")
-                else:
-                    writer.book.active = 0
-            except Exception as ex:
-                logging.warning(f"[write_to_excel] Не удалось выставить активный лист: {ex}")
+                # Делаем SUMMARY лист активным по умолчанию (если он есть в файле)
                 try:
-                    writer.book.active = 0
-                except Exception:
-                    pass
-            # Не вызывать writer.book.save() здесь: контекстный менеджер ExcelWriter при выходе из ``with``
-            # сам сохраняет файл. Повторное сохранение на тот же путь часто даёт повреждённый ZIP (xlsx не открывается).
+                    if "SUMMARY" in writer.book.sheetnames:
+                        writer.book.active = writer.book.sheetnames.index("SUMMARY")
+                    else:
+                        writer.book.active = 0
+                except Exception as ex:
+                    logging.warning(f"[write_to_excel] Не удалось выставить активный лист: {ex}")
+                    try:
+                        writer.book.active = 0
+                    except Exception:
+                        pass
+                # Не вызывать writer.book.save() здесь: контекстный менеджер ExcelWriter при выходе из ``with``
+                # сам сохраняет файл. Повторное сохранение на тот же путь часто даёт повреждённый ZIP (xlsx не открывается).
 
         # Логируем успешное завершение
         func_time = time() - func_start
@@ -1636,20 +1888,18 @@ def write_to_excel(
 
 
 # === Форматирование листа ===
-# При AUTO-ширине не сканируем весь столбец (на крупных листах это десятки миллионов обращений к ячейкам):
-# заголовок + первые N строк данных. Фиксированная ширина (число в col_width_mode) не меняется.
-_AUTO_COLUMN_WIDTH_MAX_DATA_ROWS = 500
-
-
-def calculate_column_width(col_name, ws, params, col_num):
-    """
-    Вычисляет ширину колонки на основе параметров и содержимого.
-
-    - col_width_mode == "AUTO": ширина по содержимому в пределах [min_col_width, max_col_width]
-      (оценка по заголовку и первым N строкам данных, см. ``_AUTO_COLUMN_WIDTH_MAX_DATA_ROWS``).
-    - col_width_mode == число (или строка-число): фиксированная ширина, min/max не используются.
-    - Иначе: ширина по содержимому, ограниченная min/max.
-    """
+# AUTO-ширина считается по подготовленному DataFrame до записи листа (одинаково для openpyxl и stream):
+# длины строк векторно (str.len) по выборке performance.column_width — первые строки + случайные строки,
+# затем соседи longest_rows самых длинных значений выборки (длинные тексты в выгрузках идут блоками);
+# текстовые колонки до full_scan_max_rows строк меряются целиком, у целых чисел длиннейшие — min/max,
+# у category — категории, которые встречаются в колонке. Фиксированная ширина (число в col_width_mode) не меняется.
+_COLUMN_WIDTH_SAMPLE_SEED = 0
+# Сколько строк выше и ниже каждого из самых длинных значений выборки домеряется
+_COLUMN_WIDTH_LONGEST_WINDOW = 25
+
+
+def _column_width_settings(col_name, params):
+    """Параметры ширины колонки: (min_width, max_width, width_mode) с учётом added_columns_width."""
     # Получаем параметры для конкретной колонки (если добавлена через merge — MERGE_FIELDS_ADVANCED)
     added_cols_width = params.get("added_columns_width", {})
     if col_name in added_cols_width:
@@ -1662,8 +1912,11 @@ def calculate_column_width(col_name, ws, params, col_num):
         max_width = params.get("max_col_width", 30)
         width_mode = params.get("col_width_mode", "AUTO")
         min_width = params.get("min_col_width", 8)
+    return min_width, max_width, width_mode
+
 
-    # Фиксированная ширина: число (в т.ч. если в JSON пришло строкой "50")
+def _fixed_column_width(width_mode) -> Optional[int]:
+    """Фиксированная ширина: число (в т.ч. если в JSON пришло строкой "50"); иначе None."""
     try:
         if isinstance(width_mode, (int, float)):
             return max(1, int(width_mode))
@@ -1673,31 +1926,113 @@ def calculate_column_width(col_name, ws, params, col_num):
                 return max(1, int(fixed))
     except (ValueError, TypeError):
         pass
+    return None
 
-    # Вычисляем ширину на основе содержимого (выборка строк — ускорение; фиксированный режим выше уже обработан)
-    content_width = min_width
-    hval = ws.cell(row=1, column=col_num).value
-    if hval is not None:
-        content_width = max(content_width, len(str(hval)))
-    if ws.max_row >= 2:
-        last_scan = min(ws.max_row, 1 + _AUTO_COLUMN_WIDTH_MAX_DATA_ROWS)
-        for row_idx in range(2, last_scan + 1):
-            val = ws.cell(row=row_idx, column=col_num).value
-            if val is not None:
-                content_width = max(content_width, len(str(val)))
-
-    if width_mode == "AUTO" or (isinstance(width_mode, str) and str(width_mode).strip().upper() == "AUTO"):
-        # Автоматически: уместить между min и max
-        final_width = min(content_width, max_width)
-        final_width = max(final_width, min_width)
-    else:
-        # Резерв: ограничить содержимое min/max
-        final_width = min(content_width, max_width)
-        final_width = max(final_width, min_width)
 
+def _column_width_sample_positions(n_rows: int, settings: Mapping[str, Any]) -> np.ndarray:
+    """Позиции строк выборки: первые head_rows + random_rows случайных (детерминированно)."""
+    head = min(n_rows, int(settings.get("head_rows", 0)))
+    n_random = min(n_rows - head, int(settings.get("random_rows", 0)))
+    positions = np.arange(head)
+    if n_random > 0:
+        rng = np.random.default_rng(_COLUMN_WIDTH_SAMPLE_SEED)
+        extra = head + rng.choice(n_rows - head, size=n_random, replace=False)
+        positions = np.concatenate([positions, np.sort(extra)])
+    return positions
+
+
+def _column_width_longest_neighbours(
+    n_rows: int, positions: np.ndarray, lengths: np.ndarray, settings: Mapping[str, Any]
+) -> np.ndarray:
+    """Строки вокруг longest_rows самых длинных значений выборки, ещё не вошедшие в неё."""
+    n_longest = min(len(lengths), int(settings.get("longest_rows", 0)))
+    if n_longest <= 0 or len(positions) >= n_rows:
+        return np.empty(0, dtype=np.int64)
+    top = positions[np.argpartition(lengths, len(lengths) - n_longest)[-n_longest:]]
+    window = np.arange(-_COLUMN_WIDTH_LONGEST_WINDOW, _COLUMN_WIDTH_LONGEST_WINDOW + 1)
+    around = np.unique(np.clip(top[:, None] + window, 0, n_rows - 1))
+    return np.setdiff1d(around, positions, assume_unique=True)
+
+
+def _series_max_display_len(series: pd.Series, settings: Mapping[str, Any]) -> int:
+    """Наибольшая длина str(значения) в колонке (пустые значения не учитываются) по выборке."""
+    n_rows = len(series)
+    if n_rows == 0:
+        return 0
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = np.unique(series.cat.codes.to_numpy())
+        codes = codes[codes >= 0]
+        if not len(codes):
+            return 0
+        return int(pd.Series(series.cat.categories.take(codes)).astype(str).str.len().max())
+    if pd.api.types.is_integer_dtype(dtype):
+        # Самые длинные записи целых — у минимума и максимума
+        values = series.dropna()
+        if values.empty:
+            return 0
+        return max(len(str(values.min())), len(str(values.max())))
+    full_scan = n_rows <= int(settings.get("full_scan_max_rows", 0)) and (
+        dtype == object or pd.api.types.is_string_dtype(dtype)
+    )
+    if pd.api.types.is_datetime64_any_dtype(dtype) or isinstance(dtype, pd.PeriodDtype):
+        # astype(str) у datetime64 опускает нулевое время; длина — как у str(Timestamp)
+        values = series.iloc[_column_width_sample_positions(n_rows, settings)].dropna()
+        return int(values.map(str).str.len().max()) if not values.empty else 0
+    if pd.api.types.is_float_dtype(dtype):
+        values = series.iloc[_column_width_sample_positions(n_rows, settings)].dropna()
+        if not series.dropna().empty:
+            values = pd.concat([values, pd.Series([series.min(), series.max()], dtype=dtype)])
+        return int(values.astype(str).str.len().max()) if not values.empty else 0
+    if n_rows <= int(settings.get("full_scan_max_rows", 0)):
+        lengths = series.dropna().astype(str).str.len()
+        return int(lengths.max()) if not lengths.empty else 0
+    positions = _column_width_sample_positions(n_rows, settings)
+    sample = series.iloc[positions]
+    present = sample.notna().to_numpy()
+    lengths = sample[present].astype(str).str.len().to_numpy()
+    best = int(lengths.max()) if len(lengths) else 0
+    if len(lengths) and (dtype == object or pd.api.types.is_string_dtype(dtype)):
+        extra = series.iloc[_column_width_longest_neighbours(n_rows, positions[present], lengths, settings)]
+        extra = extra.dropna()
+        if not extra.empty:
+            best = max(best, int(extra.astype(str).str.len().max()))
+    return best
+
+
+def calculate_column_width_from_series(col_name, series: pd.Series, params, settings=None):
+    """
+    Ширина колонки по данным DataFrame (до записи листа; одинаково для движков openpyxl и stream).
+
+    - col_width_mode == "AUTO": ширина по заголовку и выборке значений в пределах [min_col_width, max_col_width]
+      (выборка — performance.column_width; если заголовок уже не уже max_col_width, данные не меряются).
+    - col_width_mode == число (или строка-число): фиксированная ширина, min/max не используются.
+    - Иначе: ширина по содержимому, ограниченная min/max.
+    """
+    min_width, max_width, width_mode = _column_width_settings(col_name, params)
+    fixed = _fixed_column_width(width_mode)
+    if fixed is not None:
+        return fixed
+    content_width = max(min_width, len(str(col_name))) if col_name is not None else min_width
+    if content_width < max_width:
+        content_width = max(
+            content_width,
+            _series_max_display_len(series, COLUMN_WIDTH if settings is None else settings),
+        )
+    final_width = min(content_width, max_width)
+    final_width = max(final_width, min_width)
     return final_width
 
 
+def column_widths_from_frame(df: pd.DataFrame, params, settings=None) -> List[int]:
+    """Ширины всех колонок листа по DataFrame (позиционно, дубли имён колонок допустимы)."""
+    params = params or {}
+    return [
+        calculate_column_width_from_series(col_name, df.iloc[:, j], params, settings)
+        for j, col_name in enumerate(df.columns)
+    ]
+
+
 def _build_excel_number_format(rule):
     """
     Строит строку формата Excel для числовых ячеек по правилу COLUMN_FORMATS.
@@ -1822,6 +2157,128 @@ def _iter_sheet_format_rules(
     return rules
 
 
+@dataclasses.dataclass(frozen=True)
+class SheetStylePlan:
+    """
+    Правила COLUMN_FORMATS листа, сопоставленные заголовкам один раз (индексы колонок 0-based).
+
+    rule_columns — (правило, колонки) в порядке правил (для преобразования типов);
+    num_formats / alignments — итоговый формат и выравнивание данных по колонке
+    (последнее подходящее правило; выравнивание None — не выставлять);
+    force_int — числовые колонки с 0 знаков после запятой.
+    """
+
+    rule_columns: Tuple[Tuple[Mapping[str, Any], Tuple[int, ...]], ...]
+    num_formats: Tuple[Optional[str], ...]
+    alignments: Tuple[Optional[Tuple[str, str, bool]], ...]
+    force_int: frozenset
+    covered: frozenset
+
+
+# Выравнивание данных без правил COLUMN_FORMATS (перенос по словам, как в _format_sheet)
+_DEFAULT_DATA_ALIGNMENT = ("left", "center", True)
+_sheet_style_plans: Dict[Tuple[Any, ...], SheetStylePlan] = {}
+_sheet_style_plans_lock = threading.Lock()
+
+
+def _format_rule_alignment(rule: Mapping[str, Any]) -> Tuple[str, str, bool]:
+    h_map = {"left": "left", "center": "center", "right": "right"}
+    v_map = {"top": "top", "center": "center", "bottom": "bottom"}
+    return (
+        h_map.get(rule.get("horizontal", "left").lower(), "left"),
+        v_map.get(rule.get("vertical", "center").lower(), "center"),
+        bool(rule.get("wrap_text", False)),
+    )
+
+
+def _compile_sheet_style_plan(
+    headers: Sequence[str],
+    rules: Sequence[Mapping[str, Any]],
+    skip_data_align: bool,
+) -> SheetStylePlan:
+    header_norm = [_normalize_column_name_for_format_match(h) for h in headers]
+    n_cols = len(headers)
+    num_formats: List[Optional[str]] = [None] * n_cols
+    alignments: List[Optional[Tuple[str, str, bool]]] = [
+        None if skip_data_align else _DEFAULT_DATA_ALIGNMENT
+    ] * n_cols
+    force_int: Set[int] = set()
+    covered: Set[int] = set()
+    rule_columns = []
+    for rule in rules:
+        if not _format_rule_has_column_selector(rule):
+            continue
+        except_cols = rule.get("except_columns") or []
+        columns_list = rule.get("columns") or []
+        prefixes = rule.get("column_prefixes") or []
+        # Та же логика, что в _column_matches_format_rule, но множества/префиксы — один раз на правило
+        if except_cols:
+            except_norm = {_normalize_column_name_for_format_match(x) for x in except_cols}
+            idxs = tuple(j for j, h in enumerate(header_norm) if h not in except_norm)
+        elif columns_list:
+            allowed_norm = {_normalize_column_name_for_format_match(x) for x in columns_list}
+            idxs = tuple(j for j, h in enumerate(header_norm) if h in allowed_norm)
+        else:
+            pnorms = [p for p in (_normalize_column_name_for_format_match(x) for x in prefixes) if p]
+            idxs = tuple(j for j, h in enumerate(header_norm) if any(h.startswith(p) for p in pnorms))
+        rule_columns.append((rule, idxs))
+        data_type = (rule.get("data_type") or "general").lower()
+        if data_type == "number":
+            num_fmt = _build_excel_number_format(rule)
+        elif data_type == "date":
+            num_fmt = _build_excel_date_format(rule)
+        else:
+            num_fmt = None
+        is_int = data_type == "number" and int(rule.get("decimal_places", 0)) == 0
+        align = None if skip_data_align else _format_rule_alignment(rule)
+        for j in idxs:
+            covered.add(j)
+            if num_fmt is not None:
+                num_formats[j] = num_fmt
+            if is_int:
+                force_int.add(j)
+            alignments[j] = align
+    return SheetStylePlan(
+        rule_columns=tuple(rule_columns),
+        num_formats=tuple(num_formats),
+        alignments=tuple(alignments),
+        force_int=frozenset(force_int),
+        covered=frozenset(covered),
+    )
+
+
+def sheet_style_plan(
+    sheet_name: str,
+    col_names: Sequence[Any],
+    extra_rules: Optional[Sequence[Mapping[str, Any]]] = None,
+) -> SheetStylePlan:
+    """
+    План стилей листа по заголовкам: кэш по (заголовки, правила без поля sheet, skip-alignment),
+    поэтому листы одного семейства с одинаковыми колонками (RATING_*, ORDER_*) используют один план.
+    """
+    headers = tuple(str(c) if c is not None else "" for c in col_names)
+    rules = _iter_sheet_format_rules(sheet_name, extra_rules)
+    try:
+        skip_pats = SKIP_DATA_ALIGNMENT_SHEETS
+    except NameError:
+        skip_pats = None
+    skip_data_align = sheet_skips_data_alignment(sheet_name, skip_pats)
+    rules_key = json.dumps(
+        [{k: v for k, v in r.items() if k != "sheet"} for r in rules],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    key = (headers, rules_key, skip_data_align)
+    with _sheet_style_plans_lock:
+        plan = _sheet_style_plans.get(key)
+    if plan is None:
+        plan = _compile_sheet_style_plan(headers, rules, skip_data_align)
+        with _sheet_style_plans_lock:
+            _sheet_style_plans[key] = plan
+    return plan
+
+
 @debug_timed()
 def apply_column_format_conversion(
     df: pd.DataFrame,
@@ -1831,26 +2288,30 @@ def apply_column_format_conversion(
     """
     Преобразует типы колонок в DataFrame по правилам COLUMN_FORMATS перед записью в Excel.
     Вызывается для копии DataFrame перед to_excel, чтобы Excel получал числа/даты, а не строки.
-    Для числа с 0 знаков после запятой записываются целые (без .0), чтобы Excel не показывал дробную часть.
+    Для числа с 0 знаков после запятой записываются целые (без .0), чтобы Excel не показывал дробную часть:
+    если в колонке есть дробные значения, целыми становятся только целочисленные ячейки
+    (после записи значения ячеек больше не переписываются).
 
     Args:
         df (pd.DataFrame): DataFrame листа (будет изменён in-place)
         sheet_name (str): Имя листа
         extra_rules: Доп. правила из params листа (без поля sheet)
     """
-    for rule in _iter_sheet_format_rules(sheet_name, extra_rules):
-        if not _format_rule_has_column_selector(rule):
-            continue
+    plan = sheet_style_plan(sheet_name, list(df.columns), extra_rules)
+    duplicated = df.columns.duplicated(keep=False)
+    for rule, idxs in plan.rule_columns:
         dtype = (rule.get("data_type") or "general").lower()
-        for col in df.columns:
-            if not _column_matches_format_rule(col, rule):
-                continue
-            col_data = df[col]
-            if isinstance(col_data, pd.DataFrame):
+        force_int = dtype == "number" and int(rule.get("decimal_places", 0)) == 0
+        for j in idxs:
+            col = df.columns[j]
+            if duplicated[j]:
                 logging.warning(
                     f"[COLUMN_FORMATS] Лист «{sheet_name}»: имя колонки «{col}» дублируется — пропуск преобразования"
                 )
+                if force_int and len(df):
+                    df.isetitem(j, _coerce_int_like_series(df.iloc[:, j]))
                 continue
+            col_data = df[col]
             try:
                 if dtype == "number":
                     # После read_csv_file значения строковые; убираем разряды (пробел/NBSP), запятую в десятичную точку
@@ -1858,11 +2319,13 @@ def apply_column_format_conversion(
                         col_data.map(_normalize_string_for_numeric_cell),
                         errors="coerce",
                     )
-                    decimal_places = int(rule.get("decimal_places", 0))
-                    if decimal_places == 0:
+                    if not force_int:
+                        df[col] = ser
+                    elif (ser.dropna() % 1 == 0).all():
                         df[col] = ser.astype("Int64")
                     else:
-                        df[col] = ser
+                        # Есть дробные значения: целыми становятся только целочисленные ячейки
+                        df[col] = _coerce_int_like_series(col_data)
                 elif dtype == "date":
                     raw_ser = col_data.astype(str).str.strip()
                     pd_fmt = _config_date_format_to_pandas(rule.get("date_format"))
@@ -1902,18 +2365,38 @@ def _column_indices_covered_by_column_formats(
     Возвращает номера столбцов (1-based), к которым будут применены правила COLUMN_FORMATS на листе.
     Нужно, чтобы не выставлять общий alignment второй раз тем же ячейкам в _format_sheet (перенос и пр. из правил сохраняются).
     """
-    rules_for_sheet = _iter_sheet_format_rules(sheet_name, extra_rules)
-    covered: Set[int] = set()
-    if not rules_for_sheet:
-        return covered
-    for rule in rules_for_sheet:
-        if not _format_rule_has_column_selector(rule):
+    plan = sheet_style_plan(sheet_name, col_names, extra_rules)
+    return {j + 1 for j in plan.covered}
+
+
+def _apply_style_plan_to_worksheet(ws: Any, plan: SheetStylePlan, columns: Sequence[int]) -> None:
+    """
+    Формат числа/даты и выравнивание данных из плана — по колонкам, а не по правилам.
+    Стиль ячейки (StyleArray) вычисляется один раз на пару (колонка, исходный стиль ячейки)
+    и копируется остальным ячейкам колонки, без поиска в реестрах стилей книги на каждую ячейку.
+    """
+    if ws.max_row < 2:
+        return
+    alignments: Dict[Tuple[str, str, bool], Alignment] = {}
+    for j in columns:
+        num_fmt = plan.num_formats[j]
+        align = plan.alignments[j]
+        if num_fmt is None and align is None:
             continue
-        for col_idx, raw_header in enumerate(col_names, start=1):
-            header = str(raw_header) if raw_header is not None else ""
-            if _column_matches_format_rule(header, rule):
-                covered.add(col_idx)
-    return covered
+        if align is not None and align not in alignments:
+            alignments[align] = Alignment(horizontal=align[0], vertical=align[1], wrap_text=align[2])
+        styled: Dict[Tuple[int, ...], Any] = {}
+        for (cell,) in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=j + 1, max_col=j + 1):
+            src = tuple(cell._style) if cell._style is not None else ()
+            done = styled.get(src)
+            if done is not None:
+                cell._style = copy.copy(done)
+                continue
+            if num_fmt is not None:
+                cell.number_format = num_fmt
+            if align is not None:
+                cell.alignment = alignments[align]
+            styled[src] = copy.copy(cell._style)
 
 
 def apply_column_formats(
@@ -1924,76 +2407,62 @@ def apply_column_formats(
     """
     Применяет к ячейкам листа Excel формат числа/даты и выравнивание по правилам COLUMN_FORMATS.
     Вызывается из _format_sheet после базового форматирования. Обрабатывает только колонки,
-    перечисленные в правилах для данного листа (batch по колонкам).
-    Имена колонок берутся из заголовка листа (ws), не из DataFrame.
+    перечисленные в правилах для данного листа (план стилей листа, batch по колонкам).
+    Имена колонок берутся из заголовка листа (ws), не из DataFrame. Целые для чисел с 0 знаков
+    после запятой готовит apply_column_format_conversion — значения ячеек здесь не меняются.
 
     Args:
         ws: openpyxl Worksheet
         sheet_name (str): Имя листа
     """
-    header_cells = list(ws[1])
-    col_names = [c.value for c in header_cells]
-    rules_for_sheet = _iter_sheet_format_rules(sheet_name, extra_rules)
-    if not rules_for_sheet:
+    col_names = [c.value for c in ws[1]]
+    plan = sheet_style_plan(sheet_name, col_names, extra_rules)
+    if not plan.covered:
         return
+    _apply_style_plan_to_worksheet(ws, plan, sorted(plan.covered))
+    logging.debug(
+        f"[COLUMN_FORMATS] Применён формат к листу {sheet_name}: колонок {len(plan.covered)}"
+    )
 
-    # На листах из skip_data_alignment_sheets: number_format остаётся, Alignment данных — нет
-    try:
-        _skip_pats = SKIP_DATA_ALIGNMENT_SHEETS
-    except NameError:
-        _skip_pats = None
-    skip_data_align = sheet_skips_data_alignment(sheet_name, _skip_pats)
 
-    for rule in rules_for_sheet:
-        if not _format_rule_has_column_selector(rule):
+def _reorder_cell_fills(cell_fills: Dict[str, Any], order: Sequence[int]) -> Dict[str, Any]:
+    """Перестановка позиционных заливок ``cell_fills["columns"]`` в порядок строк после сортировки."""
+    columns = {}
+    for col_name, fills in (cell_fills.get("columns") or {}).items():
+        columns[col_name] = [fills[i] if i < len(fills) else None for i in order]
+    return {"header": dict(cell_fills.get("header") or {}), "columns": columns}
+
+
+def apply_cell_fills(ws: Any, cell_fills: Mapping[str, Any]) -> None:
+    """
+    Заливка заголовков и ячеек данных из params листа ``cell_fills``:
+    ``{"header": {колонка: hex}, "columns": {колонка: [hex | None по строкам данных]}}``.
+    """
+    header_idx = {}
+    for col_num, cell in enumerate(ws[1], 1):
+        if cell.value is not None:
+            header_idx.setdefault(str(cell.value).strip(), col_num)
+    pf_cache: Dict[str, PatternFill] = {}
+
+    def _fill(hx: str) -> PatternFill:
+        pf = pf_cache.get(hx)
+        if pf is None:
+            pf = PatternFill(fill_type="solid", start_color=hx, end_color=hx)
+            pf_cache[hx] = pf
+        return pf
+
+    for col_name, hx in (cell_fills.get("header") or {}).items():
+        ci = header_idx.get(str(col_name).strip())
+        if ci is not None and hx:
+            ws.cell(row=1, column=ci).fill = _fill(hx)
+    max_data_rows = max(ws.max_row - 1, 0)
+    for col_name, fills in (cell_fills.get("columns") or {}).items():
+        ci = header_idx.get(str(col_name).strip())
+        if ci is None:
             continue
-        data_type = (rule.get("data_type") or "general").lower()
-        # Строка формата Excel
-        if data_type == "number":
-            num_fmt = _build_excel_number_format(rule)
-        elif data_type == "date":
-            num_fmt = _build_excel_date_format(rule)
-        else:
-            num_fmt = None
-        # Выравнивание
-        h = rule.get("horizontal", "left").lower()
-        v = rule.get("vertical", "center").lower()
-        wrap = bool(rule.get("wrap_text", False))
-        h_map = {"left": "left", "center": "center", "right": "right"}
-        v_map = {"top": "top", "center": "center", "bottom": "bottom"}
-        alignment = Alignment(
-            horizontal=h_map.get(h, "left"),
-            vertical=v_map.get(v, "center"),
-            wrap_text=wrap,
-        )
-        # Обход по индексу столбца: совпадение с except/columns/prefixes
-        for col_idx, raw_header in enumerate(col_names, start=1):
-            header = str(raw_header) if raw_header is not None else ""
-            if not _column_matches_format_rule(header, rule):
-                continue
-            # Для числа с 0 знаков после запятой: записать в ячейку целое значение (1, 2), а не 1.0, 2.0,
-            # иначе Excel в части локалей отображает "1,0"
-            force_int = (data_type == "number" and int(rule.get("decimal_places", 0)) == 0)
-            for row_idx in range(2, ws.max_row + 1):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                if num_fmt is not None:
-                    cell.number_format = num_fmt
-                if force_int and cell.value is not None:
-                    try:
-                        raw = _normalize_string_for_numeric_cell(cell.value)
-                        if raw != "":
-                            v = float(raw)
-                            if v == int(v):
-                                cell.value = int(v)
-                    except (TypeError, ValueError):
-                        pass
-                if not skip_data_align:
-                    cell.alignment = alignment
-            logging.debug(
-                f"[COLUMN_FORMATS] Применён формат к листу {sheet_name}, колонка {col_idx} "
-                f"«{raw_header}» (тип: {data_type})"
-            )
-    return
+        for pos, hx in enumerate(fills[:max_data_rows]):
+            if hx:
+                ws.cell(row=pos + 2, column=ci).fill = _fill(hx)
 
 
 @debug_timed()
@@ -2003,12 +2472,15 @@ def _format_sheet(ws, df, params, use_color_scheme: bool = True):
     logging.debug(f"[START] _format_sheet {params_str}")
     header_font = Font(bold=True)
     align_center = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    align_data = Alignment(horizontal="left", vertical="center", wrap_text=True)
 
     # ОПТИМИЗАЦИЯ: Batch-операции для заголовков - вычисляем все ширины сразу
+    # Ширины — по DataFrame листа (как в движке stream), без чтения ячеек листа
     header_cells = list(ws[1])
     column_widths = {}
-    
+    if df is None or len(df.columns) != len(header_cells):
+        df = pd.DataFrame(columns=[c.value for c in header_cells])
+    widths = column_widths_from_frame(df, params)
+
     for col_num, cell in enumerate(header_cells, 1):
         cell.font = header_font
         cell.alignment = align_center
@@ -2016,7 +2488,7 @@ def _format_sheet(ws, df, params, use_color_scheme: bool = True):
         col_name = cell.value
         
         # Вычисляем ширину колонки
-        width = calculate_column_width(col_name, ws, params, col_num)
+        width = widths[col_num - 1]
         column_widths[col_letter] = width
         
         # Определяем режим для логирования
@@ -2035,32 +2507,24 @@ def _format_sheet(ws, df, params, use_color_scheme: bool = True):
     if use_color_scheme:
         apply_color_scheme(ws, ws.title)
 
-    # Выравнивание и перенос для данных: столбцы из COLUMN_FORMATS обрабатывает только apply_column_formats
-    # (там wrap_text и т.д. как в конфиге), остальные — общий стиль с переносом по словам как раньше.
-    # Листы из performance.skip_data_alignment_sheets — без Alignment на данных (ускорение).
-    skip_data_align = sheet_skips_data_alignment(
-        ws.title, SKIP_DATA_ALIGNMENT_SHEETS
-    )
+    # Выравнивание и перенос для данных и формат чисел/дат по правилам — один план стилей листа:
+    # столбцы из COLUMN_FORMATS получают стиль правила (wrap_text и т.д. как в конфиге), остальные —
+    # общий стиль с переносом по словам. Листы из performance.skip_data_alignment_sheets —
+    # без Alignment на данных (ускорение), number_format остаётся.
     if ws.max_row > 1:
         col_names_header = [c.value for c in header_cells]
         extra_fmt = params.get("column_format_rules") if isinstance(params, dict) else None
-        if not skip_data_align:
-            cols_covered_by_rules = _column_indices_covered_by_column_formats(
-                ws.title, col_names_header, extra_rules=extra_fmt
-            )
-            for row in ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=ws.max_column):
-                for cell in row:
-                    if cell.column in cols_covered_by_rules:
-                        continue
-                    cell.alignment = align_data
-        else:
+        plan = sheet_style_plan(ws.title, col_names_header, extra_fmt)
+        if sheet_skips_data_alignment(ws.title, SKIP_DATA_ALIGNMENT_SHEETS):
             logging.debug(
                 f"[_format_sheet] {ws.title}: Alignment данных пропущен "
                 f"(performance.skip_data_alignment_sheets)"
             )
+        _apply_style_plan_to_worksheet(ws, plan, range(len(col_names_header)))
 
-        # Формат чисел/дат и выравнивание по правилам (включая wrap_text из конфига)
-        apply_column_formats(ws, ws.title, extra_rules=extra_fmt)
+    # Заливки отдельных ячеек (матрица ITEM на RATING) — последними, поверх цветовой схемы
+    if isinstance(params, dict) and params.get("cell_fills"):
+        apply_cell_fills(ws, params["cell_fills"])
 
     # Закрепление строк и столбцов
     ws.freeze_panes = params.get("freeze", "A2")
@@ -2079,46 +2543,200 @@ def _format_sheet(ws, df, params, use_color_scheme: bool = True):
     return ws.title
 
 
+def _coerce_int_like_series(series: pd.Series) -> pd.Series:
+    """
+    Целые значения для числовых колонок с 0 знаков после запятой (apply_column_format_conversion):
+    «1 000» / 1.0 → 1000 / 1; нечисловые значения остаются как есть.
+    """
+    if pd.api.types.is_integer_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series
+
+    def _to_int(val):
+        if val is None or val is pd.NA or isinstance(val, (bool, datetime, pd.Timestamp)):
+            return val
+        try:
+            raw = _normalize_string_for_numeric_cell(val)
+            if raw != "":
+                num = float(raw)
+                if num == int(num):
+                    return int(num)
+        except (TypeError, ValueError, OverflowError):
+            pass
+        return val
+
+    return series.astype(object).map(_to_int)
+
+
+def _build_stream_sheet(
+    sheet_name: str,
+    df: pd.DataFrame,
+    params: Optional[Dict[str, Any]],
+    styles: XlsxStyleRegistry,
+    use_color_scheme: bool = True,
+) -> StreamSheet:
+    """
+    Лист для движка ``stream``: те же стили, что дают to_excel + _format_sheet в openpyxl,
+    но вычисленные один раз на столбец (заголовок, данные, формат чисел/дат, ширина).
+    """
+    params = params or {}
+    col_names = list(df.columns)
+    n_cols = len(col_names)
+
+    header: List[Dict[str, Any]] = [
+        {"bold": True, "font_color": None, "fill": None} for _ in range(n_cols)
+    ]
+    data: List[Dict[str, Any]] = [
+        {"font_color": None, "fill": None, "num_fmt": None, "align": None} for _ in range(n_cols)
+    ]
+
+    if use_color_scheme:
+        for color_conf in _get_all_color_schemes():
+            if sheet_name not in color_conf["sheets"]:
+                continue
+            colnames = color_conf["columns"] if color_conf["columns"] else col_names
+            style_scope = color_conf.get("style_scope", "header")
+            for colname in colnames:
+                try:
+                    j = col_names.index(colname)
+                except ValueError:
+                    continue  # нет такой колонки на этом листе
+                if style_scope == "header":
+                    if color_conf.get("header_bg"):
+                        header[j]["fill"] = color_conf["header_bg"]
+                    if color_conf.get("header_fg"):
+                        header[j]["font_color"] = color_conf["header_fg"]
+                        header[j]["bold"] = False
+                elif style_scope == "all":
+                    if color_conf.get("header_bg"):
+                        header[j]["fill"] = color_conf["header_bg"]
+                        if color_conf.get("header_fg"):
+                            header[j]["font_color"] = color_conf["header_fg"]
+                            header[j]["bold"] = False
+                    elif color_conf.get("column_bg"):
+                        header[j]["fill"] = color_conf["column_bg"]
+                        if color_conf.get("column_fg"):
+                            header[j]["font_color"] = color_conf["column_fg"]
+                            header[j]["bold"] = False
+                    if color_conf.get("column_bg"):
+                        data[j]["fill"] = color_conf["column_bg"]
+                        if color_conf.get("column_fg"):
+                            data[j]["font_color"] = color_conf["column_fg"]
+
+    # Выравнивание данных и COLUMN_FORMATS — тот же план стилей листа, что в _format_sheet
+    extra_fmt = params.get("column_format_rules") if isinstance(params, dict) else None
+    plan = sheet_style_plan(sheet_name, col_names, extra_fmt)
+    for j in range(n_cols):
+        data[j]["num_fmt"] = plan.num_formats[j]
+        data[j]["align"] = plan.alignments[j]
+
+    # Заливки отдельных ячеек (cell_fills, матрица ITEM на RATING) — поверх цветовой схемы
+    cell_fills = params.get("cell_fills") if isinstance(params, dict) else None
+    fill_cols: Dict[int, List[Optional[str]]] = {}
+    if cell_fills:
+        header_idx: Dict[str, int] = {}
+        for j, header_name in enumerate(col_names):
+            if header_name is not None:
+                header_idx.setdefault(str(header_name).strip(), j)
+        for col_name, hx in (cell_fills.get("header") or {}).items():
+            j = header_idx.get(str(col_name).strip())
+            if j is not None and hx:
+                header[j]["fill"] = hx
+        for col_name, fills in (cell_fills.get("columns") or {}).items():
+            j = header_idx.get(str(col_name).strip())
+            if j is not None:
+                fill_cols[j] = list(fills[: len(df)])
+
+    header_ids: List[int] = []
+    cell_style_ids: Dict[int, List[Optional[int]]] = {}
+    data_ids: List[int] = []
+    datetime_ids: List[int] = []
+    date_ids: List[int] = []
+    for j in range(n_cols):
+        h = header[j]
+        header_ids.append(styles.style_id(CellStyle(
+            bold=h["bold"], font_color=h["font_color"], fill=h["fill"], border=True,
+            horizontal="center", vertical="center", wrap_text=True,
+        )))
+        d = data[j]
+        align = d["align"] or (None, None, False)
+        base = CellStyle(
+            font_color=d["font_color"], fill=d["fill"], num_fmt=d["num_fmt"],
+            horizontal=align[0], vertical=align[1], wrap_text=align[2],
+        )
+        data_ids.append(styles.style_id(base))
+        if j in fill_cols:
+            by_hex: Dict[str, int] = {}
+            row_ids: List[Optional[int]] = []
+            for hx in fill_cols[j]:
+                if not hx:
+                    row_ids.append(None)
+                    continue
+                if hx not in by_hex:
+                    by_hex[hx] = styles.style_id(dataclasses.replace(base, fill=hx))
+                row_ids.append(by_hex[hx])
+            cell_style_ids[j] = row_ids
+        if d["num_fmt"] is None:
+            # Даты без правила COLUMN_FORMATS — формат pandas по умолчанию
+            datetime_ids.append(styles.style_id(base.with_num_fmt(DEFAULT_DATETIME_FORMAT)))
+            date_ids.append(styles.style_id(base.with_num_fmt(DEFAULT_DATE_FORMAT)))
+        else:
+            datetime_ids.append(data_ids[-1])
+            date_ids.append(data_ids[-1])
+
+    return StreamSheet(
+        name=sheet_name,
+        df=df,
+        header_styles=header_ids,
+        data_styles=data_ids,
+        datetime_styles=datetime_ids,
+        date_styles=date_ids,
+        col_widths=column_widths_from_frame(df, params),
+        freeze=params.get("freeze", "A2"),
+        cell_styles=cell_style_ids,
+    )
+
+
+def _write_to_excel_stream(
+    ordered_sheets: Sequence[str],
+    prepared_sheets: Dict[str, Any],
+    output_path: str,
+    use_color_scheme: bool = True,
+) -> None:
+    """Запись основной книги движком ``stream`` (performance.excel_engine)."""
+    styles = XlsxStyleRegistry()
+    stream_sheets: List[StreamSheet] = []
+    for sheet_name in ordered_sheets:
+        sheet_data = prepared_sheets.get(sheet_name)
+        if sheet_data is None or len(sheet_data) < 1 or sheet_data[0] is None:
+            logging.warning(f"[write_to_excel] Пропущен лист {sheet_name}: данные отсутствуют или равны None")
+            continue
+        df_write, params_sheet = sheet_data
+        if len(df_write) == 0:
+            logging.error(f"[write_to_excel] ❌ ОШИБКА: Лист {sheet_name} ПУСТОЙ перед записью!")
+        stream_sheets.append(
+            _build_stream_sheet(sheet_name, df_write, params_sheet, styles, use_color_scheme=use_color_scheme)
+        )
+    if not stream_sheets:
+        raise ValueError("нет листов для записи")
+    # Делаем SUMMARY лист активным по умолчанию (если он есть в файле)
+    active = next((sh for sh in stream_sheets if sh.name == "SUMMARY"), stream_sheets[0])
+    active.selected = True
+    # Крупные листы (LIST-REWARDS, REPORT, STATISTICS, RATING) рендерятся в процессах параллельно
+    write_xlsx_stream(output_path, stream_sheets, styles, max_workers=MAX_WORKERS_CPU)
+    for sh in stream_sheets:
+        logging.info(
+            f"Лист Excel записан: {sh.name} (строк: {len(sh.df)}, колонок: {len(sh.df.columns)}, движок: stream)"
+        )
+
+
 def safe_json_loads(s: str):
     """
     Преобразует строку в объект JSON. Возвращает dict/list или None, если не удается разобрать.
     Более толерантен к разным типам кавычек и пустым строкам.
-    Дополнительно исправляет тройные кавычки, отсутствие двоеточий, лишние запятые и пробует "починить" кривой JSON.
+    Реализация общая с src/json_utils.safe_json_loads: ячейки SPOD с тройными кавычками разбираются
+    за один проход (src/spod_json.py), цепочка автоисправлений — только для остального «кривого» JSON.
     """
-    if not isinstance(s, str):
-        return s
-    s = s.strip()
-    if not s or s in {'-', 'None', 'null'}:
-        return None
-    try:
-        return json.loads(s)
-    except Exception as ex:
-        try:
-            fixed = s
-            # 1. Заменяем тройные кавычки на обычные двойные
-            fixed = fixed.replace('"""', '"')
-            # 2. Заменяем одиночные и фигурные кавычки на стандартные двойные
-            fixed = fixed.replace("'", '"')
-            fixed = fixed.replace('"', '"').replace('"', '"')
-            fixed = fixed.replace(''', '"').replace(''', '"')
-            # 3. Исправляем ключи вида ""key"" на "key"
-            fixed = re.sub(r'"{2,}([^"\s]+)"{2,}', r'"\1"', fixed)
-            # 4. Исправляем конструкции типа "key""": на "key":
-            fixed = re.sub(r'"{2,}([^"\s]+)"{2,}\s*:', r'"\1":', fixed)
-            # 5. Исправляем конструкции типа :"""value""" на :"value"
-            fixed = re.sub(r':\s*"{2,}([^"\s]+)"{2,}', r':"\1"', fixed)
-            # 6. Убираем завершающие запятые перед закрывающей скобкой
-            fixed = re.sub(r',\s*([}\]])', r'\1', fixed)
-            # 7. Исправляем отсутствие двоеточий между ключом и значением ("key" "value" -> "key":"value")
-            fixed = re.sub(r'(\"[^"]+\")\s+(\")', r'\1: \2', fixed)
-            # 8. Удаляем лишние пробелы между ключом и двоеточием
-            fixed = re.sub(r'(\"[^"]+\")\s*:\s*', r'\1:', fixed)
-            # 9. Попытка повторного парсинга
-            return json.loads(fixed)
-        except Exception as ex2:
-            from src.json_utils import _log_json_parse_error
-            _log_json_parse_error("safe_json_loads", s, ex, ex2)
-            return None
+    return _json_utils_safe_json_loads(s)
 
 
 def safe_json_loads_preserve_triple_quotes(s: str):
@@ -2143,7 +2761,7 @@ def safe_json_loads_preserve_triple_quotes(s: str):
 
 
 @debug_timed(hot=True)
-def flatten_json_column_recursive(df, column, prefix=None, sheet=None, sep="; "):
+def flatten_json_column_recursive(df, column, prefix=None, sheet=None, sep="; ", storage="object"):
     func_start = tmod.time()
     n_rows = len(df)
     n_errors = 0
@@ -2166,143 +2784,24 @@ def flatten_json_column_recursive(df, column, prefix=None, sheet=None, sep="; ")
     else:
         column_to_parse = column
 
-    def extract(obj, current_prefix):
-        """Recursively flattens obj. Keeps the field itself and expands nested JSON
-        if the value looks like a JSON string."""
-        fields = {}
-        if isinstance(obj, str):
-            # Сначала пробуем распарсить JSON (для разворачивания)
-            nested = safe_json_loads(obj)
-            
-            if isinstance(nested, (dict, list)):
-                # keep original string (с тройными кавычками, если они были)
-                fields[current_prefix] = obj
-                fields.update(extract(nested, current_prefix))
-                return fields
-            else:
-                # Если не удалось распарсить как JSON, сохраняем исходную строку
-                fields[current_prefix] = obj
-                return fields
-
-        if isinstance(obj, dict):
-            fields[current_prefix] = json.dumps(obj, ensure_ascii=False)
-            for k, v in obj.items():
-                new_prefix = f"{current_prefix} => {k}"
-                fields.update(extract(v, new_prefix))
-        elif isinstance(obj, list):
-            if all(isinstance(x, (str, int, float, bool, type(None))) for x in obj):
-                fields[current_prefix] = sep.join(str(x) for x in obj)
-            else:
-                fields[current_prefix] = json.dumps(obj, ensure_ascii=False)
-                for idx, x in enumerate(obj):
-                    item_prefix = f"{current_prefix} => [{idx}]"
-                    fields.update(extract(x, item_prefix))
-        else:
-            if isinstance(obj, float) and pd.isna(obj):
-                fields[current_prefix] = None
-            else:
-                fields[current_prefix] = obj
-        return fields
-
-            # ОПТИМИЗИРОВАННАЯ ВЕРСИЯ v2: Параллельный парсинг JSON с проверкой размера
-    new_cols = {}
-    
-    # ОПТИМИЗАЦИЯ: Параллелизация только для больших данных (>5000 строк)
-    # Для небольших данных накладные расходы превышают выигрыш
-    PARALLEL_JSON_THRESHOLD = 5000
-    
-    if n_rows > PARALLEL_JSON_THRESHOLD:
-        def parse_json_chunk(chunk_data):
-            """Парсит chunk данных и возвращает словарь с результатами"""
-            chunk_results = {}
-            chunk_errors = 0
-            chunk_idx, chunk_values = chunk_data
-            for local_idx, val in enumerate(chunk_values):
-                global_idx = chunk_idx + local_idx
-                try:
-                    parsed = None
-                    if isinstance(val, str):
-                        val = val.strip()
-                        if val in {"", "-", "None", "null"}:
-                            parsed = {}
-                        else:
-                            parsed = safe_json_loads(val)
-                    elif isinstance(val, (dict, list)):
-                        parsed = val
-                    else:
-                        parsed = {}
-                    flat = extract(parsed, prefix)
-                except Exception as ex:
-                    logging.debug(f"Ошибка разбора JSON (строка {global_idx}): {ex}")
-                    chunk_errors += 1
-                    flat = {}
-                
-                for k, v in flat.items():
-                    if k not in chunk_results:
-                        chunk_results[k] = {}
-                    chunk_results[k][global_idx] = v
-            return chunk_results, chunk_errors
-        
-        # Разбиваем на chunks для параллельной обработки
-        # Оптимизированный размер chunk: минимум 2000 строк на chunk
-        chunk_size = max(2000, n_rows // MAX_WORKERS_IO)
-        chunks = [(i * chunk_size, df[column_to_parse].iloc[i * chunk_size:(i + 1) * chunk_size].tolist()) 
-                  for i in range((n_rows + chunk_size - 1) // chunk_size)]
-        
-        # Параллельная обработка chunks только если chunks > 1
-        if len(chunks) > 1:
-            from concurrent.futures import ThreadPoolExecutor as TPE
-            with TPE(max_workers=min(MAX_WORKERS_IO, len(chunks))) as executor:
-                chunk_data_list = list(executor.map(parse_json_chunk, chunks))
-                chunk_results_list = [data[0] for data in chunk_data_list]
-                n_errors += sum(data[1] for data in chunk_data_list)
-            
-            # Объединяем результаты
-            for chunk_results in chunk_results_list:
-                for k, v_dict in chunk_results.items():
-                    if k not in new_cols:
-                        new_cols[k] = [None] * n_rows
-                    for idx, val in v_dict.items():
-                        new_cols[k][idx] = val
-        else:
-            # Один chunk - обрабатываем последовательно
-            chunk_results, chunk_errors = parse_json_chunk(chunks[0])
-            n_errors += chunk_errors
-            for k, v_dict in chunk_results.items():
-                if k not in new_cols:
-                    new_cols[k] = [None] * n_rows
-                for idx, val in v_dict.items():
-                    new_cols[k][idx] = val
-    else:
-        # Небольшие данные - последовательная обработка (быстрее из-за отсутствия накладных расходов)
-        for idx, val in enumerate(df[column_to_parse]):
-            try:
-                parsed = None
-                if isinstance(val, str):
-                    val = val.strip()
-                    if val in {"", "-", "None", "null"}:
-                        parsed = {}
-                    else:
-                        parsed = safe_json_loads(val)
-                elif isinstance(val, (dict, list)):
-                    parsed = val
-                else:
-                    parsed = {}
-                flat = extract(parsed, prefix)
-            except Exception as ex:
-                logging.debug(f"Ошибка разбора JSON (строка {idx}): {ex}")
-                n_errors += 1
-                flat = {}
-            for k, v in flat.items():
-                if k not in new_cols:
-                    new_cols[k] = [None] * n_rows
-                new_cols[k][idx] = v
+    # Разворот: куски строк в процессах (GIL не сериализует разбор) + план путей схемы — src/json_utils.py
+    new_cols, n_errors = flatten_json_values(
+        df[column_to_parse].tolist(),
+        prefix,
+        sep=sep,
+        settings=JSON_FLATTEN,
+        max_workers=MAX_WORKERS_CPU,
+        label=f"{sheet}/{column}",
+        executor=_JSON_FLATTEN_POOL,
+    )
     # Оставлять только реально созданные колонки (не пустые); пакетная вставка — без фрагментации DataFrame
     cols_to_add = {
         col_name: values
         for col_name, values in new_cols.items()
         if any(x is not None for x in values)
     }
+    # json_columns[*].storage: category — коды вместо объектов Python на каждую строку
+    cols_to_add = compact_json_columns(cols_to_add, storage)
     if cols_to_add:
         cols_new = {k: v for k, v in cols_to_add.items() if k not in df.columns}
         cols_overwrite = {k: v for k, v in cols_to_add.items() if k in df.columns}
@@ -2339,6 +2838,14 @@ _color_scheme_cache_key = None
 
 # Расхождения по числу полей в CSV (строка с большим/меньшим числом колонок, чем заголовок)
 _csv_column_mismatches: List[Dict[str, Any]] = []
+# Фоновый процесс архива SQLite текущего блока (input_archive_sqlite.background); None — не запущен
+_INPUT_ARCHIVE_JOB: Optional[InputArchiveJob] = None
+# --force: полный прогон даже при совпадении отпечатка run_memo (выставляет main)
+RUN_FORCE = False
+# Общий пул процессов разворота JSON на этап 01 (один на все потоки чтения файлов); None — вне этапа
+_JSON_FLATTEN_POOL: Optional[Any] = None
+# Кэш merge по ключам текущего блока (performance.incremental.merge); None — merge без кэша
+_MERGE_ROW_CACHE: Optional[MergeRowCache] = None
 _csv_mismatches_lock = threading.Lock()
 
 def generate_dynamic_color_scheme_from_merge_fields():
@@ -2414,12 +2921,8 @@ def generate_dynamic_color_scheme_from_merge_fields():
     return dynamic_scheme
 
 
-def apply_color_scheme(ws, sheet_name):
-    """
-    Окрашивает заголовки и/или всю колонку на листе Excel по схеме COLOR_SCHEME.
-    Также применяет динамически сгенерированную схему из MERGE_FIELDS_ADVANCED.
-    Все действия логируются напрямую в местах вызова.
-    """
+def _get_all_color_schemes() -> List[Dict[str, Any]]:
+    """COLOR_SCHEME + схема, сгенерированная из MERGE_FIELDS_ADVANCED (с кэшем)."""
     # ОПТИМИЗАЦИЯ v5.0: Используем кэш для цветовых схем
     global _color_scheme_cache, _color_scheme_cache_key
     # Проверяем, нужно ли обновить кэш (если MERGE_FIELDS_ADVANCED изменились)
@@ -2427,7 +2930,16 @@ def apply_color_scheme(ws, sheet_name):
     if _color_scheme_cache is None or _color_scheme_cache_key != current_key:
         _color_scheme_cache = COLOR_SCHEME + generate_dynamic_color_scheme_from_merge_fields()
         _color_scheme_cache_key = current_key
-    all_color_schemes = _color_scheme_cache
+    return _color_scheme_cache
+
+
+def apply_color_scheme(ws, sheet_name):
+    """
+    Окрашивает заголовки и/или всю колонку на листе Excel по схеме COLOR_SCHEME.
+    Также применяет динамически сгенерированную схему из MERGE_FIELDS_ADVANCED.
+    Все действия логируются напрямую в местах вызова.
+    """
+    all_color_schemes = _get_all_color_schemes()
 
     for color_conf in all_color_schemes:
         if sheet_name not in color_conf["sheets"]:
@@ -2478,6 +2990,7 @@ def collect_summary_keys(dfs):
     включая осиротевшие коды и сочетания с GROUP_VALUE и INDICATOR_ADD_CALC_TYPE.
     Теперь учитывает ВСЕ коды из всех таблиц, включая CONTEST-DATA и INDICATOR.
     ИСПРАВЛЕНИЕ: GROUP_VALUE правильно связан с конкретным GROUP_CODE.
+    Эталон для collect_summary_keys_optimized (SUMMARY строится векторной версией).
     """
     all_rows = []
 
@@ -2848,28 +3361,186 @@ def collect_summary_keys(dfs):
     return summary_keys
 
 
+# Внутренние имена семи позиций ключа SUMMARY (порядок — как в кортеже collect_summary_keys)
+_SUMMARY_KEY_FIELDS = (
+    "CONTEST_CODE",
+    "TOURNAMENT_CODE",
+    "REWARD_CODE",
+    "GROUP_CODE",
+    "GROUP_VALUE",
+    "INDICATOR_CODE",
+    "INDICATOR_ADD_CALC_TYPE",
+)
+
+
+def _summary_source(dfs, sheet):
+    """Лист из dfs или пустой DataFrame (None и отсутствующий лист — одинаково)."""
+    df = dfs.get(sheet)
+    return df if isinstance(df, pd.DataFrame) else pd.DataFrame()
+
+
+def _summary_lookup(df, columns, notna):
+    """Справочник CONTEST_CODE → значения: без пустых ключей/значений, без дублей, ключ — object."""
+    if df.empty:
+        return pd.DataFrame({c: pd.Series(dtype=object) for c in columns})
+    out = df[list(columns)].dropna(subset=list(notna)).drop_duplicates()
+    return out.astype(object)
+
+
+def _summary_expand(frame, key, lookup, lookup_key, defaults):
+    """
+    Левое соединение каркаса со справочником (декартово по совпавшему ключу).
+    Строки без совпадения получают значения-заглушки ("-" / ""), как в циклах collect_summary_keys.
+    """
+    right = lookup.rename(columns={lookup_key: "_LK"})
+    out = frame.merge(right, how="left", left_on=key, right_on="_LK", sort=False)
+    out = out.drop(columns="_LK")
+    for col, default in defaults.items():
+        out[col] = out[col].fillna(default)
+    return out
+
+
 def collect_summary_keys_optimized(dfs):
     """
-    ОПТИМИЗИРОВАННАЯ ВЕРСИЯ: Использует merge вместо вложенных циклов.
-    
-    ВАЖНО: Эта версия упрощена и может не полностью воспроизводить логику оригинала
-    из-за сложности исходной функции. Используется для тестирования производительности.
-    Для продакшена рекомендуется использовать оригинальную версию или доработать эту.
-    
-    Ожидаемое ускорение: 20-50x за счет использования pandas merge.
+    Векторная версия collect_summary_keys: те же строки каркаса SUMMARY через merge/groupby.
+
+    Пять проходов оригинала (CONTEST_CODE, TOURNAMENT_CODE, REWARD_CODE, GROUP_CODE, строки INDICATOR)
+    собираются как левые соединения «якорей» со справочниками по CONTEST_CODE; INDICATOR_CODE для
+    пары (CONTEST_CODE, INDICATOR_ADD_CALC_TYPE) — одним merge с groupby().first(). Время — линейно
+    по объёму входа (плюс размер результата) вместо фильтрации всех листов на каждый код.
+    Порядок строк детерминирован (первое появление кода); оригинал шёл в порядке обхода set.
     """
     func_start = time()
-    logging.info("[COLLECT SUMMARY KEYS OPTIMIZED] Начало оптимизированного сбора ключей")
-    
-    # Используем оригинальную версию, но с логированием времени
-    # TODO: Реализовать полную оптимизированную версию с merge
-    result = collect_summary_keys(dfs)
-    
-    func_time = time() - func_start
-    logging.info(f"[COLLECT SUMMARY KEYS OPTIMIZED] Завершено за {func_time:.3f}s, создано {len(result)} строк")
-    
-    return result
+    rewards = _summary_source(dfs, "REWARD-LINK")
+    tournaments = _summary_source(dfs, "TOURNAMENT-SCHEDULE")
+    groups = _summary_source(dfs, "GROUP")
+    reward_data = _summary_source(dfs, "REWARD")
+    contest_data = _summary_source(dfs, "CONTEST-DATA")
+    indicators = _summary_source(dfs, "INDICATOR")
+
+    C, T, R, GC, GV, IC, IT = _SUMMARY_KEY_FIELDS
+
+    # Справочники по CONTEST_CODE (пустые коды в оригинале не совпадают ни с одним ключом)
+    t_map = _summary_lookup(tournaments, (C, T), (C, T))
+    r_map = _summary_lookup(rewards, (C, R), (C, R))
+    g_map = _summary_lookup(groups, (C, GC, GV), (C, GC, GV))
+    if not g_map.empty:
+        # Пары (GROUP_CODE, GROUP_VALUE) сравниваются как строки
+        g_map[GC] = g_map[GC].map(str)
+        g_map[GV] = g_map[GV].map(str)
+        g_map = g_map.drop_duplicates()
+    if indicators.empty:
+        i_map = _summary_lookup(indicators, (C, IT), (C,))
+    else:
+        i_map = pd.DataFrame({C: indicators[C], IT: indicators[IT].fillna("")})
+        i_map = i_map.dropna(subset=[C]).drop_duplicates().astype(object)
+
+    t_fill = (t_map, C, {T: "-"})
+    r_fill = (r_map, C, {R: "-"})
+    g_fill = (g_map, C, {GC: "-", GV: "-"})
+    i_fill = (i_map, C, {IT: ""})
+
+    def _expand_all(frame, steps):
+        for key, (lookup, lookup_key, defaults) in steps:
+            frame = _summary_expand(frame, key, lookup, lookup_key, defaults)
+        return frame
+
+    def _first_contest_by(df, code_col, codes):
+        """Первый непустой CONTEST_CODE для каждого кода (как .dropna().unique()[0]), иначе "-"."""
+        if df.empty:
+            return pd.Series("-", index=range(len(codes)), dtype=object)
+        first = df.groupby(code_col, sort=False)[C].first()
+        return pd.Series(codes, dtype=object).map(first).fillna("-").astype(object)
+
+    def _mask_dash(codes):
+        """Ключ, не совпадающий ни с чем, для code == "-" (проходы 2/3/5 не ищут по "-")."""
+        return codes.where(codes != "-", None).astype(object)
+
+    blocks = []
+
+    # 1. Каждый CONTEST_CODE из всех листов
+    contest_sources = [
+        df[C].dropna()
+        for df in (rewards, tournaments, groups, contest_data, indicators)
+        if not df.empty
+    ]
+    if contest_sources:
+        codes = pd.unique(pd.concat(contest_sources, ignore_index=True).astype(object))
+        anchor = pd.DataFrame({C: pd.Series(codes, dtype=object)})
+        anchor["_K"] = anchor[C]
+        blocks.append(_expand_all(anchor, [("_K", t_fill), ("_K", r_fill), ("_K", g_fill), ("_K", i_fill)]))
 
+    # 2. Каждый TOURNAMENT_CODE: CONTEST_CODE — первый найденный, иначе "-"
+    if not tournaments.empty:
+        t_codes = pd.unique(tournaments[T].dropna().astype(object))
+        anchor = pd.DataFrame({T: pd.Series(t_codes, dtype=object)})
+        anchor[C] = _first_contest_by(tournaments, T, t_codes).values
+        anchor["_K"] = anchor[C]
+        anchor["_KI"] = _mask_dash(anchor[C])
+        blocks.append(_expand_all(anchor, [("_K", r_fill), ("_K", g_fill), ("_KI", i_fill)]))
+
+    # 3. Каждый REWARD_CODE (REWARD-LINK и REWARD)
+    reward_sources = [df[R].dropna() for df in (rewards, reward_data) if not df.empty]
+    if reward_sources:
+        r_codes = pd.unique(pd.concat(reward_sources, ignore_index=True).astype(object))
+        anchor = pd.DataFrame({R: pd.Series(r_codes, dtype=object)})
+        anchor[C] = _first_contest_by(rewards, R, r_codes).values
+        anchor["_K"] = _mask_dash(anchor[C])
+        blocks.append(_expand_all(anchor, [("_K", t_fill), ("_K", g_fill), ("_K", i_fill)]))
+
+    # 4. Каждая пара (GROUP_CODE, CONTEST_CODE) из GROUP: GROUP_VALUE только этой пары, иначе "-"
+    if not groups.empty:
+        anchor = groups[[GC, C]].dropna().drop_duplicates().astype(object)
+        anchor[C] = anchor[C].map(str)
+        gv_map = groups[[GC, C, GV]].dropna().drop_duplicates().astype(object)
+        anchor = anchor.merge(gv_map, how="left", on=[GC, C], sort=False)
+        anchor[GV] = anchor[GV].fillna("-")
+        anchor["_K"] = anchor[C]
+        blocks.append(_expand_all(anchor, [("_K", t_fill), ("_K", r_fill), ("_K", i_fill)]))
+
+    rows = [b[[C, T, R, GC, GV, IT]].astype(str) for b in blocks]
+    keyed = (
+        pd.concat(rows, ignore_index=True)
+        if rows
+        else pd.DataFrame({c: pd.Series(dtype=object) for c in (C, T, R, GC, GV, IT)})
+    )
+
+    # INDICATOR_CODE для пары (CONTEST_CODE, INDICATOR_ADD_CALC_TYPE) — первый непустой, по strip
+    keyed[IC] = ""
+    if not indicators.empty and not keyed.empty:
+        ic_src = pd.DataFrame({
+            "_C": indicators[C].astype(str).str.strip(),
+            "_T": indicators[IT].fillna("").astype(str).str.strip(),
+            "_I": indicators[IC],
+        }).dropna(subset=["_I"])
+        ic_src["_I"] = ic_src["_I"].astype(str).str.strip()
+        ic_map = ic_src.groupby(["_C", "_T"], sort=False)["_I"].first().reset_index()
+        probe = pd.DataFrame({"_C": keyed[C].str.strip(), "_T": keyed[IT].str.strip()})
+        found = probe.merge(ic_map, how="left", on=["_C", "_T"], sort=False)["_I"]
+        keyed[IC] = found.where(keyed[C].values != "-", None).fillna("").values
+
+    # 5. Каждая строка INDICATOR со своим INDICATOR_CODE
+    parts = [keyed[list(_SUMMARY_KEY_FIELDS)]]
+    if not indicators.empty:
+        anchor = pd.DataFrame({
+            C: indicators[C].where(indicators[C].notna(), "-").map(str),
+            IT: indicators[IT].where(indicators[IT].notna(), "").map(str),
+            IC: indicators[IC].where(indicators[IC].notna(), "").map(str),
+        }).reset_index(drop=True)
+        anchor["_K"] = _mask_dash(anchor[C])
+        block = _expand_all(anchor, [("_K", t_fill), ("_K", r_fill), ("_K", g_fill)])
+        parts.append(block[list(_SUMMARY_KEY_FIELDS)].astype(str))
+
+    summary_keys = pd.concat(parts, ignore_index=True)
+    # Строка-заглушка (все ключи "-" и пустые индикаторы) отбрасывается, дубли удаляются
+    placeholder = (summary_keys[[C, T, R, GC, GV]] == "-").all(axis=1) & (summary_keys[[IC, IT]] == "").all(axis=1)
+    summary_keys = summary_keys[~placeholder].drop_duplicates().reset_index(drop=True)
+    summary_keys.columns = SUMMARY_KEY_COLUMNS
+
+    logging.info(
+        f"[COLLECT SUMMARY KEYS] Каркас SUMMARY: {len(summary_keys)} строк за {time() - func_start:.3f}s (merge)"
+    )
+    return summary_keys
 
 
 @debug_timed(hot=True, log_args_len=True)
@@ -3169,6 +3840,19 @@ def add_fields_to_sheet(df_base, df_ref, src_keys, dst_keys, columns, sheet_name
 
     return df_base
 
+def _merge_add_fields(rule, df_dst, df_src, src_keys, dst_keys, columns, sheet_dst, sheet_src, **kwargs):
+    """
+    add_fields_to_sheet для правила merge: при включённом performance.incremental.merge — через
+    кэш по ключам (пересчёт только строк с новыми и изменившимися ключами), иначе напрямую.
+    """
+    cache = _MERGE_ROW_CACHE
+    if cache is None:
+        return add_fields_to_sheet(df_dst, df_src, src_keys, dst_keys, columns, sheet_dst, sheet_src, **kwargs)
+    return cache.add_fields(
+        add_fields_to_sheet, rule, df_dst, df_src, src_keys, dst_keys, columns, sheet_dst, sheet_src, **kwargs
+    )
+
+
 def _vectorized_tuple_key(df, keys):
     """
     ВЕКТОРИЗОВАННАЯ ВЕРСИЯ tuple_key: создает кортежи ключей для всего DataFrame сразу.
@@ -3432,8 +4116,8 @@ def _process_single_merge_rule(rule, sheets_data_copy, count_column_prefix="COUN
         df_src_filtered = apply_grouping_and_aggregation(df_src_filtered, group_by, aggregate, sheet_src)
     
     # Вызываем основную функцию добавления полей
-    df_dst = add_fields_to_sheet(
-        df_dst, df_src_filtered, src_keys, dst_keys, col_names, sheet_dst, sheet_src, mode=mode,
+    df_dst = _merge_add_fields(
+        rule, df_dst, df_src_filtered, src_keys, dst_keys, col_names, sheet_dst, sheet_src, mode=mode,
         multiply_rows=multiply_rows, count_prefix=count_column_prefix,
         count_aggregation=count_aggregation, count_label=count_label,
         source_rows_before_filter=rows_before_filter, applied_filters=filter_ctx,
@@ -3685,8 +4369,8 @@ def merge_fields_across_sheets(sheets_data, merge_fields, count_column_prefix="C
             if group_by or aggregate:
                 df_src_filtered = apply_grouping_and_aggregation(df_src_filtered, group_by, aggregate, sheet_src)
             
-            df_dst = add_fields_to_sheet(
-                df_dst, df_src_filtered, src_keys, dst_keys, col_names, sheet_dst, sheet_src, mode=mode,
+            df_dst = _merge_add_fields(
+                rule, df_dst, df_src_filtered, src_keys, dst_keys, col_names, sheet_dst, sheet_src, mode=mode,
                 multiply_rows=multiply_rows, count_prefix=count_column_prefix,
                 count_aggregation=count_aggregation, count_label=count_label,
                 source_rows_before_filter=rows_before_filter, applied_filters=filter_ctx,
@@ -4162,7 +4846,7 @@ def build_summary_sheet(dfs, params_summary, merge_fields):
     params_log = f"(лист: {params_summary['sheet']})"
     logging.info(f"[START] build_summary_sheet {params_log}")
 
-    summary = collect_summary_keys(dfs)
+    summary = collect_summary_keys_optimized(dfs)
     logging.debug(f"[build_summary_sheet] После collect_summary_keys: summary shape={summary.shape if summary is not None and isinstance(summary, pd.DataFrame) else "None"}")
     if summary is not None and isinstance(summary, pd.DataFrame) and len(summary) > 0:
         logging.debug(f"[build_summary_sheet] summary колонки: {list(summary.columns)}")
@@ -4302,7 +4986,8 @@ def build_summary_sheet(dfs, params_summary, merge_fields):
                     ref_df_filtered, group_by, aggregate, sheet_src
                 )
 
-            summary = add_fields_to_sheet(
+            summary = _merge_add_fields(
+                field,
                 summary,
                 ref_df_filtered,
                 src_keys,
@@ -4384,6 +5069,19 @@ def build_summary_sheet(dfs, params_summary, merge_fields):
     return summary
 
 
+def _register_csv_issues(csv_issues, sheet_name, file_conf) -> None:
+    """Расхождения числа полей CSV → общий список для CONSISTENCY (с листом и файлом)."""
+    if not csv_issues:
+        return
+    with _csv_mismatches_lock:
+        for rec in csv_issues:
+            _csv_column_mismatches.append({
+                **rec,
+                "sheet": sheet_name,
+                "file": file_conf.get("file", ""),
+            })
+
+
 @debug_timed(log_args_len=True)
 def process_single_file(file_conf):
     """
@@ -4418,6 +5116,19 @@ def process_single_file(file_conf):
         # expected_columns из consistency_checks.csv_columns_count.sheets[sheet], иначе из file_conf (обратная совместимость); 0 = АВТО
         csv_cc = (CONSISTENCY_CHECKS or {}).get("csv_columns_count", {}).get("sheets", {})
         expected_columns = int(csv_cc.get(sheet_name, {}).get("expected_columns", file_conf.get("expected_columns", 0)))
+        json_columns = JSON_COLUMNS.get(sheet_name, [])
+
+        # Файл не менялся с прошлого прогона (тот же SHA-256 и те же параметры разбора) — кадры из кэша
+        cache_sig = None
+        if PARSE_CACHE.get("enabled"):
+            cache_sig = parse_signature({"expected_columns": expected_columns, "json_columns": json_columns})
+            cached = load_parsed_frames(PARSE_CACHE, PROJECT_BASE_DIR, sheet_name, file_path, cache_sig)
+            if cached is not None:
+                df, df_raw_for_source, csv_issues = cached
+                _register_csv_issues(csv_issues, sheet_name, file_conf)
+                logging.info(f"Файл успешно обработан: {sheet_name}, строк: {len(df)} (кэш разбора) [поток: {th}]")
+                return df, sheet_name, file_conf, df_raw_for_source, file_path
+
         result = read_csv_file(file_path, expected_columns=expected_columns)
         if result is None:
             logging.error(f"Ошибка чтения файла: {file_path} [поток: {th}]")
@@ -4425,22 +5136,16 @@ def process_single_file(file_conf):
         df, csv_issues = result
         # Копия ровно того, что в CSV (без разворота JSON и без доп. полей) — для выгрузки source
         df_raw_for_source = df.copy()
-        if csv_issues:
-            with _csv_mismatches_lock:
-                for rec in csv_issues:
-                    _csv_column_mismatches.append({
-                        **rec,
-                        "sheet": sheet_name,
-                        "file": file_conf.get("file", ""),
-                    })
+        _register_csv_issues(csv_issues, sheet_name, file_conf)
 
         # Разворачиваем только нужные JSON-поля по строгому списку
-        json_columns = JSON_COLUMNS.get(sheet_name, [])
         for json_conf in json_columns:
             col = json_conf["column"]
             prefix = json_conf.get("prefix", col)
             if col in df.columns:
-                df = flatten_json_column_recursive(df, col, prefix=prefix, sheet=sheet_name)
+                df = flatten_json_column_recursive(
+                    df, col, prefix=prefix, sheet=sheet_name, storage=json_column_storage(json_conf)
+                )
                 logging.info(f"[JSON FLATTEN] {sheet_name}: поле '{col}' развернуто с префиксом '{prefix}' [поток: {th}]")
             else:
                 logging.warning(f"[JSON FLATTEN] {sheet_name}: поле '{col}' не найдено в колонках! [поток: {th}]")
@@ -4448,6 +5153,12 @@ def process_single_file(file_conf):
         # Для дебага: логируем итоговый список колонок после всех разворотов
         logging.debug(f"{sheet_name}: колонки после разворачивания: {', '.join(df.columns.tolist())} [поток: {th}]")
 
+        if cache_sig is not None:
+            store_parsed_frames(
+                PARSE_CACHE, PROJECT_BASE_DIR, sheet_name, file_path, cache_sig,
+                df, df_raw_for_source, csv_issues or [],
+            )
+
         logging.info(f"Файл успешно обработан: {sheet_name}, строк: {len(df)} [поток: {th}]")
         
         return df, sheet_name, file_conf, df_raw_for_source, file_path
@@ -4975,6 +5686,43 @@ def _console_footer(
     console_ui.print_banner(banner)
 
 
+def _sheet_memory_report_rows(sheets_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Память кадров после этапа 01 по листам: всего и развёрнутых JSON-колонок
+    (для category — и оценка того же в object, чтобы видеть экономию от json_columns[*].storage).
+    """
+    mb = 1024.0 * 1024.0
+    rows: List[Dict[str, Any]] = []
+    for sheet_name, item in sheets_data.items():
+        if not isinstance(item, (list, tuple)) or not isinstance(item[0], pd.DataFrame):
+            continue
+        df = item[0]
+        prefixes = [
+            f"{jc.get('prefix', jc.get('column'))} => " for jc in JSON_COLUMNS.get(sheet_name, []) or []
+        ]
+        json_cols = [c for c in df.columns if any(str(c).startswith(p) for p in prefixes)]
+        usage = df.memory_usage(deep=True, index=False)
+        json_bytes = float(usage[json_cols].sum()) if json_cols else 0.0
+        cat_cols = [c for c in json_cols if isinstance(df[c].dtype, pd.CategoricalDtype)]
+        as_object = json_bytes
+        for c in cat_cols:
+            as_object += float(df[c].astype(object).memory_usage(deep=True, index=False)) - float(usage[c])
+        rows.append(
+            {
+                "Лист": sheet_name,
+                "Строк": len(df),
+                "Колонок": len(df.columns),
+                "Колонок JSON (развёрнутых)": len(json_cols),
+                "Из них category": len(cat_cols),
+                "Память листа, МБ": round(float(usage.sum()) / mb, 3),
+                "Память JSON-колонок, МБ": round(json_bytes / mb, 3),
+                "JSON-колонки как object, МБ": round(as_object / mb, 3),
+                "Экономия, МБ": round((as_object - json_bytes) / mb, 3),
+            }
+        )
+    return rows
+
+
 def _write_stat_file_perf_excel(
     run_output_dir: str,
     start_time: datetime,
@@ -5054,7 +5802,7 @@ def _write_manager_stats_excel(
     return out_path
 
 
-def _parallel_block_worker(payload: Tuple[str, str]) -> Tuple[str, str, Optional[str]]:
+def _parallel_block_worker(payload: Tuple[str, str, bool]) -> Tuple[str, str, Optional[str]]:
     """
     Воркер процесса: один блок целиком. Возвращает (block, console_text, error_or_None).
     Вывод stdout/stderr буферизуется — родитель печатает пачками без перемешивания.
@@ -5063,7 +5811,8 @@ def _parallel_block_worker(payload: Tuple[str, str]) -> Tuple[str, str, Optional
     import io
     import traceback
 
-    config_path, block = payload
+    global RUN_FORCE
+    config_path, block, RUN_FORCE = payload
     buf = io.StringIO()
     err: Optional[str] = None
     try:
@@ -5092,7 +5841,15 @@ def _parallel_block_worker(payload: Tuple[str, str]) -> Tuple[str, str, Optional
     return block, buf.getvalue(), err
 
 
-def main():
+def main(force: bool = False):
+    """
+    Запуск всех блоков run_blocks.
+
+    Args:
+        force: полный прогон без повторного использования книг (performance.run_memo)
+    """
+    global RUN_FORCE
+    RUN_FORCE = bool(force)
     # Повторная загрузка глобалов при запуске (подхват внедрённого Config из config_holder)
     _load_config_globals()
     overall_start = datetime.now()
@@ -5114,7 +5871,7 @@ def main():
         cfg_path = CONFIG_PATH or os.path.join(
             os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json"
         )
-        payloads = [(cfg_path, b) for b in blocks]
+        payloads = [(cfg_path, b, RUN_FORCE) for b in blocks]
         # max_workers <= число блоков; только stdlib
         from concurrent.futures import ProcessPoolExecutor, as_completed
 
@@ -5150,6 +5907,27 @@ def main():
     )
 
 
+def _join_input_archive() -> None:
+    """Присоединяет фоновый архив SQLite (если запущен): его время — отдельными строками этапов."""
+    global _INPUT_ARCHIVE_JOB
+    job, _INPUT_ARCHIVE_JOB = _INPUT_ARCHIVE_JOB, None
+    if job is None:
+        return
+    result = join_input_archive(job)
+    record_phase("01b_input_archive_sqlite_background", result["duration_sec"])
+    record_phase("01b_input_archive_sqlite_join_wait", result["wait_sec"])
+
+
+def _finish_merge_row_cache() -> None:
+    """Сохраняет кэш merge блока (если включён); классификация ключей — лист STAT_FILE «Инкрементальный merge»."""
+    global _MERGE_ROW_CACHE
+    cache, _MERGE_ROW_CACHE = _MERGE_ROW_CACHE, None
+    if cache is None:
+        return
+    cache.flush()
+    record_stat_rows("Инкрементальный merge", cache.stat_rows())
+
+
 def _run_pipeline_for_block(block: str, log_file: str) -> None:
     """Полный пайплайн обработки для одного блока (PROM / IFT / PSI)."""
     global _csv_column_mismatches
@@ -5170,6 +5948,8 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
             RUN_CONSISTENCY_EARLY,
             RUN_WRITE_MANAGER_STATS,
             MANAGER_STATS_EARLY,
+            write_columnar="main_columnar" in RUN_OUTPUTS,
+            write_sqlite="main_sqlite" in RUN_OUTPUTS,
         )
     )
     logging.info(
@@ -5197,6 +5977,74 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
             )
             return
 
+    # Мемоизация (performance.run_memo): при совпадении отпечатка — книги прошлого прогона без пересчёта
+    memo_fp: Optional[Dict[str, Any]] = None
+    memo_dir = ""
+    memo_before: Dict[str, float] = {}
+    if RUN_MEMO.get("enabled"):
+        memo_fp, memo_dir = _run_memo_fingerprint(block)
+        if memo_fp is not None:
+            # --force: прошлый прогон не ищется, но отпечаток нового записывается — следующий повтор возьмёт его книги
+            run = None if RUN_FORCE else run_memo.find_previous_run(memo_dir, memo_fp["fingerprint"])
+            if run is not None:
+                reused = run_memo.reuse_previous_outputs(memo_dir, run, link=RUN_MEMO["link"])
+                logging.info(
+                    f"[run_memo] Блок {block}: отпечаток {memo_fp['fingerprint'][:12]} совпал с прогоном "
+                    f"{run.get('finished')} (входы, конфиг и код не менялись) — файлы ({len(reused)}) "
+                    f"связаны ({RUN_MEMO['link']}) без пересчёта; --force для полного прогона"
+                )
+                for src_path, dst_path in reused:
+                    logging.info(f"[run_memo] {os.path.basename(src_path)} → {dst_path}")
+                main_out = next(
+                    (d for _, d in reused if os.path.basename(d).startswith(OUTPUT_FILENAME_MAIN)),
+                    reused[0][1] if reused else "",
+                )
+                _console_footer(
+                    log_file,
+                    output_excel=main_out,
+                    banner=f"Блок {block}: без изменений (run_memo)",
+                )
+                return
+            memo_before = run_memo.list_output_files(memo_dir)
+
+    try:
+        _run_block_stages(block, log_file, start_time)
+    finally:
+        # Выход из этапов по исключению — фоновый архив всё равно дописывается и присоединяется
+        _join_input_archive()
+        _finish_merge_row_cache()
+
+    if memo_fp is not None:
+        recorded = run_memo.record_run(memo_dir, memo_fp, memo_before)
+        logging.info(
+            f"[run_memo] Блок {block}: отпечаток {memo_fp['fingerprint'][:12]} сохранён "
+            f"({len(recorded)} файлов) в {os.path.join(memo_dir, run_memo.MANIFEST_NAME)}"
+        )
+
+
+def _run_memo_fingerprint(block: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Отпечаток прогона блока и каталог вывода OUT/<BLOCK>/YYYY/DD-MM.
+    Если какого-то входного файла нет — (None, каталог): мемоизация не применяется.
+    """
+    memo_dir = get_output_dir_for_run(DIR_OUTPUT, block=block)
+    resolved = _resolve_input_files()
+    if any(path is None for _, path in resolved):
+        return None, memo_dir
+    cfg = CFG_RAW if isinstance(CFG_RAW, dict) else {}
+    with debug_phase("00_run_memo_fingerprint"):
+        fp = run_memo.run_fingerprint(
+            block,
+            [(file_conf["sheet"], path) for file_conf, path in resolved],
+            cfg,
+            datetime.now().strftime("%Y-%m-%d"),
+        )
+    return fp, memo_dir
+
+
+def _run_block_stages(block: str, log_file: str, start_time: datetime) -> None:
+    """Этапы блока от чтения CSV до итоговой сводки (вызывается из _run_pipeline_for_block)."""
+    global _INPUT_ARCHIVE_JOB, _JSON_FLATTEN_POOL, _MERGE_ROW_CACHE
     sheets_data = {}
     archive_payload: Dict[str, Any] = {}
     files_processed = 0
@@ -5213,57 +6061,69 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
     lock = threading.Lock()  # Для безопасного доступа к sheets_data
 
     with debug_phase("01_parallel_csv_read_and_json_flatten"):
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS_IO) as executor:  # I/O операция
-            futures = {executor.submit(process_single_file, file_conf): file_conf for file_conf in INPUT_FILES}
-
-            raw_sheets = {}
-            for future in as_completed(futures):
-                df, sheet_name, file_conf, df_raw, resolved_path = future.result()
-                if df is not None and file_conf is not None:
-                    with lock:
-                        sheets_data[sheet_name] = (df, file_conf)
-                        files_processed += 1
-                        rows_total += len(df)
-                        summary.append(f"{sheet_name}: {len(df)} строк")
-                        if file_conf.get("include_in_source", True):
-                            raw_sheets[sheet_name] = (
-                                df_raw.copy() if df_raw is not None else pd.DataFrame(),
-                                file_conf,
-                            )
-                        archive_payload[sheet_name] = {
-                            "df_raw": df_raw.copy() if df_raw is not None else None,
-                            "file_conf": file_conf,
-                            "file_path": resolved_path,
-                        }
-                elif sheet_name:
-                    summary.append(f"{sheet_name}: {'файл не найден' if file_conf is None else 'ошибка'}")
+        # Пул процессов разворота создаётся здесь, в главном потоке, и общий для всех файлов
+        _JSON_FLATTEN_POOL = create_json_flatten_pool(JSON_FLATTEN, MAX_WORKERS_CPU)
+        try:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS_IO) as executor:  # I/O операция
+                futures = {executor.submit(process_single_file, file_conf): file_conf for file_conf in INPUT_FILES}
+
+                raw_sheets = {}
+                for future in as_completed(futures):
+                    df, sheet_name, file_conf, df_raw, resolved_path = future.result()
+                    if df is not None and file_conf is not None:
+                        with lock:
+                            sheets_data[sheet_name] = (df, file_conf)
+                            files_processed += 1
+                            rows_total += len(df)
+                            summary.append(f"{sheet_name}: {len(df)} строк")
+                            if file_conf.get("include_in_source", True):
+                                raw_sheets[sheet_name] = (
+                                    df_raw.copy() if df_raw is not None else pd.DataFrame(),
+                                    file_conf,
+                                )
+                            archive_payload[sheet_name] = {
+                                "df_raw": df_raw.copy() if df_raw is not None else None,
+                                "file_conf": file_conf,
+                                "file_path": resolved_path,
+                            }
+                    elif sheet_name:
+                        summary.append(f"{sheet_name}: {'файл не найден' if file_conf is None else 'ошибка'}")
+        finally:
+            if _JSON_FLATTEN_POOL is not None:
+                _JSON_FLATTEN_POOL.shutdown()
+            _JSON_FLATTEN_POOL = None
 
     logging.info(f"Параллельное чтение CSV файлов завершено. Обработано файлов: {files_processed}")
 
     # Объединённые листы (aggregate_into_sheet в input_files): дополняют данные, исходные листы сохраняются
     apply_aggregate_sheets(sheets_data, raw_sheets, INPUT_FILES, SHEET_ORDER, summary)
+    if RUN_WRITE_STAT_FILE:
+        # Лист «Память листов» в STAT_FILE (deep memory_usage — только когда отчёт нужен)
+        record_stat_rows("Память листов", _sheet_memory_report_rows(sheets_data))
 
-    # Архив сырых CSV в SQLite (опционально, config input_archive_sqlite.enabled)
+    # Архив сырых CSV в SQLite (опционально, config input_archive_sqlite.enabled);
+    # background: true — отдельный процесс, присоединение перед STAT_FILE и итоговой сводкой
     if INPUT_ARCHIVE_SQLITE.get("enabled"):
-        try:
-            if INPUT_ARCHIVE_SQLITE.get("row_level_archive"):
-                from src.input_archive_sqlite_v2 import run_input_archive_sqlite_v2
-
-                run_input_archive_sqlite_v2(
+        if INPUT_ARCHIVE_SQLITE.get("background"):
+            try:
+                _INPUT_ARCHIVE_JOB = start_input_archive_background(
                     PROJECT_BASE_DIR, INPUT_ARCHIVE_SQLITE, archive_payload
                 )
-            else:
-                from src.input_archive_sqlite import run_input_archive_sqlite
-
-                cfg_v1 = dict(INPUT_ARCHIVE_SQLITE)
-                legacy_db = (cfg_v1.get("legacy_db_path") or "").strip()
-                if legacy_db:
-                    cfg_v1["db_path"] = legacy_db
-                run_input_archive_sqlite(PROJECT_BASE_DIR, cfg_v1, archive_payload)
-        except Exception:
-            logging.exception(
-                "[archive_sqlite] Ошибка записи архива во входной SQLite (продолжаем пайплайн)"
-            )
+            except Exception:
+                logging.exception(
+                    "[archive_sqlite] Не удалось запустить фоновый процесс архива — пишем синхронно"
+                )
+        if _INPUT_ARCHIVE_JOB is None:
+            t_archive = tmod.perf_counter()
+            try:
+                run_input_archive(PROJECT_BASE_DIR, INPUT_ARCHIVE_SQLITE, archive_payload)
+            except Exception:
+                logging.exception(
+                    "[archive_sqlite] Ошибка записи архива во входной SQLite (продолжаем пайплайн)"
+                )
+            record_phase("01b_input_archive_sqlite", tmod.perf_counter() - t_archive)
+        # Копии сырых кадров больше не нужны (фоновый процесс получил свои при старте)
+        archive_payload.clear()
 
     run_mode = int(RUN_MODE) if RUN_MODE is not None else 1
     _run_mode_label = (
@@ -5291,6 +6151,8 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
             sys.exit(1)
         with debug_phase("mode2_source_only_excel"):
             write_source_excel(raw_sheets, run_output_dir)
+        _join_input_archive()
+        _finish_merge_row_cache()
         _write_stat_file_perf_excel(run_output_dir, start_time, _run_mode_label)
         logging.info(
             f"=== Блок {block}, режим 2 завершён. Выгружен только source. "
@@ -5335,6 +6197,9 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
                 CONSISTENCY_CHECKS,
                 current_block=block,
                 max_workers=MAX_WORKERS,
+                row_cache=(
+                    ConsistencyRowCache(INCREMENTAL, PROJECT_BASE_DIR, block) if INCREMENTAL["enabled"] else None
+                ),
             )
             copy_consistency_results_from_raw_to_processed(raw_sheets_data, sheets_data, summary_sheet_name)
             logging.info("[main] Проверки консистентности завершены, результаты скопированы на обработанные листы")
@@ -5422,6 +6287,11 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
 
         # 4. Merge fields и сводка REWARD getCondition
         if not RUN_CONSISTENCY_EARLY:
+            _MERGE_ROW_CACHE = (
+                MergeRowCache(INCREMENTAL, PROJECT_BASE_DIR, block)
+                if INCREMENTAL["enabled"] and INCREMENTAL["merge"]
+                else None
+            )
             merge_fields_across_sheets(
                 sheets_data,
                 [f for f in MERGE_FIELDS_ADVANCED if f.get("sheet_dst") != "SUMMARY"],
@@ -5471,6 +6341,8 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
     if MANAGER_STATS_EARLY:
         ts_ms = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         manager_stats_path = _write_manager_stats_excel(sheets_data, run_output_dir, ts_ms)
+        _join_input_archive()
+        _finish_merge_row_cache()
         _write_stat_file_perf_excel(run_output_dir, start_time, _run_mode_label)
         logging.info(
             f"=== Режим manager_stats_only завершён. Файл: {manager_stats_path}. "
@@ -5504,6 +6376,8 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
         logging.info(f"[START] write_to_excel (режим 4) ({consistency_path})")
         with debug_phase("04_consistency_only_write_excel"):
             write_to_excel(consistency_data, consistency_path, use_color_scheme=False)
+        _join_input_archive()
+        _finish_merge_row_cache()
         _write_stat_file_perf_excel(run_output_dir, start_time, _run_mode_label)
         logging.info(f"=== Режим 4 завершён. Файл консистентности: {consistency_path}. Время: {datetime.now() - start_time} ===")
         _console_footer(
@@ -5516,9 +6390,13 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
         )
         return
 
-    # 6–8. Основная книга Excel — только если в run_outputs есть main_only
+    # 6–8. Основная книга Excel — если в run_outputs есть main_only; колоночная выгрузка — main_columnar
     output_excel = ""
-    if RUN_WRITE_MAIN:
+    columnar_dir = ""
+    sqlite_path = ""
+    write_columnar = "main_columnar" in RUN_OUTPUTS
+    write_sqlite = "main_sqlite" in RUN_OUTPUTS
+    if RUN_WRITE_MAIN or write_columnar or write_sqlite:
         with debug_phase("05_summary_stat_baseline"):
             dfs = {k: v[0] for k, v in sheets_data.items()}
             df_summary = build_summary_sheet(
@@ -5562,17 +6440,44 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
                     for msg in diff_errors:
                         logging.warning(f"[MERGE] Baseline расхождение: {msg}")
 
-        output_excel = os.path.join(run_output_dir, get_output_filename())
-        logging.info(f"[START] write_to_excel ({output_excel})")
-        with debug_phase("06_write_main_excel"):
-            write_to_excel(sheets_data, output_excel)
-        _wt_main_elapsed = run_elapsed_sec()
-        logging.info(f"[END] write_to_excel ({output_excel}) (от старта прогона ~{_wt_main_elapsed:.2f} s)")
+        # Колоночная выгрузка листов (Parquet/Feather/pickle + manifest.json) — без оформления Excel
+        if write_columnar:
+            columnar_dir = os.path.join(
+                run_output_dir, os.path.splitext(get_output_filename())[0] + ".columnar"
+            )
+            with debug_phase("06_write_main_columnar"):
+                write_columnar_sheets(
+                    sheets_data, columnar_dir, COLUMNAR_OUTPUT, sheet_order=SHEET_ORDER, block=block
+                )
+
+        # SQLite с таблицей на лист и индексами по ключам строк и merge (для админ-панели)
+        if write_sqlite:
+            sqlite_path = os.path.join(
+                run_output_dir, os.path.splitext(get_output_filename())[0] + ".sqlite"
+            )
+            with debug_phase("06_write_main_sqlite"):
+                write_sheets_sqlite(
+                    sheets_data,
+                    sqlite_path,
+                    archive_cfg=INPUT_ARCHIVE_SQLITE,
+                    merge_rules=MERGE_FIELDS_ADVANCED,
+                    sheet_order=SHEET_ORDER,
+                    block=block,
+                )
+
+        if RUN_WRITE_MAIN:
+            # Заливки матрицы ITEM — в params листа RATING, красятся при записи книги (без второго load/save)
+            if _rating_matrix_meta:
+                from src.rating_item_matrix import attach_rating_item_matrix_fills
 
-        if _rating_matrix_meta:
-            from src.rating_item_matrix import apply_rating_item_matrix_colors
+                attach_rating_item_matrix_fills(sheets_data, _rating_matrix_meta, RATING_ITEM_MATRIX)
 
-            apply_rating_item_matrix_colors(output_excel, _rating_matrix_meta, RATING_ITEM_MATRIX)
+            output_excel = os.path.join(run_output_dir, get_output_filename())
+            logging.info(f"[START] write_to_excel ({output_excel})")
+            with debug_phase("06_write_main_excel"):
+                write_to_excel(sheets_data, output_excel)
+            _wt_main_elapsed = run_elapsed_sec()
+            logging.info(f"[END] write_to_excel ({output_excel}) (от старта прогона ~{_wt_main_elapsed:.2f} s)")
 
         # 8.1. Отдельный файл consistency — если в run_outputs указаны и main_only, и consistency_only
         if RUN_WRITE_CONSISTENCY_FILE and not consistency_written_early:
@@ -5600,6 +6505,8 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
         ts_ms = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         manager_stats_path = _write_manager_stats_excel(sheets_data, run_output_dir, ts_ms)
 
+    _join_input_archive()
+    _finish_merge_row_cache()
     _write_stat_file_perf_excel(run_output_dir, start_time, _run_mode_label)
 
     # Итоговая статистика по отклонениям длины полей и расхождениям по числу полей в CSV (дубликаты — в сводке консистентности)
@@ -5615,13 +6522,17 @@ def _run_pipeline_for_block(block: str, log_file: str) -> None:
     logging.info(f"Summary: {'; '.join(summary)}")
     if output_excel:
         logging.info(f"Excel file: {output_excel}")
+    if columnar_dir:
+        logging.info(f"Columnar output: {columnar_dir}")
+    if sqlite_path:
+        logging.info(f"SQLite output: {sqlite_path}")
     if manager_stats_path:
         logging.info(f"Manager stats file: {manager_stats_path}")
     logging.info(f"Log file: {log_file}")
 
     _console_footer(
         log_file,
-        output_excel=output_excel or manager_stats_path or "",
+        output_excel=output_excel or columnar_dir or sqlite_path or manager_stats_path or "",
         banner=f"Блок {block}: обработка завершена",
         files_processed=files_processed,
         rows_total=rows_total,
@@ -278,7 +278,7 @@ def _normalize_column_width_rule(raw: Any) -> Dict[str, Any]:
 
 
 def _added_columns_width_from_config(mcfg: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
-    """Словарь ширин колонок листа TAB_NUMBERS для main_impl.calculate_column_width."""
+    """Словарь ширин колонок листа TAB_NUMBERS для main_impl.calculate_column_width_from_series."""
     raw = mcfg.get("column_widths")
     if not isinstance(raw, dict):
         return dict(_DEFAULT_COLUMN_WIDTHS)
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Инкрементальный merge (performance.incremental, ``merge``): правила MERGE_FIELDS_ADVANCED
+(этап 03) и правила листа SUMMARY (этап 05) пересчитываются только для изменившихся ключей.
+
+Без ``multiply_rows`` значение колонки merge в строке приёмника зависит только от ключа строки
+и от строк источника с тем же ключом (после фильтров, преобразования ключей и группировки —
+они применяются до вызова). Поэтому для каждого правила в кэше лежат:
+
+- подпись группы источника по каждому ключу — хеш содержимого её строк (ключи + переносимые
+  колонки) с учётом порядка строк в группе («первое/последнее найденное» зависит от порядка);
+- результат по каждому ключу приёмника из прошлого прогона.
+
+Ключ приёмника пересчитывается, если его нет в кэше или группа источника с этим ключом новая,
+изменилась или исчезла; ``add_fields_to_sheet`` вызывается только на этих строках приёмника и
+строках источника с теми же ключами, остальные значения берутся из кэша. Изменения распространяются
+по цепочкам merge: колонка, добавленная одним правилом, входит в содержимое источника следующего.
+
+Классификация ключей (новые / изменённые / удалённые группы источника, строки из кэша и
+пересчитанные) — в ``stats`` и на листе STAT_FILE «Инкрементальный merge».
+
+Полностью (как без кэша) выполняются: ``multiply_rows``, пустой источник, ключи/колонки с
+нестроковыми значениями, колонки, найденные только без учёта регистра или подставленные внутри
+merge, результат с именем уже существующей колонки, листы меньше ``min_rows``.
+Каталог — ``<dir>/<BLOCK>/merge``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.consistency_row_cache import DEFAULT_INCREMENTAL, _HASH_KEYS, _safe_name, code_fingerprint
+
+# Увеличивать при изменении структуры записи кэша
+CACHE_FORMAT_VERSION = 1
+
+# Модули, от которых зависит результат merge (add_fields_to_sheet, сопоставление имён колонок)
+_CODE_FILES: Tuple[str, ...] = ("main_impl.py", "csv_headers.py", "merge_row_cache.py")
+
+# Имя колонки, которую add_fields_to_sheet может переименовать после merge (REWARD_LINK => CONTEST_CODE)
+_RENAMED_RESULT_COLUMN = "REWARD_LINK => CONTEST_CODE"
+
+# Параметры вызова, влияющие только на текст лога
+_LOG_ONLY_KWARGS = ("source_rows_before_filter", "applied_filters")
+
+AddFields = Callable[..., pd.DataFrame]
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value]
+
+
+def _norm_name(name: str) -> str:
+    return str(name).replace("-", "_").replace(" ", "")
+
+
+def result_column_names(
+    sheet_src: str, columns: Sequence[str], mode: str, count_prefix: str, count_aggregation: str, count_label: Any
+) -> List[str]:
+    """Имена колонок, которые add_fields_to_sheet добавляет на лист-приёмник."""
+    if mode == "count" and count_label is not None:
+        return [f"{sheet_src}=>COUNT_{count_aggregation}_{count_label}"]
+    if mode == "count":
+        return [f"{sheet_src}=>{count_prefix}_{c}" for c in columns]
+    return [f"{sheet_src}=>{c}" for c in columns]
+
+
+def _key_hashes(df: pd.DataFrame, keys: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    sub = df[keys]
+    h1 = pd.util.hash_pandas_object(sub, index=False, hash_key=_HASH_KEYS[0]).to_numpy()
+    h2 = pd.util.hash_pandas_object(sub, index=False, hash_key=_HASH_KEYS[1]).to_numpy()
+    return h1, h2
+
+
+def _key_index(h1: np.ndarray, h2: np.ndarray) -> pd.MultiIndex:
+    return pd.MultiIndex.from_arrays([h1, h2])
+
+
+def _string_values(s: pd.Series) -> bool:
+    """Только строки (и пропуски): хеш значения совпадает тогда и только тогда, когда равны значения."""
+    return s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) in ("string", "empty")
+
+
+def source_group_signatures(
+    df_src: pd.DataFrame, src_keys: List[str], columns: List[str], null_keys: np.ndarray
+) -> Tuple[pd.MultiIndex, np.ndarray]:
+    """
+    Подпись группы строк источника на каждый ключ (строки с пустым ключом не входят):
+    сумма хешей пар «содержимое строки, номер строки в группе» — меняется при правке, добавлении,
+    удалении и перестановке строк группы.
+    """
+    ok = ~null_keys
+    src = df_src.loc[ok]
+    if src.empty:
+        return _key_index(np.empty(0, np.uint64), np.empty(0, np.uint64)), np.empty(0, np.uint64)
+    k1, k2 = _key_hashes(src, src_keys)
+    codes, uniques = _key_index(k1, k2).factorize()
+    content = list(dict.fromkeys(src_keys + columns))
+    row_hash = pd.util.hash_pandas_object(src[content], index=False, hash_key=_HASH_KEYS[0]).to_numpy()
+    position = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+    mixed = pd.util.hash_pandas_object(
+        pd.DataFrame({"row": row_hash, "pos": position}), index=False, hash_key=_HASH_KEYS[1]
+    ).to_numpy()
+    signatures = np.zeros(len(uniques), dtype=np.uint64)
+    np.add.at(signatures, codes, mixed)
+    return uniques, signatures
+
+
+class MergeRowCache:
+    """
+    Кэш результатов merge одного прогона блока по ключам приёмника.
+
+    ``add_fields`` — вместо прямого вызова add_fields_to_sheet (потокобезопасно: правила одной
+    группы merge идут параллельно); ``flush`` — после SUMMARY (запись и очистка каталога).
+    """
+
+    def __init__(self, cfg: Mapping[str, Any], base_dir: str, block: Optional[str]) -> None:
+        root = str(cfg.get("dir") or DEFAULT_INCREMENTAL["dir"])
+        root = root if os.path.isabs(root) else os.path.join(base_dir, root)
+        self.cache_dir = os.path.join(root, _safe_name(str(block or "DEFAULT")), "merge")
+        self.min_rows = int(cfg.get("min_rows") or 0)
+        self.stats: List[Dict[str, Any]] = []
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _signature(self, payload: Dict[str, Any]) -> str:
+        payload = dict(payload, v=CACHE_FORMAT_VERSION, code=code_fingerprint(_CODE_FILES))
+        text = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def _load(self, path: str) -> Optional[Dict[str, Any]]:
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            if entry.get("version") != CACHE_FORMAT_VERSION:
+                return None
+            return entry
+        except Exception as ex:
+            logging.warning(f"[incremental] Запись кэша {path} не прочитана ({ex}) — merge считается полностью")
+            return None
+
+    def _eligible(
+        self,
+        df_dst: Any,
+        df_src: Any,
+        src_keys: List[str],
+        dst_keys: List[str],
+        columns: List[str],
+        mode: str,
+        multiply_rows: bool,
+        out_names: List[str],
+    ) -> bool:
+        if mode not in ("value", "count") or multiply_rows:
+            return False
+        if not isinstance(df_dst, pd.DataFrame) or not isinstance(df_src, pd.DataFrame) or df_src.empty:
+            return False
+        if len(df_dst) < max(1, self.min_rows) or not columns or not src_keys or len(src_keys) != len(dst_keys):
+            return False
+        if not df_dst.index.equals(pd.RangeIndex(len(df_dst))):
+            return False
+        if not df_dst.columns.is_unique or not df_src.columns.is_unique:
+            return False
+        if not set(dst_keys) <= set(df_dst.columns) or not set(src_keys + columns) <= set(df_src.columns):
+            return False
+        if len(set(out_names)) != len(out_names) or set(out_names) & set(df_dst.columns):
+            return False
+        if any(_norm_name(n) == _norm_name(_RENAMED_RESULT_COLUMN) for n in out_names):
+            return False
+        checked = [df_dst[k] for k in dst_keys] + [df_src[k] for k in src_keys]
+        if mode == "value":
+            checked += [df_src[c] for c in columns]
+        return all(_string_values(s) for s in checked)
+
+    def add_fields(
+        self,
+        add_fn: AddFields,
+        rule: Mapping[str, Any],
+        df_dst: pd.DataFrame,
+        df_src: pd.DataFrame,
+        src_keys: Any,
+        dst_keys: Any,
+        columns: Any,
+        sheet_dst: str,
+        sheet_src: str,
+        **kwargs: Any,
+    ) -> pd.DataFrame:
+        """
+        То же, что ``add_fn(df_dst, df_src, src_keys, dst_keys, columns, sheet_dst, sheet_src, **kwargs)``,
+        но add_fn выполняется только на строках с новыми и изменившимися ключами.
+        """
+        t0 = time.perf_counter()
+        src_keys_l, dst_keys_l, columns_l = _as_list(src_keys), _as_list(dst_keys), _as_list(columns)
+        mode = kwargs.get("mode", "value")
+        out_names = result_column_names(
+            sheet_src,
+            columns_l,
+            mode,
+            kwargs.get("count_prefix", "COUNT"),
+            kwargs.get("count_aggregation", "size"),
+            kwargs.get("count_label"),
+        )
+
+        def full() -> pd.DataFrame:
+            return add_fn(df_dst, df_src, src_keys, dst_keys, columns, sheet_dst, sheet_src, **kwargs)
+
+        if not self._eligible(
+            df_dst, df_src, src_keys_l, dst_keys_l, columns_l, mode,
+            bool(kwargs.get("multiply_rows")), out_names,
+        ):
+            return full()
+
+        sig = self._signature(
+            {
+                "rule": rule,
+                "sheets": [sheet_dst, sheet_src],
+                "keys": [src_keys_l, dst_keys_l],
+                "columns": columns_l,
+                "kwargs": {k: v for k, v in kwargs.items() if k not in _LOG_ONLY_KWARGS},
+                "dtypes": [str(df_src[c].dtype) for c in src_keys_l + columns_l],
+            }
+        )
+        path = os.path.join(self.cache_dir, f"{_safe_name(sheet_dst)}_{_safe_name(sheet_src)}_{sig}.pkl")
+        with self._lock:
+            if path in self._entries:
+                # Одно и то же правило второй раз за прогон — запись уже занята первым вызовом
+                return full()
+            self._entries[path] = {}
+        entry = self._load(path)
+
+        # Источник: группы по ключам и их подписи; сравнение с прошлым прогоном
+        src_null = df_src[src_keys_l].isna().any(axis=1).to_numpy()
+        groups, signatures = source_group_signatures(df_src, src_keys_l, columns_l, src_null)
+        dst_null = df_dst[dst_keys_l].isna().any(axis=1).to_numpy()
+        d1, d2 = _key_hashes(df_dst, dst_keys_l)
+        dst_index = _key_index(d1, d2)
+        n_new = n_changed = n_removed = 0
+        if entry is not None:
+            prev_groups = _key_index(entry["group_h1"], entry["group_h2"])
+            pos = prev_groups.get_indexer(groups)
+            is_new = pos < 0
+            prev_sig = entry["group_sig"]
+            is_changed = ~is_new
+            if len(prev_sig):
+                is_changed &= prev_sig[np.where(is_new, 0, pos)] != signatures
+            removed = groups.get_indexer(prev_groups) < 0
+            n_new, n_changed, n_removed = int(is_new.sum()), int(is_changed.sum()), int(removed.sum())
+            touched = groups[is_new | is_changed].append(prev_groups[removed])
+            cached_pos = _key_index(entry["key_h1"], entry["key_h2"]).get_indexer(dst_index)
+            miss = dst_null | (cached_pos < 0) | dst_index.isin(touched)
+        else:
+            n_new = len(groups)
+            cached_pos = np.full(len(df_dst), -1, dtype=np.int64)
+            miss = np.ones(len(df_dst), dtype=bool)
+        n_miss = int(miss.sum())
+
+        fresh: Optional[pd.DataFrame] = None
+        if n_miss:
+            s1, s2 = _key_hashes(df_src, src_keys_l)
+            src_rows = src_null | _key_index(s1, s2).isin(dst_index[miss])
+            src_sub = df_src.loc[src_rows, list(dict.fromkeys(src_keys_l + columns_l))].reset_index(drop=True)
+            dst_sub = df_dst.loc[miss, dst_keys_l].reset_index(drop=True)
+            fresh = add_fn(dst_sub, src_sub, src_keys, dst_keys, columns, sheet_dst, sheet_src, **kwargs)
+            if (
+                not isinstance(fresh, pd.DataFrame)
+                or list(fresh.columns) != dst_keys_l + out_names
+                or len(fresh) != n_miss
+                or (entry is not None and n_miss < len(df_dst)
+                    and [str(fresh[c].dtype) for c in out_names] != entry["dtypes"])
+            ):
+                logging.debug(f"[incremental] merge {sheet_src} -> {sheet_dst}: нестандартный результат, полный пересчёт")
+                return full()
+
+        hit = ~miss
+        new_cols: Dict[str, pd.Series] = {}
+        for j, col in enumerate(out_names):
+            dtype = fresh[col].dtype if fresh is not None else np.dtype(entry["dtypes"][j])
+            values = np.empty(len(df_dst), dtype=dtype)
+            if hit.any():
+                values[hit] = entry["values"][j][cached_pos[hit]]
+            if fresh is not None:
+                values[miss] = fresh[col].to_numpy()
+            new_cols[col] = pd.Series(values, index=df_dst.index, dtype=dtype)
+        result = pd.concat([df_dst, pd.DataFrame(new_cols, index=df_dst.index)], axis=1)
+
+        # Новая запись: по одному значению на каждый непустой ключ приёмника
+        keyed = np.flatnonzero(~dst_null)
+        codes, _ = dst_index[keyed].factorize()
+        first = keyed[np.unique(codes, return_index=True)[1]]
+        new_entry = {
+            "version": CACHE_FORMAT_VERSION,
+            "sheets": [sheet_dst, sheet_src],
+            "key_h1": d1[first],
+            "key_h2": d2[first],
+            "values": [new_cols[c].to_numpy()[first] for c in out_names],
+            "dtypes": [str(new_cols[c].dtype) for c in out_names],
+            "group_h1": groups.get_level_values(0).to_numpy(dtype=np.uint64),
+            "group_h2": groups.get_level_values(1).to_numpy(dtype=np.uint64),
+            "group_sig": signatures,
+        }
+        with self._lock:
+            self._entries[path] = new_entry
+            self._dirty.add(path)
+            self.stats.append(
+                {
+                    "sheet_dst": sheet_dst,
+                    "sheet_src": sheet_src,
+                    "columns": ", ".join(out_names),
+                    "rows": len(df_dst),
+                    "reused": len(df_dst) - n_miss,
+                    "computed": n_miss,
+                    "src_keys_new": n_new,
+                    "src_keys_changed": n_changed,
+                    "src_keys_removed": n_removed,
+                    "duration_sec": round(time.perf_counter() - t0, 3),
+                }
+            )
+        return result
+
+    def stat_rows(self) -> List[Dict[str, Any]]:
+        """Строки листа STAT_FILE «Инкрементальный merge»."""
+        return [
+            {
+                "Лист": s["sheet_dst"],
+                "Источник": s["sheet_src"],
+                "Колонки": s["columns"],
+                "Строк": s["rows"],
+                "Из кэша": s["reused"],
+                "Пересчитано": s["computed"],
+                "Ключей источника: новых": s["src_keys_new"],
+                "изменённых": s["src_keys_changed"],
+                "удалённых": s["src_keys_removed"],
+                "Время, с": s["duration_sec"],
+            }
+            for s in self.stats
+        ]
+
+    def flush(self) -> None:
+        """Сохраняет записи прогона и удаляет записи правил, не выполнявшихся в этом прогоне."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for path in sorted(self._dirty):
+                if not self._entries.get(path):
+                    continue
+                tmp = path + ".tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump(self._entries[path], f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if name.endswith(".pkl") and not self._entries.get(path):
+                    os.remove(path)
+        except OSError as ex:
+            logging.warning(f"[incremental] Кэш merge не сохранён в {self.cache_dir}: {ex}")
+        self._dirty.clear()
+        reused = sum(s["reused"] for s in self.stats)
+        total = sum(s["rows"] for s in self.stats)
+        logging.info(
+            f"[incremental] Merge: правил через кэш {len(self.stats)}, строк {total}, "
+            f"из кэша {reused}, пересчитано {total - reused}"
+        )
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш результатов этапа 01 (чтение CSV + разворот JSON) по SHA-256 содержимого файла.
+
+Ключ — тот же SHA-256, что пишется в ``archive_file_row_inventory`` (``_hash_file``),
+плюс подпись параметров разбора (expected_columns, json_columns листа, хеш исходников src).
+Для неизменённого файла ``process_single_file`` загружает готовые кадры (сырой и развёрнутый)
+и список расхождений числа полей вместо ``read_csv_file`` + ``flatten_json_column_recursive``.
+
+Формат на диске: Parquet (если установлен pyarrow), иначе pickle. Настройки — ``performance.parse_cache``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import pandas as pd
+
+from src.input_archive_sqlite import _hash_file
+from src.run_memo import code_version
+
+# Увеличивать при изменении структуры записи кэша
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_PARSE_CACHE: Dict[str, Any] = {
+    "enabled": False,
+    "dir": "OUT/CACHE/parsed",
+    # auto | parquet | pickle
+    "format": "auto",
+    # Сколько последних версий одного входного файла хранить
+    "keep_per_file": 2,
+}
+
+
+
+def merge_parse_cache_config(raw: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Дефолты + ``performance.parse_cache`` из конфига."""
+    cfg = dict(DEFAULT_PARSE_CACHE)
+    if isinstance(raw, Mapping):
+        for k, v in raw.items():
+            if not str(k).startswith("_"):
+                cfg[k] = v
+    fmt = str(cfg.get("format") or "auto").strip().lower()
+    if fmt not in ("auto", "parquet", "pickle"):
+        raise ValueError(
+            f"performance.parse_cache.format: недопустимое значение {cfg.get('format')!r}; "
+            "допустимо: auto, parquet, pickle"
+        )
+    cfg["format"] = fmt
+    cfg["enabled"] = bool(cfg.get("enabled"))
+    cfg["keep_per_file"] = max(1, int(cfg.get("keep_per_file") or 1))
+    return cfg
+
+
+def code_fingerprint() -> str:
+    """
+    Версия кода разбора — хеш всех модулей пакета src (``run_memo.code_version``): разбор тянет
+    json_utils, spod_json, csv_headers и т.д., новый модуль разбора не выпадет из подписи.
+    """
+    return code_version()
+
+
+def parse_signature(params: Mapping[str, Any]) -> str:
+    """Короткий хеш параметров разбора листа + версии кода."""
+    payload = json.dumps(
+        {"v": CACHE_FORMAT_VERSION, "code": code_fingerprint(), "params": params},
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _safe_name(text: str) -> str:
+    return re.sub(r"[^0-9A-Za-z._-]+", "_", text).strip("_") or "file"
+
+
+def _entry_dir(base_dir: str, cache_dir: str, sheet_name: str, file_path: str) -> str:
+    root = cache_dir if os.path.isabs(cache_dir) else os.path.join(base_dir, cache_dir)
+    return os.path.join(root, _safe_name(sheet_name), _safe_name(os.path.basename(file_path)))
+
+
+def _dtype_list(df: pd.DataFrame) -> List[str]:
+    return [str(dt) for dt in df.dtypes]
+
+
+def _write_frame(df: pd.DataFrame, path_base: str, fmt: str) -> str:
+    """Запись кадра; возвращает фактический формат (parquet → pickle при ошибке)."""
+    if fmt in ("auto", "parquet") and _pyarrow_available():
+        tmp = path_base + ".parquet.tmp"
+        try:
+            df.to_parquet(tmp, index=True)
+            os.replace(tmp, path_base + ".parquet")
+            return "parquet"
+        except Exception as ex:  # смешанные типы в object-колонках и т.п.
+            logging.debug(f"[parse_cache] Parquet недоступен для {path_base}: {ex}; используется pickle")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+    tmp = path_base + ".pkl.tmp"
+    df.to_pickle(tmp)
+    os.replace(tmp, path_base + ".pkl")
+    return "pickle"
+
+
+def _read_frame(path_base: str, fmt: str) -> pd.DataFrame:
+    if fmt == "parquet":
+        return pd.read_parquet(path_base + ".parquet")
+    return pd.read_pickle(path_base + ".pkl")
+
+
+def load_parsed_frames(
+    cfg: Mapping[str, Any],
+    base_dir: str,
+    sheet_name: str,
+    file_path: str,
+    signature: str,
+) -> Optional[Tuple[pd.DataFrame, pd.DataFrame, List[Dict[str, Any]]]]:
+    """
+    (развёрнутый df, сырой df, issues) из кэша или None (промах, другой SHA/подпись, повреждённая запись).
+    """
+    if not cfg.get("enabled"):
+        return None
+    t0 = time.perf_counter()
+    sha = _hash_file(file_path)
+    entry = os.path.join(_entry_dir(base_dir, str(cfg.get("dir")), sheet_name, file_path), f"{sha}_{signature}")
+    meta_path = entry + ".meta.json"
+    if not os.path.isfile(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        df_flat = _read_frame(entry + ".flat", meta["flat_format"])
+        df_raw = _read_frame(entry + ".raw", meta["raw_format"])
+        if _dtype_list(df_flat) != meta.get("flat_dtypes") or _dtype_list(df_raw) != meta.get("raw_dtypes"):
+            logging.info(f"[parse_cache] «{sheet_name}»: типы колонок в кэше не совпали — повторный разбор")
+            return None
+        issues = list(meta.get("issues") or [])
+    except Exception as ex:
+        logging.warning(f"[parse_cache] «{sheet_name}»: запись кэша не прочитана ({ex}) — повторный разбор")
+        return None
+    try:
+        os.utime(meta_path)  # для вытеснения: последняя использованная версия — самая свежая
+    except OSError:
+        pass
+    logging.info(
+        f"[parse_cache] «{sheet_name}»: файл без изменений (SHA {sha[:12]}…), кадры загружены из кэша "
+        f"за {time.perf_counter() - t0:.3f} s (строк: {len(df_flat)})"
+    )
+    return df_flat, df_raw, issues
+
+
+def store_parsed_frames(
+    cfg: Mapping[str, Any],
+    base_dir: str,
+    sheet_name: str,
+    file_path: str,
+    signature: str,
+    df_flat: pd.DataFrame,
+    df_raw: pd.DataFrame,
+    issues: List[Dict[str, Any]],
+) -> None:
+    """Сохраняет результат разбора; ошибки записи только логируются (кэш не обязателен)."""
+    if not cfg.get("enabled"):
+        return
+    try:
+        sha = _hash_file(file_path)
+        entry_dir = _entry_dir(base_dir, str(cfg.get("dir")), sheet_name, file_path)
+        os.makedirs(entry_dir, exist_ok=True)
+        entry = os.path.join(entry_dir, f"{sha}_{signature}")
+        fmt = str(cfg.get("format") or "auto")
+        meta = {
+            "version": CACHE_FORMAT_VERSION,
+            "sheet": sheet_name,
+            "file": os.path.basename(file_path),
+            "sha256": sha,
+            "signature": signature,
+            "flat_format": _write_frame(df_flat, entry + ".flat", fmt),
+            "raw_format": _write_frame(df_raw, entry + ".raw", fmt),
+            "flat_dtypes": _dtype_list(df_flat),
+            "raw_dtypes": _dtype_list(df_raw),
+            "issues": issues,
+        }
+        tmp = entry + ".meta.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+        os.replace(tmp, entry + ".meta.json")
+        _evict_old_entries(entry_dir, int(cfg.get("keep_per_file") or 1))
+        logging.debug(f"[parse_cache] «{sheet_name}»: кадры сохранены ({meta['flat_format']}) → {entry_dir}")
+    except Exception as ex:
+        logging.warning(f"[parse_cache] «{sheet_name}»: кэш не сохранён: {ex}")
+
+
+def _evict_old_entries(entry_dir: str, keep: int) -> None:
+    """Оставляет ``keep`` последних (по mtime meta) версий файла."""
+    metas = [
+        os.path.join(entry_dir, n) for n in os.listdir(entry_dir) if n.endswith(".meta.json")
+    ]
+    if len(metas) <= keep:
+        return
+    metas.sort(key=lambda p: os.path.getmtime(p), reverse=True)
+    for meta_path in metas[keep:]:
+        stem = meta_path[: -len(".meta.json")]
+        for suffix in (".meta.json", ".flat.parquet", ".flat.pkl", ".raw.parquet", ".raw.pkl"):
+            try:
+                os.remove(stem + suffix)
+            except OSError:
+                pass
@@ -15,8 +15,6 @@ from typing import Any, Dict, List, Optional, Set, Union
 
 import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
 
 from src.reward_item_catalog import (
     build_item_catalog_from_reward_df,
@@ -716,75 +714,45 @@ def apply_rating_item_matrix_enrichment(
     }
 
 
-def _header_col_map(ws: Any) -> Dict[str, int]:
-    """Имя заголовка (строка 1) -> индекс столбца openpyxl (1-based)."""
-    m: Dict[str, int] = {}
-    for c in range(1, ws.max_column + 1):
-        v = ws.cell(row=1, column=c).value
-        if v is not None:
-            m[str(v).strip()] = c
-    return m
-
-
-def apply_rating_item_matrix_colors(
-    xlsx_path: str,
+def build_rating_item_matrix_fills(
     meta: Dict[str, Any],
     cfg: Dict[str, Any],
-) -> None:
-    """Подсветка ячеек матрицы (4 состояния) и заголовков при исчерпании itemAmount."""
+    n_rows: int,
+) -> Optional[Dict[str, Any]]:
+    """
+    Наложение заливок матрицы для ``write_to_excel`` (params листа ``cell_fills``):
+    ``{"header": {колонка: hex}, "columns": {колонка: [hex | None по строкам данных]}}``.
+    None — подсветка выключена или ячеек нет.
+    """
     if not cfg or not bool(cfg.get("enabled")):
-        return
+        return None
     if meta.get("skip_colors"):
         logging.info("[rating_item_matrix] Подсветка отключена флагом skip_colors")
-        return
+        return None
     cells = meta.get("matrix_cells") or meta.get("accessibility_cells") or []
     if not cells:
         logging.warning("[rating_item_matrix] Нет предвычисленных ячеек матрицы — подсветка пропущена")
-        return
-    try:
-        wb = load_workbook(xlsx_path)
-    except OSError as e:
-        logging.warning(f"[rating_item_matrix] Не удалось открыть файл для подсветки: {e}")
-        return
-
-    sn = meta.get("sheet_rating") or "RATING"
-    if sn not in wb.sheetnames:
-        wb.close()
-        return
-    ws = wb[sn]
-    hmap = _header_col_map(ws)
-
-    def col_for(name: str) -> Optional[int]:
-        return hmap.get(str(name).strip())
+        return None
 
     fills_cfg = meta.get("fills") or _resolve_fill_colors(cfg or {})
-    fill_by_key: Dict[str, PatternFill] = {}
+    fill_by_key: Dict[str, str] = {}
     for key in (
         FILL_ORDERED_AVAILABLE,
         FILL_ORDERED_UNAVAILABLE,
         FILL_AVAILABLE_NOT_ORDERED,
         FILL_UNAVAILABLE_NOT_ORDERED,
     ):
-        hx = _strip_hex(fills_cfg.get(key) or "FFFFFF")
-        fill_by_key[key] = PatternFill(fill_type="solid", start_color=hx, end_color=hx)
+        fill_by_key[key] = _strip_hex(fills_cfg.get(key) or "FFFFFF")
     header_hex = _strip_hex(fills_cfg.get("header_stock_out") or "FF0000")
-    fill_header = PatternFill(fill_type="solid", start_color=header_hex, end_color=header_hex)
-
-    n_header = 0
-    for cname in meta.get("header_stock_out_columns") or []:
-        ci = col_for(str(cname))
-        if ci is not None:
-            ws.cell(row=1, column=ci).fill = fill_header
-            n_header += 1
 
-    n_applied = 0
+    header: Dict[str, str] = {
+        str(cname).strip(): header_hex for cname in meta.get("header_stock_out_columns") or []
+    }
+    columns: Dict[str, List[Optional[str]]] = {}
     for item in cells:
         r = int(item.get("row_excel") or 0)
         cname = item.get("col_name")
-        if r < 2 or not cname:
-            continue
-        ci = col_for(str(cname))
-        if ci is None:
+        if r < 2 or r - 2 >= n_rows or not cname:
             continue
         fill_key = item.get("fill_key")
         if not fill_key and "ok" in item:
@@ -792,12 +760,37 @@ def apply_rating_item_matrix_colors(
             fill_key = (
                 FILL_ORDERED_AVAILABLE if item.get("ok") else FILL_UNAVAILABLE_NOT_ORDERED
             )
-        pf = fill_by_key.get(str(fill_key)) or fill_by_key[FILL_UNAVAILABLE_NOT_ORDERED]
-        ws.cell(row=r, column=ci).fill = pf
-        n_applied += 1
+        col_fills = columns.get(str(cname).strip())
+        if col_fills is None:
+            col_fills = [None] * n_rows
+            columns[str(cname).strip()] = col_fills
+        col_fills[r - 2] = fill_by_key.get(str(fill_key)) or fill_by_key[FILL_UNAVAILABLE_NOT_ORDERED]
+    return {"header": header, "columns": columns}
+
 
-    wb.save(xlsx_path)
-    wb.close()
+def attach_rating_item_matrix_fills(
+    sheets_data: Dict[str, Any],
+    meta: Dict[str, Any],
+    cfg: Dict[str, Any],
+) -> bool:
+    """
+    Кладёт заливки матрицы в params листа RATING (``cell_fills``): ``write_to_excel`` красит
+    ячейки и заголовки при первой записи книги, без повторного load_workbook/save.
+    """
+    sn = meta.get("sheet_rating") or "RATING"
+    t = sheets_data.get(sn)
+    if not t or t[0] is None:
+        return False
+    df, params = t
+    overlay = build_rating_item_matrix_fills(meta, cfg, len(df))
+    if overlay is None:
+        return False
+    params = dict(params or {})
+    params["cell_fills"] = overlay
+    sheets_data[sn] = (df, params)
+    n_cells = sum(1 for col in overlay["columns"].values() for hx in col if hx)
     logging.info(
-        f"[rating_item_matrix] Подсветка ITEM: {n_applied} ячеек, {n_header} заголовков в {xlsx_path}"
+        f"[rating_item_matrix] Подсветка ITEM: {n_cells} ячеек, {len(overlay['header'])} заголовков "
+        f"(лист «{sn}», применяется при записи книги)"
     )
+    return True
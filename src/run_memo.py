@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Мемоизация результатов прогона блока (performance.run_memo).
+
+Отпечаток прогона — SHA-256 от:
+- SHA-256 каждого входного CSV (тот же ``_hash_file``, что у архива и parse_cache);
+- хеша объединённого конфига (``load_config_dict``: вход + ``$include``);
+- версии кода (хеш исходников ``src/*.py`` и подпакетов, без тестов);
+- блока и даты прогона (статус турнира и др. считаются от текущей даты).
+
+Отпечаток и список файлов прогона хранятся в ``run_fingerprint.json`` рядом с выходами
+(``OUT/<BLOCK>/YYYY/DD-MM``). Если в том же каталоге уже есть завершённый прогон с тем же
+отпечатком и все его файлы на месте, книги (основная, STAT_FILE, консистентность и др.)
+связываются жёсткой ссылкой (или копируются) под новым таймштампом — без пересчёта.
+Ключ командной строки ``--force`` отключает повторное использование на один запуск.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from src.input_archive_sqlite import _hash_file
+
+# Увеличивать при изменении состава отпечатка
+RUN_MEMO_VERSION = 1
+MANIFEST_NAME = "run_fingerprint.json"
+# Сколько последних прогонов хранить в манифесте одного каталога
+_MANIFEST_KEEP_RUNS = 20
+
+DEFAULT_RUN_MEMO: Dict[str, Any] = {
+    "enabled": False,
+    # hardlink (при ошибке — копия) | copy
+    "link": "hardlink",
+}
+
+_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}")
+_code_version_value: Optional[str] = None
+
+
+def merge_run_memo_config(raw: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Дефолты + ``performance.run_memo`` из конфига."""
+    cfg = dict(DEFAULT_RUN_MEMO)
+    if isinstance(raw, Mapping):
+        for k, v in raw.items():
+            if not str(k).startswith("_"):
+                cfg[k] = v
+    link = str(cfg.get("link") or "hardlink").strip().lower()
+    if link not in ("hardlink", "copy"):
+        raise ValueError(
+            f"performance.run_memo.link: недопустимое значение {cfg.get('link')!r}; допустимо: hardlink, copy"
+        )
+    cfg["link"] = link
+    cfg["enabled"] = bool(cfg.get("enabled"))
+    return cfg
+
+
+def code_version() -> str:
+    """SHA-256 исходников пакета src (все *.py, кроме каталога Tests) — меняется при любой правке кода."""
+    global _code_version_value
+    if _code_version_value is None:
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        sha = hashlib.sha256()
+        for root, dirs, files in os.walk(src_dir):
+            dirs[:] = sorted(d for d in dirs if d not in ("Tests", "__pycache__"))
+            for name in sorted(files):
+                if not name.endswith(".py"):
+                    continue
+                path = os.path.join(root, name)
+                sha.update(os.path.relpath(path, src_dir).replace(os.sep, "/").encode("utf-8"))
+                with open(path, "rb") as f:
+                    sha.update(f.read())
+        _code_version_value = sha.hexdigest()
+    return _code_version_value
+
+
+def config_hash(cfg: Mapping[str, Any]) -> str:
+    """SHA-256 объединённого конфига (ключи отсортированы, порядок include не важен)."""
+    payload = json.dumps(cfg, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def run_fingerprint(
+    block: str,
+    input_files: Sequence[Tuple[str, str]],
+    cfg: Mapping[str, Any],
+    run_date: str,
+) -> Dict[str, Any]:
+    """
+    Отпечаток прогона блока.
+
+    Args:
+        input_files: пары (лист, путь к найденному CSV)
+        run_date: дата прогона YYYY-MM-DD
+
+    Returns:
+        {"fingerprint", "inputs": [{"sheet", "file", "sha256"}], "config", "code"}
+    """
+    inputs = [
+        {"sheet": sheet, "file": os.path.basename(path), "sha256": _hash_file(path)}
+        for sheet, path in sorted(input_files)
+    ]
+    parts = {
+        "v": RUN_MEMO_VERSION,
+        "block": str(block).strip().upper(),
+        "date": run_date,
+        "inputs": inputs,
+        "config": config_hash(cfg),
+        "code": code_version(),
+    }
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+    return {"fingerprint": digest, "inputs": inputs, "config": parts["config"], "code": parts["code"]}
+
+
+def _read_manifest(run_output_dir: str) -> Dict[str, Any]:
+    path = os.path.join(run_output_dir, MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {"version": RUN_MEMO_VERSION, "runs": []}
+    if not isinstance(data, dict) or not isinstance(data.get("runs"), list):
+        return {"version": RUN_MEMO_VERSION, "runs": []}
+    return data
+
+
+def find_previous_run(run_output_dir: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+    """Последний завершённый прогон с тем же отпечатком, все файлы которого на месте; иначе None."""
+    for run in reversed(_read_manifest(run_output_dir)["runs"]):
+        if not isinstance(run, dict) or run.get("fingerprint") != fingerprint:
+            continue
+        outputs = run.get("outputs") or []
+        if outputs and all(os.path.exists(os.path.join(run_output_dir, name)) for name in outputs):
+            return run
+    return None
+
+
+def list_output_files(run_output_dir: str) -> Dict[str, float]:
+    """Файлы и подкаталоги (колоночная выгрузка) каталога вывода: имя → mtime, для сравнения «до / после» прогона."""
+    try:
+        names = os.listdir(run_output_dir)
+    except OSError:
+        return {}
+    out: Dict[str, float] = {}
+    for name in names:
+        path = os.path.join(run_output_dir, name)
+        if name != MANIFEST_NAME and (os.path.isfile(path) or os.path.isdir(path)):
+            out[name] = os.path.getmtime(path)
+    return out
+
+
+def record_run(
+    run_output_dir: str,
+    fingerprint: Mapping[str, Any],
+    files_before: Mapping[str, float],
+) -> List[str]:
+    """Добавляет в манифест прогон: отпечаток и файлы, созданные или перезаписанные за прогон."""
+    after = list_output_files(run_output_dir)
+    outputs = sorted(name for name, mtime in after.items() if files_before.get(name) != mtime)
+    if not outputs:
+        return []
+    manifest = _read_manifest(run_output_dir)
+    manifest["version"] = RUN_MEMO_VERSION
+    manifest["runs"].append({
+        "fingerprint": fingerprint["fingerprint"],
+        "finished": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "inputs": list(fingerprint.get("inputs") or []),
+        "config": fingerprint.get("config"),
+        "code": fingerprint.get("code"),
+        "outputs": outputs,
+    })
+    manifest["runs"] = manifest["runs"][-_MANIFEST_KEEP_RUNS:]
+    path = os.path.join(run_output_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return outputs
+
+
+def _reused_name(name: str, timestamp: str) -> str:
+    """Имя файла с новым таймштампом (YYYY-MM-DD_HH-MM-SS); без таймштампа — суффикс перед расширением."""
+    if _TIMESTAMP_RE.search(name):
+        return _TIMESTAMP_RE.sub(timestamp, name, count=1)
+    stem, ext = os.path.splitext(name)
+    return f"{stem} {timestamp}{ext}"
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def reuse_previous_outputs(
+    run_output_dir: str,
+    run: Mapping[str, Any],
+    link: str = "hardlink",
+    timestamp: Optional[str] = None,
+) -> List[Tuple[str, str]]:
+    """
+    Связывает (hardlink, при ошибке — копия) или копирует файлы прошлого прогона под новым таймштампом.
+
+    Returns:
+        пары (исходный файл, новый файл) — пути в run_output_dir
+    """
+    ts = timestamp or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    done: List[Tuple[str, str]] = []
+    for name in run.get("outputs") or []:
+        src = os.path.join(run_output_dir, name)
+        dst = os.path.join(run_output_dir, _reused_name(name, ts))
+        if os.path.abspath(dst) == os.path.abspath(src):
+            done.append((src, dst))
+            continue
+        if os.path.isdir(src):
+            # Каталог (main_columnar): дерево с hardlink-ами файлов или копией
+            if os.path.exists(dst):
+                shutil.rmtree(dst)
+            shutil.copytree(src, dst, copy_function=_link_or_copy if link == "hardlink" else shutil.copy2)
+            done.append((src, dst))
+            continue
+        if os.path.exists(dst):
+            os.remove(dst)
+        if link == "hardlink":
+            try:
+                os.link(src, dst)
+            except OSError as ex:
+                logging.debug(f"[run_memo] hardlink {src} → {dst} не удался ({ex}); копия")
+                shutil.copy2(src, dst)
+        else:
+            shutil.copy2(src, dst)
+        done.append((src, dst))
+    return done
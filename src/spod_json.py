@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Однопроходный разбор «SPOD-JSON» в объекты Python.
+
+Диалект выгрузок SPOD (CONTEST_FEATURE, REWARD_ADD_DATA и др.): ключи и строки в тройных кавычках
+(\"\"\"key\"\"\": \"\"\"value\"\"\"), числа / true / false / null — как в JSON; обычные строки \"…\"
+тоже допускаются. Строка в тройных кавычках длится до следующих \"\"\" и может содержать одиночные \".
+Пробелы между токенами — только JSON-пробелы (как у json.loads).
+
+``safe_json_loads`` (src/json_utils.py) сначала пробует ``json.loads`` после замены \"\"\" → \"
+(на C, в один проход), затем этот разбор и только потом цепочку автоисправлений. Всё, что не
+укладывается в диалект (лишняя запятая, одинарные кавычки и т.п.), даёт ``SpodJsonError``.
+Проверка формата с текстами замечаний для листа CONSISTENCY — ``src/json_spod_format_check.py``.
+"""
+
+from __future__ import annotations
+
+import re
+from json.decoder import scanstring
+from typing import Any, Dict, List, Tuple
+
+_TRIPLE = '"""'
+_WS = " \t\n\r"
+_WS_RE = re.compile(r"[ \t\n\r]*")
+# Числа — как json.scanner.NUMBER_RE
+_NUMBER_RE = re.compile(r"(-?(?:0|[1-9]\d*))(\.\d+)?([eE][-+]?\d+)?")
+_CONSTANTS: Dict[str, Any] = {
+    "null": None,
+    "true": True,
+    "false": False,
+    "NaN": float("nan"),
+    "Infinity": float("inf"),
+    "-Infinity": float("-inf"),
+}
+
+
+class SpodJsonError(ValueError):
+    """Строка не укладывается в диалект SPOD-JSON (позиция — индекс символа)."""
+
+    def __init__(self, message: str, pos: int) -> None:
+        super().__init__(f"{message} (позиция {pos})")
+        self.pos = pos
+
+
+def _skip_ws(s: str, i: int) -> int:
+    if i < len(s) and s[i] in _WS:
+        return _WS_RE.match(s, i).end()
+    return i
+
+
+def _parse_triple_string(s: str, i: int) -> Tuple[str, int]:
+    """\"\"\"текст\"\"\" с позиции i → (текст, индекс после закрывающих кавычек)."""
+    start = i + 3
+    end = s.find(_TRIPLE, start)
+    if end < 0:
+        raise SpodJsonError("нет закрывающих тройных кавычек", i)
+    text = s[start:end]
+    if "\\" in text or not text.isprintable():
+        # Экранирование и управляющие символы — по правилам JSON-строки
+        if '"' in text:
+            raise SpodJsonError("кавычка и экранирование в одной строке в тройных кавычках", start)
+        try:
+            text, _ = scanstring(text + '"', 0, True)
+        except ValueError as ex:
+            raise SpodJsonError(f"недопустимая строка: {ex}", start) from None
+    return text, end + 3
+
+
+def _parse_string(s: str, i: int) -> Tuple[str, int]:
+    if s.startswith(_TRIPLE, i):
+        return _parse_triple_string(s, i)
+    try:
+        return scanstring(s, i + 1, True)
+    except ValueError as ex:
+        raise SpodJsonError(f"недопустимая строка: {ex}", i) from None
+
+
+def _parse_value(s: str, i: int) -> Tuple[Any, int]:
+    c = s[i : i + 1]
+    if c == '"':
+        return _parse_string(s, i)
+    if c == "{":
+        return _parse_object(s, i + 1)
+    if c == "[":
+        return _parse_array(s, i + 1)
+    m = _NUMBER_RE.match(s, i)
+    if m:
+        integer, frac, exp = m.groups()
+        if frac or exp:
+            return float(integer + (frac or "") + (exp or "")), m.end()
+        return int(integer), m.end()
+    for word, value in _CONSTANTS.items():
+        if s.startswith(word, i):
+            return value, i + len(word)
+    raise SpodJsonError("ожидалось значение", i)
+
+
+def _parse_object(s: str, i: int) -> Tuple[Dict[str, Any], int]:
+    obj: Dict[str, Any] = {}
+    i = _skip_ws(s, i)
+    if s[i : i + 1] == "}":
+        return obj, i + 1
+    while True:
+        if s[i : i + 1] != '"':
+            raise SpodJsonError("ожидался ключ в кавычках", i)
+        key, i = _parse_string(s, i)
+        i = _skip_ws(s, i)
+        if s[i : i + 1] != ":":
+            raise SpodJsonError("ожидалось «:»", i)
+        i = _skip_ws(s, i + 1)
+        obj[key], i = _parse_value(s, i)
+        i = _skip_ws(s, i)
+        c = s[i : i + 1]
+        if c == "}":
+            return obj, i + 1
+        if c != ",":
+            raise SpodJsonError("ожидалось «,» или «}»", i)
+        i = _skip_ws(s, i + 1)
+
+
+def _parse_array(s: str, i: int) -> Tuple[List[Any], int]:
+    arr: List[Any] = []
+    i = _skip_ws(s, i)
+    if s[i : i + 1] == "]":
+        return arr, i + 1
+    while True:
+        value, i = _parse_value(s, i)
+        arr.append(value)
+        i = _skip_ws(s, i)
+        c = s[i : i + 1]
+        if c == "]":
+            return arr, i + 1
+        if c != ",":
+            raise SpodJsonError("ожидалось «,» или «]»", i)
+        i = _skip_ws(s, i + 1)
+
+
+def parse_spod_json(s: str) -> Any:
+    """Разбор всей строки SPOD-JSON; ``SpodJsonError``, если строка вне диалекта."""
+    i = _skip_ws(s, 0)
+    value, i = _parse_value(s, i)
+    i = _skip_ws(s, i)
+    if i != len(s):
+        raise SpodJsonError("лишние символы после значения", i)
+    return value
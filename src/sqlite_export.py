@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Выгрузка обработанных листов в SQLite (токен ``main_sqlite`` в run_outputs).
+
+Все листы ``sheets_data`` (после merge, SUMMARY, матрицы RATING, сводки SEASON) загружаются
+в один файл ``<имя основной книги>_<таймштамп>.sqlite`` каталога OUT/<BLOCK>/YYYY/DD-MM:
+таблица на лист, ``executemany`` в одной транзакции, на время сборки
+``PRAGMA journal_mode=OFF`` / ``synchronous=OFF``. Индексы создаются после загрузки данных —
+по ключам строк ``input_archive_sqlite.default_row_key_by_sheet`` (и ``row_key_columns`` листа)
+и по ключам правил ``merge_fields_advanced`` (``src_key`` на листе-источнике, ``dst_key`` на приёмнике).
+Служебные таблицы: ``_sheets`` (лист → таблица, строки, колонки) и ``_meta``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.input_archive_sqlite_v2 import resolve_row_key_columns
+
+# Увеличивать при изменении структуры служебных таблиц
+SQLITE_EXPORT_VERSION = 1
+TABLE_SHEETS = "_sheets"
+TABLE_META = "_meta"
+
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _unique_names(names: Iterable[Any]) -> List[str]:
+    """Имена колонок строками, без повторов без учёта регистра (в SQLite имена колонок регистронезависимы)."""
+    seen: Dict[str, int] = {}
+    out: List[str] = []
+    for col in names:
+        name = str(col)
+        key = name.casefold()
+        if key in seen:
+            n = seen[key]
+            candidate = f"{name} ({n + 1})"
+            while candidate.casefold() in seen:
+                n += 1
+                candidate = f"{name} ({n + 1})"
+            seen[key] = n + 1
+            name = candidate
+            key = name.casefold()
+        seen[key] = 1
+        out.append(name)
+    return out
+
+
+def _sql_type(series: pd.Series) -> str:
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return _sql_type(pd.Series(dtype.categories))
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def _column_values(series: pd.Series) -> List[Any]:
+    """Значения колонки как типы Python для sqlite3 (NaN/NaT/NA → None, даты — ISO-строки)."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    mask = series.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        values = series.dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object)
+    elif pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype):
+        if mask.any():
+            values = series.astype(object).to_numpy()
+        else:
+            return series.astype(np.int64).tolist()
+    elif pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=object)
+    else:
+        values = series.to_numpy(dtype=object)
+        if len(values):
+            # numpy-скаляры, Timestamp, dict/list в object-колонках — к str/int/float
+            kinds = {type(v) for v in values[~mask]}
+            if not kinds <= {str, int, float, bool}:
+                values = np.array(
+                    [
+                        v if isinstance(v, (str, int, float)) or m
+                        else (v.item() if isinstance(v, np.generic) else str(v))
+                        for v, m in zip(values, mask)
+                    ],
+                    dtype=object,
+                )
+    if mask.any():
+        values = values.copy()
+        values[mask] = None
+    return values.tolist()
+
+
+def sheet_index_keys(
+    sheet_name: str,
+    file_conf: Mapping[str, Any],
+    archive_cfg: Mapping[str, Any],
+    merge_rules: Sequence[Mapping[str, Any]],
+) -> List[Tuple[str, ...]]:
+    """Наборы колонок для индексов листа: ключ строки, затем ключи правил merge (без повторов)."""
+    keys: List[Tuple[str, ...]] = []
+    row_key = resolve_row_key_columns(sheet_name, file_conf or {}, archive_cfg or {})
+    if row_key:
+        keys.append(tuple(row_key))
+    for rule in merge_rules or []:
+        for side, key_field in (("sheet_src", "src_key"), ("sheet_dst", "dst_key")):
+            cols = rule.get(key_field)
+            if rule.get(side) == sheet_name and isinstance(cols, list) and cols:
+                keys.append(tuple(str(c) for c in cols))
+    out: List[Tuple[str, ...]] = []
+    for key in keys:
+        if key not in out:
+            out.append(key)
+    return out
+
+
+def write_sheets_sqlite(
+    sheets_data: Mapping[str, Any],
+    db_path: str,
+    *,
+    archive_cfg: Optional[Mapping[str, Any]] = None,
+    merge_rules: Optional[Sequence[Mapping[str, Any]]] = None,
+    sheet_order: Optional[Sequence[str]] = None,
+    block: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Собирает SQLite-файл из ``sheets_data`` ({лист: (DataFrame, params)}).
+
+    Файл строится во временном ``<db_path>.tmp`` и переименовывается по завершении.
+
+    Returns:
+        {"path", "sheets", "rows", "indexes"}
+    """
+    order = [s for s in (sheet_order or []) if s in sheets_data]
+    order += sorted(s for s in sheets_data if s not in order)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    n_rows = 0
+    n_indexes = 0
+    sheet_rows: List[Tuple[Any, ...]] = []
+    try:
+        cur = conn.cursor()
+        cur.execute("PRAGMA journal_mode=OFF")
+        cur.execute("PRAGMA synchronous=OFF")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("BEGIN")
+        cur.execute(f"CREATE TABLE {TABLE_META} (key TEXT PRIMARY KEY, value TEXT)")
+        cur.execute(
+            f"CREATE TABLE {TABLE_SHEETS} (sheet_name TEXT PRIMARY KEY, table_name TEXT NOT NULL, "
+            "rows INTEGER NOT NULL, columns_json TEXT NOT NULL, indexes_json TEXT NOT NULL)"
+        )
+        used_tables = {TABLE_META.casefold(), TABLE_SHEETS.casefold()}
+        index_jobs: List[Tuple[str, List[str], Tuple[str, ...]]] = []
+        for sheet_name in order:
+            item = sheets_data[sheet_name]
+            df = item[0] if isinstance(item, (list, tuple)) else item
+            file_conf = item[1] if isinstance(item, (list, tuple)) and len(item) > 1 else {}
+            if not isinstance(df, pd.DataFrame):
+                continue
+            table = str(sheet_name)
+            while table.casefold() in used_tables:
+                table += "_"
+            used_tables.add(table.casefold())
+            columns = _unique_names(df.columns)
+            col_defs = ", ".join(
+                f"{_quote(name)} {_sql_type(df.iloc[:, i])}" for i, name in enumerate(columns)
+            )
+            cur.execute(f"CREATE TABLE {_quote(table)} ({col_defs or '_empty TEXT'})")
+            if columns and len(df):
+                placeholders = ",".join("?" * len(columns))
+                data = [_column_values(df.iloc[:, i]) for i in range(len(columns))]
+                cur.executemany(
+                    f"INSERT INTO {_quote(table)} VALUES ({placeholders})", zip(*data)
+                )
+            n_rows += len(df)
+            lookup: Dict[str, str] = {}
+            for c, name in zip(df.columns, columns):
+                lookup.setdefault(str(c), name)
+            keys = [
+                key for key in sheet_index_keys(sheet_name, file_conf, archive_cfg or {}, merge_rules or [])
+                if all(c in lookup for c in key)
+            ]
+            for key in keys:
+                index_jobs.append((table, [lookup[c] for c in key], key))
+            sheet_rows.append((
+                sheet_name,
+                table,
+                int(len(df)),
+                json.dumps(
+                    [{"name": name, "source": str(c), "type": _sql_type(df.iloc[:, i])}
+                     for i, (c, name) in enumerate(zip(df.columns, columns))],
+                    ensure_ascii=False,
+                ),
+                json.dumps([list(k) for k in keys], ensure_ascii=False),
+            ))
+        cur.executemany(f"INSERT INTO {TABLE_SHEETS} VALUES (?,?,?,?,?)", sheet_rows)
+        # Индексы — после данных: одна сортировка вместо поддержки B-дерева на каждой вставке
+        for n, (table, cols, _key) in enumerate(index_jobs, start=1):
+            cur.execute(
+                f"CREATE INDEX {_quote(f'idx_{n}_{table}')} ON {_quote(table)} "
+                f"({', '.join(_quote(c) for c in cols)})"
+            )
+            n_indexes += 1
+        cur.executemany(
+            f"INSERT INTO {TABLE_META} VALUES (?, ?)",
+            [
+                ("version", str(SQLITE_EXPORT_VERSION)),
+                ("block", block or ""),
+                ("created", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            ],
+        )
+        cur.execute("COMMIT")
+        cur.execute("ANALYZE")
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, db_path)
+    logging.info(
+        f"[sqlite_export] Листов: {len(sheet_rows)}, строк: {n_rows}, индексов: {n_indexes} → {db_path}"
+    )
+    return {"path": db_path, "sheets": len(sheet_rows), "rows": n_rows, "indexes": n_indexes}
@@ -0,0 +1,685 @@
+# -*- coding: utf-8 -*-
+"""
+Потоковая запись основной книги Excel через stdlib (zipfile + xml), без openpyxl.
+
+Используется в ``write_to_excel`` при ``performance.excel_engine: "stream"``.
+Каждый лист сериализуется сразу в ``xl/worksheets/sheetN.xml`` за один проход по
+DataFrame: стили ячеек заранее собраны в ``XlsxStyleRegistry`` (id стиля на столбец),
+строки пишутся как inline strings (без общего sharedStrings), ширины, закрепление и
+автофильтр — атрибутами листа. Подход тот же, что в ``src/contest_badge_form/xlsx_write.py``,
+но для произвольного числа листов и строк. Крупные листы можно рендерить параллельно
+в процессах (``write_xlsx_stream(..., max_workers=N)``), zip собирается один раз.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+# Символы, недопустимые в XML 1.0 (openpyxl на них падает с IllegalCharacterError)
+_ILLEGAL_XML_CHARS_RE = re.compile(r"[\000-\010\013\014\016-\037]")
+
+# Встроенные форматы чисел Excel (numFmtId < 164 не объявляются в styles.xml)
+_BUILTIN_NUM_FMTS: Dict[str, int] = {
+    "General": 0,
+    "0": 1,
+    "0.00": 2,
+    "#,##0": 3,
+    "#,##0.00": 4,
+}
+
+# Форматы по умолчанию для дат без правила COLUMN_FORMATS (как у pandas.ExcelWriter)
+DEFAULT_DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+DEFAULT_DATE_FORMAT = "YYYY-MM-DD"
+
+# Сколько строк листа копить в памяти перед записью в zip-поток
+_ROWS_PER_FLUSH = 2000
+
+# Лист от стольких строк рендерится в отдельном процессе (меньшие — в родителе, без затрат на pickle)
+PARALLEL_SHEET_MIN_ROWS = 5000
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+_EXCEL_EPOCH_TS = pd.Timestamp(_EXCEL_EPOCH)
+
+
+def col_letter(col_1based: int) -> str:
+    """Буквенное обозначение столбца Excel (1 → A, 27 → AA)."""
+    n = col_1based
+    out = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        out = chr(65 + rem) + out
+    return out
+
+
+def _xml_text(value: Any) -> str:
+    """Экранированный текст для XML без недопустимых управляющих символов."""
+    text = _ILLEGAL_XML_CHARS_RE.sub("", str(value))
+    return escape(text, {'"': "&quot;"})
+
+
+def parse_cell_ref(ref: Optional[str]) -> Optional[Tuple[int, int]]:
+    """«C2» → (строка 2, столбец 3); None при пустой или некорректной ссылке."""
+    if not ref or not isinstance(ref, str):
+        return None
+    m = re.fullmatch(r"\s*\$?([A-Za-z]{1,3})\$?(\d+)\s*", ref)
+    if not m:
+        return None
+    col = 0
+    for ch in m.group(1).upper():
+        col = col * 26 + (ord(ch) - 64)
+    return int(m.group(2)), col
+
+
+@dataclass(frozen=True)
+class CellStyle:
+    """Описание стиля ячейки; одинаковые описания получают один id в styles.xml."""
+
+    bold: bool = False
+    font_color: Optional[str] = None
+    fill: Optional[str] = None
+    border: bool = False
+    num_fmt: Optional[str] = None
+    horizontal: Optional[str] = None
+    vertical: Optional[str] = None
+    wrap_text: bool = False
+
+    def with_num_fmt(self, num_fmt: Optional[str]) -> "CellStyle":
+        return CellStyle(
+            bold=self.bold,
+            font_color=self.font_color,
+            fill=self.fill,
+            border=self.border,
+            num_fmt=num_fmt,
+            horizontal=self.horizontal,
+            vertical=self.vertical,
+            wrap_text=self.wrap_text,
+        )
+
+
+def _argb(color: Optional[str]) -> Optional[str]:
+    """«E6F3FF» / «#E6F3FF» → «00E6F3FF» (ARGB для styles.xml, как Color() в openpyxl)."""
+    if not color:
+        return None
+    hx = str(color).strip().lstrip("#").upper()
+    if len(hx) == 6:
+        return "00" + hx
+    return hx[:8] or None
+
+
+class XlsxStyleRegistry:
+    """Реестр шрифтов, заливок, форматов и cellXfs одной книги."""
+
+    def __init__(self) -> None:
+        self._fonts: List[Tuple[bool, Optional[str]]] = [(False, None)]
+        self._fills: List[Optional[str]] = [None, None]  # 0 none, 1 gray125 (обязательные)
+        self._num_fmts: Dict[str, int] = {}
+        self._xfs: List[Tuple[int, int, int, int, Optional[Tuple[str, str, bool]]]] = [
+            (0, 0, 0, 0, None)
+        ]
+        self._xf_index: Dict[CellStyle, int] = {CellStyle(): 0}
+
+    def _font_id(self, bold: bool, color: Optional[str]) -> int:
+        key = (bool(bold), _argb(color))
+        if key not in self._fonts:
+            self._fonts.append(key)
+        return self._fonts.index(key)
+
+    def _fill_id(self, color: Optional[str]) -> int:
+        rgb = _argb(color)
+        if rgb is None:
+            return 0
+        if rgb not in self._fills[2:]:
+            self._fills.append(rgb)
+        return self._fills.index(rgb, 2)
+
+    def _num_fmt_id(self, fmt: Optional[str]) -> int:
+        if not fmt:
+            return 0
+        if fmt in _BUILTIN_NUM_FMTS:
+            return _BUILTIN_NUM_FMTS[fmt]
+        if fmt not in self._num_fmts:
+            self._num_fmts[fmt] = 164 + len(self._num_fmts)
+        return self._num_fmts[fmt]
+
+    def style_id(self, style: Optional[CellStyle]) -> int:
+        """Индекс xf в cellXfs для стиля (0 — стиль по умолчанию)."""
+        if style is None:
+            return 0
+        sid = self._xf_index.get(style)
+        if sid is not None:
+            return sid
+        align = None
+        if style.horizontal or style.vertical or style.wrap_text:
+            align = (style.horizontal or "", style.vertical or "", bool(style.wrap_text))
+        xf = (
+            self._num_fmt_id(style.num_fmt),
+            self._font_id(style.bold, style.font_color),
+            self._fill_id(style.fill),
+            1 if style.border else 0,
+            align,
+        )
+        self._xfs.append(xf)
+        sid = len(self._xfs) - 1
+        self._xf_index[style] = sid
+        return sid
+
+    def styles_xml(self) -> str:
+        fonts = []
+        for bold, color in self._fonts:
+            b = "<b/>" if bold else ""
+            c = f'<color rgb="{color}"/>' if color else '<color theme="1"/>'
+            fonts.append(f'<font>{b}<sz val="11"/>{c}<name val="Calibri"/><family val="2"/></font>')
+        fills = [
+            '<fill><patternFill patternType="none"/></fill>',
+            '<fill><patternFill patternType="gray125"/></fill>',
+        ]
+        for rgb in self._fills[2:]:
+            fills.append(
+                f'<fill><patternFill patternType="solid"><fgColor rgb="{rgb}"/>'
+                f'<bgColor rgb="{rgb}"/></patternFill></fill>'
+            )
+        borders = (
+            '<borders count="2">'
+            "<border><left/><right/><top/><bottom/><diagonal/></border>"
+            '<border><left style="thin"/><right style="thin"/><top style="thin"/>'
+            '<bottom style="thin"/><diagonal/></border>'
+            "</borders>"
+        )
+        xfs = []
+        for num_id, font_id, fill_id, border_id, align in self._xfs:
+            attrs = f'numFmtId="{num_id}" fontId="{font_id}" fillId="{fill_id}" borderId="{border_id}" xfId="0"'
+            if num_id:
+                attrs += ' applyNumberFormat="1"'
+            if font_id:
+                attrs += ' applyFont="1"'
+            if fill_id:
+                attrs += ' applyFill="1"'
+            if border_id:
+                attrs += ' applyBorder="1"'
+            if align is None:
+                xfs.append(f"<xf {attrs}/>")
+                continue
+            h, v, wrap = align
+            a = ""
+            if h:
+                a += f' horizontal="{h}"'
+            if v:
+                a += f' vertical="{v}"'
+            if wrap:
+                a += ' wrapText="1"'
+            xfs.append(f'<xf {attrs} applyAlignment="1"><alignment{a}/></xf>')
+        num_fmts = ""
+        if self._num_fmts:
+            items = "".join(
+                f'<numFmt numFmtId="{i}" formatCode="{_xml_text(code)}"/>'
+                for code, i in self._num_fmts.items()
+            )
+            num_fmts = f'<numFmts count="{len(self._num_fmts)}">{items}</numFmts>'
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f"{num_fmts}"
+            f'<fonts count="{len(fonts)}">{"".join(fonts)}</fonts>'
+            f'<fills count="{len(fills)}">{"".join(fills)}</fills>'
+            f"{borders}"
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            f'<cellXfs count="{len(xfs)}">{"".join(xfs)}</cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+            "</styleSheet>"
+        )
+
+
+@dataclass
+class StreamSheet:
+    """
+    Лист для потоковой записи: данные + id стилей по столбцам.
+
+    ``data_styles[i]`` — стиль значений столбца i; ``datetime_styles[i]`` / ``date_styles[i]`` —
+    стиль для дат в столбце без собственного формата (формат pandas по умолчанию).
+    ``cell_styles[i]`` — стили отдельных строк столбца i (None — стиль столбца), напр. заливки матрицы ITEM.
+    """
+
+    name: str
+    df: pd.DataFrame
+    header_styles: List[int]
+    data_styles: List[int]
+    datetime_styles: List[int]
+    date_styles: List[int]
+    col_widths: List[float]
+    freeze: Optional[str] = "A2"
+    autofilter: bool = True
+    selected: bool = False
+    cell_styles: Dict[int, List[Optional[int]]] = field(default_factory=dict)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def _excel_serial(value: Any) -> Optional[float]:
+    """datetime/date/Timestamp → число дней Excel (система 1900)."""
+    if isinstance(value, pd.Timestamp):
+        if value is pd.NaT:
+            return None
+        if value.tzinfo is not None:
+            value = value.tz_localize(None)
+        delta = value - _EXCEL_EPOCH_TS
+        serial = delta.days + delta.seconds / 86400.0 + delta.microseconds / 86400e6
+    elif isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        delta = value - _EXCEL_EPOCH
+        serial = delta.days + delta.seconds / 86400.0 + delta.microseconds / 86400e6
+    elif isinstance(value, date):
+        serial = float((value - _EXCEL_EPOCH.date()).days)
+    else:
+        return None
+    # Ошибка Excel 1900 (несуществующее 29.02.1900): даты до 01.03.1900 сдвинуты на день
+    if serial < 61:
+        serial -= 1
+    return serial
+
+
+def _num_text(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _cell_tail(value: Any, s_num: int, s_dt: int, s_date: int) -> Optional[str]:
+    """
+    Хвост XML ячейки после ``<c r="A1`` (начинается с закрывающей кавычки атрибута r).
+    None — ячейку не писать (пусто и без стиля).
+    """
+    if value is None or value is pd.NA or value is pd.NaT:
+        return f'" s="{s_num}"/>' if s_num else None
+    if isinstance(value, str):
+        if value == "":
+            return f'" s="{s_num}"/>' if s_num else None
+        s_attr = f' s="{s_num}"' if s_num else ""
+        text = _xml_text(value)
+        space = ' xml:space="preserve"' if value[:1].isspace() or value[-1:].isspace() else ""
+        return f'"{s_attr} t="inlineStr"><is><t{space}>{text}</t></is></c>'
+    if isinstance(value, (bool, np.bool_)):
+        s_attr = f' s="{s_num}"' if s_num else ""
+        return f'"{s_attr} t="b"><v>{1 if value else 0}</v></c>'
+    if isinstance(value, (int, np.integer)):
+        s_attr = f' s="{s_num}"' if s_num else ""
+        return f'"{s_attr}><v>{int(value)}</v></c>'
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value) or math.isinf(value):
+            return f'" s="{s_num}"/>' if s_num else None
+        s_attr = f' s="{s_num}"' if s_num else ""
+        return f'"{s_attr}><v>{_num_text(float(value))}</v></c>'
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        serial = _excel_serial(value)
+        if serial is None:
+            return f'" s="{s_num}"/>' if s_num else None
+        sid = s_dt if isinstance(value, datetime) else s_date
+        s_attr = f' s="{sid}"' if sid else ""
+        return f'"{s_attr}><v>{_num_text(serial)}</v></c>'
+    if isinstance(value, (pd.Timedelta, np.timedelta64)):
+        secs = pd.Timedelta(value).total_seconds()
+        s_attr = f' s="{s_num}"' if s_num else ""
+        return f'"{s_attr}><v>{_num_text(secs / 86400.0)}</v></c>'
+    return _cell_tail(str(value), s_num, s_dt, s_date)
+
+
+def _column_tails(
+    series: pd.Series,
+    s_num: int,
+    s_dt: int,
+    s_date: int,
+    row_styles: Optional[Sequence[Optional[int]]] = None,
+    start: int = 0,
+) -> List[Optional[str]]:
+    """
+    Хвосты XML ячеек куска столбца (один проход по значениям); start — номер первой строки куска
+    в листе, row_styles — стили отдельных строк листа (по номеру строки листа).
+    """
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        values: Sequence[Any] = series.tolist()
+    else:
+        values = series.to_numpy(dtype=object, na_value=None)
+    n_styled = len(row_styles) if row_styles else 0
+    if n_styled <= start:
+        return [_cell_tail(v, s_num, s_dt, s_date) for v in values]
+    out: List[Optional[str]] = []
+    for i, v in enumerate(values, start=start):
+        sid = row_styles[i] if i < n_styled else None
+        if sid is None:
+            out.append(_cell_tail(v, s_num, s_dt, s_date))
+        else:
+            out.append(_cell_tail(v, sid, sid, sid))
+    return out
+
+
+def _pane_xml(freeze: Optional[str]) -> str:
+    ref = parse_cell_ref(freeze)
+    if ref is None:
+        return ""
+    row, col = ref
+    x_split = col - 1
+    y_split = row - 1
+    if x_split <= 0 and y_split <= 0:
+        return ""
+    if x_split > 0 and y_split > 0:
+        pane = "bottomRight"
+    elif y_split > 0:
+        pane = "bottomLeft"
+    else:
+        pane = "topRight"
+    top_left = f"{col_letter(col)}{row}"
+    attrs = ""
+    if x_split > 0:
+        attrs += f' xSplit="{x_split}"'
+    if y_split > 0:
+        attrs += f' ySplit="{y_split}"'
+    return (
+        f'<pane{attrs} topLeftCell="{top_left}" activePane="{pane}" state="frozen"/>'
+        f'<selection pane="{pane}" activeCell="{top_left}" sqref="{top_left}"/>'
+    )
+
+
+def sheet_dimension(sheet: StreamSheet) -> str:
+    """Диапазон листа A1:<последняя ячейка> (как ws.dimensions в openpyxl)."""
+    n_cols = max(len(sheet.df.columns), 1)
+    n_rows = len(sheet.df) + 1
+    return f"A1:{col_letter(n_cols)}{n_rows}"
+
+
+def _write_sheet_xml(fh: Any, sheet: StreamSheet) -> None:
+    """Сериализация листа в открытый на запись поток zip-части (bytes)."""
+    df = sheet.df
+    n_cols = len(df.columns)
+    dim = sheet_dimension(sheet)
+    selected = ' tabSelected="1"' if sheet.selected else ""
+    head = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<dimension ref="{dim}"/>'
+        f'<sheetViews><sheetView{selected} workbookViewId="0">{_pane_xml(sheet.freeze)}</sheetView></sheetViews>'
+        '<sheetFormatPr defaultRowHeight="15"/>'
+    ]
+    if sheet.col_widths:
+        cols = "".join(
+            f'<col min="{i}" max="{i}" width="{w}" customWidth="1"/>'
+            for i, w in enumerate(sheet.col_widths, start=1)
+        )
+        head.append(f"<cols>{cols}</cols>")
+    head.append("<sheetData>")
+    fh.write("".join(head).encode("utf-8"))
+
+    letters = [col_letter(i) for i in range(1, n_cols + 1)]
+    if n_cols:
+        header_parts = ['<row r="1">']
+        for j, name in enumerate(df.columns):
+            tail = _cell_tail(str(name), sheet.header_styles[j], 0, 0)
+            if tail is not None:
+                header_parts.append(f'<c r="{letters[j]}1{tail}')
+        header_parts.append("</row>")
+        fh.write("".join(header_parts).encode("utf-8"))
+
+        # Хвосты ячеек — по кускам строк: в памяти только текущий кусок листа, а не весь лист
+        for a in range(0, len(df), _ROWS_PER_FLUSH):
+            chunk = df.iloc[a : a + _ROWS_PER_FLUSH]
+            tails_by_col = [
+                _column_tails(
+                    chunk.iloc[:, j],
+                    sheet.data_styles[j],
+                    sheet.datetime_styles[j],
+                    sheet.date_styles[j],
+                    sheet.cell_styles.get(j),
+                    start=a,
+                )
+                for j in range(n_cols)
+            ]
+            buf: List[str] = []
+            for k in range(len(chunk)):
+                rn = str(a + k + 2)
+                buf.append(f'<row r="{rn}">')
+                for j in range(n_cols):
+                    tail = tails_by_col[j][k]
+                    if tail is not None:
+                        buf.append(f'<c r="{letters[j]}{rn}{tail}')
+                buf.append("</row>")
+            fh.write("".join(buf).encode("utf-8"))
+
+    tail_xml = "</sheetData>"
+    if sheet.autofilter and n_cols:
+        tail_xml += f'<autoFilter ref="{dim}"/>'
+    tail_xml += "</worksheet>"
+    fh.write(tail_xml.encode("utf-8"))
+
+
+def _quote_sheet_name(name: str) -> str:
+    return "'" + str(name).replace("'", "''") + "'"
+
+
+def _workbook_xml(sheets: Sequence[StreamSheet]) -> str:
+    active = next((i for i, sh in enumerate(sheets) if sh.selected), 0)
+    sheet_tags = "".join(
+        f'<sheet name="{_xml_text(sh.name)}" sheetId="{i}" r:id="rId{i}"/>'
+        for i, sh in enumerate(sheets, start=1)
+    )
+    defined = []
+    for i, sh in enumerate(sheets):
+        if sh.autofilter and len(sh.df.columns):
+            first, last = sheet_dimension(sh).split(":")
+            fr, fc = parse_cell_ref(first) or (1, 1)
+            lr, lc = parse_cell_ref(last) or (1, 1)
+            ref = f"{_quote_sheet_name(sh.name)}!${col_letter(fc)}${fr}:${col_letter(lc)}${lr}"
+            defined.append(
+                f'<definedName name="_xlnm._FilterDatabase" localSheetId="{i}" hidden="1">'
+                f"{_xml_text(ref)}</definedName>"
+            )
+    defined_xml = f"<definedNames>{''.join(defined)}</definedNames>" if defined else ""
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<bookViews><workbookView activeTab="{active}"/></bookViews>'
+        f"<sheets>{sheet_tags}</sheets>"
+        f"{defined_xml}"
+        "</workbook>"
+    )
+
+
+def _workbook_rels(n_sheets: int) -> str:
+    rels = [
+        f'<Relationship Id="rId{i}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, n_sheets + 1)
+    ]
+    rels.append(
+        f'<Relationship Id="rId{n_sheets + 1}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + "".join(rels)
+        + "</Relationships>"
+    )
+
+
+def _content_types(n_sheets: int) -> str:
+    overrides = [
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>',
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>',
+        '<Override PartName="/docProps/core.xml" '
+        'ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>',
+        '<Override PartName="/docProps/app.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.extended-properties+xml"/>',
+    ]
+    for i in range(1, n_sheets + 1):
+        overrides.append(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        + "".join(overrides)
+        + "</Types>"
+    )
+
+
+def _root_rels() -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" '
+        'Target="docProps/core.xml"/>'
+        '<Relationship Id="rId3" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/extended-properties" '
+        'Target="docProps/app.xml"/>'
+        "</Relationships>"
+    )
+
+
+def _core_xml() -> str:
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'xmlns:dcterms="http://purl.org/dc/terms/" '
+        'xmlns:dcmitype="http://purl.org/dc/dcmitype/" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        "<dc:creator>SPOD_PROM</dc:creator>"
+        f'<dcterms:created xsi:type="dcterms:W3CDTF">{now}</dcterms:created>'
+        f'<dcterms:modified xsi:type="dcterms:W3CDTF">{now}</dcterms:modified>'
+        "</cp:coreProperties>"
+    )
+
+
+def _app_xml(sheet_names: Sequence[str]) -> str:
+    titles = "".join(f"<vt:lpstr>{_xml_text(n)}</vt:lpstr>" for n in sheet_names)
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties" '
+        'xmlns:vt="http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes">'
+        "<Application>SPOD_PROM</Application>"
+        '<HeadingPairs><vt:vector size="2" baseType="variant">'
+        "<vt:variant><vt:lpstr>Worksheets</vt:lpstr></vt:variant>"
+        f"<vt:variant><vt:i4>{len(sheet_names)}</vt:i4></vt:variant>"
+        "</vt:vector></HeadingPairs>"
+        f'<TitlesOfParts><vt:vector size="{len(sheet_names)}" baseType="lpstr">'
+        f"{titles}</vt:vector></TitlesOfParts>"
+        "</Properties>"
+    )
+
+
+def render_sheet_xml(path: str, sheet: StreamSheet) -> str:
+    """XML листа в отдельный (несжатый) файл; используется воркерами параллельной записи."""
+    with open(path, "wb") as fh:
+        _write_sheet_xml(fh, sheet)
+    return path
+
+
+def _render_sheet_worker(task: Tuple[StreamSheet, str]) -> Tuple[str, float]:
+    """Воркер ProcessPoolExecutor: (лист, путь) → (путь, секунды)."""
+    sheet, path = task
+    t0 = time.perf_counter()
+    render_sheet_xml(path, sheet)
+    return path, time.perf_counter() - t0
+
+
+def _prerender_sheets_parallel(
+    sheets: Sequence[StreamSheet],
+    tmp_dir: str,
+    max_workers: int,
+    min_rows_for_parallel: int,
+) -> Dict[int, str]:
+    """
+    Крупные листы рендерятся в процессах (каждый — в свой файл sheetN.xml во временном каталоге).
+    Возвращает {индекс листа: путь к готовому XML}; листы вне словаря пишутся в родителе.
+    При сбое пула — пустой словарь (все листы пишутся последовательно).
+    """
+    heavy = [
+        i for i, sh in enumerate(sheets)
+        if len(sh.df) >= min_rows_for_parallel and len(sh.df.columns) > 0
+    ]
+    if max_workers <= 1 or len(heavy) < 2:
+        return {}
+    # Самые тяжёлые листы — первыми: общее время ≈ время самого большого листа
+    heavy.sort(key=lambda i: len(sheets[i].df) * len(sheets[i].df.columns), reverse=True)
+    tasks = [(sheets[i], os.path.join(tmp_dir, f"sheet{i + 1}.xml")) for i in heavy]
+    workers = min(max_workers, len(tasks))
+    rendered: Dict[int, str] = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            for i, (path, elapsed) in zip(heavy, ex.map(_render_sheet_worker, tasks, chunksize=1)):
+                rendered[i] = path
+                logging.debug(
+                    f"[xlsx_stream] Лист «{sheets[i].name}» отрендерен в процессе: {elapsed:.2f} s"
+                )
+    except Exception as ex:
+        logging.warning(
+            f"[xlsx_stream] Параллельный рендер листов не удался ({ex}); листы пишутся последовательно"
+        )
+        return {}
+    logging.info(
+        f"[xlsx_stream] Листов отрендерено параллельно: {len(rendered)} (процессов: {workers})"
+    )
+    return rendered
+
+
+def write_xlsx_stream(
+    path: str,
+    sheets: Sequence[StreamSheet],
+    styles: XlsxStyleRegistry,
+    max_workers: int = 1,
+    min_rows_for_parallel: int = PARALLEL_SHEET_MIN_ROWS,
+) -> None:
+    """
+    Записывает книгу: служебные части + по одной части worksheet на лист.
+
+    Листы пишутся в zip потоково (``ZipFile.open(..., "w")``), без промежуточной
+    строки XML на весь лист. При ``max_workers > 1`` листы от ``min_rows_for_parallel`` строк
+    рендерятся в отдельных процессах (стили уже разрешены в id, строки inline — общий
+    sharedStrings не нужен), а zip собирается один раз в родителе.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="xlsx_stream_", dir=parent or None) as tmp_dir:
+        rendered = _prerender_sheets_parallel(sheets, tmp_dir, max_workers, min_rows_for_parallel)
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            z.writestr("[Content_Types].xml", _content_types(len(sheets)))
+            z.writestr("_rels/.rels", _root_rels())
+            z.writestr("docProps/core.xml", _core_xml())
+            z.writestr("docProps/app.xml", _app_xml([s.name for s in sheets]))
+            z.writestr("xl/workbook.xml", _workbook_xml(sheets))
+            z.writestr("xl/_rels/workbook.xml.rels", _workbook_rels(len(sheets)))
+            z.writestr("xl/styles.xml", styles.styles_xml())
+            for i, sh in enumerate(sheets):
+                arcname = f"xl/worksheets/sheet{i + 1}.xml"
+                if i in rendered:
+                    z.write(rendered[i], arcname)
+                    continue
+                with z.open(arcname, "w", force_zip64=True) as fh:
+                    _write_sheet_xml(fh, sh)